@@ -1,18 +1,53 @@
+import asyncio
 import base64
 import json
 import random
 import requests
-from PIL import Image, PngImagePlugin
+from PIL import Image
 import io
 import os
 from datetime import datetime
 import re
+import shlex
 from tqdm import tqdm
 import time
 import logging
 import glob
 import math
 import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+
+try:
+    from .webui_client import WebUIClient
+    from .backend_pool import BackendPool, NoHealthyBackendError
+    from .retry_policy import RetryPolicy
+    from .batch_manifest import BatchManifest
+    from .response_stream import read_txt2img_response, DEFAULT_SPOOL_MAX_SIZE
+    from .progress_monitor import ProgressMonitor, RenderStalledError
+    from .model_load_times import ModelLoadTimes
+    from .capability_cache import CapabilityCache, PreflightError
+    from .response_cache import ResponseCache
+    from .shared_output import SharedOutputHandoff
+    from .post_process_pipeline import PostProcessPipeline
+    from .image_encoder import ImageEncoder, merge_images, save_target
+    from .job_journal import JobJournal
+except ImportError:
+    # autoimagegeneratorフォルダ内でスクリプトとして実行された場合
+    from webui_client import WebUIClient
+    from backend_pool import BackendPool, NoHealthyBackendError
+    from retry_policy import RetryPolicy
+    from batch_manifest import BatchManifest
+    from response_stream import read_txt2img_response, DEFAULT_SPOOL_MAX_SIZE
+    from progress_monitor import ProgressMonitor, RenderStalledError
+    from model_load_times import ModelLoadTimes
+    from capability_cache import CapabilityCache, PreflightError
+    from response_cache import ResponseCache
+    from shared_output import SharedOutputHandoff
+    from post_process_pipeline import PostProcessPipeline
+    from image_encoder import ImageEncoder, merge_images, save_target
+    from job_journal import JobJournal
 
 class AutoImageGenerator:
 
@@ -39,10 +74,16 @@ class AutoImageGenerator:
         use_lora=False,
         lora_name=None,
         dry_run=False,
-        debug_mode=False
+        debug_mode=False,
+        backends=None,
+        variation_strategy=None,
+        session=None
     ):
+        # 複数のプロファイルを1つのプロセスで実行する場合に共有するリソース（GeneratorSession、省略時は共有しない）
+        self.session = session
+
         # 設定ファイルの読み込み
-        self.settings = self._load_settings()
+        self.settings = self._shared("settings", self._load_settings)
 
         # ドライランモードの設定
         self.dry_run = dry_run
@@ -68,7 +109,7 @@ class AutoImageGenerator:
         # 画像生成バッチの実行回数を指定
         self.IMAGE_GENERATE_BATCH_EXECUTE_COUNT = image_generate_batch_execute_count
 
-        # 生成された画像の別バージョン(同じSeed値でオプションのプロンプトを変更)を作成する回数を指定
+        # 生成された画像の別バージョン(同じSeed値でオプションのプロンプトまたはVariation seedを変更)を作成する回数を指定
         self.ANOTHER_VERSION_GENERATE_COUNT = another_version_generate_count
 
         # 絶対パスを取得するためのベースディレクトリ
@@ -161,6 +202,111 @@ class AutoImageGenerator:
             if self.debug_mode:
                 self.logger.info("デバッグモードが有効です")
 
+        # 全てのAPI呼び出しで共有するHTTPトランスポート（接続プール・Keep-Alive・タイムアウト）
+        self.client = self._shared(
+            ("client", self.URL),
+            lambda: WebUIClient.from_settings(self.URL, self.settings.get("http", {}), logger=self.logger)
+        )
+
+        # txt2imgリクエストを振り分けるバックエンドプール（引数またはsettings.jsonの "backends" で複数指定可能）
+        # session を共有する場合は、同じバックエンドの組み合わせのプールを使い回し、ロード済みのモデルの情報も引き継ぐ
+        pool_settings = {**self.settings, "backends": backends} if backends else self.settings
+        self.backend_pool = self._shared(
+            ("backend_pool", self.URL, tuple(backends or ())),
+            lambda: BackendPool.from_settings(self.URL, pool_settings, client=self.client, logger=self.logger)
+        )
+
+        # モデル切り替えの確認間隔と期限（秒）、チェックポイント毎のロード時間の記録
+        self.MODEL_SWITCH_SETTINGS = {
+            "initial_interval": 0.5,
+            "max_interval": 5,
+            "backoff": 1.5,
+            "deadline": 600,
+            **self.settings.get("model_switch", {})
+        }
+        load_times_file = self.MODEL_SWITCH_SETTINGS.get("load_times_file") or os.path.join(self.OUTPUT_FOLDER, "model_load_times.json")
+        self.model_load_times = self._shared(
+            ("model_load_times", load_times_file),
+            lambda: ModelLoadTimes(load_times_file, logger=self.logger)
+        )
+
+        # モデル切り替え後のウォームアップ（低ステップの描画を1回行い、出力は破棄する）
+        self.WARMUP_SETTINGS = {"enabled": False, "steps": 2, **self.settings.get("warmup", {})}
+        # バックエンド毎のウォームアップの所要時間（秒）
+        self.warmup_times = {}
+
+        # バックエンド毎に利用可能なモデル・LoRA等のキャッシュ（txt2imgの送信前にペイロードを検証する）
+        capability_settings = self.settings.get("capabilities", {})
+        self.capabilities = None
+        if capability_settings.get("enabled", True):
+            self.capabilities = self._shared(("capabilities", self.OUTPUT_FOLDER), lambda: CapabilityCache.from_settings(
+                capability_settings,
+                default_cache_file=os.path.join(self.OUTPUT_FOLDER, "capabilities.json"),
+                logger=self.logger
+            ))
+
+        # 同じペイロードのtxt2imgのレスポンスを再利用するディスクキャッシュ（無効な場合はNone）
+        self.response_cache = self._shared(("response_cache", self.OUTPUT_FOLDER), lambda: ResponseCache.from_settings(
+            self.settings.get("response_cache", {}),
+            default_cache_dir=os.path.join(self.OUTPUT_FOLDER, "txt2img_cache"),
+            logger=self.logger
+        ))
+
+        # Web UIと共有しているフォルダ経由でtxt2imgの画像を受け取るハンドオフ（無効な場合はNone）
+        self.shared_output = SharedOutputHandoff.from_settings(self.settings.get("shared_output", {}), logger=self.logger)
+        if self.shared_output is not None and self.IS_TRANSPARENT_BACKGROUND:
+            # ABG Removerの透過背景画像はWeb UIの保存先に保存されないため、レスポンスで受け取る
+            self.logger.warning("透過画像の生成では shared_output を使用できないため、画像をレスポンスで受け取ります")
+            self.shared_output = None
+
+        # txt2imgリクエストの送信と画像の保存等の後処理を分離するパイプライン（無効な場合は送信したスレッドで保存する）
+        self.post_processor = self._shared(
+            "post_processor",
+            lambda: PostProcessPipeline.from_settings(self.settings.get("post_process", {}), logger=self.logger)
+        )
+
+        # 元画像・JPEG・サムネイル等の派生画像を複数のプロセスでエンコードするサービス（無効な場合はこのプロセスで順に保存する）
+        self.image_encoder = self._shared(
+            "image_encoder",
+            lambda: ImageEncoder.from_settings(self.settings.get("image_encoder", {}), logger=self.logger)
+        )
+
+        # 実行毎のバッチと各画像の生成状況を記録するジョブジャーナル（無効な場合はNone）
+        # run_options には --resume で再開する際にジェネレーターを作成し直すための起動オプションを設定する
+        self.job_journal = self._shared(("job_journal", self.OUTPUT_FOLDER), lambda: JobJournal.from_settings(
+            self.settings.get("job_journal", {}),
+            default_path=os.path.join(self.OUTPUT_FOLDER, "job_journal.sqlite3"),
+            logger=self.logger
+        ))
+        self.run_id = None
+        self.run_options = {}
+        # 事前検証・モデルの切り替えに失敗して run()・arun() を中止した場合はTrue（main.py serve でジョブの失敗の判定に使用）
+        self.aborted = False
+
+        # cancel() で中止を要求された場合は、未着手のバッチと送信前のリクエストを生成しない
+        self._cancel_event = threading.Event()
+        # arun() でエラーになったバッチがある場合は、他のバッチも送信前のリクエストを生成しない（arun() の開始時にクリアする）
+        self._abort_event = threading.Event()
+        # バッチの処理が終わる度に結果を通知するコールバック（on_batch_finished(dict)、main.py serve のイベント通知用）
+        self.on_batch_finished = None
+
+        # バックエンド毎の描画の進捗監視（進捗が止まった場合は /sdapi/v1/interrupt で中断してリトライする）
+        monitor_settings = self.settings.get("progress_monitor", {})
+        self.progress_monitors = {}
+        if monitor_settings.get("enabled", True):
+            self.progress_monitors = {
+                backend.url: ProgressMonitor.from_settings(backend.client, monitor_settings, logger=self.logger)
+                for backend in self.backend_pool.backends
+            }
+
+        # txt2imgのレスポンスを逐次デコードするかどうか（画像1枚あたり spool_max_size バイトを超えた分は一時ファイルに書き出す）
+        http_settings = self.settings.get("http", {})
+        self.STREAM_RESPONSES = http_settings.get("stream_responses", True)
+        self.SPOOL_MAX_SIZE = http_settings.get("spool_max_size", DEFAULT_SPOOL_MAX_SIZE)
+
+        # txt2imgリクエストのリトライ・バックオフ設定
+        self.retry_policy = RetryPolicy.from_settings(self.settings.get("retry", {}), logger=self.logger)
+
         # 画像タイプに応じたフォルダ構造を作成
         self._create_output_directories()
 
@@ -239,6 +385,11 @@ class AutoImageGenerator:
             # 2つ目：マスク画像
             # 3つ目：透過背景画像（実際に使用する画像）
         }
+
+        # 透過画像生成時に元画像・マスク画像もデコードせずに保存するかどうか（保存先: バッチフォルダ/transparent-source）
+        self.SAVE_TRANSPARENT_SOURCES = self.settings.get("save_transparent_sources", False)
+        self.TRANSPARENT_SOURCE_FOLDER = "transparent-source"
+        self.TRANSPARENT_SOURCE_SUFFIXES = {1: "original", 2: "mask"}
         self.DATA_POSITIVE_BASE = None
         self.DATA_POSITIVE_OPTIONAL = None
         self.DATA_POSITIVE_SELFIE = None
@@ -299,10 +450,63 @@ class AutoImageGenerator:
         # Seed の桁数が少ない場合生成される画像の質が低い可能性が高いため、生成をキャンセルする閾値として設定
         self.CANCEL_MIN_SEED_VALUE = 999999999
 
+        # PNGInfoをtxt2imgレスポンスから取得できない場合に /png-info APIを呼び出すかどうか（オプトイン）
+        self.USE_PNG_INFO_API = self.settings.get("use_png_info_api", False)
+
+        # 非同期エンジン（arun）で同時に送信しておくtxt2imgリクエストの数
+        # 省略時はバックエンド1台あたり2件（描画中の1件 + 待機中の1件）。
+        # 同時リクエスト数の自動調整が有効な場合は、各バックエンドの上限の合計（実際の同時リクエスト数はバックエンド毎に調整される）
+        default_max_in_flight = sum(
+            backend.concurrency.max_limit if backend.concurrency else 2
+            for backend in self.backend_pool.backends
+        )
+        self.MAX_IN_FLIGHT_REQUESTS = self.settings.get("max_in_flight_requests", default_max_in_flight)
+        # 非同期エンジンでプロンプトと出力フォルダを先に準備しておく（完了していない）バッチ数の上限
+        # 省略時は同時リクエスト数 + 1（1バッチ1リクエストの場合も送信待ちのリクエストが途切れない数）
+        self.MAX_PREPARED_BATCHES = self.settings.get("max_prepared_batches")
+
+        # 別バージョンの画像の作り方（"prompt": オプションのプロンプトを変更、"subseed": 同じプロンプトでVariation seedを変更）
+        self.VARIATION_SETTINGS = {
+            "strategy": "prompt",
+            "subseed_strength": 0.15,
+            "max_batch_size": 6,
+            "multi_prompt": False,
+            "max_prompts_per_request": 12,
+            "prompt_position": "start",
+            **self.settings.get("variation", {})
+        }
+        self.VARIATION_STRATEGY = variation_strategy or self.VARIATION_SETTINGS["strategy"]
+        if self.VARIATION_STRATEGY not in ("prompt", "subseed"):
+            raise ValueError(f"別バージョンの生成方法が不正です: {self.VARIATION_STRATEGY} (指定可能: prompt, subseed)")
+        if self.VARIATION_STRATEGY == "subseed" and self.IS_TRANSPARENT_BACKGROUND:
+            # ABG Removerは1枚毎に3つの画像を返すため、まとめて描画した結果を分割できない
+            self.logger.warning("透過画像の生成では subseed による別バージョンの生成を使用できないため、プロンプトを変更して生成します")
+            self.VARIATION_STRATEGY = "prompt"
+
+        # "prompt" 方式の別バージョンの画像を "Prompts from file or textbox" スクリプトで1回のリクエストにまとめるかどうか
+        self.MULTI_PROMPT_REQUESTS = self.VARIATION_STRATEGY == "prompt" and bool(self.VARIATION_SETTINGS["multi_prompt"])
+        if self.MULTI_PROMPT_REQUESTS and self.IS_TRANSPARENT_BACKGROUND:
+            # ABG Removerとスクリプトを同時に指定できない
+            self.logger.warning("透過画像の生成では multi_prompt を使用できないため、別バージョンの画像を1枚ずつ生成します")
+            self.MULTI_PROMPT_REQUESTS = False
+
+        # 1回のtxt2imgリクエストで描画するバッチ（オリジナル画像のSeed値）の数
+        # Seed値が連続するK個のバッチを batch_size=K でまとめて描画し、レスポンスをバッチフォルダ毎に分割して保存する
+        self.BASE_IMAGE_BATCH_SIZE = max(1, int(self.settings.get("base_image_batch_size", 1)))
+        if self.BASE_IMAGE_BATCH_SIZE > 1 and self.IS_TRANSPARENT_BACKGROUND:
+            # ABG Removerは1枚毎に3つの画像を返すため、まとめて描画した結果を分割できない
+            self.logger.warning("透過画像の生成では base_image_batch_size を使用できないため、1枚ずつ生成します")
+            self.BASE_IMAGE_BATCH_SIZE = 1
+
     def _create_output_directories(self):
         """
         画像タイプに応じた出力ディレクトリ構造を作成する
+
+        session を共有している場合は、同じ出力フォルダの構造は最初の1回のみ作成する。
         """
+        if self.session is not None and not self.session.claim_output_tree(self.OUTPUT_FOLDER):
+            return
+
         # スタイル（大項目）
         styles = ["realistic", "illustration"]
 
@@ -378,7 +582,12 @@ class AutoImageGenerator:
         return final_output_path
 
     def set_model(self, model_name):
-        """モデルを切り替えるためのリクエストを送信（最初の1回のみ実行）"""
+        """
+        モデルを切り替えるためのリクエストを送信（最初の1回のみ実行）
+
+        バックエンドが複数ある場合は全てのバックエンドで並行して切り替える。
+        1台でも切り替えに成功すればTrueを返す（切り替えに失敗したバックエンドには優先して振り分けない）。
+        """
         # 既にモデル切り替えが実行済みの場合はスキップ
         if self._model_switch_executed:
             self.logger.info("モデル切り替えは既に実行済みのため、スキップします")
@@ -386,43 +595,146 @@ class AutoImageGenerator:
 
         self.logger.info(f"モデル切り替え開始: {model_name}")
 
+        backends = self.backend_pool.backends
+        if len(backends) == 1:
+            results = [self._set_backend_model(backends[0], model_name)]
+        else:
+            with ThreadPoolExecutor(max_workers=len(backends)) as executor:
+                results = list(executor.map(lambda backend: self._set_backend_model(backend, model_name), backends))
+
+        if any(results):
+            self._model_switch_executed = True
+            self._current_model = model_name
+
+            # 切り替えに成功したバックエンドをウォームアップ
+            if self.WARMUP_SETTINGS["enabled"]:
+                ready_backends = [backend for backend, result in zip(backends, results) if result]
+                if len(ready_backends) == 1:
+                    self._warm_up_backend(ready_backends[0])
+                else:
+                    with ThreadPoolExecutor(max_workers=len(ready_backends)) as executor:
+                        list(executor.map(self._warm_up_backend, ready_backends))
+            return True
+        return False
+
+    def _set_backend_model(self, backend, model_name):
+        """
+        1台のバックエンドでモデルを切り替え、切り替えが完了するまで待機する
+
+        Args:
+            backend (Backend): 対象のバックエンド
+            model_name (str): 切り替えるモデルのチェックポイント名
+
+        Returns:
+            bool: 切り替えに成功した場合はTrue
+        """
+        # ロード済みのモデルが分かっている場合は問い合わせを省略
+        if backend.current_model == model_name:
+            self.logger.info(f"モデル {model_name} は既に設定されています ({backend.url})")
+            return True
+
         try:
             # 現在のモデルを確認
-            current_model_response = requests.get(self.OPTIONS_URL)
+            current_model_response = backend.client.get(backend.options_url)
             current_model = current_model_response.json().get("sd_model_checkpoint")
-            self.logger.info(f"現在のモデル: {current_model}")
+            backend.current_model = current_model
+            self.logger.info(f"現在のモデル: {current_model} ({backend.url})")
 
             # 既に指定されたモデルが設定されている場合はスキップ
             if current_model == model_name:
-                self.logger.info(f"モデル {model_name} は既に設定されています")
-                self._model_switch_executed = True
+                self.logger.info(f"モデル {model_name} は既に設定されています ({backend.url})")
                 return True
 
+            # 過去の実績からロード時間を予測
+            predicted_time = self.model_load_times.predict(model_name, backend.url)
+            if predicted_time is not None:
+                self.logger.info(f"モデル {model_name} の予測ロード時間: {predicted_time:.1f}秒 ({backend.url})")
+
             # _switch_modelを呼び出してモデルを切り替え
-            self._switch_model(model_name)
+            switch_start_time = time.time()
+            try:
+                self._switch_model(model_name, backend)
+            except requests.exceptions.ReadTimeout:
+                # 大きなモデルはロードが終わるまで応答が返らないため、タイムアウトしても完了を待つ
+                self.logger.info(f"モデル切り替えリクエストの応答待ちがタイムアウトしました。ロードの完了を待ちます ({backend.url})")
 
             # モデルの切り替えが完了するまで待機
-            max_retries = 20
-            retry_count = 0
-            while retry_count < max_retries:
-                time.sleep(5)
-                verify_response = requests.get(self.OPTIONS_URL)
-                current_model = verify_response.json().get("sd_model_checkpoint")
-                self.logger.info(f"モデル切り替え確認 (試行 {retry_count+1}/{max_retries}): 現在のモデル = {current_model}")
-
-                if current_model == model_name:
-                    self.logger.info(f"モデルを {model_name} に切り替えました")
-                    self._model_switch_executed = True
-                    return True
-                retry_count += 1
-
-            self.logger.error(f"モデルの切り替えが確認できませんでした。最終モデル: {current_model}")
+            if self._wait_for_model(backend, model_name, switch_start_time):
+                self.model_load_times.record(model_name, time.time() - switch_start_time, backend.url)
+                return True
+
+            self.logger.error(f"モデルの切り替えが確認できませんでした。最終モデル: {backend.current_model} ({backend.url})")
             return False
 
         except requests.exceptions.RequestException as e:
-            self.logger.error(f"モデルの切り替え中にエラーが発生しました: {e}")
+            self.logger.error(f"モデルの切り替え中にエラーが発生しました: {e} ({backend.url})")
+            self.backend_pool.mark_unhealthy(backend)
             return False
 
+    def _warm_up_backend(self, backend):
+        """
+        ジョブと同じ解像度・LoRA設定で低ステップの描画を1回行い、VRAMへのロードやキャッシュの準備を済ませる
+
+        出力画像は返さないように指定して破棄する。所要時間はバッチの所要時間とは別に記録する。
+        失敗してもバッチの生成は続行する。
+
+        Args:
+            backend (Backend): 対象のバックエンド
+        """
+        payload = self._build_payload("warm-up", "", -1, apply_lora=True)
+        steps = self.WARMUP_SETTINGS["steps"]
+        payload.update({"steps": steps, "hr_second_pass_steps": steps, "send_images": False, "save_images": False})
+
+        self.logger.info(f"ウォームアップを開始します ({backend.url}, {payload['width']}x{payload['height']}, {steps}ステップ)")
+        start_time = time.time()
+        try:
+            response = backend.client.post(backend.txt2img_url, json=payload)
+            response.raise_for_status()
+            response.close()
+        except requests.exceptions.RequestException as e:
+            self.logger.warning(f"ウォームアップに失敗しました ({backend.url}): {e}")
+            return
+
+        self.warmup_times[backend.url] = time.time() - start_time
+        self.logger.info(f"ウォームアップが完了しました ({backend.url}, 所要時間: {self.warmup_times[backend.url]:.2f}秒)")
+
+    def _wait_for_model(self, backend, model_name, switch_start_time):
+        """
+        モデルの切り替えが完了するまで、間隔を広げながら /sdapi/v1/options を確認する
+
+        最初は短い間隔で確認し、確認する毎に間隔を backoff 倍（最大 max_interval 秒）に広げる。
+        切り替え開始から deadline 秒を過ぎた場合は失敗とする。
+
+        Args:
+            backend (Backend): 対象のバックエンド
+            model_name (str): 切り替えるモデルのチェックポイント名
+            switch_start_time (float): 切り替えを開始した時刻
+
+        Returns:
+            bool: 期限内に切り替えが確認できた場合はTrue
+        """
+        interval = self.MODEL_SWITCH_SETTINGS["initial_interval"]
+        deadline = switch_start_time + self.MODEL_SWITCH_SETTINGS["deadline"]
+        attempt = 0
+
+        while True:
+            attempt += 1
+            verify_response = backend.client.get(backend.options_url)
+            current_model = verify_response.json().get("sd_model_checkpoint")
+            backend.current_model = current_model
+            elapsed_time = time.time() - switch_start_time
+            self.logger.info(f"モデル切り替え確認 (試行 {attempt}, {elapsed_time:.1f}秒経過): 現在のモデル = {current_model} ({backend.url})")
+
+            if current_model == model_name:
+                self.logger.info(f"モデルを {model_name} に切り替えました ({backend.url})")
+                return True
+
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return False
+            time.sleep(min(interval, remaining))
+            interval = min(interval * self.MODEL_SWITCH_SETTINGS["backoff"], self.MODEL_SWITCH_SETTINGS["max_interval"])
+
     # ランダムなプロンプトを生成
     def generate_random_prompts(self, data):
         combined_prompt = []
@@ -538,103 +850,82 @@ class AutoImageGenerator:
 
     # 必要な関連画像を作成
     def generate_related_images(self, base_image, folder_path, filename, pnginfo=None):
+        self._encode_image(base_image, self._build_related_targets(base_image, folder_path, filename))
+        return {}
 
+    def _build_related_targets(self, base_image, folder_path, filename):
+        """
+        関連画像（サンプル画像・サムネイル・サンプルサムネイル・半分の解像度の画像）の保存先と加工内容を作成する
+
+        Args:
+            base_image (PIL.Image.Image): 元画像
+            folder_path (str): バッチの出力フォルダ
+            filename (str): ファイル名（拡張子なし）
+
+        Returns:
+            list: 派生画像の指定（image_encoder.save_target を参照）
+        """
         # 画像に「Sample」のテキストを追加して保存
         sample_text_image_path = os.path.join(self.INPUT_FOLDER, "sample.png")
 
-        # サンプル画像が存在するか確認
-        if os.path.exists(sample_text_image_path):
-            sample_text_image = Image.open(sample_text_image_path)
-            image_with_sample_text = self.merge_images(base_image, sample_text_image)
-        else:
-            # サンプル画像が存在しない場合は、テキストを直接描画
+        # サンプル画像が存在しない場合は、テキストを直接描画
+        if not os.path.exists(sample_text_image_path):
             logging.warning(f"サンプル画像が見つかりません: {sample_text_image_path}")
-            image_with_sample_text = base_image.copy()
-            # テキストを描画するためのDrawオブジェクトを作成
-            from PIL import ImageDraw, ImageFont
-            draw = ImageDraw.Draw(image_with_sample_text)
-            # フォントサイズは画像サイズに応じて調整
-            font_size = max(10, min(base_image.width, base_image.height) // 10)
-            try:
-                # フォントを読み込む（システムフォントを使用）
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except IOError:
-                # フォントが見つからない場合はデフォルトフォントを使用
-                font = ImageFont.load_default()
-            # テキストを描画
-            draw.text((10, 10), "SAMPLE", fill=(255, 0, 0, 255), font=font)
-
-        sample_folder = os.path.normpath(os.path.join(folder_path, "sample"))
-        image_with_sample_text_file_path = os.path.normpath(os.path.join(sample_folder,
-                                                         filename + "-with-sample-text" + self.IMAGE_FILE_EXTENSION))
-        # フォルダが存在しない場合は作成
-        if not os.path.exists(sample_folder):
-            os.makedirs(sample_folder)
-
-        image_with_sample_text.save(image_with_sample_text_file_path)
+            sample_text_image_path = None
 
-        # サムネイル用画像を生成して保存
+        # サムネイル用画像のサイズ（画像サイズが小さい場合は、サムネイルのサイズを調整）
         thumbnail_ratio = 2
         if self.ENABLE_HR == True:
             thumbnail_ratio = 4
-
-        # 画像サイズが小さい場合は、サムネイルのサイズを調整
-        new_width = max(1, base_image.width // thumbnail_ratio)
-        new_height = max(1, base_image.height // thumbnail_ratio)
-        thumbnail_image = base_image.resize((new_width, new_height))
+        thumbnail_size = (max(1, base_image.width // thumbnail_ratio), max(1, base_image.height // thumbnail_ratio))
         thumbnail_filename = f"{filename}-thumbnail"
-        thumbnail_folder = os.path.normpath(os.path.join(folder_path, "thumbnail"))
-        thumbnail_file_path = os.path.normpath(os.path.join(thumbnail_folder,
-                                                 thumbnail_filename + self.IMAGE_FILE_EXTENSION))
-        if not os.path.exists(thumbnail_folder):
-            os.makedirs(thumbnail_folder)
-        thumbnail_image.save(thumbnail_file_path)
-
-        # サンプルサムネイル画像を生成して保存
-        if os.path.exists(sample_text_image_path):
-            # サンプル画像が存在する場合
-            sample_text_image = Image.open(sample_text_image_path)
-            image_with_sample_text = self.merge_images(thumbnail_image, sample_text_image)
-        else:
-            # サンプル画像が存在しない場合は、テキストを直接描画
-            image_with_sample_text = thumbnail_image.copy()
-            # テキストを描画するためのDrawオブジェクトを作成
-            from PIL import ImageDraw, ImageFont
-            draw = ImageDraw.Draw(image_with_sample_text)
-            # フォントサイズは画像サイズに応じて調整
-            font_size = max(5, min(thumbnail_image.width, thumbnail_image.height) // 10)
-            try:
-                # フォントを読み込む（システムフォントを使用）
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except IOError:
-                # フォントが見つからない場合はデフォルトフォントを使用
-                font = ImageFont.load_default()
-            # テキストを描画
-            draw.text((5, 5), "SAMPLE", fill=(255, 0, 0, 255), font=font)
-
-        sample_thumbnail_folder = os.path.normpath(os.path.join(folder_path, "sample-thumbnail"))
-        image_with_sample_text_file_path = os.path.normpath(os.path.join(sample_thumbnail_folder,
-                                                         thumbnail_filename + "-with-sample-text" + self.IMAGE_FILE_EXTENSION))
-        if not os.path.exists(sample_thumbnail_folder):
-            os.makedirs(sample_thumbnail_folder)
-        image_with_sample_text.save(image_with_sample_text_file_path)
+
+        targets = [
+            {
+                "path": os.path.normpath(os.path.join(folder_path, "sample",
+                                                      filename + "-with-sample-text" + self.IMAGE_FILE_EXTENSION)),
+                "watermark": {"image": sample_text_image_path, "offset": 10, "min_font_size": 10}
+            },
+            {
+                "path": os.path.normpath(os.path.join(folder_path, "thumbnail",
+                                                      thumbnail_filename + self.IMAGE_FILE_EXTENSION)),
+                "size": thumbnail_size
+            },
+            {
+                "path": os.path.normpath(os.path.join(folder_path, "sample-thumbnail",
+                                                      thumbnail_filename + "-with-sample-text" + self.IMAGE_FILE_EXTENSION)),
+                "size": thumbnail_size,
+                "watermark": {"image": sample_text_image_path, "offset": 5, "min_font_size": 5}
+            }
+        ]
 
         if self.ENABLE_HR == True:
-            # 半分の解像度の画像を生成して保存
-            new_width = max(1, base_image.width // 2)
-            new_height = max(1, base_image.height // 2)
-            half_resolution_image = base_image.resize((new_width, new_height), Image.LANCZOS)
-            half_resolution_filename = f"{filename}-half-resolution"
-            half_resolution_folder = os.path.normpath(os.path.join(folder_path, "half-resolution"))
-            half_resolution_file_path = os.path.normpath(os.path.join(half_resolution_folder,
-                                                      half_resolution_filename + self.IMAGE_FILE_EXTENSION))
-            if not os.path.exists(half_resolution_folder):
-                os.makedirs(half_resolution_folder)
-            half_resolution_image.save(half_resolution_file_path)
+            # 半分の解像度の画像
+            targets.append({
+                "path": os.path.normpath(os.path.join(folder_path, "half-resolution",
+                                                      f"{filename}-half-resolution" + self.IMAGE_FILE_EXTENSION)),
+                "size": (max(1, base_image.width // 2), max(1, base_image.height // 2)),
+                "resample": Image.LANCZOS
+            })
 
-        return {}
+        return targets
+
+    def _encode_image(self, image, targets):
+        """
+        派生画像を保存する（image_encoder が有効な場合は複数のプロセスで並列に保存する）
+
+        Args:
+            image (PIL.Image.Image): 元画像
+            targets (list): 派生画像の指定（image_encoder.save_target を参照）
+
+        Returns:
+            list: 保存したファイルのパス
+        """
+        if self.image_encoder is not None:
+            return self.image_encoder.encode(image, targets)
+        return [save_target(image, target) for target in targets]
 
-    def save_prompts_to_json(self, positive_base_prompt_dict, positive_pose_prompt_dict, positive_optional_prompt_dict, negative_prompt_dict, folder_path, filename, cancel_prompts):
+    def save_prompts_to_json(self, positive_base_prompt_dict, positive_pose_prompt_dict, positive_optional_prompt_dict, negative_prompt_dict, folder_path, filename, cancel_prompts, png_info=None, parameters=None):
         """
         プロンプト情報をJSONファイルに保存する
 
@@ -646,10 +937,18 @@ class AutoImageGenerator:
             folder_path (str): 保存先フォルダパス
             filename (str): ファイル名（拡張子なし）
             cancel_prompts (list): キャンセルされたプロンプトのリスト
+            png_info (dict, optional): 解析済みのPNGInfo（省略時は current_png_info を使用）
+            parameters (str, optional): PNGInfo文字列（省略時は current_parameters を使用）
 
         Returns:
             dict: 空の辞書
         """
+        # 並行して保存する場合に備え、引数で渡された値を優先する
+        if png_info is None:
+            png_info = getattr(self, 'current_png_info', None)
+        if parameters is None:
+            parameters = getattr(self, 'current_parameters', None)
+
         # モデル情報を取得（ファイル名から拡張子を除去）
         model_name = os.path.splitext(self.SD_MODEL_CHECKPOINT)[0]
 
@@ -676,24 +975,27 @@ class AutoImageGenerator:
             merged_dict["cancel_prompts"] = cancel_prompts
 
         # PNGInfoから取得した実際のプロンプト情報を追加（オプション）
-        if hasattr(self, 'current_png_info') and self.current_png_info:
+        if png_info:
             # 実際のプロンプト情報を別のキーとして追加
-            if "prompt" in self.current_png_info:
-                merged_dict["actual_prompt"] = self.current_png_info["prompt"]
-                self.logger.debug(f"実際のプロンプトをJSONに保存します: {self.current_png_info['prompt'][:100]}...")
+            if "prompt" in png_info:
+                merged_dict["actual_prompt"] = png_info["prompt"]
+                self.logger.debug(f"実際のプロンプトをJSONに保存します: {png_info['prompt'][:100]}...")
 
-            if "negative_prompt" in self.current_png_info:
-                merged_dict["actual_negative_prompt"] = self.current_png_info["negative_prompt"]
-                self.logger.debug(f"実際のネガティブプロンプトをJSONに保存します: {self.current_png_info['negative_prompt'][:100]}...")
+            if "negative_prompt" in png_info:
+                merged_dict["actual_negative_prompt"] = png_info["negative_prompt"]
+                self.logger.debug(f"実際のネガティブプロンプトをJSONに保存します: {png_info['negative_prompt'][:100]}...")
 
             # シード値を追加
-            if "seed" in self.current_png_info:
-                merged_dict["seed"] = self.current_png_info["seed"]
+            if "seed" in png_info:
+                merged_dict["seed"] = png_info["seed"]
+            if "subseed" in png_info:
+                merged_dict["subseed"] = png_info["subseed"]
+                merged_dict["subseed_strength"] = png_info["subseed_strength"]
         else:
             logging.warning("current_png_infoが設定されていません")
             # 代替手段として、生のパラメータから情報を抽出
-            if hasattr(self, 'current_parameters') and self.current_parameters:
-                lines = self.current_parameters.split('\n')
+            if parameters:
+                lines = parameters.split('\n')
                 if lines:
                     merged_dict["actual_prompt"] = lines[0].strip()
                     self.logger.debug(f"代替手段で実際のプロンプトをJSONに保存します: {lines[0].strip()[:100]}...")
@@ -706,7 +1008,7 @@ class AutoImageGenerator:
                             break
 
                     # Seedを探す
-                    seed_match = re.search(r"Seed:\s*(\d+)", self.current_parameters)
+                    seed_match = re.search(r"Seed:\s*(\d+)", parameters)
                     if seed_match:
                         merged_dict["seed"] = int(seed_match.group(1))
 
@@ -719,28 +1021,7 @@ class AutoImageGenerator:
 
     # 画像の合成
     def merge_images(self, background_image, transparent_image):
-        # 背景画像がRGBAでない場合は変換
-        if background_image.mode != "RGBA":
-            background_image = background_image.convert("RGBA")
-
-        # 透過画像がRGBAでない場合は変換
-        if transparent_image.mode != "RGBA":
-            transparent_image = transparent_image.convert("RGBA")
-
-        # 透過画像を背景画像のサイズに合わせる
-        transparent_image = transparent_image.resize(background_image.size)
-
-        try:
-            # 透過画像を背景画像に合成
-            result_image = Image.alpha_composite(background_image, transparent_image)
-        except ValueError as e:
-            # エラーが発生した場合はログに記録し、背景画像をそのまま返す
-            logging.warning(f"画像の合成中にエラーが発生しました: {e}")
-            logging.warning(f"背景画像: サイズ={background_image.size}, モード={background_image.mode}")
-            logging.warning(f"透過画像: サイズ={transparent_image.size}, モード={transparent_image.mode}")
-            result_image = background_image
-
-        return result_image
+        return merge_images(background_image, transparent_image)
 
     def create_image_collage(self, input_folder, output_path, rows, cols, recreate_collage=True):
 
@@ -958,13 +1239,11 @@ class AutoImageGenerator:
         # 各ファイルを読み込む関数
         def load_json_file(file_path, fallback_path=None):
             if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return self._read_prompt_file(file_path)
             elif fallback_path and os.path.exists(fallback_path):
                 self.logger.info(f"ファイルが見つかりません: {file_path}")
                 self.logger.info(f"代わりにカテゴリのファイルを使用します: {fallback_path}")
-                with open(fallback_path, 'r', encoding='utf-8') as f:
-                    return json.load(f)
+                return self._read_prompt_file(fallback_path)
             else:
                 self.logger.warning(f"ファイルが見つかりません: {file_path}")
                 return {}
@@ -999,8 +1278,44 @@ class AutoImageGenerator:
             os.path.join(base_path, "positive_cancel_pair.json")
         )
 
+    def _read_prompt_file(self, file_path):
+        """プロンプトファイル（JSON）を読み込む（session を共有している場合は読み込んだ結果を使い回す）"""
+        if self.session is not None:
+            return self.session.load_prompt_file(file_path)
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def cancel(self):
+        """
+        実行中の生成の中止を要求する（別のスレッドから呼び出す）
+
+        処理中のバッチ・送信済みのリクエストは完了を待ち、未着手のバッチと送信前のリクエストは生成しない。
+        ジョブジャーナルには未完了として記録されるため、--resume で続きから生成できる。
+        """
+        self._cancel_event.set()
+
+    def _is_stop_requested(self):
+        """中止が要求されたか、arun() でエラーになったバッチがあるかどうか"""
+        return self._cancel_event.is_set() or self._abort_event.is_set()
+
+    def _shared(self, key, factory):
+        """
+        session を共有している場合は session のリソースを返し、それ以外は factory() で作成する
+
+        Args:
+            key (hashable): session で共有するリソースのキー
+            factory (callable): リソースを作成する関数
+
+        Returns:
+            リソース
+        """
+        if self.session is None:
+            return factory()
+        return self.session.get_or_create(key, factory)
+
     def run(self):
         """画像生成を実行"""
+        self.aborted = False
         try:
             # 全体の処理開始時間を記録
             total_start_time = time.time()
@@ -1013,148 +1328,602 @@ class AutoImageGenerator:
                 self.logger.info("ドライランモード: プロンプトの生成のみを行います")
                 return prompts
 
+            # モデル・LoRA等がサーバーに存在しない場合はモデルを切り替える前に中止
+            if not self.preflight():
+                self.logger.error("事前検証に失敗したため、処理を中止します")
+                self.aborted = True
+                return
+
             # 画像生成の実行
             total_batches = self.IMAGE_GENERATE_BATCH_EXECUTE_COUNT
             self.logger.info(f"画像生成バッチを開始します。合計バッチ数: {total_batches}")
+            self._start_run(total_batches)
+
+            for current_batch, batch_count in self._get_packed_batch_ranges(total_batches):
+                if self._cancel_event.is_set():
+                    self.logger.warning(f"中止が要求されたため、バッチ {current_batch}/{total_batches} 以降は生成しません")
+                    break
 
-            for i in range(total_batches):
                 # 現在のバッチ番号をログに表示
-                current_batch = i + 1
                 self.logger.info(f"画像生成バッチ進捗: {current_batch}/{total_batches} ({(current_batch/total_batches)*100:.1f}%)")
 
-                # 画像生成処理を実行
-                self._generate_images(current_batch, total_batches)
+                # 画像生成処理を実行（複数のバッチや subseed による別バージョンの画像はまとめて描画）
+                if self._uses_packed_requests(batch_count):
+                    self._generate_packed_images(current_batch, batch_count, total_batches)
+                else:
+                    self._generate_images(current_batch, total_batches)
 
             # 全体の処理所要時間を計算
             total_end_time = time.time()
             total_elapsed_time = total_end_time - total_start_time
             self.logger.info(f"画像生成バッチが完了しました。合計バッチ数: {total_batches} (総所要時間: {total_elapsed_time:.2f}秒)")
+            self._finish_run()
+            self._log_request_stats()
 
         except Exception as e:
             self.logger.error(f"エラーが発生しました: {e}")
             raise
+        finally:
+            # エンコード用のワーカープロセスは次の実行まで残さない（session で共有している場合は session が閉じる）
+            if self.image_encoder is not None and self.session is None:
+                self.image_encoder.close()
 
-    def generate_prompts(self, reuse_positive_base=None, reuse_positive_base_dict=None):
+    async def arun(self, max_in_flight=None):
         """
-        プロンプトを生成して返す（ドライラン用）
+        非同期エンジンで画像生成を実行する（run() の非同期版）
+
+        txt2imgリクエストを常に max_in_flight 件送信済みの状態に保ち、
+        GPUでの描画中にプロンプト生成や画像の保存を並行して行う。出力されるフォルダ構成とJSONは run() と同じ。
+        バッチの準備（プロンプト生成・出力フォルダの作成）は max_prepared_batches 件先までに留め、
+        中断した場合に未着手のバッチフォルダが大量に残らないようにする。
 
         Args:
-            reuse_positive_base (list, optional): 再利用するベースプロンプトのリスト
-            reuse_positive_base_dict (dict, optional): 再利用するベースプロンプトの辞書
+            max_in_flight (int, optional): 同時に送信しておくtxt2imgリクエスト数（省略時は settings.json の max_in_flight_requests）
 
         Returns:
-            dict: 生成されたプロンプト情報
+            dict: ドライランモードの場合は生成したプロンプト、それ以外はNone
         """
-        # プロンプトファイルを読み込む
-        self._load_prompt_files()
+        self.aborted = False
+        self._abort_event.clear()
+        try:
+            # 全体の処理開始時間を記録
+            total_start_time = time.time()
 
-        # プロンプトを生成
-        positive_prompt, negative_prompt, seed, prompt_info = self._create_prompts(
-            reuse_positive_base=reuse_positive_base,
-            reuse_positive_base_dict=reuse_positive_base_dict
-        )
+            # プロンプトを生成
+            prompts = self.generate_prompts()
 
-        return {
-            "positive_prompt": positive_prompt,
-            "negative_prompt": negative_prompt,
-            "seed": seed,
-            "prompt_info": prompt_info,
-            "reusable_base_prompts": prompt_info["reusable_base_prompts"],
-            "reusable_base_prompt_dict": prompt_info["reusable_base_prompt_dict"]
-        }
+            # ドライランモードの場合は、プロンプトの生成のみを行う
+            if self.dry_run:
+                self.logger.info("ドライランモード: プロンプトの生成のみを行います")
+                return prompts
 
-    def _create_prompts(self, reuse_positive_base=None, reuse_positive_base_dict=None):
-        """
-        プロンプトを生成する内部メソッド
+            max_in_flight = max_in_flight or self.MAX_IN_FLIGHT_REQUESTS
+            total_batches = self.IMAGE_GENERATE_BATCH_EXECUTE_COUNT
+            self.logger.info(f"画像生成バッチを開始します（非同期エンジン, 同時リクエスト数: {max_in_flight}）。合計バッチ数: {total_batches}")
 
-        Args:
-            reuse_positive_base (list, optional): 再利用するベースプロンプトのリスト
-            reuse_positive_base_dict (dict, optional): 再利用するベースプロンプトの辞書
+            # モデル・LoRA等がサーバーに存在しない場合はモデルを切り替える前に中止
+            if not await asyncio.to_thread(self.preflight):
+                self.logger.error("事前検証に失敗したため、処理を中止します")
+                self.aborted = True
+                return
 
-        Returns:
-            tuple: (positive_prompt, negative_prompt, seed, prompt_info)
-                prompt_infoには生成されたプロンプト情報と、再利用可能なベースプロンプト情報が含まれる
-        """
-        # デバッグログを追加
-        self.logger.info(f"_create_prompts開始。reuse_positive_base: {reuse_positive_base is not None}, reuse_positive_base_dict: {reuse_positive_base_dict is not None}")
-        self.logger.debug(f"現在のDATA_POSITIVE_CANCEL_PAIR: {self.DATA_POSITIVE_CANCEL_PAIR}")
+            # 最初にモデルを切り替え
+            if not await asyncio.to_thread(self.set_model, self.SD_MODEL_CHECKPOINT):
+                self.logger.error("モデルの切り替えに失敗したため、処理を中止します")
+                self.aborted = True
+                return
 
-        # ランダムなシード値を生成
-        seed = random.randint(0, 4294967295)
+            await asyncio.to_thread(self._start_run, total_batches)
 
-        # キャンセル対象のシード値かチェック、または閾値よりも小さい場合は再生成
-        while str(seed) in self.DATA_CANCEL_SEEDS or seed <= self.CANCEL_MIN_SEED_VALUE:
-            seed = random.randint(0, 4294967295)
-            self.logger.info(f"キャンセル対象または閾値以下のシード値のため再生成します: {seed}")
+            # 全バッチで同時に送信するリクエスト数を共有する
+            request_semaphore = asyncio.Semaphore(max_in_flight)
+            # 準備済みで完了していないバッチが上限に達している場合は、いずれかのバッチが完了するまで次のバッチを準備しない
+            batch_semaphore = asyncio.Semaphore(self.MAX_PREPARED_BATCHES or max_in_flight + 1)
 
-        # ベースプロンプトを生成または再利用
-        if reuse_positive_base is not None and reuse_positive_base_dict is not None:
-            # 指定されたベースプロンプトを再利用
-            positive_base_prompts = reuse_positive_base
-            positive_base_prompt_dict = reuse_positive_base_dict
-            self.logger.debug("ベースプロンプトを再利用します")
-        else:
-            # 新しいベースプロンプトを生成
-            # 一貫性のために、generate_random_promptsのみを使用
-            self.logger.debug("新しいベースプロンプトを生成します")
-            positive_base_prompt_str, positive_base_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_BASE)
-            positive_base_prompts = positive_base_prompt_str.split(", ") if positive_base_prompt_str else []
-            self.logger.info(f"生成されたベースプロンプト: {positive_base_prompts}")
-            self.logger.debug(f"生成されたベースプロンプト辞書: {json.dumps(positive_base_prompt_dict, indent=2, ensure_ascii=False)[:500]}...")
+            async def generate_batch(current_batch, batch_count):
+                try:
+                    if self._uses_packed_requests(batch_count):
+                        await self.agenerate_packed(current_batch, batch_count, total_batches, request_semaphore)
+                    else:
+                        await self.agenerate(current_batch, total_batches, request_semaphore)
+                finally:
+                    batch_semaphore.release()
 
-        # ポーズプロンプトを生成（セルフィーの場合はセルフィー用プロンプトを使用）
-        if self.IS_SELFIE:
-            # 一貫性のために、generate_random_promptsのみを使用
-            self.logger.debug("セルフィー用プロンプトを生成します")
-            positive_pose_prompt_str, positive_pose_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_SELFIE)
-            positive_pose_prompts = positive_pose_prompt_str.split(", ") if positive_pose_prompt_str else []
-            self.logger.debug(f"生成されたセルフィープロンプト: {positive_pose_prompts}")
+            tasks = []
+            try:
+                for current_batch, batch_count in self._get_packed_batch_ranges(total_batches):
+                    await batch_semaphore.acquire()
+                    # 中止が要求された場合・エラーで終了したバッチがある場合は残りのバッチを準備しない
+                    if self._cancel_event.is_set() or any(task.done() and task.exception() for task in tasks):
+                        batch_semaphore.release()
+                        break
+                    tasks.append(asyncio.create_task(generate_batch(current_batch, batch_count)))
+                await asyncio.gather(*tasks)
+            except BaseException:
+                # 他のバッチの送信前のリクエストを中止し、送信済みのリクエストと画像の保存が終わってから
+                # 画像エンコーダーを閉じる（タスクをキャンセルすると to_thread で実行中の保存処理が残るため、完了を待つ）
+                self._abort_event.set()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+
+            # 全体の処理所要時間を計算
+            total_elapsed_time = time.time() - total_start_time
+            self.logger.info(f"画像生成バッチが完了しました。合計バッチ数: {total_batches} (総所要時間: {total_elapsed_time:.2f}秒)")
+            self._finish_run()
+            self._log_request_stats()
+
+        except Exception as e:
+            self.logger.error(f"エラーが発生しました: {e}")
+            raise
+        finally:
+            # エンコード用のワーカープロセスは次の実行まで残さない（session で共有している場合は session が閉じる）
+            if self.image_encoder is not None and self.session is None:
+                await asyncio.to_thread(self.image_encoder.close)
+
+    def _log_request_stats(self):
+        """txt2imgリクエストの成功・失敗・リトライ回数とバックエンド毎の集計をログに出力する"""
+        self.logger.info(f"リクエスト統計: {self.retry_policy.get_stats()}")
+        for backend in self.backend_pool.backends:
+            monitor = self.progress_monitors.get(backend.url)
+            self.logger.info(
+                f"バックエンド {backend.url}: 成功 {backend.completed}, 失敗 {backend.failed}, "
+                f"サーキットブレーカー {backend.breaker.state} (open回数: {backend.breaker.open_count}), "
+                f"中断回数: {monitor.stall_count if monitor else '-'}"
+            )
+            if backend.concurrency:
+                self.logger.info(
+                    f"バックエンド {backend.url}: 同時リクエスト数の上限 {backend.concurrency.limit} "
+                    f"(調整回数: {backend.concurrency.decision_count}, エラー率: {backend.concurrency.error_rate:.0%})"
+                )
+            if backend.url in self.warmup_times:
+                self.logger.info(f"バックエンド {backend.url}: ウォームアップ所要時間 {self.warmup_times[backend.url]:.2f}秒")
+        if self.response_cache is not None:
+            self.logger.info(f"レスポンスキャッシュ: {self.response_cache.get_stats()}")
+        if self.post_processor is not None:
+            self.logger.info(f"後処理パイプライン: {self.post_processor.get_stats()}")
+
+    def _start_run(self, total_batches):
+        """
+        ジョブジャーナルに新しい実行を記録する（ジョブジャーナルが無効な場合は何もしない）
+
+        Args:
+            total_batches (int): 総バッチ数
+        """
+        if self.job_journal is None:
+            return
+        self.run_id = self.job_journal.start_run(total_batches, options=self.run_options)
+        self.logger.info(f"実行ID: {self.run_id}（中断した場合は --resume {self.run_id} で再開できます）")
+
+    def _finish_run(self):
+        """ジョブジャーナルに実行の結果を記録する"""
+        if self.job_journal is None or self.run_id is None:
+            return
+        status = self.job_journal.finish_run(self.run_id)
+        summary = self.job_journal.get_summary(self.run_id)
+        if status == JobJournal.DONE:
+            self.logger.info(f"ジョブジャーナル: 実行 {self.run_id} が完了しました {summary}")
         else:
-            # 一貫性のために、generate_random_promptsのみを使用
-            self.logger.debug("ポーズプロンプトを生成します")
-            positive_pose_prompt_str, positive_pose_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_POSE)
-            positive_pose_prompts = positive_pose_prompt_str.split(", ") if positive_pose_prompt_str else []
-            self.logger.debug(f"生成されたポーズプロンプト: {positive_pose_prompts}")
+            self.logger.warning(
+                f"ジョブジャーナル: 実行 {self.run_id} に未完了の画像があります {summary}。"
+                f"--resume {self.run_id} で未完了の画像のみを生成できます"
+            )
 
-        # オプショナルプロンプトを生成
-        # 一貫性のために、generate_random_promptsのみを使用
-        self.logger.debug("オプショナルプロンプトを生成します")
-        positive_optional_prompt_str, positive_optional_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_OPTIONAL)
-        positive_optional_prompts = positive_optional_prompt_str.split(", ") if positive_optional_prompt_str else []
-        self.logger.debug(f"生成されたオプショナルプロンプト: {positive_optional_prompts}")
+    def resume(self, run_id):
+        """
+        ジョブジャーナルに記録された実行を、中断したところから再開する
 
-        # ネガティブプロンプトを生成
-        # 一貫性のために、generate_random_promptsのみを使用
-        self.logger.debug("ネガティブプロンプトを生成します")
-        negative_prompt_str, negative_prompt_dict = self.generate_random_prompts(self.DATA_NEGATIVE)
-        negative_prompts = negative_prompt_str.split(", ") if negative_prompt_str else []
+        完了していない画像（pending・in_flight・failed、または画像ファイルが存在しないもの）は記録済みのプロンプトと
+        Seed値で同じバッチフォルダに生成し、未着手のバッチは通常通りプロンプトを生成して生成する。
 
-        # 元のプロンプトリストを保存（互換性チェック前）
-        original_positive_prompts = positive_base_prompts + positive_pose_prompts + positive_optional_prompts
-        self.logger.debug(f"互換性チェック前の元のプロンプト: {original_positive_prompts}")
+        Args:
+            run_id (str): 再開する実行ID
 
-        # プロンプトの組み合わせをチェックし、相性の悪い組み合わせを除外
-        self.logger.debug("プロンプトの互換性チェックを実行します")
-        positive_prompts = self._check_prompt_compatibility(original_positive_prompts)
-        self.logger.debug(f"互換性チェック後のプロンプト: {positive_prompts}")
+        Returns:
+            str: 実行の状態（JobJournal.DONE / JobJournal.FAILED）
 
-        # 除外されたプロンプトを特定
-        excluded_prompts = [p for p in original_positive_prompts if p not in positive_prompts]
-        if excluded_prompts:
-            self.logger.info(f"互換性チェックにより除外されたプロンプト: {', '.join(excluded_prompts)}")
+        Raises:
+            ValueError: ジョブジャーナルが無効な場合、または実行IDが見つからない場合
+        """
+        if self.job_journal is None:
+            raise ValueError("job_journal が無効なため再開できません")
+        run = self.job_journal.get_run(run_id)
+        if run is None:
+            raise ValueError(f"実行IDが見つかりません: {run_id}")
+
+        self.run_id = run_id
+        total_batches = run["total_batches"]
+        recorded_batches = self.job_journal.get_batches(run_id)
+        recorded_numbers = {batch["batch"] for batch in recorded_batches}
+        incomplete_batches = [
+            batch for batch in recorded_batches
+            if batch["status"] != JobJournal.DONE or self._get_unfinished_journal_jobs(batch)
+        ]
+        remaining_batches = [number for number in range(1, total_batches + 1) if number not in recorded_numbers]
+        self.logger.info(
+            f"実行 {run_id} を再開します。未完了のバッチ: {[batch['batch'] for batch in incomplete_batches]}, "
+            f"未着手のバッチ: {remaining_batches}"
+        )
 
-            # 除外されたプロンプトに基づいて、各カテゴリの辞書を更新
-            self._update_prompt_dict_based_on_exclusions(positive_base_prompt_dict, excluded_prompts)
-            self._update_prompt_dict_based_on_exclusions(positive_pose_prompt_dict, excluded_prompts)
-            self._update_prompt_dict_based_on_exclusions(positive_optional_prompt_dict, excluded_prompts)
+        if incomplete_batches or remaining_batches:
+            if not self.preflight() or not self.set_model(self.SD_MODEL_CHECKPOINT):
+                self.logger.error("事前検証またはモデルの切り替えに失敗したため、処理を中止します")
+                return JobJournal.FAILED
+            self.job_journal.set_run_status(run_id, JobJournal.IN_FLIGHT)
+
+            for batch in incomplete_batches:
+                self._resume_batch(batch, total_batches)
+            for current_batch in remaining_batches:
+                if self._uses_packed_requests(1):
+                    self._generate_packed_images(current_batch, 1, total_batches)
+                else:
+                    self._generate_images(current_batch, total_batches)
 
-        # 最終的なプロンプトを結合
-        positive_prompt = ", ".join(positive_prompts)
-        negative_prompt = ", ".join(negative_prompts)
+        self._finish_run()
+        self._log_request_stats()
+        return self.job_journal.get_run(run_id)["status"]
 
-        # 再利用可能なベースプロンプト情報を保存
-        reusable_base_prompts = positive_base_prompts
-        reusable_base_prompt_dict = positive_base_prompt_dict
+    def _get_unfinished_journal_jobs(self, batch):
+        """ジョブジャーナルのバッチのうち、完了していない（または画像ファイルが存在しない）画像を返す"""
+        return [
+            job for job in self.job_journal.get_jobs(self.run_id, batch["batch"])
+            if job["status"] != JobJournal.DONE or not os.path.exists(job["output_path"])
+        ]
+
+    def _resume_batch(self, batch, total_batches):
+        """
+        ジョブジャーナルに記録されたバッチの完了していない画像を、記録済みのプロンプトとSeed値で生成する
+
+        Args:
+            batch (dict): ジョブジャーナルのバッチの記録
+            total_batches (int): 総バッチ数
+        """
+        batch_start_time = time.time()
+        current_batch = batch["batch"]
+        folder_path = batch["folder_path"]
+        jobs = self.job_journal.get_jobs(self.run_id, current_batch)
+        unfinished_jobs = self._get_unfinished_journal_jobs(batch)
+
+        # 1枚も生成できずにバッチフォルダを削除した場合は、マニフェストから作成し直す
+        os.makedirs(folder_path, exist_ok=True)
+        if BatchManifest.exists(folder_path):
+            manifest = BatchManifest.load(folder_path)
+            self._attach_job_journal(manifest, jobs, current_batch)
+        else:
+            manifest = self._create_batch_manifest(folder_path, jobs, current_batch)
+
+        self.logger.info(f"バッチ {current_batch}/{total_batches} を再開します: {folder_path} (未完了: {[job['index'] for job in unfinished_jobs]})")
+        result_images = {}
+        for job in unfinished_jobs:
+            self._log_job_start(current_batch, total_batches, job["index"], len(jobs))
+            try:
+                manifest.mark_in_flight(job["filename"])
+                self._generate_single_image(job["payload"], folder_path, job["filename"], result_images, job["prompt_info"])
+            except Exception as e:
+                self._log_generation_error(e, job["payload"])
+                manifest.mark_failed(job["filename"], e)
+                if isinstance(e, NoHealthyBackendError):
+                    self.logger.error("利用可能なバックエンドがないため、このバッチの残りの画像の生成を中断します")
+                    break
+            else:
+                manifest.mark_completed(job["filename"])
+
+        self._finalize_batch(manifest, current_batch, total_batches, batch_start_time)
+
+    def repair(self, folder_path=None):
+        """
+        バッチマニフェストで未生成となっている画像のみを、保存済みのプロンプトとSeed値で再生成する
+
+        Args:
+            folder_path (str, optional): 対象のバッチフォルダ（省略時は出力先フォルダ内の全バッチ）
+
+        Returns:
+            dict: バッチフォルダのパスをキーとした、再生成後も未生成の画像のインデックスのリスト
+        """
+        if folder_path:
+            folder_paths = [folder_path]
+        else:
+            base_path = os.path.join(self.OUTPUT_FOLDER, self.OUTPUT_FOLDER_PREFIX.lstrip('/'))
+            folder_paths = sorted(glob.glob(os.path.join(base_path, "*", BatchManifest.FILENAME)))
+            folder_paths = [os.path.dirname(path) for path in folder_paths]
+
+        # 再生成が必要なバッチを抽出
+        targets = []
+        for path in folder_paths:
+            if not BatchManifest.exists(path):
+                self.logger.warning(f"バッチマニフェストが見つかりません: {path}")
+                continue
+            manifest = BatchManifest.load(path)
+            if manifest.data.get("sd_model_checkpoint") != self.SD_MODEL_CHECKPOINT:
+                self.logger.warning(f"モデルが異なるためスキップします: {path} ({manifest.data.get('sd_model_checkpoint')})")
+                continue
+            if manifest.get_missing_jobs(self.IMAGE_FILE_EXTENSION):
+                targets.append(manifest)
+
+        self.logger.info(f"再生成が必要なバッチ数: {len(targets)}")
+        if not targets:
+            return {}
+
+        if not self.preflight() or not self.set_model(self.SD_MODEL_CHECKPOINT):
+            self.logger.error("事前検証またはモデルの切り替えに失敗したため、処理を中止します")
+            return {manifest.folder_path: [job["index"] for job in manifest.get_missing_jobs(self.IMAGE_FILE_EXTENSION)] for manifest in targets}
+
+        remaining = {}
+        for manifest in targets:
+            missing_jobs = manifest.get_missing_jobs(self.IMAGE_FILE_EXTENSION)
+            self.logger.info(f"バッチを修復します: {manifest.folder_path} (未生成: {[job['index'] for job in missing_jobs]})")
+            result_images = {}
+            for job in missing_jobs:
+                try:
+                    manifest.mark_in_flight(job["filename"])
+                    self._generate_single_image(job["payload"], manifest.folder_path, job["filename"], result_images, job["prompt_info"])
+                except Exception as e:
+                    self._log_generation_error(e, job["payload"])
+                    manifest.mark_failed(job["filename"], e)
+                else:
+                    manifest.mark_completed(job["filename"])
+
+            missing_indices = [job["index"] for job in manifest.get_missing_jobs(self.IMAGE_FILE_EXTENSION)]
+            if missing_indices:
+                remaining[manifest.folder_path] = missing_indices
+                self.logger.warning(f"再生成できなかった画像があります: {manifest.folder_path} {missing_indices}")
+            else:
+                self.logger.info(f"バッチの修復が完了しました: {manifest.folder_path}")
+
+        return remaining
+
+    async def agenerate(self, current_batch, total_batches, request_semaphore=None):
+        """
+        1バッチ分の画像を非同期に生成する（_generate_images() の非同期版）
+
+        Args:
+            current_batch (int): 現在のバッチ番号
+            total_batches (int): 総バッチ数
+            request_semaphore (asyncio.Semaphore, optional): 同時リクエスト数を制限するセマフォ
+
+        Returns:
+            dict: 生成された画像の情報（ファイル名をキーとした辞書）
+        """
+        # バッチ処理開始時間を記録
+        batch_start_time = time.time()
+
+        if request_semaphore is None:
+            request_semaphore = asyncio.Semaphore(self.MAX_IN_FLIGHT_REQUESTS)
+
+        # プロンプト・出力フォルダ・ペイロードを準備（描画中の他のリクエストと並行して実行）
+        output_folder_path, jobs = await asyncio.to_thread(self._prepare_batch, current_batch, total_batches)
+
+        # 結果を格納する辞書
+        result_images = {}
+
+        try:
+            manifest = await asyncio.to_thread(self._create_batch_manifest, output_folder_path, jobs, current_batch)
+        except Exception as e:
+            self._handle_batch_error(e, output_folder_path, jobs[0]["payload"])
+            return result_images
+
+        # 各画像の失敗はマニフェストに記録され、他の画像の生成は継続する
+        await asyncio.gather(*(
+            self._agenerate_single_image(
+                job, output_folder_path, result_images, request_semaphore,
+                current_batch, total_batches, index, len(jobs), manifest
+            )
+            for index, job in enumerate(jobs)
+        ))
+
+        self._finalize_batch(manifest, current_batch, total_batches, batch_start_time)
+        return result_images
+
+    async def _agenerate_single_image(self, job, output_folder_path, result_images, request_semaphore,
+                                      current_batch, total_batches, index, total_versions, manifest=None):
+        """
+        単一の画像を非同期に生成する内部メソッド
+
+        セマフォはtxt2imgリクエストの間だけ保持し、レスポンス受信後すぐに次のリクエストを送信できるようにする。
+        manifest を指定した場合は、失敗してもエラーを送出せずにマニフェストに記録する。
+        """
+        try:
+            async with request_semaphore:
+                # 中止が要求された場合は送信せず、未生成（pending）のまま残す
+                if self._is_stop_requested():
+                    return
+                self._log_job_start(current_batch, total_batches, index, total_versions)
+                start_time = time.time()
+                if manifest is not None:
+                    await asyncio.to_thread(manifest.mark_in_flight, job["filename"])
+                r = await asyncio.to_thread(self._dispatch, self._request_txt2img, job["payload"])
+
+            # 画像と関連ファイルの保存は後処理パイプラインで次のリクエストの描画と並行して行う
+            await self._apost_process(
+                self._save_generated_images,
+                r, job["payload"], output_folder_path, job["filename"], result_images, job["prompt_info"]
+            )
+        except Exception as e:
+            if manifest is None:
+                raise
+            self._log_generation_error(e, job["payload"])
+            await asyncio.to_thread(manifest.mark_failed, job["filename"], e)
+            return
+
+        if manifest is not None:
+            await asyncio.to_thread(manifest.mark_completed, job["filename"])
+        elapsed_time = time.time() - start_time
+        self.logger.info(f"画像生成完了: {job['filename']} (所要時間: {elapsed_time:.2f}秒)")
+
+    async def agenerate_packed(self, current_batch, batch_count, total_batches, request_semaphore=None):
+        """
+        複数のバッチ・別バージョンの画像をまとめて非同期に生成する（_generate_packed_images() の非同期版）
+
+        Args:
+            current_batch (int): 先頭のバッチ番号
+            batch_count (int): まとめて描画するバッチの数
+            total_batches (int): 総バッチ数
+            request_semaphore (asyncio.Semaphore, optional): 同時リクエスト数を制限するセマフォ
+
+        Returns:
+            dict: バッチフォルダのパスをキーとした、生成された画像の情報
+        """
+        # バッチ処理開始時間を記録
+        batch_start_time = time.time()
+
+        if request_semaphore is None:
+            request_semaphore = asyncio.Semaphore(self.MAX_IN_FLIGHT_REQUESTS)
+
+        packed_batches = await asyncio.to_thread(self._create_packed_batches, current_batch, batch_count, total_batches)
+        if not packed_batches:
+            return {}
+
+        total_versions = len(packed_batches[0]["jobs"])
+        await asyncio.gather(*(
+            self._agenerate_packed_image(unit, request_semaphore, current_batch, total_batches, total_versions)
+            for unit in self._get_request_units(packed_batches)
+        ))
+
+        for offset, batch in enumerate(packed_batches):
+            self._finalize_batch(batch["manifest"], current_batch + offset, total_batches, batch_start_time)
+        return {batch["folder_path"]: batch["result_images"] for batch in packed_batches}
+
+    async def _agenerate_packed_image(self, unit, request_semaphore, current_batch, total_batches, total_versions):
+        """1回のリクエストで描画する画像をまとめて非同期に生成する内部メソッド（失敗は各バッチのマニフェストに記録する）"""
+        jobs = [batch["jobs"][index] for batch, index in unit]
+        try:
+            async with request_semaphore:
+                # 中止が要求された場合は送信せず、未生成（pending）のまま残す
+                if self._is_stop_requested():
+                    return
+                self._log_job_start(current_batch, total_batches, unit[0][1], total_versions)
+                start_time = time.time()
+                await asyncio.to_thread(self._mark_packed_in_flight, unit)
+                responses = await asyncio.to_thread(self._dispatch, self._request_packed_txt2img, jobs)
+        except Exception as e:
+            self._log_generation_error(e, jobs[0]["payload"])
+            await asyncio.to_thread(self._mark_packed_failed, unit, e)
+            return
+
+        # 画像と関連ファイルの保存は後処理パイプラインで次のリクエストの描画と並行して行う
+        await self._apost_process(self._post_process_packed_images, unit, responses, start_time)
+
+    def generate_prompts(self, reuse_positive_base=None, reuse_positive_base_dict=None):
+        """
+        プロンプトを生成して返す（ドライラン用）
+
+        Args:
+            reuse_positive_base (list, optional): 再利用するベースプロンプトのリスト
+            reuse_positive_base_dict (dict, optional): 再利用するベースプロンプトの辞書
+
+        Returns:
+            dict: 生成されたプロンプト情報
+        """
+        # プロンプトファイルを読み込む
+        self._load_prompt_files()
+
+        # プロンプトを生成
+        positive_prompt, negative_prompt, seed, prompt_info = self._create_prompts(
+            reuse_positive_base=reuse_positive_base,
+            reuse_positive_base_dict=reuse_positive_base_dict
+        )
+
+        return {
+            "positive_prompt": positive_prompt,
+            "negative_prompt": negative_prompt,
+            "seed": seed,
+            "prompt_info": prompt_info,
+            "reusable_base_prompts": prompt_info["reusable_base_prompts"],
+            "reusable_base_prompt_dict": prompt_info["reusable_base_prompt_dict"]
+        }
+
+    def _create_prompts(self, reuse_positive_base=None, reuse_positive_base_dict=None, seed_span=1):
+        """
+        プロンプトを生成する内部メソッド
+
+        Args:
+            reuse_positive_base (list, optional): 再利用するベースプロンプトのリスト
+            reuse_positive_base_dict (dict, optional): 再利用するベースプロンプトの辞書
+            seed_span (int): seed から seed + seed_span - 1 までの全てのSeed値が使用可能な値を選ぶ（まとめて描画する場合）
+
+        Returns:
+            tuple: (positive_prompt, negative_prompt, seed, prompt_info)
+                prompt_infoには生成されたプロンプト情報と、再利用可能なベースプロンプト情報が含まれる
+        """
+        # デバッグログを追加
+        self.logger.info(f"_create_prompts開始。reuse_positive_base: {reuse_positive_base is not None}, reuse_positive_base_dict: {reuse_positive_base_dict is not None}")
+        self.logger.debug(f"現在のDATA_POSITIVE_CANCEL_PAIR: {self.DATA_POSITIVE_CANCEL_PAIR}")
+
+        # ランダムなシード値を生成
+        seed = random.randint(0, 4294967295 - (seed_span - 1))
+
+        # キャンセル対象のシード値かチェック、または閾値よりも小さい場合は再生成
+        while any(str(seed + i) in self.DATA_CANCEL_SEEDS for i in range(seed_span)) or seed <= self.CANCEL_MIN_SEED_VALUE:
+            seed = random.randint(0, 4294967295 - (seed_span - 1))
+            self.logger.info(f"キャンセル対象または閾値以下のシード値のため再生成します: {seed}")
+
+        # ベースプロンプトを生成または再利用
+        if reuse_positive_base is not None and reuse_positive_base_dict is not None:
+            # 指定されたベースプロンプトを再利用
+            positive_base_prompts = reuse_positive_base
+            positive_base_prompt_dict = reuse_positive_base_dict
+            self.logger.debug("ベースプロンプトを再利用します")
+        else:
+            # 新しいベースプロンプトを生成
+            # 一貫性のために、generate_random_promptsのみを使用
+            self.logger.debug("新しいベースプロンプトを生成します")
+            positive_base_prompt_str, positive_base_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_BASE)
+            positive_base_prompts = positive_base_prompt_str.split(", ") if positive_base_prompt_str else []
+            self.logger.info(f"生成されたベースプロンプト: {positive_base_prompts}")
+            self.logger.debug(f"生成されたベースプロンプト辞書: {json.dumps(positive_base_prompt_dict, indent=2, ensure_ascii=False)[:500]}...")
+
+        # ポーズプロンプトを生成（セルフィーの場合はセルフィー用プロンプトを使用）
+        if self.IS_SELFIE:
+            # 一貫性のために、generate_random_promptsのみを使用
+            self.logger.debug("セルフィー用プロンプトを生成します")
+            positive_pose_prompt_str, positive_pose_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_SELFIE)
+            positive_pose_prompts = positive_pose_prompt_str.split(", ") if positive_pose_prompt_str else []
+            self.logger.debug(f"生成されたセルフィープロンプト: {positive_pose_prompts}")
+        else:
+            # 一貫性のために、generate_random_promptsのみを使用
+            self.logger.debug("ポーズプロンプトを生成します")
+            positive_pose_prompt_str, positive_pose_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_POSE)
+            positive_pose_prompts = positive_pose_prompt_str.split(", ") if positive_pose_prompt_str else []
+            self.logger.debug(f"生成されたポーズプロンプト: {positive_pose_prompts}")
+
+        # オプショナルプロンプトを生成
+        # 一貫性のために、generate_random_promptsのみを使用
+        self.logger.debug("オプショナルプロンプトを生成します")
+        positive_optional_prompt_str, positive_optional_prompt_dict = self.generate_random_prompts(self.DATA_POSITIVE_OPTIONAL)
+        positive_optional_prompts = positive_optional_prompt_str.split(", ") if positive_optional_prompt_str else []
+        self.logger.debug(f"生成されたオプショナルプロンプト: {positive_optional_prompts}")
+
+        # ネガティブプロンプトを生成
+        # 一貫性のために、generate_random_promptsのみを使用
+        self.logger.debug("ネガティブプロンプトを生成します")
+        negative_prompt_str, negative_prompt_dict = self.generate_random_prompts(self.DATA_NEGATIVE)
+        negative_prompts = negative_prompt_str.split(", ") if negative_prompt_str else []
+
+        # 元のプロンプトリストを保存（互換性チェック前）
+        original_positive_prompts = positive_base_prompts + positive_pose_prompts + positive_optional_prompts
+        self.logger.debug(f"互換性チェック前の元のプロンプト: {original_positive_prompts}")
+
+        # プロンプトの組み合わせをチェックし、相性の悪い組み合わせを除外
+        self.logger.debug("プロンプトの互換性チェックを実行します")
+        positive_prompts = self._check_prompt_compatibility(original_positive_prompts)
+        self.logger.debug(f"互換性チェック後のプロンプト: {positive_prompts}")
+
+        # 除外されたプロンプトを特定
+        excluded_prompts = [p for p in original_positive_prompts if p not in positive_prompts]
+        if excluded_prompts:
+            self.logger.info(f"互換性チェックにより除外されたプロンプト: {', '.join(excluded_prompts)}")
+
+            # 除外されたプロンプトに基づいて、各カテゴリの辞書を更新
+            self._update_prompt_dict_based_on_exclusions(positive_base_prompt_dict, excluded_prompts)
+            self._update_prompt_dict_based_on_exclusions(positive_pose_prompt_dict, excluded_prompts)
+            self._update_prompt_dict_based_on_exclusions(positive_optional_prompt_dict, excluded_prompts)
+
+        # 最終的なプロンプトを結合
+        positive_prompt = ", ".join(positive_prompts)
+        negative_prompt = ", ".join(negative_prompts)
+
+        # 再利用可能なベースプロンプト情報を保存
+        reusable_base_prompts = positive_base_prompts
+        reusable_base_prompt_dict = positive_base_prompt_dict
 
         # プロンプト情報を辞書にまとめる
         prompt_info = {
@@ -1387,39 +2156,245 @@ class AutoImageGenerator:
             total_batches (int): 総バッチ数
 
         Returns:
-            None
+            dict: 生成された画像の情報（ファイル名をキーとした辞書）
         """
-        # バッチ処理開始時間を記録
+        # 最初にモデルを切り替え
+        if not self.set_model(self.SD_MODEL_CHECKPOINT):
+            self.logger.error("モデルの切り替えに失敗したため、処理を中止します")
+            self.aborted = True
+            return
+
+        # バッチ処理開始時間を記録（モデルの切り替えとウォームアップの時間は含めない）
         batch_start_time = time.time()
 
-        # プロンプトの生成
-        positive_prompt, negative_prompt, seed, prompt_info = self._create_prompts()
+        # プロンプト・出力フォルダ・ペイロードを準備
+        output_folder_path, jobs = self._prepare_batch(current_batch, total_batches)
 
-        # プロンプトとモデル情報をログに出力
-        self.logger.info(f"画像生成: ポジティブプロンプト={positive_prompt}")
-        self.logger.info(f"画像生成: ネガティブプロンプト={negative_prompt}")
-        self.logger.info(f"画像生成: Seed値={seed}")
-        self.logger.info(f"画像生成: モデルチェックポイント={self.SD_MODEL_CHECKPOINT}")
-        self.logger.info(f"画像生成: モデル名（JSONに記録）={os.path.splitext(self.SD_MODEL_CHECKPOINT)[0]}")
-        self.logger.info(f"画像生成: カスタムチェックポイント使用={self.USE_CUSTOM_CHECKPOINT}")
+        # 結果を格納する辞書
+        result_images = {}
 
-        # バッチ進捗情報をログに出力
-        self.logger.info(f"バッチ {current_batch}/{total_batches} の画像生成を開始します")
+        try:
+            manifest = self._create_batch_manifest(output_folder_path, jobs, current_batch)
+        except Exception as e:
+            self._handle_batch_error(e, output_folder_path, jobs[0]["payload"])
+            return result_images
+
+        # レスポンスを受け取ったら保存は後処理パイプラインに任せ、すぐに次のtxt2imgリクエストを送信する
+        pending = []
+        for index, job in enumerate(jobs):
+            self._log_job_start(current_batch, total_batches, index, len(jobs))
+            start_time = time.time()
+            try:
+                manifest.mark_in_flight(job["filename"])
+                r = self._dispatch(self._request_txt2img, job["payload"])
+            except Exception as e:
+                # 失敗した画像のみを記録し、生成済みの画像は残す
+                self._log_generation_error(e, job["payload"])
+                manifest.mark_failed(job["filename"], e)
+
+                # 全てのバックエンドが停止している場合は残りの画像も失敗するため中断（--repairで再生成可能）
+                if isinstance(e, NoHealthyBackendError):
+                    self.logger.error("利用可能なバックエンドがないため、このバッチの残りの画像の生成を中断します")
+                    break
+                continue
+            pending.append(self._submit_post_process(
+                self._post_process_image, r, job, output_folder_path, result_images, manifest, start_time
+            ))
+
+        # バッチの全ての画像の後処理が終わってから結果をまとめる
+        for future in pending:
+            future.result()
+
+        self._finalize_batch(manifest, current_batch, total_batches, batch_start_time)
+        return result_images
 
+    def _generate_packed_images(self, current_batch, batch_count, total_batches):
+        """
+        複数のバッチ・別バージョンの画像を、_get_request_units で決めた単位毎に1回のリクエストでまとめて生成する
+
+        Args:
+            current_batch (int): 先頭のバッチ番号
+            batch_count (int): まとめて描画するバッチの数
+            total_batches (int): 総バッチ数
+
+        Returns:
+            dict: バッチフォルダのパスをキーとした、生成された画像の情報
+        """
         # 最初にモデルを切り替え
         if not self.set_model(self.SD_MODEL_CHECKPOINT):
             self.logger.error("モデルの切り替えに失敗したため、処理を中止します")
+            self.aborted = True
             return
 
-        # 出力ディレクトリ構造を作成
-        self._create_output_directories()
+        # バッチ処理開始時間を記録（モデルの切り替えとウォームアップの時間は含めない）
+        batch_start_time = time.time()
 
-        # 現在の日時を取得してフォルダ名の一部に使用
-        now = datetime.now()
-        date_str = now.strftime("%Y%m%d-%H")
+        packed_batches = self._create_packed_batches(current_batch, batch_count, total_batches)
+        if not packed_batches:
+            return {}
 
-        # 出力フォルダのパスを生成
-        output_folder_path = os.path.join(
+        total_versions = len(packed_batches[0]["jobs"])
+        pending = []
+        for unit in self._get_request_units(packed_batches):
+            first_batch, first_index = unit[0]
+            self._log_job_start(current_batch, total_batches, first_index, total_versions)
+            start_time = time.time()
+            try:
+                self._mark_packed_in_flight(unit)
+                responses = self._dispatch(self._request_packed_txt2img, [batch["jobs"][index] for batch, index in unit])
+            except Exception as e:
+                # 失敗した画像のみを記録し、生成済みの画像は残す
+                self._log_generation_error(e, first_batch["jobs"][first_index]["payload"])
+                self._mark_packed_failed(unit, e)
+
+                # 全てのバックエンドが停止している場合は残りの画像も失敗するため中断（--repairで再生成可能）
+                if isinstance(e, NoHealthyBackendError):
+                    self.logger.error("利用可能なバックエンドがないため、このバッチの残りの画像の生成を中断します")
+                    break
+                continue
+            # 保存は後処理パイプラインに任せ、すぐに次のリクエストを送信する
+            pending.append(self._submit_post_process(self._post_process_packed_images, unit, responses, start_time))
+
+        for future in pending:
+            future.result()
+
+        for offset, batch in enumerate(packed_batches):
+            self._finalize_batch(batch["manifest"], current_batch + offset, total_batches, batch_start_time)
+        return {batch["folder_path"]: batch["result_images"] for batch in packed_batches}
+
+    def _uses_packed_requests(self, batch_count):
+        """まとめて描画する生成処理（_generate_packed_images）を使用するかどうか"""
+        return batch_count > 1 or self.VARIATION_STRATEGY == "subseed" or self.MULTI_PROMPT_REQUESTS
+
+    def _get_request_units(self, packed_batches):
+        """
+        1回のtxt2imgリクエストでまとめて描画する画像の単位を決める
+
+        オリジナル画像と "prompt" 方式の別バージョンの画像は、各バッチの同じインデックスの画像をまとめる（Seed値が連続）。
+        "subseed" 方式の別バージョンの画像は、バッチ毎に最大 max_batch_size 枚ずつ均等にまとめる（subseed が連続）。
+        multi_prompt が有効な場合、"prompt" 方式の別バージョンの画像はバッチ毎に最大 max_prompts_per_request 枚ずつまとめる。
+
+        Args:
+            packed_batches (list): _create_packed_batches で作成したバッチのリスト
+
+        Returns:
+            list: (バッチ, ジョブのインデックス) のリストのリスト
+        """
+        total_versions = len(packed_batches[0]["jobs"])
+        if self.VARIATION_STRATEGY == "subseed":
+            max_batch_size = self.VARIATION_SETTINGS["max_batch_size"]
+        elif self.MULTI_PROMPT_REQUESTS:
+            max_batch_size = self.VARIATION_SETTINGS["max_prompts_per_request"]
+        else:
+            return [[(batch, index) for batch in packed_batches] for index in range(total_versions)]
+
+        units = [[(batch, 0) for batch in packed_batches]]
+        version_count = total_versions - 1
+        if version_count <= 0:
+            return units
+        max_batch_size = max(1, int(max_batch_size))
+        request_count = math.ceil(version_count / max_batch_size)
+        for batch in packed_batches:
+            start = 1
+            for i in range(request_count):
+                size = version_count // request_count + (1 if i < version_count % request_count else 0)
+                units.append([(batch, index) for index in range(start, start + size)])
+                start += size
+        return units
+
+    def _describe_request_unit(self, unit):
+        """ログ出力用に、まとめて描画した画像のファイル名を返す"""
+        filenames = sorted({batch["jobs"][index]["filename"] for batch, index in unit})
+        label = filenames[0] if len(filenames) == 1 else f"{filenames[0]}〜{filenames[-1]}"
+        batch_count = len({batch["folder_path"] for batch, _ in unit})
+        return f"{label} × {batch_count}バッチ" if batch_count > 1 else label
+
+    def _get_packed_batch_ranges(self, total_batches):
+        """
+        まとめて描画するバッチの範囲を返す
+
+        Args:
+            total_batches (int): 総バッチ数
+
+        Returns:
+            list: (先頭のバッチ番号, バッチ数) のリスト（base_image_batch_size が1の場合は全て1バッチずつ）
+        """
+        return [
+            (first_batch, min(self.BASE_IMAGE_BATCH_SIZE, total_batches - first_batch + 1))
+            for first_batch in range(1, total_batches + 1, self.BASE_IMAGE_BATCH_SIZE)
+        ]
+
+    def _create_packed_batches(self, current_batch, batch_count, total_batches):
+        """
+        まとめて描画するバッチのプロンプト・出力フォルダ・マニフェストを準備する
+
+        Args:
+            current_batch (int): 先頭のバッチ番号
+            batch_count (int): まとめて描画するバッチの数
+            total_batches (int): 総バッチ数
+
+        Returns:
+            list: バッチ毎の {"folder_path", "jobs", "manifest", "result_images"} のリスト（マニフェストを作成できない場合はNone）
+        """
+        if batch_count > 1:
+            self.logger.info(
+                f"バッチ {current_batch}〜{current_batch + batch_count - 1}/{total_batches} を "
+                f"batch_size={batch_count} でまとめて生成します"
+            )
+        batches = self._prepare_packed_batches(current_batch, total_batches, batch_count)
+
+        packed_batches = []
+        try:
+            for offset, (output_folder_path, jobs) in enumerate(batches):
+                packed_batches.append({
+                    "folder_path": output_folder_path,
+                    "jobs": jobs,
+                    "manifest": self._create_batch_manifest(output_folder_path, jobs, current_batch + offset),
+                    "result_images": {}
+                })
+        except Exception as e:
+            self._log_generation_error(e, batches[0][1][0]["payload"])
+            for output_folder_path, _ in batches:
+                self._remove_batch_folder(output_folder_path)
+            return None
+        return packed_batches
+
+    def _prepare_batch(self, current_batch, total_batches, seed_span=1):
+        """
+        1バッチ分のプロンプト・出力フォルダ・ペイロードを準備する
+
+        Args:
+            current_batch (int): 現在のバッチ番号
+            total_batches (int): 総バッチ数
+            seed_span (int): Seed値を連続して使用するバッチの数（_prepare_packed_batches から呼び出す場合）
+
+        Returns:
+            tuple: (output_folder_path, jobs)
+                jobsはオリジナル画像と別バージョン画像の {"payload", "filename", "prompt_info"} のリスト
+        """
+        # プロンプトの生成
+        positive_prompt, negative_prompt, seed, prompt_info = self._create_prompts(seed_span=seed_span)
+
+        # プロンプトとモデル情報をログに出力
+        self.logger.info(f"画像生成: ポジティブプロンプト={positive_prompt}")
+        self.logger.info(f"画像生成: ネガティブプロンプト={negative_prompt}")
+        self.logger.info(f"画像生成: Seed値={seed}")
+        self.logger.info(f"画像生成: モデルチェックポイント={self.SD_MODEL_CHECKPOINT}")
+        self.logger.info(f"画像生成: モデル名（JSONに記録）={os.path.splitext(self.SD_MODEL_CHECKPOINT)[0]}")
+        self.logger.info(f"画像生成: カスタムチェックポイント使用={self.USE_CUSTOM_CHECKPOINT}")
+
+        # バッチ進捗情報をログに出力
+        self.logger.info(f"バッチ {current_batch}/{total_batches} の画像生成を開始します")
+
+        # 出力ディレクトリ構造を作成
+        self._create_output_directories()
+
+        # 現在の日時を取得してフォルダ名の一部に使用
+        now = datetime.now()
+        date_str = now.strftime("%Y%m%d-%H")
+
+        # 出力フォルダのパスを生成
+        output_folder_path = os.path.join(
             self.OUTPUT_FOLDER,
             self.OUTPUT_FOLDER_PREFIX.lstrip('/'),
             f"{date_str}-{seed}"
@@ -1427,9 +2402,115 @@ class AutoImageGenerator:
 
         # フォルダが存在しない場合は作成
         os.makedirs(output_folder_path, exist_ok=True)
-        created_folder_path = output_folder_path  # エラー時のフォルダ削除用に保存
 
-        # 画像生成のためのペイロードを作成
+        # オリジナル画像のジョブ
+        jobs = [{
+            "payload": self._build_payload(positive_prompt, negative_prompt, seed, apply_lora=True),
+            "filename": "00001",
+            "prompt_info": prompt_info
+        }]
+
+        # 別バージョンの画像のジョブ（オリジナル画像と同じプロンプト・Seed値で、Variation seedのみを変更）
+        if self.VARIATION_STRATEGY == "subseed":
+            jobs.extend(self._prepare_subseed_variation_jobs(jobs[0]))
+            return output_folder_path, jobs
+
+        # 再利用するベースプロンプトを取得
+        reusable_base_prompts = prompt_info.get("reusable_base_prompts", [])
+        reusable_base_prompt_dict = prompt_info.get("reusable_base_prompt_dict", {})
+
+        # 別バージョンの画像のジョブ（ベースプロンプトとオリジナル画像のSeed値を再利用）
+        for i in range(1, self.ANOTHER_VERSION_GENERATE_COUNT + 1):
+            version_positive_prompt, version_negative_prompt, _, version_prompt_info = self._create_prompts(
+                reuse_positive_base=reusable_base_prompts,
+                reuse_positive_base_dict=reusable_base_prompt_dict
+            )
+            version_prompt_info["seed"] = seed
+
+            jobs.append({
+                "payload": self._build_payload(version_positive_prompt, version_negative_prompt, seed),
+                "filename": f"{str(i+1).zfill(5)}",
+                "prompt_info": version_prompt_info
+            })
+
+        return output_folder_path, jobs
+
+    def _prepare_subseed_variation_jobs(self, original_job):
+        """
+        オリジナル画像のペイロードに subseed / subseed_strength を追加した別バージョンの画像のジョブを作成する
+
+        各ジョブの subseed は連続した値とし、Web UIが batch_size 枚を描画する際に割り当てる値と一致させる
+        （subseed_strength が0より大きい場合、Seed値は全ての画像で同じになる）。
+
+        Args:
+            original_job (dict): オリジナル画像のジョブ
+
+        Returns:
+            list: 別バージョンの画像のジョブのリスト
+        """
+        subseed = random.randint(0, 4294967295 - self.ANOTHER_VERSION_GENERATE_COUNT)
+        jobs = []
+        for i in range(1, self.ANOTHER_VERSION_GENERATE_COUNT + 1):
+            version_subseed = subseed + i - 1
+            jobs.append({
+                "payload": {
+                    **original_job["payload"],
+                    "subseed": version_subseed,
+                    "subseed_strength": self.VARIATION_SETTINGS["subseed_strength"]
+                },
+                "filename": f"{str(i+1).zfill(5)}",
+                "prompt_info": {**original_job["prompt_info"], "subseed": version_subseed}
+            })
+        return jobs
+
+    def _prepare_packed_batches(self, current_batch, total_batches, batch_count):
+        """
+        Seed値が連続する batch_count 個のバッチを準備する
+
+        プロンプトは先頭のバッチで生成したものを共有し、各バッチのSeed値は seed, seed + 1, ... とする
+        （Web UIが batch_size 枚を描画する際に割り当てるSeed値と同じ）。
+        マニフェストには1枚ずつのペイロードを記録するため、--repair では通常通り1枚ずつ再生成される。
+
+        Args:
+            current_batch (int): 先頭のバッチ番号
+            total_batches (int): 総バッチ数
+            batch_count (int): まとめて描画するバッチの数
+
+        Returns:
+            list: バッチ毎の (output_folder_path, jobs) のリスト
+        """
+        output_folder_path, jobs = self._prepare_batch(current_batch, total_batches, seed_span=batch_count)
+        seed = jobs[0]["payload"]["seed"]
+        date_str = os.path.basename(output_folder_path)[:-len(f"-{seed}")]
+
+        batches = [(output_folder_path, jobs)]
+        for offset in range(1, batch_count):
+            batch_seed = seed + offset
+            batch_folder_path = os.path.join(os.path.dirname(output_folder_path), f"{date_str}-{batch_seed}")
+            os.makedirs(batch_folder_path, exist_ok=True)
+            batches.append((batch_folder_path, [
+                {
+                    "payload": {**job["payload"], "seed": batch_seed},
+                    "filename": job["filename"],
+                    "prompt_info": {**job["prompt_info"], "seed": batch_seed}
+                }
+                for job in jobs
+            ]))
+        return batches
+
+    def _build_payload(self, positive_prompt, negative_prompt, seed, apply_lora=False):
+        """
+        txt2imgに送信するペイロードを作成する
+
+        Args:
+            positive_prompt (str): ポジティブプロンプト
+            negative_prompt (str): ネガティブプロンプト
+            seed (int): Seed値
+            apply_lora (bool): LoRAの設定をalwayson_scriptsに追加するかどうか（オリジナル画像のみ）
+
+        Returns:
+            dict: ペイロード
+        """
         payload = {
             **self.COMMON_PAYLOAD_SETTINGS,
             "prompt": positive_prompt,
@@ -1442,7 +2523,7 @@ class AutoImageGenerator:
         payload["height"] = self.height
 
         # LoRAを使用する場合、LoRAの設定を追加
-        if self.USE_LORA and self.LORA_NAME:
+        if apply_lora and self.USE_LORA and self.LORA_NAME:
             self.logger.info(f"LoRA {self.LORA_NAME} を使用します")
             try:
                 from main import LORA_SETTINGS
@@ -1471,80 +2552,129 @@ class AutoImageGenerator:
             except ImportError as e:
                 self.logger.warning(f"警告: LoRA設定の取得中にエラーが発生しました: {e}")
 
-        # 透過背景の場合は設定を変更
+        # 透過背景の場合は透過画像用のペイロードとプロンプトを追加
         if self.IS_TRANSPARENT_BACKGROUND:
-            try:
-                # generate_images関数と同様に透過画像用のペイロードを追加
-                payload = {**payload, **self.TRANPARENT_PAYLOAD}
-                # 透過背景用のプロンプトを追加
-                payload["prompt"] = "(no background: 1.3, white background: 1.3), " + payload["prompt"]
-                self.logger.info(f"透過画像生成モードを有効化しました。使用スクリプト: {self.TRANPARENT_PAYLOAD['script_name']}")
-            except Exception as e:
-                self.logger.error(f"透過画像設定中にエラーが発生しました: {e}")
-                # エラーが発生しても処理を続行
+            payload = {**payload, **self.TRANPARENT_PAYLOAD}
+            payload["prompt"] = "(no background: 1.3, white background: 1.3), " + payload["prompt"]
+            self.logger.debug(f"透過画像生成モードを有効化しました。使用スクリプト: {self.TRANPARENT_PAYLOAD['script_name']}")
 
-        # 結果を格納する辞書
-        result_images = {}
+        return payload
 
-        try:
-            # オリジナル画像の生成
-            self.logger.info(f"バッチ {current_batch}/{total_batches} - オリジナル画像 (1/{self.ANOTHER_VERSION_GENERATE_COUNT + 1}) の生成を開始します")
-            self._generate_single_image(payload, output_folder_path, "00001", result_images, prompt_info)
-
-            # オリジナル画像のSeed値を保存
-            original_seed = seed
-
-            # 再利用するベースプロンプトを取得
-            reusable_base_prompts = prompt_info.get("reusable_base_prompts", [])
-            reusable_base_prompt_dict = prompt_info.get("reusable_base_prompt_dict", {})
-
-            # 別バージョンの画像を生成
-            for i in range(1, self.ANOTHER_VERSION_GENERATE_COUNT + 1):
-                # 進捗状況をログに出力
-                version_number = i + 1
-                total_versions = self.ANOTHER_VERSION_GENERATE_COUNT + 1
-                self.logger.info(f"バッチ {current_batch}/{total_batches} - バージョン画像 ({version_number}/{total_versions}) の生成を開始します")
-
-                # 別バージョン用のプロンプトを生成（ベースプロンプトを再利用）
-                version_positive_prompt, version_negative_prompt, _, version_prompt_info = self._create_prompts(
-                    reuse_positive_base=reusable_base_prompts,
-                    reuse_positive_base_dict=reusable_base_prompt_dict
-                )
+    def _log_job_start(self, current_batch, total_batches, index, total_versions):
+        """バッチ内の各画像の生成開始をログに出力する"""
+        if index == 0:
+            self.logger.info(f"バッチ {current_batch}/{total_batches} - オリジナル画像 (1/{total_versions}) の生成を開始します")
+        else:
+            self.logger.info(f"バッチ {current_batch}/{total_batches} - バージョン画像 ({index + 1}/{total_versions}) の生成を開始します")
 
-                # オリジナル画像と同じSeed値を使用
-                version_seed = original_seed
+    def _create_batch_manifest(self, output_folder_path, jobs, current_batch=None):
+        """
+        バッチフォルダに各画像の生成状況を記録するマニフェストを作成する
 
-                # Seed値を更新
-                version_prompt_info["seed"] = version_seed
+        Args:
+            output_folder_path (str): バッチの出力フォルダ
+            jobs (list): _prepare_batch で作成したジョブのリスト
+            current_batch (int, optional): バッチ番号（指定した場合はジョブジャーナルにも記録する）
 
-                # 別バージョン用のペイロードを作成
-                version_payload = {
-                    **self.COMMON_PAYLOAD_SETTINGS,
-                    "prompt": version_positive_prompt,
-                    "negative_prompt": version_negative_prompt,
-                    "seed": version_seed,
-                }
+        Returns:
+            BatchManifest: 作成したマニフェスト
+        """
+        manifest = BatchManifest.create(
+            output_folder_path,
+            jobs,
+            sd_model_checkpoint=self.SD_MODEL_CHECKPOINT,
+            style=self.style,
+            category=self.category,
+            subcategory=self.subcategory,
+            seed=jobs[0]["payload"].get("seed")
+        )
+        self._attach_job_journal(manifest, jobs, current_batch)
+        return manifest
 
-                # 透過背景の場合は設定を変更
-                if self.IS_TRANSPARENT_BACKGROUND:
-                    try:
-                        version_payload = {**version_payload, **self.TRANPARENT_PAYLOAD}
-                        version_payload["prompt"] = "(no background: 1.3, white background: 1.3), " + version_payload["prompt"]
-                    except Exception as e:
-                        self.logger.error(f"透過画像設定中にエラーが発生しました: {e}")
+    def _attach_job_journal(self, manifest, jobs, current_batch):
+        """
+        バッチと各画像をジョブジャーナルに記録し、マニフェストの状態の更新をジョブジャーナルにも反映する
 
-                # 別バージョンの画像を生成
-                filename = f"{str(i+1).zfill(5)}"
-                self._generate_single_image(version_payload, output_folder_path, filename, result_images, version_prompt_info)
+        Args:
+            manifest (BatchManifest): バッチのマニフェスト
+            jobs (list): バッチのジョブのリスト
+            current_batch (int): バッチ番号（Noneの場合は記録しない）
+        """
+        if self.job_journal is None or self.run_id is None or current_batch is None:
+            return
+        run_id = self.run_id
+        self.job_journal.add_batch(run_id, current_batch, manifest.folder_path, jobs, self.IMAGE_FILE_EXTENSION)
+
+        statuses = {
+            BatchManifest.IN_FLIGHT: JobJournal.IN_FLIGHT,
+            BatchManifest.COMPLETED: JobJournal.DONE,
+            BatchManifest.FAILED: JobJournal.FAILED
+        }
+
+        def on_update(filename, status, error):
+            self.job_journal.set_job_status(run_id, current_batch, filename, statuses.get(status, JobJournal.PENDING), error)
+
+        manifest.on_update = on_update
+
+    def _finalize_batch(self, manifest, current_batch, total_batches, batch_start_time):
+        """
+        バッチの生成結果をログに出力する
+
+        1枚も生成できなかった場合は、従来通りバッチフォルダを削除する。
+
+        Args:
+            manifest (BatchManifest): バッチのマニフェスト
+            current_batch (int): 現在のバッチ番号
+            total_batches (int): 総バッチ数
+            batch_start_time (float): バッチ処理の開始時刻
+        """
+        batch_elapsed_time = time.time() - batch_start_time
+        missing_jobs = manifest.get_missing_jobs(self.IMAGE_FILE_EXTENSION)
+        if manifest.on_update is not None:
+            self.job_journal.finish_batch(self.run_id, current_batch)
 
-            # バッチ処理の所要時間を計算
-            batch_end_time = time.time()
-            batch_elapsed_time = batch_end_time - batch_start_time
+        if not missing_jobs:
             self.logger.info(f"バッチ {current_batch}/{total_batches} の処理が完了しました (所要時間: {batch_elapsed_time:.2f}秒)")
+        elif len(missing_jobs) == len(manifest.jobs):
+            self.logger.error(f"バッチ {current_batch}/{total_batches} の画像を1枚も生成できませんでした")
+            self._remove_batch_folder(manifest.folder_path)
+        else:
+            self.logger.warning(
+                f"バッチ {current_batch}/{total_batches} の処理が一部失敗しました "
+                f"(未生成: {[job['index'] for job in missing_jobs]}, 所要時間: {batch_elapsed_time:.2f}秒)。"
+                f"--repair で未生成の画像のみを再生成できます: {manifest.folder_path}"
+            )
 
-            return result_images
+        if self.on_batch_finished is not None:
+            self.on_batch_finished({
+                "batch": current_batch,
+                "total_batches": total_batches,
+                "folder_path": manifest.folder_path,
+                "images": len(manifest.jobs),
+                "missing": len(missing_jobs)
+            })
 
-        except requests.exceptions.HTTPError as e:
+    def _handle_batch_error(self, e, created_folder_path, payload):
+        """
+        バッチ処理中に発生したエラーをログに出力し、作成したフォルダを削除する
+
+        Args:
+            e (Exception): 発生したエラー
+            created_folder_path (str): バッチの出力フォルダ
+            payload (dict): エラー発生時に送信していたペイロード
+        """
+        self._log_generation_error(e, payload)
+        self._remove_batch_folder(created_folder_path)
+
+    def _log_generation_error(self, e, payload):
+        """
+        画像生成中に発生したエラーの詳細をログに出力する
+
+        Args:
+            e (Exception): 発生したエラー
+            payload (dict): エラー発生時に送信していたペイロード
+        """
+        if isinstance(e, requests.exceptions.HTTPError):
             # HTTPエラーの詳細情報を取得
             self.logger.error(f"HTTPエラー: {e}")
             try:
@@ -1563,17 +2693,7 @@ class AutoImageGenerator:
                     self.logger.error("レスポンスオブジェクトが存在しません")
             except Exception as json_error:
                 self.logger.error(f"エラー情報の解析中に例外が発生しました: {json_error}")
-
-            # エラー発生時にも作成したフォルダを削除
-            if 'created_folder_path' in locals() and created_folder_path and os.path.exists(created_folder_path):
-                import shutil
-                try:
-                    shutil.rmtree(created_folder_path)
-                    self.logger.info(f"エラー発生のため、フォルダを削除しました: {created_folder_path}")
-                except Exception as e2:
-                    self.logger.error(f"フォルダの削除中にエラーが発生しました: {e2}")
-
-        except requests.exceptions.RequestException as e:
+        elif isinstance(e, requests.exceptions.RequestException):
             self.logger.error(f"API呼び出し中にエラーが発生しました: {e}")
 
             # リクエストの内容を表示
@@ -1581,265 +2701,489 @@ class AutoImageGenerator:
                 self.logger.info(f"送信したリクエスト: {json.dumps(payload, indent=2, ensure_ascii=False)}")
             except Exception as req_error:
                 self.logger.error(f"リクエスト情報の表示中にエラーが発生しました: {req_error}")
+        else:
+            self.logger.error(f"画像生成中に予期しないエラーが発生しました: {e}")
 
-            # エラー発生時にも作成したフォルダを削除
-            if 'created_folder_path' in locals() and created_folder_path and os.path.exists(created_folder_path):
-                import shutil
-                try:
-                    shutil.rmtree(created_folder_path)
-                    self.logger.info(f"エラー発生のため、フォルダを削除しました: {created_folder_path}")
-                except Exception as e2:
-                    self.logger.error(f"フォルダの削除中にエラーが発生しました: {e2}")
+    def _remove_batch_folder(self, created_folder_path):
+        """エラー発生時に作成したバッチフォルダを削除する"""
+        if created_folder_path and os.path.exists(created_folder_path):
+            try:
+                shutil.rmtree(created_folder_path)
+                self.logger.info(f"エラー発生のため、フォルダを削除しました: {created_folder_path}")
+            except Exception as e:
+                self.logger.error(f"フォルダの削除中にエラーが発生しました: {e}")
+
+    def _generate_single_image(self, payload, output_folder_path, filename, result_images, prompt_info):
+        """単一の画像を生成する内部メソッド"""
+        try:
+            # 画像生成開始をログに記録
+            self.logger.debug(f"画像生成開始: {filename}")
+
+            # 画像生成開始時間を記録
+            start_time = time.time()
+
+            # 画像生成APIを呼び出す
+            r = self._request_txt2img(payload)
+
+            # 画像と関連ファイルを保存
+            self._save_generated_images(r, payload, output_folder_path, filename, result_images, prompt_info)
+
+            # 画像生成完了をログに記録
+            end_time = time.time()
+            elapsed_time = end_time - start_time
+            self.logger.info(f"画像生成完了: {filename} (所要時間: {elapsed_time:.2f}秒)")
 
         except Exception as e:
-            self.logger.error(f"画像生成中に予期しないエラーが発生しました: {e}")
+            logging.error(f"画像生成中にエラーが発生しました: {e}")
+            raise e
 
-            # エラー発生時にも作成したフォルダを削除
-            if 'created_folder_path' in locals() and created_folder_path and os.path.exists(created_folder_path):
-                import shutil
-                try:
-                    shutil.rmtree(created_folder_path)
-                    self.logger.info(f"エラー発生のため、フォルダを削除しました: {created_folder_path}")
-                except Exception as e2:
-                    self.logger.error(f"フォルダの削除中にエラーが発生しました: {e2}")
+    def _dispatch(self, request, *args):
+        """
+        txt2imgリクエストを送信してレスポンスを返す（所要時間を後処理パイプラインの dispatch ステージとして記録する）
 
-        return result_images
+        Args:
+            request (callable): リクエストを送信する関数（_request_txt2img 等）
+            *args: request に渡す引数
 
-    def _generate_single_image(self, payload, output_folder_path, filename, result_images, prompt_info):
-        """単一の画像を生成する内部メソッド"""
+        Returns:
+            request の戻り値
+        """
+        start_time = time.time()
         try:
-            # 武器タイプを抽出（RPGアイコンの武器カテゴリの場合のみ）
-            weapon_type = None
-            if self.style == "illustration" and self.category == "rpg_icon" and self.subcategory == "weapon":
-                # デバッグログを追加
-                self.logger.debug(f"武器タイプ抽出を開始します。prompt_info: {json.dumps(prompt_info, indent=2, ensure_ascii=False)[:500]}...")
+            return request(*args)
+        finally:
+            if self.post_processor is not None:
+                self.post_processor.record("dispatch", time.time() - start_time)
 
-                # プロンプトから武器タイプを抽出
-                if "positive_base_prompt_dict" in prompt_info and "Weapon Type" in prompt_info["positive_base_prompt_dict"]:
-                    self.logger.debug(f"positive_base_prompt_dict内のWeapon Type: {json.dumps(prompt_info['positive_base_prompt_dict']['Weapon Type'], indent=2, ensure_ascii=False)}")
+    def _submit_post_process(self, fn, *args):
+        """
+        後処理を後処理パイプラインのキューに入れる（パイプラインが無効な場合はその場で実行する）
 
-                    # 辞書構造を確認して適切にアクセス
-                    weapon_type_data = prompt_info["positive_base_prompt_dict"]["Weapon Type"]
+        Args:
+            fn (callable): 後処理の関数
+            *args: fn に渡す引数
 
-                    # 新しい形式（selected_prompts）と古い形式の両方に対応
-                    if isinstance(weapon_type_data, dict) and "selected_prompts" in weapon_type_data:
-                        weapon_prompts = weapon_type_data["selected_prompts"]
-                    elif isinstance(weapon_type_data, list):
-                        weapon_prompts = weapon_type_data
-                    else:
-                        weapon_prompts = []
+        Returns:
+            concurrent.futures.Future: 後処理の結果
+        """
+        if self.post_processor is not None:
+            return self.post_processor.submit(fn, *args)
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
 
-                    # 武器タイプを抽出
-                    if weapon_prompts:
-                        # 最初の武器タイプを使用
-                        weapon_type = weapon_prompts[0].lower()
-                        self.logger.debug(f"抽出された武器タイプ: {weapon_type}")
-                    else:
-                        logging.warning("武器タイプが見つかりませんでした")
-                else:
-                    logging.warning("武器タイプ情報が見つかりませんでした")
+    async def _apost_process(self, fn, *args):
+        """後処理を後処理パイプラインで実行して完了を待つ（_submit_post_process() の非同期版）"""
+        if self.post_processor is None:
+            return await asyncio.to_thread(fn, *args)
+        future = await asyncio.to_thread(self.post_processor.submit, fn, *args)
+        return await asyncio.wrap_future(future)
 
-            # 画像生成開始をログに記録
-            self.logger.debug(f"画像生成開始: {filename}")
+    def _post_process_image(self, r, job, output_folder_path, result_images, manifest, start_time):
+        """
+        画像と関連ファイルを保存し、マニフェストに結果を記録する（後処理パイプラインで実行）
 
-            # 画像生成開始時間を記録
-            start_time = time.time()
+        Args:
+            r (dict): txt2img APIのレスポンス
+            job (dict): _prepare_batch で作成したジョブ
+            output_folder_path (str): 保存先フォルダ
+            result_images (dict): 結果を格納する辞書
+            manifest (BatchManifest): バッチのマニフェスト
+            start_time (float): リクエストの送信を開始した時刻
+        """
+        try:
+            self._save_generated_images(r, job["payload"], output_folder_path, job["filename"], result_images, job["prompt_info"])
+        except Exception as e:
+            self._log_generation_error(e, job["payload"])
+            manifest.mark_failed(job["filename"], e)
+            return
+        manifest.mark_completed(job["filename"])
+        self.logger.info(f"画像生成完了: {job['filename']} (所要時間: {time.time() - start_time:.2f}秒)")
 
-            # 画像生成APIを呼び出す
-            try:
-                # 正しいエンドポイントを使用
-                response = requests.post(url=self.TXT2IMG_URL, json=payload)
-                response.raise_for_status()
-            except requests.exceptions.HTTPError as e:
-                self.logger.error(f"画像生成中にエラーが発生しました: {e}")
-                self.logger.error(f"HTTPエラー: {e}")
-                try:
-                    error_detail = response.json()
-                    self.logger.error(f"サーバーからのエラー詳細: {json.dumps(error_detail, indent=2, ensure_ascii=False)}")
-                except:
-                    self.logger.error("サーバーからのエラー詳細を取得できませんでした")
-                raise
+    def _request_txt2img(self, payload):
+        """
+        txt2img APIを呼び出してレスポンスのJSONを返す
 
-            # レスポンスからJSONデータを取得
-            r = response.json()
-
-            # 画像処理用の変数を初期化
-            images_processed_count = 0
-            seed_value = 0
-            parameters = ""
-            self.current_parameters = ""
-
-            # 生成された画像を処理
-            for i, image_data in enumerate(r['images']):
-                images_processed_count += 1
-                self.logger.debug(f"透過画像生成時の画像処理回数: {images_processed_count}")
-                # Base64エンコードされた画像データをデコード
-                image = Image.open(io.BytesIO(base64.b64decode(image_data.split(",", 1)[0])))
-
-                # 透過画像生成時は最初の１つ目の r['images'] にのみ PNG 画像情報があるので、そこから各種値を取得
-                # seed_value == 0 ではなく、最初の画像（images_processed_count == 1）から必ずPNGInfoを取得する
-                if images_processed_count == 1:
-                    try:
-                        # ABG Removerを使用した場合、最初の画像にのみPNGInfoが含まれているため、
-                        # ここで取得したPNGInfoを3つ目の透過画像用に保持する必要がある
-                        png_payload = {
-                            "image": "data:image/png;base64," + image_data
-                        }
-                        self.logger.debug("最初の画像からPNGInfoを取得しています...")
-                        self.logger.debug(f"PNGInfo APIエンドポイント: {self.PNGINFO_URL}")
-                        self.logger.debug(f"PNGInfo APIペイロードの長さ: {len(json.dumps(png_payload))}")
-
-                        # リクエスト送信前にデータの先頭部分をログに記録
-                        image_data_preview = image_data[:100] + "..." if len(image_data) > 100 else image_data
-                        self.logger.debug(f"画像データプレビュー: {image_data_preview}")
-
-                        response2 = requests.post(url=self.PNGINFO_URL, json=png_payload)
-                        self.logger.debug(f"PNGInfo APIステータスコード: {response2.status_code}")
-                        response2.raise_for_status()
-
-                        # PNGInfoを取得
-                        info_text = response2.json().get("info", "")
-                        if not info_text:
-                            logging.error("PNGInfoが空でした！レスポンス全体を確認します。")
-                            logging.error(f"PNGInfo API レスポンス: {json.dumps(response2.json(), indent=2, ensure_ascii=False)}")
-
-                            # PNGInfoが空の場合、元のプロンプト情報からデフォルトのPNGInfoを生成
-                            # payloadから直接情報を取得
-                            # 元のプロンプトとネガティブプロンプトを取得
-                            positive_prompt = payload.get("prompt", "")
-                            negative_prompt = payload.get("negative_prompt", "")
-                            seed = payload.get("seed", 0)
-
-                            # デフォルトのPNGInfo文字列を生成
-                            info_text = (
-                                f"{positive_prompt}\n"
-                                f"Negative prompt: {negative_prompt}\n"
-                                f"Steps: {payload.get('steps', 50)}, "
-                                f"Sampler: {payload.get('sampler_name', 'DPM++ 2M')}, "
-                                f"CFG scale: {payload.get('cfg_scale', 7)}, "
-                                f"Seed: {seed}, "
-                                f"Size: {payload.get('width', 512)}x{payload.get('height', 768)}, "
-                                f"Model: {self.SD_MODEL_CHECKPOINT}"
-                            )
-                            self.logger.debug("デフォルトのPNGInfo情報を生成しました")
-                        else:
-                            self.logger.debug(f"取得したPNGInfo: {info_text[:200]}...")  # 最初の200文字だけログに出力
-
-                        # パラメータを保存
-                        parameters = info_text if info_text else "デフォルトパラメータ（PNGInfoが取得できませんでした）"
-                        self.current_parameters = parameters  # 現在のパラメータをクラス変数に保存
-                        self.logger.debug(f"保存したパラメータの長さ: {len(parameters)}")
-
-                        # PNGInfoが取得できた場合のみ解析を行う
-                        if info_text:
-                            # PNGInfoを解析（先頭に「Prompt:」はない前提）
-                            lines = info_text.split('\n')
-                            self.current_png_info = {}
-
-                            # 最初の行をプロンプトとして扱う
-                            if lines:
-                                prompt_line = lines[0].strip()
-                                self.current_png_info["prompt"] = prompt_line
-                                self.logger.debug(f"最初の行からプロンプトを抽出しました: {prompt_line[:100]}...")
-
-                            # 残りの行をパラメータとして解析
-                            for line in lines[1:]:
-                                if ":" in line:
-                                    key, value = line.split(":", 1)
-                                    key = key.strip()
-                                    value = value.strip()
-                                    self.current_png_info[key] = value
-
-                                    # Seed値を取得
-                                    if key.lower() == "seed":
-                                        try:
-                                            seed_value = int(value)
-                                            self.debug.info(f"Seed値を抽出しました: {seed_value}")
-                                        except ValueError:
-                                            logging.warning(f"Seed値の変換に失敗しました: {value}")
+        5xx・タイムアウト・接続エラーの場合は settings.json の "retry" に従ってリトライする。
+        レスポンスキャッシュが有効な場合、同じペイロードの結果が保存されていればWeb UIに送信せずに返す。
 
-                    except Exception as e:
-                        logging.error(f"PNG情報の取得中にエラーが発生しました: {e}")
+        Args:
+            payload (dict): txt2imgに送信するペイロード
 
-                # 透過画像生成時は３つ目の画像のみを保存するため、１つ目と２つ目はスキップ
-                # ABG Removerの出力: 1つ目=元画像、2つ目=マスク画像、3つ目=透過背景画像
-                if self.IS_TRANSPARENT_BACKGROUND and images_processed_count != 3:
-                    continue
+        Returns:
+            dict: txt2img APIのレスポンス
+        """
+        if self.response_cache is not None:
+            return self.response_cache.fetch(
+                payload,
+                lambda: self._request_txt2img_uncached(payload),
+                required_images=self._get_decoded_image_indices(),
+                model=self.SD_MODEL_CHECKPOINT
+            )
+        return self._request_txt2img_uncached(payload)
 
-                # 画像のメタデータを設定
-                pnginfo = PngImagePlugin.PngInfo()
-                # 透過画像生成時に3つ目の画像にも1つ目の画像から取得したPNGInfoを適用する
-                if self.IS_TRANSPARENT_BACKGROUND and images_processed_count == 3 and self.current_parameters:
-                    self.logger.debug(f"透過画像に元画像のPNGInfoを適用します。長さ: {len(self.current_parameters)}")
-                    pnginfo.add_text("parameters", self.current_parameters)
-                else:
-                    if not parameters:
-                        logging.warning("PNGInfoに設定するパラメータが空です。")
-                        parameters = "自動生成された画像（詳細情報なし）"
-                    self.logger.debug(f"通常の方法でPNGInfoを設定します。長さ: {len(parameters)}")
-                    pnginfo.add_text("parameters", parameters)
+    def _request_txt2img_uncached(self, payload):
+        """txt2img APIを呼び出してレスポンスのJSONを返す（レスポンスキャッシュを使用しない）"""
+        self._validate_payload(payload)
+        return self.retry_policy.execute(lambda: self._send_txt2img(payload), description="txt2img")
 
-                # 画像ファイルパスを生成
-                image_path = os.path.normpath(os.path.join(output_folder_path, filename + self.IMAGE_FILE_EXTENSION))
+    def _request_packed_txt2img(self, jobs):
+        """
+        Seed値またはsubseedのみが異なるジョブを batch_size=len(jobs) の1回のtxt2imgリクエストで生成する
 
-                # 画像を保存
-                image.save(image_path, pnginfo=pnginfo)
+        Args:
+            jobs (list): まとめて描画するジョブのリスト（Seed値またはsubseedが連続していること）
 
-                # 保存後にPNGInfoが正しく設定されたか確認（デバッグ用）
-                if self.IS_TRANSPARENT_BACKGROUND and images_processed_count == 3:
-                    try:
-                        # 保存した画像を開いて確認
-                        with Image.open(image_path) as saved_image:
-                            if 'parameters' in saved_image.info:
-                                self.logger.debug(f"透過画像にPNGInfoが正しく保存されました。長さ: {len(saved_image.info['parameters'])}")
-                            else:
-                                logging.warning("透過画像にPNGInfoが保存されていません")
-                    except Exception as e:
-                        logging.error(f"保存した透過画像のPNGInfo確認中にエラーが発生しました: {e}")
+        Returns:
+            list: ジョブ毎に分割したtxt2img APIのレスポンス（画像が返されなかったジョブはNone）
+        """
+        r = self._request_txt2img(self._build_packed_payload(jobs))
+        return self._split_batch_response(r, len(jobs))
 
-                # 画像をJPG形式でも保存
-                jpg_file_path = os.path.normpath(os.path.join(output_folder_path, filename + ".jpg"))
-                image.convert("RGB").save(jpg_file_path, format="JPEG")
+    def _build_packed_payload(self, jobs):
+        """
+        まとめて描画するジョブのペイロードを作成する
 
-                # 結果を辞書に追加
-                result_images[filename] = {
-                    "path": image_path,
-                    "seed": seed_value,
-                    "parameters": parameters
-                }
+        Seed値またはsubseedが連続するジョブは batch_size で描画し、Seed値が同じでプロンプトのみが異なるジョブ（multi_prompt）は
+        "Prompts from file or textbox" スクリプトに1行ずつ渡して、同じSeed値で順番に描画する。
 
-            # 関連画像（サムネイル、サンプル画像など）を生成
-            self.generate_related_images(image, output_folder_path, filename, pnginfo)
-
-            # prompt_infoから必要な情報を取得
-            positive_base_prompt_dict = prompt_info["positive_base_prompt_dict"]
-            positive_pose_prompt_dict = prompt_info["positive_pose_prompt_dict"]
-            positive_optional_prompt_dict = prompt_info["positive_optional_prompt_dict"]
-            negative_prompt_dict = prompt_info["negative_prompt_dict"]
-            cancel_prompts = prompt_info["cancel_prompts"]
-
-            # プロンプト情報をJSONファイルとして保存
-            self.save_prompts_to_json(
-                positive_base_prompt_dict,
-                positive_pose_prompt_dict,
-                positive_optional_prompt_dict,
-                negative_prompt_dict,
-                output_folder_path,
-                filename,
-                cancel_prompts
+        Args:
+            jobs (list): まとめて描画するジョブのリスト
+
+        Returns:
+            dict: txt2imgに送信するペイロード
+        """
+        payload = jobs[0]["payload"]
+        if len(jobs) == 1 or any(
+            job["payload"].get("seed") != payload.get("seed") or job["payload"].get("subseed") != payload.get("subseed")
+            for job in jobs
+        ):
+            return {**payload, "batch_size": len(jobs)}
+
+        # 各行は --prompt "..." --negative_prompt "..." の形式（Web UI側で shlex により解析される）
+        lines = [
+            "--prompt {} --negative_prompt {}".format(
+                shlex.quote(job["payload"].get("prompt", "").replace("\n", " ")),
+                shlex.quote(job["payload"].get("negative_prompt", "").replace("\n", " "))
             )
+            for job in jobs
+        ]
+        # スクリプトの引数（行毎にSeed値を変更する, 全ての行で同じランダムなSeed値を使用する, [プロンプトの位置], プロンプトのリスト）
+        # prompt_position は v1.6 以降の Web UI のみ（null の場合は省略）
+        prompt_position = self.VARIATION_SETTINGS["prompt_position"]
+        script_args = [False, False] + ([prompt_position] if prompt_position else []) + ["\n".join(lines)]
+        return {**payload, "script_name": "prompts from file or textbox", "script_args": script_args}
+
+    def _post_process_packed_images(self, unit, responses, start_time):
+        """まとめて生成した画像を保存し、生成完了をログに出力する（後処理パイプラインで実行）"""
+        self._save_packed_images(unit, responses)
+        elapsed_time = time.time() - start_time
+        self.logger.info(f"画像生成完了: {self._describe_request_unit(unit)} (所要時間: {elapsed_time:.2f}秒)")
+
+    def _save_packed_images(self, unit, responses):
+        """
+        まとめて生成した画像をバッチフォルダ毎に保存し、各バッチのマニフェストに結果を記録する
 
-            # 画像生成完了をログに記録
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            self.logger.info(f"画像生成完了: {filename} (所要時間: {elapsed_time:.2f}秒)")
+        Args:
+            unit (list): _get_request_units で決めた (バッチ, ジョブのインデックス) のリスト
+            responses (list): _request_packed_txt2img が返したジョブ毎のレスポンス
+        """
+        for (batch, index), r in zip(unit, responses):
+            job = batch["jobs"][index]
+            try:
+                if r is None:
+                    raise ValueError("txt2imgレスポンスに画像が含まれていません")
+                self._save_generated_images(r, job["payload"], batch["folder_path"], job["filename"], batch["result_images"], job["prompt_info"])
+            except Exception as e:
+                self._log_generation_error(e, job["payload"])
+                batch["manifest"].mark_failed(job["filename"], e)
+            else:
+                batch["manifest"].mark_completed(job["filename"])
+
+    def _mark_packed_in_flight(self, unit):
+        """まとめて生成する画像のリクエストを送信したことを各バッチのマニフェストに記録する"""
+        for batch, index in unit:
+            batch["manifest"].mark_in_flight(batch["jobs"][index]["filename"])
 
-            # 検証に成功したか最大試行回数に達した場合はループを終了
+    def _mark_packed_failed(self, unit, error):
+        """まとめて生成した画像のリクエストが失敗したことを各バッチのマニフェストに記録する"""
+        for batch, index in unit:
+            batch["manifest"].mark_failed(batch["jobs"][index]["filename"], error)
+
+    def _validate_payload(self, payload):
+        """
+        ペイロードで指定したモデル・LoRA・アップスケーラー・サンプラー・スクリプトがサーバーに存在するかを検証する
+
+        いずれかの正常なバックエンドで実行できれば検証成功とする。
+
+        Args:
+            payload (dict): txt2imgに送信するペイロード
+
+        Raises:
+            PreflightError: 実行できるバックエンドが存在しない場合
+        """
+        if self.capabilities is None:
             return
+        backends = [backend for backend in self.backend_pool.backends if backend.healthy] or self.backend_pool.backends
+        problems = []
+        for backend in backends:
+            backend_problems = self.capabilities.validate(payload, backend)
+            if not backend_problems:
+                return
+            problems.extend(backend_problems)
+        raise PreflightError(problems)
+
+    def preflight(self):
+        """
+        モデルを切り替える前に、このジョブのペイロードがサーバーで実行できるかを検証する
 
-        except Exception as e:
-            logging.error(f"画像生成中にエラーが発生しました: {e}")
-            raise e
+        Returns:
+            bool: 実行できる場合はTrue
+        """
+        try:
+            self._validate_payload(self._build_payload("", "", -1, apply_lora=True))
+        except PreflightError as e:
+            for problem in e.problems:
+                self.logger.error(f"事前検証エラー: {problem}")
+            return False
+        return True
+
+    def _send_txt2img(self, payload):
+        """
+        txt2img APIを1回だけ呼び出してレスポンスのJSONを返す
+
+        Args:
+            payload (dict): txt2imgに送信するペイロード
+
+        Returns:
+            dict: txt2img APIのレスポンス
+        """
+        # 処理中のリクエストが最も少ないバックエンドに送信
+        with self.backend_pool.lease(self.SD_MODEL_CHECKPOINT) as backend:
+            # 共有フォルダを使用するバックエンドには、画像をジョブフォルダに保存してBase64で返さないよう指定する
+            if self.shared_output is not None and self.shared_output.applies_to(backend.url):
+                request_payload, job_dir = self.shared_output.prepare(payload)
+                try:
+                    r = self._post_txt2img(backend, request_payload, stream=False)
+                    return self.shared_output.collect(job_dir, r)
+                except BaseException:
+                    self.shared_output.discard(job_dir)
+                    raise
+            return self._post_txt2img(backend, payload, stream=self.STREAM_RESPONSES)
+
+    def _post_txt2img(self, backend, payload, stream):
+        """
+        1台のバックエンドにtxt2imgリクエストを送信してレスポンスのJSONを返す
+
+        Args:
+            backend (Backend): 送信先のバックエンド
+            payload (dict): txt2imgに送信するペイロード
+            stream (bool): レスポンスを逐次解析し、画像をチャンク毎にデコードするかどうか
+
+        Returns:
+            dict: txt2img APIのレスポンス
+        """
+        # 描画中は進捗を監視し、進捗が止まった場合は中断させる
+        monitor = self.progress_monitors.get(backend.url)
+        with monitor.track() if monitor else nullcontext():
+            try:
+                response = backend.client.post(backend.txt2img_url, json=payload, stream=stream)
+            finally:
+                stalled = monitor.consume_interrupt() if monitor else False
+
+        # サーバーの待ち行列の長さを同時リクエスト数の調整に使用
+        if monitor and backend.concurrency:
+            backend.concurrency.observe_queue(monitor.last_status.get("queue_depth"))
+
+        # 中断されたリクエストは途中までの画像が返されるため、破棄してリトライポリシーに任せる
+        if stalled:
+            response.close()
+            raise RenderStalledError(f"描画の進捗が止まったため生成を中断しました ({backend.url})")
+
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            self.logger.error(f"画像生成中にエラーが発生しました: {e} ({backend.url})")
+            self.logger.error(f"HTTPエラー: {e}")
+            try:
+                error_detail = response.json()
+                self.logger.error(f"サーバーからのエラー詳細: {json.dumps(error_detail, indent=2, ensure_ascii=False)}")
+            except:
+                self.logger.error("サーバーからのエラー詳細を取得できませんでした")
+            raise
+
+        # レスポンスからJSONデータを取得（画像はBase64文字列全体を保持せずに逐次デコード）
+        if stream:
+            return read_txt2img_response(
+                response,
+                spool_max_size=self.SPOOL_MAX_SIZE,
+                keep_images=self._get_decoded_image_indices()
+            )
+        return response.json()
+
+    def _save_generated_images(self, r, payload, output_folder_path, filename, result_images, prompt_info):
+        """
+        txt2img APIのレスポンスから画像・関連画像・プロンプトのJSONを保存する
+
+        Args:
+            r (dict): txt2img APIのレスポンス
+            payload (dict): txt2imgに送信したペイロード
+            output_folder_path (str): 保存先フォルダ
+            filename (str): ファイル名（拡張子なし）
+            result_images (dict): 結果を格納する辞書
+            prompt_info (dict): プロンプト情報
+        """
+        # 武器タイプを抽出（RPGアイコンの武器カテゴリの場合のみ）
+        weapon_type = None
+        if self.style == "illustration" and self.category == "rpg_icon" and self.subcategory == "weapon":
+            # デバッグログを追加
+            self.logger.debug(f"武器タイプ抽出を開始します。prompt_info: {json.dumps(prompt_info, indent=2, ensure_ascii=False)[:500]}...")
+
+            # プロンプトから武器タイプを抽出
+            if "positive_base_prompt_dict" in prompt_info and "Weapon Type" in prompt_info["positive_base_prompt_dict"]:
+                self.logger.debug(f"positive_base_prompt_dict内のWeapon Type: {json.dumps(prompt_info['positive_base_prompt_dict']['Weapon Type'], indent=2, ensure_ascii=False)}")
+
+                # 辞書構造を確認して適切にアクセス
+                weapon_type_data = prompt_info["positive_base_prompt_dict"]["Weapon Type"]
+
+                # 新しい形式（selected_prompts）と古い形式の両方に対応
+                if isinstance(weapon_type_data, dict) and "selected_prompts" in weapon_type_data:
+                    weapon_prompts = weapon_type_data["selected_prompts"]
+                elif isinstance(weapon_type_data, list):
+                    weapon_prompts = weapon_type_data
+                else:
+                    weapon_prompts = []
+
+                # 武器タイプを抽出
+                if weapon_prompts:
+                    # 最初の武器タイプを使用
+                    weapon_type = weapon_prompts[0].lower()
+                    self.logger.debug(f"抽出された武器タイプ: {weapon_type}")
+                else:
+                    logging.warning("武器タイプが見つかりませんでした")
+            else:
+                logging.warning("武器タイプ情報が見つかりませんでした")
+
+        # 画像処理用の変数を初期化
+        # 非同期エンジンでは複数の画像を並行して保存するため、PNGInfoはローカル変数で保持する
+        images_processed_count = 0
+        seed_value = 0
+        parameters = ""
+        png_info = {}
+        self.current_parameters = ""
+
+        # 生成された画像を処理
+        for i, image_data in enumerate(r['images']):
+            images_processed_count += 1
+            self.logger.debug(f"透過画像生成時の画像処理回数: {images_processed_count}")
+
+            # 透過画像生成時は最初の１つ目の r['images'] にのみ PNG 画像情報があるので、そこから各種値を取得
+            # seed_value == 0 ではなく、最初の画像（images_processed_count == 1）から必ずPNGInfoを取得する
+            if images_processed_count == 1:
+                try:
+                    # ABG Removerを使用した場合、最初の画像にのみPNGInfoが含まれているため、
+                    # ここで取得したPNGInfoを3つ目の透過画像用に保持する必要がある
+                    info_text = self._extract_infotext(r, image_data, payload)
+
+                    # パラメータを保存
+                    parameters = info_text if info_text else "デフォルトパラメータ（PNGInfoが取得できませんでした）"
+                    self.current_parameters = parameters  # 現在のパラメータをクラス変数に保存
+                    self.logger.debug(f"保存したパラメータの長さ: {len(parameters)}")
+
+                    # PNGInfoが取得できた場合のみ解析を行う
+                    if info_text:
+                        png_info = self._parse_infotext_lines(info_text)
+                        seed_value = self._get_seed_from_info(r, info_text)
+                        if seed_value:
+                            png_info["seed"] = seed_value
+                        # subseed による別バージョンの画像はVariation seedも記録する
+                        if payload.get("subseed_strength"):
+                            all_subseeds = self._parse_txt2img_info(r).get("all_subseeds") or [payload.get("subseed")]
+                            png_info["subseed"] = all_subseeds[0]
+                            png_info["subseed_strength"] = payload["subseed_strength"]
+                        self.current_png_info = png_info
+
+                except Exception as e:
+                    logging.error(f"PNG情報の取得中にエラーが発生しました: {e}")
+
+            # 透過画像生成時は３つ目の画像のみを保存するため、１つ目と２つ目はスキップ
+            # ABG Removerの出力: 1つ目=元画像、2つ目=マスク画像、3つ目=透過背景画像
+            # 元画像とマスク画像はデコードせず、設定に応じてバイト列のまま保存する
+            if self.IS_TRANSPARENT_BACKGROUND and images_processed_count != 3:
+                if self.SAVE_TRANSPARENT_SOURCES and images_processed_count in self.TRANSPARENT_SOURCE_SUFFIXES:
+                    self._save_raw_image(image_data, output_folder_path, filename, images_processed_count)
+                continue
+
+            # 保存する画像のみデコード
+            image = self._open_image_data(image_data)
+
+            # 画像のメタデータを設定
+            # 透過画像生成時に3つ目の画像にも1つ目の画像から取得したPNGInfoを適用する
+            if self.IS_TRANSPARENT_BACKGROUND and images_processed_count == 3 and parameters:
+                self.logger.debug(f"透過画像に元画像のPNGInfoを適用します。長さ: {len(parameters)}")
+            else:
+                if not parameters:
+                    logging.warning("PNGInfoに設定するパラメータが空です。")
+                    parameters = "自動生成された画像（詳細情報なし）"
+                self.logger.debug(f"通常の方法でPNGInfoを設定します。長さ: {len(parameters)}")
+
+            # 画像ファイルパスを生成
+            image_path = os.path.normpath(os.path.join(output_folder_path, filename + self.IMAGE_FILE_EXTENSION))
+            jpg_file_path = os.path.normpath(os.path.join(output_folder_path, filename + ".jpg"))
+
+            # 画像・JPG形式の画像・関連画像（サムネイル、サンプル画像など）を保存
+            # image_encoder が有効な場合は、全てのファイルを複数のプロセスで並列にエンコードする
+            targets = [
+                {"path": image_path, "pnginfo": {"parameters": parameters}},
+                {"path": jpg_file_path, "format": "JPEG", "convert": "RGB"}
+            ]
+            targets.extend(self._build_related_targets(image, output_folder_path, filename))
+            self._encode_image(image, targets)
+
+            # 保存後にPNGInfoが正しく設定されたか確認（デバッグ用）
+            if self.IS_TRANSPARENT_BACKGROUND and images_processed_count == 3:
+                try:
+                    # 保存した画像を開いて確認
+                    with Image.open(image_path) as saved_image:
+                        if 'parameters' in saved_image.info:
+                            self.logger.debug(f"透過画像にPNGInfoが正しく保存されました。長さ: {len(saved_image.info['parameters'])}")
+                        else:
+                            logging.warning("透過画像にPNGInfoが保存されていません")
+                except Exception as e:
+                    logging.error(f"保存した透過画像のPNGInfo確認中にエラーが発生しました: {e}")
+
+            # 結果を辞書に追加
+            result_images[filename] = {
+                "path": image_path,
+                "seed": seed_value,
+                "parameters": parameters
+            }
+
+        # prompt_infoから必要な情報を取得
+        positive_base_prompt_dict = prompt_info["positive_base_prompt_dict"]
+        positive_pose_prompt_dict = prompt_info["positive_pose_prompt_dict"]
+        positive_optional_prompt_dict = prompt_info["positive_optional_prompt_dict"]
+        negative_prompt_dict = prompt_info["negative_prompt_dict"]
+        cancel_prompts = prompt_info["cancel_prompts"]
+
+        # プロンプト情報をJSONファイルとして保存
+        self.save_prompts_to_json(
+            positive_base_prompt_dict,
+            positive_pose_prompt_dict,
+            positive_optional_prompt_dict,
+            negative_prompt_dict,
+            output_folder_path,
+            filename,
+            cancel_prompts,
+            png_info=png_info,
+            parameters=parameters
+        )
+
+        # 逐次デコードした画像の一時ファイルを解放
+        self._close_response_images(r)
 
     def _set_image_size_by_type(self):
         """画像タイプに基づいて画像サイズを設定する"""
@@ -1875,6 +3219,250 @@ class AutoImageGenerator:
             self.width = 512
             self.height = 768
 
+    def _parse_txt2img_info(self, r):
+        """
+        txt2imgレスポンスの info（JSON文字列）を辞書に変換する
+
+        Args:
+            r (dict): txt2img APIのレスポンス
+
+        Returns:
+            dict: info の内容（infotexts, seed, all_seeds 等）。解析できない場合は空の辞書
+        """
+        info = r.get("info", {})
+        if isinstance(info, str):
+            try:
+                info = json.loads(info)
+            except json.JSONDecodeError:
+                self.logger.warning("txt2imgレスポンスのinfoを解析できませんでした")
+                return {}
+        return info if isinstance(info, dict) else {}
+
+    def _split_batch_response(self, r, count):
+        """
+        batch_size=count で描画したtxt2imgレスポンスを、画像1枚ずつのレスポンスに分割する
+
+        各レスポンスの info には、その画像の infotext と Seed値（all_seeds / all_subseeds）のみを残す。
+
+        Args:
+            r (dict): txt2img APIのレスポンス
+            count (int): 描画した画像の数
+
+        Returns:
+            list: 画像1枚ずつのレスポンスのリスト（画像が不足している場合はNone）
+        """
+        images = r.get("images", [])
+        info = self._parse_txt2img_info(r)
+        infotexts = info.get("infotexts") or []
+        all_seeds = info.get("all_seeds") or []
+        all_subseeds = info.get("all_subseeds") or []
+
+        # グリッド画像が返された場合は先頭に追加されている
+        image_offset = max(0, len(images) - count)
+        infotext_offset = max(0, len(infotexts) - count)
+        self._close_response_images({"images": images[:image_offset]})
+
+        responses = []
+        for i in range(count):
+            if image_offset + i >= len(images):
+                responses.append(None)
+                continue
+            image_info = {**info, "infotexts": infotexts[infotext_offset + i:infotext_offset + i + 1]}
+            if i < len(all_seeds):
+                image_info["seed"] = all_seeds[i]
+                image_info["all_seeds"] = [all_seeds[i]]
+            else:
+                # Seed値はinfotextから取得する
+                image_info.pop("seed", None)
+                image_info.pop("all_seeds", None)
+            if i < len(all_subseeds):
+                image_info["subseed"] = all_subseeds[i]
+                image_info["all_subseeds"] = [all_subseeds[i]]
+            responses.append({**r, "images": [images[image_offset + i]], "info": image_info})
+        return responses
+
+    def _open_image_data(self, image_data):
+        """
+        txt2imgレスポンスの画像データをPIL画像として開く
+
+        Args:
+            image_data (str | file object): Base64エンコードされた画像データ、または逐次デコード済みのファイルオブジェクト
+
+        Returns:
+            PIL.Image.Image: 画像
+        """
+        if isinstance(image_data, str):
+            return Image.open(io.BytesIO(base64.b64decode(image_data.split(",", 1)[0])))
+        image_data.seek(0)
+        return Image.open(image_data)
+
+    def _close_response_images(self, r):
+        """逐次デコードした画像の一時ファイルを閉じる"""
+        for image_data in r.get("images", []):
+            if image_data is not None and not isinstance(image_data, str):
+                image_data.close()
+
+    def _get_decoded_image_indices(self):
+        """
+        txt2imgレスポンスのうちデコードが必要な画像のインデックスを返す
+
+        Returns:
+            set: インデックスのセット（全ての画像が必要な場合はNone）
+        """
+        if not self.IS_TRANSPARENT_BACKGROUND or self.SAVE_TRANSPARENT_SOURCES:
+            return None
+        # ABG Removerの出力のうち保存する3つ目の透過背景画像のみ（PNGInfo APIを使う場合は1つ目も）
+        return {0, 2} if self.USE_PNG_INFO_API else {2}
+
+    def _save_raw_image(self, image_data, output_folder_path, filename, images_processed_count):
+        """
+        ABG Removerの元画像・マスク画像をPILでデコードせずにそのまま保存する
+
+        Args:
+            image_data (str | file object): Base64エンコードされた画像データ、または逐次デコード済みのファイルオブジェクト
+            output_folder_path (str): バッチの出力フォルダ
+            filename (str): ファイル名（拡張子なし）
+            images_processed_count (int): レスポンス内の画像の番号（1始まり）
+        """
+        source_folder = os.path.join(output_folder_path, self.TRANSPARENT_SOURCE_FOLDER)
+        os.makedirs(source_folder, exist_ok=True)
+        suffix = self.TRANSPARENT_SOURCE_SUFFIXES[images_processed_count]
+        source_path = os.path.normpath(os.path.join(source_folder, f"{filename}-{suffix}{self.IMAGE_FILE_EXTENSION}"))
+
+        with open(source_path, "wb") as f:
+            if isinstance(image_data, str):
+                f.write(base64.b64decode(image_data.split(",", 1)[0]))
+            else:
+                image_data.seek(0)
+                shutil.copyfileobj(image_data, f)
+        self.logger.debug(f"透過画像の生成元画像を保存しました: {source_path}")
+
+    def _fetch_png_info(self, image_data):
+        """
+        /sdapi/v1/png-info APIに画像を送信してPNGInfoを取得する（オプトインのフォールバック）
+
+        Args:
+            image_data (str | file object): Base64エンコードされた画像データ、または逐次デコード済みのファイルオブジェクト
+
+        Returns:
+            str: 取得したPNGInfo文字列
+        """
+        if not isinstance(image_data, str):
+            image_data.seek(0)
+            image_data = base64.b64encode(image_data.read()).decode()
+        png_payload = {
+            "image": "data:image/png;base64," + image_data
+        }
+        self.logger.debug(f"PNGInfo APIエンドポイント: {self.PNGINFO_URL}")
+        response = self.client.post(self.PNGINFO_URL, json=png_payload)
+        self.logger.debug(f"PNGInfo APIステータスコード: {response.status_code}")
+        response.raise_for_status()
+        return response.json().get("info", "")
+
+    def _build_default_infotext(self, payload):
+        """
+        PNGInfoが取得できない場合に、payloadからデフォルトのPNGInfo文字列を生成する
+
+        Args:
+            payload (dict): txt2imgに送信したペイロード
+
+        Returns:
+            str: PNGInfo形式の文字列
+        """
+        return (
+            f"{payload.get('prompt', '')}\n"
+            f"Negative prompt: {payload.get('negative_prompt', '')}\n"
+            f"Steps: {payload.get('steps', 50)}, "
+            f"Sampler: {payload.get('sampler_name', 'DPM++ 2M')}, "
+            f"CFG scale: {payload.get('cfg_scale', 7)}, "
+            f"Seed: {payload.get('seed', 0)}, "
+            f"Size: {payload.get('width', 512)}x{payload.get('height', 768)}, "
+            f"Model: {self.SD_MODEL_CHECKPOINT}"
+        )
+
+    def _extract_infotext(self, r, image_data, payload, index=0):
+        """
+        生成画像のPNGInfo（infotext）を取得する
+
+        txt2imgレスポンスの info に含まれる infotexts をローカルで読み取る。
+        取得できず、settings.json の use_png_info_api が true の場合のみ /png-info APIを呼び出す。
+
+        Args:
+            r (dict): txt2img APIのレスポンス
+            image_data (str): Base64エンコードされた画像データ（フォールバック用）
+            payload (dict): txt2imgに送信したペイロード
+            index (int): 対象画像のインデックス
+
+        Returns:
+            str: PNGInfo文字列
+        """
+        info = self._parse_txt2img_info(r)
+        infotexts = info.get("infotexts") or []
+        info_text = ""
+        if infotexts:
+            # ABG Remover等で画像数とinfotextsの数が異なる場合は先頭のinfotextを使用
+            info_text = infotexts[index] if index < len(infotexts) else infotexts[0]
+            self.logger.debug(f"txt2imgレスポンスからPNGInfoを取得しました: {info_text[:200]}...")
+
+        if not info_text and self.USE_PNG_INFO_API and image_data is not None:
+            self.logger.debug("PNGInfo APIからPNGInfoを取得しています...")
+            info_text = self._fetch_png_info(image_data)
+
+        if not info_text:
+            logging.warning("PNGInfoを取得できなかったため、payloadからデフォルトのPNGInfoを生成します")
+            info_text = self._build_default_infotext(payload)
+
+        return info_text
+
+    def _parse_infotext_lines(self, info_text):
+        """
+        PNGInfo文字列を「キー: 値」の辞書に変換する（先頭行はプロンプトとして扱う）
+
+        Args:
+            info_text (str): PNGInfo文字列
+
+        Returns:
+            dict: 解析結果
+        """
+        lines = info_text.split('\n')
+        png_info = {}
+
+        # 最初の行をプロンプトとして扱う
+        if lines:
+            png_info["prompt"] = lines[0].strip()
+
+        # 残りの行をパラメータとして解析
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                png_info[key.strip()] = value.strip()
+
+        return png_info
+
+    def _get_seed_from_info(self, r, info_text, index=0):
+        """
+        生成に使用されたSeed値を取得する（info の all_seeds/seed を優先し、なければinfotextから抽出）
+
+        Args:
+            r (dict): txt2img APIのレスポンス
+            info_text (str): PNGInfo文字列
+            index (int): 対象画像のインデックス
+
+        Returns:
+            int: Seed値（取得できない場合は0）
+        """
+        info = self._parse_txt2img_info(r)
+        all_seeds = info.get("all_seeds") or []
+        if index < len(all_seeds):
+            return int(all_seeds[index])
+        if info.get("seed") is not None:
+            return int(info["seed"])
+
+        seed_match = re.search(r"Seed:\s*(\d+)", info_text)
+        if seed_match:
+            return int(seed_match.group(1))
+        return 0
+
     def _parse_png_info(self, info_text):
         """
         PNGInfoからプロンプト情報を抽出する
@@ -1911,23 +3499,27 @@ class AutoImageGenerator:
 
         return result
 
-    def _switch_model(self, model_name: str) -> None:
-        """モデルを切り替える"""
-        if self._model_switch_executed:
-            return
+    def _switch_model(self, model_name: str, backend=None) -> None:
+        """
+        モデルを切り替える
+
+        Args:
+            model_name (str): 切り替えるモデルのチェックポイント名
+            backend (Backend, optional): 対象のバックエンド（省略時は先頭のバックエンド）
+        """
+        backend = backend or self.backend_pool.primary
 
         try:
             # モデル切り替えリクエスト
             option_payload = {
                 "sd_model_checkpoint": model_name
             }
-            response = requests.post(url=self.OPTIONS_URL, json=option_payload)
+            response = backend.client.post(backend.options_url, json=option_payload)
             response.raise_for_status()
-            self.logger.info(f"モデル切り替えリクエスト送信完了: ステータスコード {response.status_code}")
+            self.logger.info(f"モデル切り替えリクエスト送信完了: ステータスコード {response.status_code} ({backend.url})")
 
             # 現在のモデルを更新
             self._current_model = model_name
-            self._model_switch_executed = True
 
         except Exception as e:
             self.logger.error(f"モデル切り替え中にエラーが発生: {str(e)}")
@@ -0,0 +1,337 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+try:
+    from .webui_client import WebUIClient
+    from .retry_policy import CircuitBreaker
+    from .concurrency_controller import AIMDController
+except ImportError:
+    # autoimagegeneratorフォルダ内でスクリプトとして実行された場合
+    from webui_client import WebUIClient
+    from retry_policy import CircuitBreaker
+    from concurrency_controller import AIMDController
+
+
+class NoHealthyBackendError(requests.exceptions.ConnectionError):
+    """リクエストを送信できる正常なバックエンドが存在しない場合のエラー"""
+
+    def __init__(self, message, retry_after=0.0):
+        """
+        Args:
+            message (str): エラーメッセージ
+            retry_after (float): いずれかのバックエンドが利用可能になるまでの秒数の目安
+        """
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Backend:
+    """
+    1台の Stable Diffusion Web UI インスタンス
+
+    接続先ごとにHTTPクライアント・重み・処理中のリクエスト数・ロード済みモデルを管理する。
+    """
+
+    def __init__(self, url, weight=1, client=None, http_settings=None, breaker=None, concurrency=None, logger=None):
+        """
+        Args:
+            url (str): Stable Diffusion Web UI のURL
+            weight (float): 振り分けの重み（大きいほど多くのリクエストを受け持つ）
+            client (WebUIClient, optional): 使用するHTTPクライアント（省略時は作成する）
+            http_settings (dict, optional): settings.json の "http" セクション
+            breaker (CircuitBreaker, optional): サーキットブレーカー（省略時はデフォルト設定で作成する）
+            concurrency (AIMDController, optional): 同時リクエスト数の上限を調整するコントローラー（省略時は上限なし）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.url = url.rstrip("/")
+        self.weight = weight if weight and weight > 0 else 1
+        self.client = client or WebUIClient.from_settings(self.url, http_settings, logger=logger)
+
+        # APIのURL
+        self.options_url = self.client.endpoint_url("options")
+        self.txt2img_url = self.client.endpoint_url("txt2img")
+
+        # 状態
+        self.outstanding = 0          # 処理中のリクエスト数
+        self.healthy = True           # ヘルスチェックの結果
+        self.last_health_check = 0.0  # 最後にヘルスチェックを行った時刻
+        self.current_model = None     # ロード済みのモデル（不明な場合はNone）
+        self.completed = 0            # 成功したリクエスト数
+        self.failed = 0               # 失敗したリクエスト数
+        self.breaker = breaker or CircuitBreaker()
+        self.concurrency = concurrency
+
+    def __repr__(self):
+        return (
+            f"Backend(url={self.url!r}, weight={self.weight}, outstanding={self.outstanding}, "
+            f"healthy={self.healthy}, breaker={self.breaker.state}, "
+            f"limit={self.concurrency.limit if self.concurrency else None})"
+        )
+
+
+class BackendPool:
+    """
+    複数の Stable Diffusion Web UI へリクエストを振り分けるバックエンドプール
+
+    正常なバックエンドのうち、対象モデルがロード済みで「処理中リクエスト数 / 重み」が最小のものを選択する。
+    異常と判定したバックエンドは health_check_interval 秒ごとに再チェックする。
+    サーキットブレーカーが open のバックエンドにも、reset_timeout 秒が経過するまで振り分けない。
+    同時リクエスト数の上限（AIMDController）に達したバックエンドには振り分けず、全て上限に達している場合は空きを待つ。
+    """
+
+    def __init__(self, backends, health_check_interval=30, logger=None):
+        """
+        Args:
+            backends (list): Backend のリスト
+            health_check_interval (float): 異常なバックエンドを再チェックする間隔（秒）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        if not backends:
+            raise ValueError("バックエンドが1つも指定されていません")
+        self.backends = backends
+        self.health_check_interval = health_check_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._slot_available = threading.Condition(self._lock)
+
+    @classmethod
+    def from_settings(cls, default_url, settings=None, client=None, logger=None):
+        """
+        settings.json の "backends" セクションからプールを作成する
+
+        "backends" が未指定の場合は default_url の1台のみで構成する。
+
+        Args:
+            default_url (str): デフォルトのStable Diffusion Web UI のURL
+            settings (dict, optional): settings.json の内容
+            client (WebUIClient, optional): default_url 用の既存のHTTPクライアント（共有する）
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            BackendPool: 作成したプール
+        """
+        settings = settings or {}
+        http_settings = settings.get("http", {})
+        breaker_settings = settings.get("circuit_breaker", {})
+        concurrency_settings = settings.get("concurrency", {})
+        backend_settings = settings.get("backends") or [{"url": default_url, "weight": 1}]
+
+        backends = []
+        for backend_setting in backend_settings:
+            # URLのみの文字列指定にも対応
+            if isinstance(backend_setting, str):
+                backend_setting = {"url": backend_setting}
+            url = backend_setting["url"]
+            shared_client = client if client and url.rstrip("/") == default_url.rstrip("/") else None
+            backends.append(Backend(
+                url,
+                weight=backend_setting.get("weight", 1),
+                client=shared_client,
+                http_settings=http_settings,
+                breaker=CircuitBreaker.from_settings(breaker_settings),
+                concurrency=AIMDController.from_settings(concurrency_settings, name=url, logger=logger),
+                logger=logger
+            ))
+
+        return cls(backends, health_check_interval=settings.get("health_check_interval", 30), logger=logger)
+
+    @property
+    def primary(self):
+        """先頭（デフォルト）のバックエンド"""
+        return self.backends[0]
+
+    def check_health(self, backend):
+        """
+        バックエンドのヘルスチェックを行い、ロード済みのモデルも更新する
+
+        Args:
+            backend (Backend): チェック対象のバックエンド
+
+        Returns:
+            bool: 正常な場合はTrue
+        """
+        backend.last_health_check = time.time()
+        try:
+            response = backend.client.get(backend.options_url)
+            response.raise_for_status()
+            backend.current_model = response.json().get("sd_model_checkpoint")
+            backend.healthy = True
+        except (requests.exceptions.RequestException, ValueError) as e:
+            self.logger.warning(f"バックエンド {backend.url} のヘルスチェックに失敗しました: {e}")
+            backend.healthy = False
+        return backend.healthy
+
+    def check_all(self):
+        """全てのバックエンドのヘルスチェックを行い、正常なバックエンドのリストを返す"""
+        return [backend for backend in self.backends if self.check_health(backend)]
+
+    def mark_unhealthy(self, backend):
+        """バックエンドを異常としてマークする（次のヘルスチェックまで振り分け対象外）"""
+        with self._lock:
+            backend.healthy = False
+            backend.last_health_check = time.time()
+        self.logger.warning(f"バックエンド {backend.url} を振り分け対象から除外しました")
+
+    def _recheck_unhealthy(self):
+        """
+        再チェック間隔を過ぎた異常なバックエンドのヘルスチェックを行う
+
+        複数のスレッドが同時に acquire した場合も同じバックエンドに重複して問い合わせないよう、
+        ロックを取得した状態で確認日時を更新したスレッドのみがヘルスチェックを行う。
+        """
+        with self._lock:
+            now = time.time()
+            due = [
+                backend for backend in self.backends
+                if not backend.healthy and now - backend.last_health_check >= self.health_check_interval
+            ]
+            for backend in due:
+                backend.last_health_check = now
+        for backend in due:
+            if self.check_health(backend):
+                self.logger.info(f"バックエンド {backend.url} が復帰しました")
+
+    def acquire(self, model=None):
+        """
+        リクエストを送信するバックエンドを選択し、処理中リクエスト数を増やす
+
+        model を指定した場合は、別のモデルがロードされているバックエンドには送信しない
+        （ペイロードの sd_model_checkpoint は Web UI に無視され、ロード済みのモデルで描画されるため）。
+
+        Args:
+            model (str, optional): 使用するモデル（ロード済みのモデルが不明なバックエンドにも送信する）
+
+        Returns:
+            Backend: 選択したバックエンド
+
+        Raises:
+            NoHealthyBackendError: model を使用できる正常なバックエンドが存在しない場合
+        """
+        while True:
+            self._recheck_unhealthy()
+            with self._lock:
+                now = time.time()
+                candidates = [
+                    (index, backend) for index, backend in enumerate(self.backends)
+                    if backend.healthy and backend.breaker.available(now) and self._has_model(backend, model)
+                ]
+                if not candidates:
+                    raise NoHealthyBackendError(
+                        "正常なバックエンドが存在しません" if model is None else f"モデル {model} を使用できる正常なバックエンドが存在しません",
+                        retry_after=self._get_retry_after(now, model)
+                    )
+
+                candidates = [
+                    (index, backend) for index, backend in candidates
+                    if backend.concurrency is None or backend.outstanding < backend.concurrency.limit
+                ]
+                if candidates:
+                    return self._dispatch(candidates, model)
+
+                # 全てのバックエンドが同時リクエスト数の上限に達している場合は空きを待つ
+                self._slot_available.wait(timeout=1.0)
+
+    @staticmethod
+    def _has_model(backend, model):
+        """バックエンドで model を使用できるかどうか（ロード済みのモデルが不明な場合は使用できるとみなす）"""
+        return model is None or backend.current_model in (None, model)
+
+    def _dispatch(self, candidates, model):
+        """候補の中から送信先を選択し、処理中リクエスト数を増やす（ロックを取得した状態で呼び出す）"""
+        def dispatch_key(item):
+            index, backend = item
+            # model がロード済みのバックエンドを、ロード済みのモデルが不明なバックエンドより優先する
+            model_unknown = model is not None and backend.current_model is None
+            return (model_unknown, (backend.outstanding + 1) / backend.weight, index)
+
+        _, backend = min(candidates, key=dispatch_key)
+        backend.breaker.before_request()
+        backend.outstanding += 1
+        return backend
+
+    def _get_retry_after(self, now, model=None):
+        """model を使用できるいずれかのバックエンドが振り分け可能になるまでの秒数を返す"""
+        waits = []
+        for backend in self.backends:
+            if not self._has_model(backend, model):
+                # モデルがロード済みか、ヘルスチェックで確認できるまで待つ
+                waits.append(self.health_check_interval)
+            elif not backend.healthy:
+                waits.append(max(0.0, backend.last_health_check + self.health_check_interval - now))
+            else:
+                waits.append(backend.breaker.retry_after(now))
+        return min(waits)
+
+    def release(self, backend, success=True, backend_fault=None, latency=None, in_flight=1):
+        """
+        リクエストの完了を記録する
+
+        Args:
+            backend (Backend): acquire で取得したバックエンド
+            success (bool): リクエストが成功したかどうか
+            backend_fault (bool, optional): 失敗の原因がバックエンド側にあるかどうか
+                （Trueの場合はサーキットブレーカーの失敗として数える。省略時は not success）
+            latency (float, optional): リクエストの所要時間（秒、同時リクエスト数の調整に使用する）
+            in_flight (int): 送信時点のバックエンドの処理中リクエスト数（このリクエストを含む）
+        """
+        if backend_fault is None:
+            backend_fault = not success
+        with self._lock:
+            backend.outstanding = max(0, backend.outstanding - 1)
+            if success:
+                backend.completed += 1
+            else:
+                backend.failed += 1
+            if backend.concurrency is not None:
+                if success and latency is not None:
+                    backend.concurrency.on_success(latency, in_flight)
+                elif not success:
+                    backend.concurrency.on_failure(backend_fault)
+            self._slot_available.notify_all()
+            previous_state = backend.breaker.state
+            if backend_fault:
+                backend.breaker.record_failure()
+            else:
+                backend.breaker.record_success()
+            state = backend.breaker.state
+        if state != previous_state:
+            self.logger.warning(f"バックエンド {backend.url} のサーキットブレーカー: {previous_state} -> {state}")
+
+    @contextmanager
+    def lease(self, model=None):
+        """
+        with文でバックエンドを取得・解放する
+
+        接続エラーが発生した場合は、そのバックエンドを異常としてマークする。
+        5xx・タイムアウト・接続エラーはサーキットブレーカーの失敗として数え、4xxなどリクエスト側の問題は数えない。
+        """
+        backend = self.acquire(model)
+        in_flight = backend.outstanding
+        start_time = time.time()
+        try:
+            yield backend
+        except requests.exceptions.ConnectionError:
+            self.release(backend, success=False)
+            self.mark_unhealthy(backend)
+            raise
+        except requests.exceptions.Timeout:
+            self.release(backend, success=False)
+            raise
+        except requests.exceptions.HTTPError as e:
+            status_code = getattr(e.response, "status_code", None)
+            self.release(backend, success=False, backend_fault=status_code is None or status_code >= 500)
+            raise
+        except Exception:
+            self.release(backend, success=False, backend_fault=False)
+            raise
+        else:
+            self.release(backend, success=True, latency=time.time() - start_time, in_flight=in_flight)
+
+    def close(self):
+        """全てのバックエンドのHTTPクライアントを閉じる"""
+        for backend in self.backends:
+            backend.client.close()
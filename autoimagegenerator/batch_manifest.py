@@ -0,0 +1,150 @@
+import json
+import os
+import threading
+from datetime import datetime
+
+
+class BatchManifest:
+    """
+    バッチフォルダ内の各画像（オリジナル・別バージョン）の生成状況を記録するマニフェスト
+
+    バッチフォルダ直下に batch_manifest.json として保存する。各ジョブのペイロード（プロンプト・Seed値）と
+    プロンプト情報を保持するため、失敗した画像だけを --repair で再生成できる。
+    """
+
+    FILENAME = "batch_manifest.json"
+
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    def __init__(self, folder_path, data):
+        """
+        Args:
+            folder_path (str): バッチフォルダのパス
+            data (dict): マニフェストの内容
+        """
+        self.folder_path = folder_path
+        self.data = data
+        self._lock = threading.Lock()
+        # 各画像の状態を更新した後に呼び出す関数（ジョブジャーナルへの記録等）
+        self.on_update = None
+
+    @classmethod
+    def create(cls, folder_path, jobs, **batch_info):
+        """
+        ジョブのリストから新しいマニフェストを作成して保存する
+
+        Args:
+            folder_path (str): バッチフォルダのパス
+            jobs (list): {"payload", "filename", "prompt_info"} のリスト
+            **batch_info: モデル名やSeed値などのバッチ情報
+
+        Returns:
+            BatchManifest: 作成したマニフェスト
+        """
+        data = {
+            **batch_info,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "jobs": [
+                {
+                    "index": index,
+                    "filename": job["filename"],
+                    "status": cls.PENDING,
+                    "error": None,
+                    "payload": job["payload"],
+                    "prompt_info": job["prompt_info"]
+                }
+                for index, job in enumerate(jobs)
+            ]
+        }
+        manifest = cls(folder_path, data)
+        manifest.save()
+        return manifest
+
+    @classmethod
+    def path_for(cls, folder_path):
+        """バッチフォルダのマニフェストのパスを返す"""
+        return os.path.join(folder_path, cls.FILENAME)
+
+    @classmethod
+    def exists(cls, folder_path):
+        """バッチフォルダにマニフェストが存在するかどうか"""
+        return os.path.exists(cls.path_for(folder_path))
+
+    @classmethod
+    def load(cls, folder_path):
+        """
+        バッチフォルダからマニフェストを読み込む
+
+        Args:
+            folder_path (str): バッチフォルダのパス
+
+        Returns:
+            BatchManifest: 読み込んだマニフェスト
+        """
+        with open(cls.path_for(folder_path), "r", encoding="utf-8") as f:
+            return cls(folder_path, json.load(f))
+
+    @property
+    def jobs(self):
+        """ジョブのリスト"""
+        return self.data["jobs"]
+
+    def get_job(self, filename):
+        """ファイル名に対応するジョブを返す"""
+        for job in self.jobs:
+            if job["filename"] == filename:
+                return job
+        raise KeyError(filename)
+
+    def save(self):
+        """マニフェストを保存する（書き込み途中のファイルが残らないよう一時ファイル経由で置き換える）"""
+        with self._lock:
+            temp_path = self.path_for(self.folder_path) + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, indent=2, ensure_ascii=False, default=str)
+            os.replace(temp_path, self.path_for(self.folder_path))
+
+    def mark_in_flight(self, filename):
+        """画像のtxt2imgリクエストの送信を記録して保存する"""
+        self._update(filename, self.IN_FLIGHT)
+
+    def mark_completed(self, filename):
+        """画像の生成完了を記録して保存する"""
+        self._update(filename, self.COMPLETED)
+
+    def mark_failed(self, filename, error):
+        """画像の生成失敗を記録して保存する"""
+        self._update(filename, self.FAILED, str(error))
+
+    def _update(self, filename, status, error=None):
+        """画像の状態を更新して保存し、on_update に通知する"""
+        with self._lock:
+            job = self.get_job(filename)
+            job["status"] = status
+            job["error"] = error
+        self.save()
+        if self.on_update is not None:
+            self.on_update(filename, status, error)
+
+    def get_failed_indices(self):
+        """失敗したジョブのインデックス（0がオリジナル画像）のリストを返す"""
+        return [job["index"] for job in self.jobs if job["status"] == self.FAILED]
+
+    def get_missing_jobs(self, image_file_extension=".png"):
+        """
+        再生成が必要なジョブ（未完了、または画像ファイルが存在しないもの）のリストを返す
+
+        Args:
+            image_file_extension (str): 画像ファイルの拡張子
+
+        Returns:
+            list: ジョブのリスト
+        """
+        return [
+            job for job in self.jobs
+            if job["status"] != self.COMPLETED
+            or not os.path.exists(os.path.join(self.folder_path, job["filename"] + image_file_extension))
+        ]
@@ -0,0 +1,216 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+
+
+class PreflightError(ValueError):
+    """ジョブが使用するモデル・LoRA・アップスケーラー・サンプラー・スクリプトがサーバーに存在しない場合のエラー"""
+
+    def __init__(self, problems):
+        """
+        Args:
+            problems (list): 見つからなかった項目の説明のリスト
+        """
+        super().__init__("; ".join(problems))
+        self.problems = problems
+
+
+class CapabilityCache:
+    """
+    バックエンド毎に利用可能なモデル・LoRA・アップスケーラー・サンプラー・スクリプトのキャッシュ
+
+    各APIをバックエンド毎に1回だけ取得し、ttl 秒の間はJSONファイルに保存した内容を使い回す。
+    txt2imgを送信する前にペイロードを検証し、サーバーに存在しない名前を指定したジョブを即座に失敗させる。
+    取得できなかった項目は検証しない（古いWeb UIや拡張機能が無効な場合）。
+    """
+
+    # 取得するAPIのエンドポイント
+    ENDPOINTS = ("sd-models", "loras", "upscalers", "samplers", "scripts")
+
+    def __init__(self, cache_file=None, ttl=3600, logger=None):
+        """
+        Args:
+            cache_file (str, optional): 取得結果を保存するJSONファイルのパス（省略時は保存しない）
+            ttl (float): 取得結果を使い回す秒数
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.snapshots = {}
+
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, "r", encoding="utf-8") as f:
+                    self.snapshots = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                self.logger.warning(f"サーバーの機能のキャッシュを読み込めませんでした: {e}")
+
+    @classmethod
+    def from_settings(cls, capability_settings=None, default_cache_file=None, logger=None):
+        """
+        settings.json の "capabilities" セクションから作成する
+
+        Args:
+            capability_settings (dict, optional): "capabilities" セクションの設定値
+            default_cache_file (str, optional): cache_file が未指定の場合の保存先
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            CapabilityCache: 作成したキャッシュ
+        """
+        capability_settings = capability_settings or {}
+        return cls(
+            cache_file=capability_settings.get("cache_file") or default_cache_file,
+            ttl=capability_settings.get("ttl", 3600),
+            logger=logger
+        )
+
+    def get(self, backend, refresh=False):
+        """
+        バックエンドの機能のスナップショットを返す（期限切れの場合は取得し直す）
+
+        Args:
+            backend (Backend): 対象のバックエンド
+            refresh (bool): キャッシュを使わずに取得し直すかどうか
+
+        Returns:
+            dict: エンドポイント名をキーとした利用可能な名前のリスト（取得できなかった項目はNone）
+        """
+        with self._lock:
+            snapshot = self.snapshots.get(backend.url)
+            if not refresh and snapshot and time.time() - snapshot.get("fetched_at", 0) < self.ttl:
+                return snapshot
+
+            snapshot = self._fetch(backend)
+            # 1つも取得できなかった場合（サーバーの停止中など）は次回取得し直す
+            if any(snapshot[endpoint] is not None for endpoint in self.ENDPOINTS):
+                self.snapshots[backend.url] = snapshot
+                self._save()
+            return snapshot
+
+    def invalidate(self, backend=None):
+        """キャッシュを破棄する（backend 省略時は全てのバックエンド）"""
+        with self._lock:
+            if backend is None:
+                self.snapshots.clear()
+            else:
+                self.snapshots.pop(backend.url, None)
+            self._save()
+
+    def _fetch(self, backend):
+        """各APIから利用可能な名前を取得する"""
+        snapshot = {"fetched_at": time.time()}
+        for endpoint in self.ENDPOINTS:
+            try:
+                response = backend.client.get(backend.client.endpoint_url(endpoint))
+                response.raise_for_status()
+                snapshot[endpoint] = sorted(self._extract_names(endpoint, response.json()))
+            except (requests.exceptions.RequestException, ValueError, AttributeError, TypeError) as e:
+                self.logger.warning(f"{endpoint} を取得できなかったため検証を省略します ({backend.url}): {e}")
+                snapshot[endpoint] = None
+        self.logger.info(
+            f"サーバーの機能を取得しました ({backend.url}): "
+            + ", ".join(f"{endpoint}={len(snapshot[endpoint]) if snapshot[endpoint] is not None else '-'}" for endpoint in self.ENDPOINTS)
+        )
+        return snapshot
+
+    @staticmethod
+    def _extract_names(endpoint, data):
+        """APIのレスポンスから照合に使う名前の集合を取り出す"""
+        expected_type = dict if endpoint == "scripts" else list
+        if not isinstance(data, expected_type):
+            raise ValueError(f"想定外のレスポンス形式です: {type(data).__name__}")
+
+        names = set()
+        if endpoint == "sd-models":
+            for model in data:
+                title = model.get("title") or ""
+                names.update([title, re.sub(r"\s*\[[0-9a-fA-F]+\]$", "", title), model.get("model_name") or ""])
+                if model.get("filename"):
+                    names.add(os.path.basename(model["filename"]))
+        elif endpoint == "loras":
+            for lora in data:
+                names.update([lora.get("name") or "", lora.get("alias") or ""])
+                if lora.get("path"):
+                    names.add(os.path.splitext(os.path.basename(lora["path"]))[0])
+        elif endpoint == "samplers":
+            for sampler in data:
+                names.add(sampler.get("name") or "")
+                names.update(sampler.get("aliases") or [])
+        elif endpoint == "upscalers":
+            names.update(upscaler.get("name") or "" for upscaler in data)
+        elif endpoint == "scripts":
+            names.update(script.lower() for script in data.get("txt2img", []))
+        names.discard("")
+        return names
+
+    def validate(self, payload, backend):
+        """
+        ペイロードで指定した名前がバックエンドに存在するかを検証する
+
+        Args:
+            payload (dict): txt2imgに送信するペイロード
+            backend (Backend): 送信先のバックエンド
+
+        Returns:
+            list: 見つからなかった項目の説明のリスト（問題がなければ空）
+        """
+        snapshot = self.get(backend)
+        problems = []
+
+        def check(endpoint, name, label):
+            available = snapshot.get(endpoint)
+            if not name or available is None:
+                return
+            if endpoint == "sd-models":
+                candidates = {name, os.path.splitext(name)[0]}
+            elif endpoint == "loras":
+                candidates = {os.path.splitext(name)[0]}
+            elif endpoint == "scripts":
+                candidates = {name.lower()}
+            else:
+                candidates = {name}
+            if not candidates & set(available):
+                problems.append(f"{label} '{name}' が {backend.url} に存在しません")
+
+        check("sd-models", payload.get("sd_model_checkpoint"), "モデル")
+        check("samplers", payload.get("sampler_name"), "サンプラー")
+        if payload.get("enable_hr"):
+            # Latent系のアップスケーラーは /upscalers に含まれない
+            upscaler = payload.get("hr_upscaler")
+            if upscaler and not upscaler.startswith("Latent"):
+                check("upscalers", upscaler, "アップスケーラー")
+            check("samplers", payload.get("hr_sampler_name"), "ハイレゾ用サンプラー")
+            hr_checkpoint = payload.get("hr_checkpoint_name")
+            if hr_checkpoint and hr_checkpoint != "Use same checkpoint":
+                check("sd-models", hr_checkpoint, "ハイレゾ用モデル")
+        check("scripts", payload.get("script_name"), "スクリプト")
+
+        # LoRA（プロンプト中の <lora:名前:重み> と alwayson_scripts の指定）
+        lora_names = re.findall(r"<lora:([^:>]+)", payload.get("prompt", ""))
+        for script in (payload.get("alwayson_scripts") or {}).values():
+            args = script.get("args") or []
+            if len(args) >= 3 and args[1] == "LoRA" and isinstance(args[2], list):
+                lora_names.extend(lora[0] for lora in args[2] if lora)
+        for lora_name in lora_names:
+            check("loras", lora_name, "LoRA")
+
+        return problems
+
+    def _save(self):
+        """取得結果をJSONファイルに保存する（ロックを取得した状態で呼び出す）"""
+        if not self.cache_file:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            with open(self.cache_file, "w", encoding="utf-8") as f:
+                json.dump(self.snapshots, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            self.logger.warning(f"サーバーの機能のキャッシュを保存できませんでした: {e}")
@@ -0,0 +1,179 @@
+import logging
+import math
+import time
+from collections import deque
+
+
+class AIMDController:
+    """
+    1台のバックエンドに同時に送信するリクエスト数の上限を調整するAIMDコントローラー
+
+    上限まで送信したリクエストが全て問題なく完了するたびに上限を increase_step ずつ増やし（加算的増加）、
+    レイテンシの悪化・エラー率の上昇を検知した場合は上限に decrease_factor を掛けて減らす（乗算的減少）。
+
+    Web UI はリクエストを順番に処理するため、レイテンシは送信時の処理中リクエスト数で割った値
+    （1件あたりの処理時間）で比較する。サーバーの待ち行列の長さが分かる場合は、上限を超えている間は増やさない。
+    """
+
+    def __init__(
+        self,
+        initial_limit=1,
+        min_limit=1,
+        max_limit=4,
+        increase_step=1,
+        decrease_factor=0.5,
+        latency_tolerance=1.5,
+        error_rate_threshold=0.1,
+        window=20,
+        history_size=100,
+        name="",
+        logger=None
+    ):
+        """
+        Args:
+            initial_limit (int): 同時リクエスト数の初期値
+            min_limit (int): 同時リクエスト数の下限
+            max_limit (int): 同時リクエスト数の上限
+            increase_step (float): 増やす場合の増分
+            decrease_factor (float): 減らす場合に掛ける係数
+            latency_tolerance (float): 1件あたりの処理時間が最小値の何倍を超えたら減らすか
+            error_rate_threshold (float): 直近の window 件のエラー率がこの値以上になったら減らす
+            window (int): エラー率を計算する直近のリクエスト数
+            history_size (int): decisions に残す直近の調整の履歴の件数
+            name (str): ログに出力する名前（バックエンドのURL）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self.error_rate_threshold = error_rate_threshold
+        self.name = name
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._limit = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._outcomes = deque(maxlen=window)
+        self._successes_since_change = 0
+        self._completions = 0
+        self._ignore_until = 0
+        self.baseline_latency = None
+        self.queue_depth = None
+
+        # 直近の調整の履歴（チューニング用、常駐デーモンでも増え続けないよう history_size 件まで）と調整回数
+        self.decisions = deque(maxlen=max(1, history_size))
+        self.decision_count = 0
+
+    @classmethod
+    def from_settings(cls, concurrency_settings=None, name="", logger=None):
+        """
+        settings.json の "concurrency" セクションから作成する（無効な場合はNone）
+
+        Args:
+            concurrency_settings (dict, optional): "concurrency" セクションの設定値
+            name (str): ログに出力する名前（バックエンドのURL）
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            AIMDController: 作成したコントローラー（enabled が false または未指定の場合はNone）
+        """
+        concurrency_settings = concurrency_settings or {}
+        if not concurrency_settings.get("enabled", False):
+            return None
+        return cls(
+            initial_limit=concurrency_settings.get("initial_limit", 1),
+            min_limit=concurrency_settings.get("min_limit", 1),
+            max_limit=concurrency_settings.get("max_limit", 4),
+            increase_step=concurrency_settings.get("increase_step", 1),
+            decrease_factor=concurrency_settings.get("decrease_factor", 0.5),
+            latency_tolerance=concurrency_settings.get("latency_tolerance", 1.5),
+            error_rate_threshold=concurrency_settings.get("error_rate_threshold", 0.1),
+            window=concurrency_settings.get("window", 20),
+            history_size=concurrency_settings.get("history_size", 100),
+            name=name,
+            logger=logger
+        )
+
+    @property
+    def limit(self):
+        """現在の同時リクエスト数の上限"""
+        return int(math.floor(self._limit))
+
+    @property
+    def error_rate(self):
+        """直近のリクエストのエラー率"""
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def observe_queue(self, depth):
+        """サーバーの待ち行列の長さを記録する（取得できない場合はNone）"""
+        self.queue_depth = depth
+
+    def on_success(self, latency, in_flight=1):
+        """
+        リクエストの成功を記録し、上限を調整する
+
+        Args:
+            latency (float): リクエストの所要時間（秒）
+            in_flight (int): 送信時点の処理中リクエスト数（このリクエストを含む）
+        """
+        self._completions += 1
+        self._outcomes.append(True)
+        per_request = latency / max(1, in_flight)
+
+        # 1件あたりの処理時間の最小値（モデルの変更などに追従するため、少しずつ現在の値に近づける）
+        if self.baseline_latency is None or per_request < self.baseline_latency:
+            self.baseline_latency = per_request
+        else:
+            self.baseline_latency += (per_request - self.baseline_latency) * 0.01
+
+        if per_request > self.baseline_latency * self.latency_tolerance:
+            self._decrease(f"レイテンシ悪化 ({per_request:.2f}秒/件, 最小 {self.baseline_latency:.2f}秒/件)")
+            return
+
+        if self.queue_depth is not None and self.queue_depth > self.limit:
+            return
+
+        self._successes_since_change += 1
+        if self._successes_since_change >= self.limit and self.limit < self.max_limit:
+            self._change(min(self.max_limit, self._limit + self.increase_step), f"{self._successes_since_change}件連続で成功")
+
+    def on_failure(self, backend_fault=True):
+        """
+        リクエストの失敗を記録し、エラー率が閾値以上の場合は上限を減らす
+
+        Args:
+            backend_fault (bool): 失敗の原因がバックエンド側にあるかどうか（Falseの場合は調整しない）
+        """
+        if not backend_fault:
+            return
+        self._completions += 1
+        self._outcomes.append(False)
+        if self.error_rate >= self.error_rate_threshold:
+            self._decrease(f"エラー率 {self.error_rate:.0%}")
+
+    def _decrease(self, reason):
+        """上限を乗算的に減らす（減らす前に送信済みのリクエストの結果では続けて減らさない）"""
+        if self._completions < self._ignore_until:
+            return
+        self._change(max(self.min_limit, math.floor(self._limit * self.decrease_factor)), reason)
+        self._ignore_until = self._completions + self.limit
+
+    def _change(self, new_limit, reason):
+        """上限を変更して記録する"""
+        previous_limit = self.limit
+        self._limit = float(new_limit)
+        self._successes_since_change = 0
+        if self.limit == previous_limit:
+            return
+        self.decision_count += 1
+        self.decisions.append({
+            "time": time.time(),
+            "from": previous_limit,
+            "to": self.limit,
+            "reason": reason,
+            "error_rate": self.error_rate,
+            "baseline_latency": self.baseline_latency
+        })
+        self.logger.info(f"同時リクエスト数の上限を変更しました ({self.name}): {previous_limit} -> {self.limit} (理由: {reason})")
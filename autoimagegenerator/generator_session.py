@@ -0,0 +1,117 @@
+import copy
+import json
+import logging
+import os
+import threading
+
+
+class GeneratorSession:
+    """
+    1つのプロセスで複数のプロファイル（スタイル・カテゴリー等の組み合わせ）を実行する際に、
+    AutoImageGenerator の間で共有するリソース
+
+    settings.json の内容、HTTPクライアントとバックエンドプール（接続プール・ロード済みモデル・サーキットブレーカー）、
+    モデルのロード時間の記録、バックエンドの機能キャッシュ、後処理パイプライン、画像エンコーダー等を最初のジェネレーターで作成し、
+    以降のジェネレーターは作成済みのものを使用する。プロンプトファイルは読み込んだ結果をキャッシュし、
+    出力ディレクトリ構造の作成も1回だけ行う。
+    """
+
+    def __init__(self, logger=None):
+        """
+        Args:
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.RLock()
+        self._resources = {}
+        self._prompt_files = {}
+        self._output_trees = set()
+        self.prompt_cache_hits = 0
+        self.prompt_cache_misses = 0
+
+    def get_or_create(self, key, factory):
+        """
+        共有するリソースを返す（まだ作成していない場合は factory() で作成する）
+
+        Args:
+            key (hashable): リソースのキー（種類と、設定によって異なる場合はその値）
+            factory (callable): リソースを作成する関数
+
+        Returns:
+            共有するリソース
+        """
+        with self._lock:
+            if key not in self._resources:
+                self._resources[key] = factory()
+            return self._resources[key]
+
+    def load_prompt_file(self, file_path):
+        """
+        プロンプトファイル（JSON）を読み込む（更新日時が変わっていない場合はキャッシュを使用する）
+
+        ジェネレーターがプロンプトの辞書を変更しても他のプロファイルに影響しないよう、コピーを返す。
+
+        Args:
+            file_path (str): プロンプトファイルのパス
+
+        Returns:
+            dict: プロンプトファイルの内容
+        """
+        path = os.path.abspath(file_path)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._prompt_files.get(path)
+            if cached is not None and cached[0] == mtime:
+                self.prompt_cache_hits += 1
+                return copy.deepcopy(cached[1])
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self._prompt_files[path] = (mtime, data)
+            self.prompt_cache_misses += 1
+        return copy.deepcopy(data)
+
+    def claim_output_tree(self, output_folder):
+        """
+        出力ディレクトリ構造を作成する必要があるかどうか（出力フォルダ毎に最初の1回のみTrue）
+
+        Args:
+            output_folder (str): 出力フォルダのパス
+
+        Returns:
+            bool: まだ作成していない場合はTrue
+        """
+        path = os.path.abspath(output_folder)
+        with self._lock:
+            if path in self._output_trees:
+                return False
+            self._output_trees.add(path)
+            return True
+
+    def get_stats(self):
+        """共有しているリソースの数とプロンプトファイルのキャッシュのヒット数・ミス数を返す"""
+        with self._lock:
+            return {
+                "resources": len(self._resources),
+                "prompt_cache_hits": self.prompt_cache_hits,
+                "prompt_cache_misses": self.prompt_cache_misses
+            }
+
+    def close(self):
+        """共有しているリソースのうち close() を持つもの（HTTPクライアント・プロセスプール等）を閉じる"""
+        with self._lock:
+            resources = list(self._resources.values())
+            self._resources.clear()
+        for resource in reversed(resources):
+            close = getattr(resource, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    self.logger.warning(f"共有リソースを閉じる際にエラーが発生しました: {e}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
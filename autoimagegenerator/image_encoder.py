@@ -0,0 +1,221 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+
+from PIL import Image, ImageDraw, ImageFont, PngImagePlugin
+
+
+def merge_images(background_image, transparent_image):
+    """
+    背景画像に透過画像を合成する
+
+    Args:
+        background_image (PIL.Image.Image): 背景画像
+        transparent_image (PIL.Image.Image): 合成する透過画像（背景画像のサイズに合わせる）
+
+    Returns:
+        PIL.Image.Image: 合成したRGBA画像（合成できない場合は背景画像）
+    """
+    # 背景画像がRGBAでない場合は変換
+    if background_image.mode != "RGBA":
+        background_image = background_image.convert("RGBA")
+
+    # 透過画像がRGBAでない場合は変換
+    if transparent_image.mode != "RGBA":
+        transparent_image = transparent_image.convert("RGBA")
+
+    # 透過画像を背景画像のサイズに合わせる
+    transparent_image = transparent_image.resize(background_image.size)
+
+    try:
+        # 透過画像を背景画像に合成
+        result_image = Image.alpha_composite(background_image, transparent_image)
+    except ValueError as e:
+        # エラーが発生した場合はログに記録し、背景画像をそのまま返す
+        logging.warning(f"画像の合成中にエラーが発生しました: {e}")
+        logging.warning(f"背景画像: サイズ={background_image.size}, モード={background_image.mode}")
+        logging.warning(f"透過画像: サイズ={transparent_image.size}, モード={transparent_image.mode}")
+        result_image = background_image
+
+    return result_image
+
+
+def add_watermark(image, watermark):
+    """
+    画像に「Sample」の透かしを入れる
+
+    Args:
+        image (PIL.Image.Image): 元画像
+        watermark (dict): 透かしの指定
+            - image: 合成するサンプル画像のパス（None の場合は "SAMPLE" の文字を描画）
+            - offset: 文字を描画する位置（左上からのピクセル数）
+            - min_font_size: 文字の最小フォントサイズ
+
+    Returns:
+        PIL.Image.Image: 透かしを入れた画像
+    """
+    if watermark.get("image"):
+        with Image.open(watermark["image"]) as sample_text_image:
+            return merge_images(image, sample_text_image)
+
+    # サンプル画像が存在しない場合は、テキストを直接描画
+    image_with_sample_text = image.copy()
+    draw = ImageDraw.Draw(image_with_sample_text)
+    # フォントサイズは画像サイズに応じて調整
+    font_size = max(watermark.get("min_font_size", 10), min(image.width, image.height) // 10)
+    try:
+        # フォントを読み込む（システムフォントを使用）
+        font = ImageFont.truetype("arial.ttf", font_size)
+    except IOError:
+        # フォントが見つからない場合はデフォルトフォントを使用
+        font = ImageFont.load_default()
+    offset = watermark.get("offset", 10)
+    draw.text((offset, offset), "SAMPLE", fill=(255, 0, 0, 255), font=font)
+    return image_with_sample_text
+
+
+def save_target(image, target):
+    """
+    画像をターゲットの指定に従って加工して保存する
+
+    Args:
+        image (PIL.Image.Image): 元画像
+        target (dict): 保存する派生画像の指定
+            - path: 保存先のパス（フォルダが存在しない場合は作成）
+            - format: 画像形式（省略時は拡張子から判定）
+            - size: リサイズ後の (幅, 高さ)（省略時は元のサイズ）
+            - resample: リサイズのフィルタ（省略時はPillowのデフォルト）
+            - watermark: 透かしの指定（add_watermark を参照）
+            - convert: 保存前に変換するモード（JPEGの場合は "RGB"）
+            - pnginfo: PNGのテキストチャンクに書き込む辞書
+
+    Returns:
+        str: 保存したファイルのパス
+    """
+    if target.get("size"):
+        size = tuple(target["size"])
+        if target.get("resample") is not None:
+            image = image.resize(size, target["resample"])
+        else:
+            image = image.resize(size)
+    if target.get("watermark"):
+        image = add_watermark(image, target["watermark"])
+    if target.get("convert"):
+        image = image.convert(target["convert"])
+
+    save_kwargs = {}
+    if target.get("format"):
+        save_kwargs["format"] = target["format"]
+    if target.get("pnginfo"):
+        pnginfo = PngImagePlugin.PngInfo()
+        for key, value in target["pnginfo"].items():
+            pnginfo.add_text(key, value)
+        save_kwargs["pnginfo"] = pnginfo
+
+    # 並行して保存する場合に備え、既に存在してもエラーにしない
+    os.makedirs(os.path.dirname(target["path"]), exist_ok=True)
+    image.save(target["path"], **save_kwargs)
+    return target["path"]
+
+
+def _encode_target(mode, size, palette, pixels, target):
+    """ワーカープロセスで画素データから画像を復元し、派生画像を保存する"""
+    image = Image.frombytes(mode, size, pixels)
+    if palette is not None:
+        image.putpalette(palette)
+    return save_target(image, target)
+
+
+class ImageEncoder:
+    """
+    元画像・JPEG・サンプル画像・サムネイル等の派生画像のエンコードをプロセスプールで並列に実行するサービス
+
+    PNGの圧縮とJPEGへの変換はCPUを使い続けるため、メインのインタープリター（GIL）で順に実行すると
+    ハイレゾ画像ではリクエストの待ち時間に対して無視できない割合になる。
+    画像を一度だけ画素データ（バイト列）に変換し、派生画像毎のターゲット（保存先・形式・サイズ・透かし・PNGInfo）と共に
+    ワーカープロセスへ渡して、全てのファイルを複数のコアで同時に書き込む。
+    """
+
+    def __init__(self, processes=None, logger=None):
+        """
+        Args:
+            processes (int, optional): ワーカープロセス数（省略時はCPUのコア数）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.processes = max(1, int(processes)) if processes else None
+        self.logger = logger or logging.getLogger(__name__)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, encoder_settings=None, logger=None):
+        """
+        settings.json の "image_encoder" セクションから作成する（無効な場合はNone）
+
+        Args:
+            encoder_settings (dict, optional): "image_encoder" セクションの設定値
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            ImageEncoder: 作成したエンコーダー（enabled が false または未指定の場合はNone）
+        """
+        encoder_settings = encoder_settings or {}
+        if not encoder_settings.get("enabled", False):
+            return None
+        return cls(processes=encoder_settings.get("processes"), logger=logger)
+
+    def encode(self, image, targets):
+        """
+        画像の派生画像を全て保存する（全てのファイルの書き込みが終わるまで待つ）
+
+        Args:
+            image (PIL.Image.Image): 元画像
+            targets (list): 保存する派生画像の指定（save_target を参照）
+
+        Returns:
+            list: 保存したファイルのパス（targets と同じ順序）
+
+        Raises:
+            Exception: いずれかの派生画像の保存に失敗した場合（全ての書き込みが終わってから送出する）
+        """
+        if not targets:
+            return []
+        image.load()
+        palette = image.getpalette() if image.mode == "P" else None
+        pixels = image.tobytes()
+
+        executor = self._get_executor()
+        futures = [
+            executor.submit(_encode_target, image.mode, image.size, palette, pixels, target)
+            for target in targets
+        ]
+        wait(futures)
+        paths = [future.result() for future in futures]
+        self.logger.debug(f"派生画像をエンコードしました: {len(paths)}件 ({image.width}x{image.height})")
+        return paths
+
+    def close(self):
+        """ワーカープロセスを終了する（次に encode を呼び出した場合は再度起動する）"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get_executor(self):
+        """最初にエンコードする時にプロセスプールを起動する"""
+        with self._lock:
+            if self._executor is None:
+                # 後処理のスレッドが動いている状態で fork しないよう、Windowsと同じ spawn で起動する
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
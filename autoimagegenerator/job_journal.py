@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime
+
+
+class JobJournal:
+    """
+    実行（run）毎のバッチと各画像（オリジナル・別バージョン）の生成状況を記録するSQLiteのジョブジャーナル
+
+    バッチ毎に1行、画像毎に1行を記録し、画像は pending → in_flight → done / failed の順に状態を更新する。
+    ペイロード（プロンプト・Seed値）・プロンプト情報・出力先も保持するため、プロセスやWeb UIが途中で停止しても、
+    main.py --resume <run_id> で完了していない画像と未着手のバッチだけを生成して再開できる。
+    更新の度にコミットするため、強制終了した場合も直前までの状態が残る（WALモード）。
+    """
+
+    PENDING = "pending"
+    IN_FLIGHT = "in_flight"
+    DONE = "done"
+    FAILED = "failed"
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS runs (
+            run_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            total_batches INTEGER NOT NULL,
+            options TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS batches (
+            run_id TEXT NOT NULL,
+            batch INTEGER NOT NULL,
+            folder_path TEXT NOT NULL,
+            seed INTEGER,
+            status TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (run_id, batch)
+        );
+        CREATE TABLE IF NOT EXISTS jobs (
+            run_id TEXT NOT NULL,
+            batch INTEGER NOT NULL,
+            job_index INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            status TEXT NOT NULL,
+            seed INTEGER,
+            payload TEXT NOT NULL,
+            prompt_info TEXT NOT NULL,
+            output_path TEXT NOT NULL,
+            error TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (run_id, batch, job_index)
+        );
+    """
+
+    def __init__(self, path, logger=None):
+        """
+        Args:
+            path (str): SQLiteのデータベースファイルのパス
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.path = path
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @classmethod
+    def from_settings(cls, journal_settings=None, default_path=None, logger=None):
+        """
+        settings.json の "job_journal" セクションから作成する（無効な場合はNone）
+
+        Args:
+            journal_settings (dict, optional): "job_journal" セクションの設定値
+            default_path (str, optional): path が未指定の場合のデータベースファイルのパス
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            JobJournal: 作成したジャーナル（enabled が false または未指定の場合はNone）
+        """
+        journal_settings = journal_settings or {}
+        if not journal_settings.get("enabled", False):
+            return None
+        return cls(journal_settings.get("path") or default_path, logger=logger)
+
+    def start_run(self, total_batches, options=None, run_id=None):
+        """
+        新しい実行を記録する
+
+        Args:
+            total_batches (int): 総バッチ数
+            options (dict, optional): 再開時にジェネレーターを作成し直すための起動オプション
+            run_id (str, optional): 実行ID（省略時は日時とランダムな文字列から作成）
+
+        Returns:
+            str: 実行ID
+        """
+        run_id = run_id or f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        now = self._now()
+        self._execute(
+            "INSERT INTO runs (run_id, status, total_batches, options, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_id, self.IN_FLIGHT, total_batches, json.dumps(options or {}, ensure_ascii=False, default=str), now, now)
+        )
+        return run_id
+
+    def get_run(self, run_id):
+        """
+        実行の記録を返す
+
+        Args:
+            run_id (str): 実行ID
+
+        Returns:
+            dict: {"run_id", "status", "total_batches", "options", "created_at", "updated_at"}（存在しない場合はNone）
+        """
+        row = self._query("SELECT * FROM runs WHERE run_id = ?", (run_id,), one=True)
+        if row is None:
+            return None
+        run = dict(row)
+        run["options"] = json.loads(run["options"] or "{}")
+        return run
+
+    def set_run_status(self, run_id, status):
+        """実行の状態を更新する"""
+        self._execute("UPDATE runs SET status = ?, updated_at = ? WHERE run_id = ?", (status, self._now(), run_id))
+
+    def finish_run(self, run_id):
+        """
+        全てのバッチの状態から実行の状態（全てのバッチが完了した場合は done、それ以外は failed）を記録する
+
+        Returns:
+            str: 実行の状態
+        """
+        run = self.get_run(run_id)
+        batches = self.get_batches(run_id)
+        completed = len(batches) >= run["total_batches"] and all(batch["status"] == self.DONE for batch in batches)
+        status = self.DONE if completed else self.FAILED
+        self.set_run_status(run_id, status)
+        return status
+
+    def add_batch(self, run_id, batch, folder_path, jobs, image_file_extension=".png"):
+        """
+        バッチとその画像のジョブを記録する（既に記録済みの画像の状態は変更しない）
+
+        Args:
+            run_id (str): 実行ID
+            batch (int): バッチ番号（1始まり）
+            folder_path (str): バッチの出力フォルダ
+            jobs (list): {"payload", "filename", "prompt_info"} のリスト
+            image_file_extension (str): 出力先の画像ファイルの拡張子
+        """
+        now = self._now()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO batches (run_id, batch, folder_path, seed, status, created_at, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (run_id, batch, folder_path, jobs[0]["payload"].get("seed"), self.IN_FLIGHT, now, now)
+                )
+                conn.executemany(
+                    "INSERT OR IGNORE INTO jobs (run_id, batch, job_index, filename, status, seed, payload, prompt_info, "
+                    "output_path, error, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, NULL, ?)",
+                    [
+                        (
+                            run_id, batch, index, job["filename"], self.PENDING, job["payload"].get("seed"),
+                            json.dumps(job["payload"], ensure_ascii=False, default=str),
+                            json.dumps(job["prompt_info"], ensure_ascii=False, default=str),
+                            os.path.join(folder_path, job["filename"] + image_file_extension), now
+                        )
+                        for index, job in enumerate(jobs)
+                    ]
+                )
+
+    def set_job_status(self, run_id, batch, filename, status, error=None):
+        """
+        画像の状態を更新する
+
+        Args:
+            run_id (str): 実行ID
+            batch (int): バッチ番号
+            filename (str): ファイル名（拡張子なし）
+            status (str): PENDING / IN_FLIGHT / DONE / FAILED
+            error (str, optional): 失敗した場合のエラー
+        """
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE run_id = ? AND batch = ? AND filename = ?",
+            (status, None if error is None else str(error), self._now(), run_id, batch, filename)
+        )
+
+    def finish_batch(self, run_id, batch):
+        """
+        全ての画像の状態からバッチの状態（全て完了した場合は done、それ以外は failed）を記録する
+
+        Returns:
+            str: バッチの状態
+        """
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                remaining = conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE run_id = ? AND batch = ? AND status != ?",
+                    (run_id, batch, self.DONE)
+                ).fetchone()[0]
+                status = self.DONE if remaining == 0 else self.FAILED
+                conn.execute(
+                    "UPDATE batches SET status = ?, updated_at = ? WHERE run_id = ? AND batch = ?",
+                    (status, self._now(), run_id, batch)
+                )
+        return status
+
+    def get_batches(self, run_id):
+        """
+        実行のバッチの記録をバッチ番号順に返す
+
+        Returns:
+            list: {"batch", "folder_path", "seed", "status", ...} のリスト
+        """
+        rows = self._query("SELECT * FROM batches WHERE run_id = ? ORDER BY batch", (run_id,))
+        return [dict(row) for row in rows]
+
+    def get_jobs(self, run_id, batch):
+        """
+        バッチの画像の記録をインデックス順に返す
+
+        Returns:
+            list: {"index", "filename", "status", "seed", "payload", "prompt_info", "output_path", "error"} のリスト
+        """
+        rows = self._query("SELECT * FROM jobs WHERE run_id = ? AND batch = ? ORDER BY job_index", (run_id, batch))
+        jobs = []
+        for row in rows:
+            job = dict(row)
+            job["index"] = job.pop("job_index")
+            job["payload"] = json.loads(job["payload"])
+            job["prompt_info"] = json.loads(job["prompt_info"])
+            jobs.append(job)
+        return jobs
+
+    def get_summary(self, run_id):
+        """実行の画像の状態毎の件数を返す"""
+        rows = self._query("SELECT status, COUNT(*) AS count FROM jobs WHERE run_id = ? GROUP BY status", (run_id,))
+        return {row["status"]: row["count"] for row in rows}
+
+    def close(self):
+        """データベースの接続を閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _connect(self):
+        """最初に使用する時にデータベースに接続し、テーブルを作成する（ロックを保持した状態で呼び出す）"""
+        if self._conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql, params):
+        """更新のSQLを実行してコミットする"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(sql, params)
+
+    def _query(self, sql, params, one=False):
+        """参照のSQLを実行して結果を返す"""
+        with self._lock:
+            cursor = self._connect().execute(sql, params)
+            return cursor.fetchone() if one else cursor.fetchall()
+
+    @staticmethod
+    def _now():
+        return datetime.now().isoformat(timespec="seconds")
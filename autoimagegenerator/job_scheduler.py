@@ -0,0 +1,179 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+
+class JobScheduler:
+    """
+    モデルの切り替えコストが最小になるようにジョブを並べ替えるスケジューラー
+
+    ジョブ（1回の main.py 実行に相当するプロファイル）をチェックポイントとLoRAでまとめ、
+    同じチェックポイントのジョブを続けて実行する。ロード済みのチェックポイントから実行し、
+    切り替えコストには ModelLoadTimes に記録された実測のロード時間を使用する。
+
+    バックエンドが複数ある場合は、完了予定時刻（処理時間 + 切り替えコスト）が最も早いバックエンドに
+    ジョブを割り当てる。同じチェックポイントを続けて割り当てたバックエンドは切り替えコストがかからないため、
+    各チェックポイントは一部のバックエンドにのみロードされた状態が保たれる。
+    """
+
+    def __init__(self, load_times=None, default_load_time=30.0, seconds_per_image=10.0, lora_switch_cost=2.0, logger=None):
+        """
+        Args:
+            load_times (ModelLoadTimes, optional): チェックポイント毎のロード時間の記録
+            default_load_time (float): ロード時間の記録がないチェックポイントの切り替えコスト（秒）
+            seconds_per_image (float): 画像1枚あたりの処理時間の見積もり（秒）
+            lora_switch_cost (float): LoRAを切り替える場合のコスト（秒）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.load_times = load_times
+        self.default_load_time = default_load_time
+        self.seconds_per_image = seconds_per_image
+        self.lora_switch_cost = lora_switch_cost
+        self.logger = logger or logging.getLogger(__name__)
+
+    @classmethod
+    def from_settings(cls, scheduler_settings=None, load_times=None, logger=None):
+        """
+        settings.json の "scheduler" セクションから作成する
+
+        Args:
+            scheduler_settings (dict, optional): "scheduler" セクションの設定値
+            load_times (ModelLoadTimes, optional): チェックポイント毎のロード時間の記録
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            JobScheduler: 作成したスケジューラー
+        """
+        scheduler_settings = scheduler_settings or {}
+        return cls(
+            load_times=load_times,
+            default_load_time=scheduler_settings.get("default_load_time", 30.0),
+            seconds_per_image=scheduler_settings.get("seconds_per_image", 10.0),
+            lora_switch_cost=scheduler_settings.get("lora_switch_cost", 2.0),
+            logger=logger
+        )
+
+    def get_load_time(self, checkpoint, backend_url=None):
+        """チェックポイントの切り替えコスト（秒）を返す"""
+        if self.load_times is None:
+            return self.default_load_time
+        return self.load_times.predict(checkpoint, backend_url, default=self.default_load_time)
+
+    def get_work(self, job):
+        """ジョブの処理時間の見積もり（秒）を返す"""
+        return job.get("images", 1) * self.seconds_per_image
+
+    def group_jobs(self, jobs):
+        """
+        ジョブをチェックポイント毎、LoRA毎にまとめる
+
+        Args:
+            jobs (list): ジョブのリスト（各ジョブは "checkpoint" と "lora" を持つdict）
+
+        Returns:
+            dict: チェックポイント -> (LoRA -> ジョブのリスト)。LoRAなしのジョブが先頭になる
+        """
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job["checkpoint"], {}).setdefault(job.get("lora"), []).append(job)
+        return {
+            checkpoint: dict(sorted(lora_groups.items(), key=lambda item: (item[0] is not None, item[0] or "")))
+            for checkpoint, lora_groups in groups.items()
+        }
+
+    def plan(self, jobs, backends):
+        """
+        ジョブをバックエンドに割り当て、バックエンド毎の実行順序を決める
+
+        Args:
+            jobs (list): ジョブのリスト（各ジョブは "checkpoint"、"lora"、"images" を持つdict）
+            backends (list): 割り当て先の Backend のリスト（current_model にロード済みのチェックポイント）
+
+        Returns:
+            dict: バックエンドのURL -> 実行するジョブのリスト（実行順）
+        """
+        if not backends:
+            raise ValueError("バックエンドが1つも指定されていません")
+
+        groups = self.group_jobs(jobs)
+        resident_models = {backend.current_model for backend in backends}
+
+        # ロード済みのチェックポイントを先に、残りは処理時間の長い順に割り当てる
+        def group_order(item):
+            checkpoint, lora_groups = item
+            work = sum(self.get_work(job) for lora_jobs in lora_groups.values() for job in lora_jobs)
+            return (checkpoint not in resident_models, -work)
+
+        states = {
+            backend.url: {"finish": 0.0, "model": backend.current_model, "lora": None, "swap_cost": 0.0, "swaps": 0}
+            for backend in backends
+        }
+        weights = {backend.url: backend.weight for backend in backends}
+        schedule = {backend.url: [] for backend in backends}
+
+        for checkpoint, lora_groups in sorted(groups.items(), key=group_order):
+            for lora, lora_jobs in lora_groups.items():
+                for job in lora_jobs:
+                    best_url, best_finish, best_cost = None, None, None
+                    for backend in backends:
+                        state = states[backend.url]
+                        cost = 0.0
+                        if state["model"] != checkpoint:
+                            cost += self.get_load_time(checkpoint, backend.url)
+                        elif state["lora"] != lora and lora is not None:
+                            cost += self.lora_switch_cost
+                        finish = state["finish"] + cost + self.get_work(job) / weights[backend.url]
+                        # 完了予定時刻が同じ場合は切り替えコストが小さいバックエンドを優先する
+                        if best_finish is None or (finish, cost) < (best_finish, best_cost):
+                            best_url, best_finish, best_cost = backend.url, finish, cost
+
+                    state = states[best_url]
+                    if state["model"] != checkpoint:
+                        state["swaps"] += 1
+                    state.update(finish=best_finish, model=checkpoint, lora=lora)
+                    state["swap_cost"] += best_cost
+                    schedule[best_url].append(job)
+
+        self._log_plan(schedule, states)
+        return schedule
+
+    def _log_plan(self, schedule, states):
+        """バックエンド毎の実行順序と見積もりをログに出力する"""
+        total_swap_cost = sum(state["swap_cost"] for state in states.values())
+        makespan = max(state["finish"] for state in states.values())
+        self.logger.info(f"=== ジョブの実行計画 (切り替えコスト合計: {total_swap_cost:.1f}秒, 完了予定: {makespan:.1f}秒) ===")
+        for url, jobs in schedule.items():
+            state = states[url]
+            self.logger.info(
+                f"{url}: {len(jobs)}ジョブ, モデル切り替え {state['swaps']}回 "
+                f"(切り替えコスト: {state['swap_cost']:.1f}秒, 完了予定: {state['finish']:.1f}秒)"
+            )
+            for job in jobs:
+                self.logger.info(f"  - {job.get('name', job['checkpoint'])} (チェックポイント: {job['checkpoint']}, LoRA: {job.get('lora') or 'なし'})")
+
+    def execute(self, schedule, run_job):
+        """
+        実行計画に従ってジョブを実行する（バックエンド毎に1スレッドで順番に実行する）
+
+        Args:
+            schedule (dict): plan() が返した実行計画
+            run_job (callable): run_job(job, backend_url) でジョブを実行する関数
+
+        Returns:
+            list: (ジョブ, 成功した場合はTrue) のリスト
+        """
+        def run_backend_jobs(url):
+            results = []
+            for job in schedule[url]:
+                try:
+                    run_job(job, url)
+                    results.append((job, True))
+                except Exception as e:
+                    self.logger.error(f"ジョブ {job.get('name', job['checkpoint'])} の実行中にエラーが発生しました ({url}): {e}")
+                    results.append((job, False))
+            return results
+
+        urls = [url for url, jobs in schedule.items() if jobs]
+        if not urls:
+            return []
+        with ThreadPoolExecutor(max_workers=len(urls)) as executor:
+            return [result for results in executor.map(run_backend_jobs, urls) for result in results]
@@ -0,0 +1,495 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+
+try:
+    from .json_http_server import JsonHTTPError, JsonHTTPServer
+except ImportError:
+    # autoimagegeneratorフォルダ内でスクリプトとして実行された場合
+    from json_http_server import JsonHTTPError, JsonHTTPServer
+
+
+class JobServerError(JsonHTTPError):
+    """ジョブ投入APIがエラーレスポンスを返す場合の例外"""
+
+
+class JobServer(JsonHTTPServer):
+    """
+    main.py serve で起動する常駐の画像生成デーモンと、ローカルのジョブ投入API（HTTP）
+
+    投入されたジョブ（プロファイル + バッチ数 + 上書きする起動オプション）はキューに追加し、ディスパッチャーのスレッドが
+    キューのジョブをまとめて --jobs と同じ JobScheduler で並べ替えて実行する（実行中に投入されたジョブは次の回にまとめる）。
+    ジェネレーターは GeneratorSession を共有するため、HTTPの接続プール・ロード済みのモデル・プロンプトファイル等は
+    デーモンを終了するまで使い回される。
+
+    ジョブの状態は queued → running → done / failed / cancelled の順に変わり、状態の変化とバッチの完了はイベントとして
+    /events（一覧）・/events/stream（改行区切りのJSONで逐次送信）から取得できる。
+    """
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    FINISHED = (DONE, FAILED, CANCELLED)
+    server_name = "ジョブ投入API"
+    thread_name = "job-server"
+
+    def __init__(
+        self,
+        scheduler,
+        backends,
+        build_job,
+        create_generator,
+        run_generator=None,
+        host="127.0.0.1",
+        port=7870,
+        max_events=10000,
+        logger=None
+    ):
+        """
+        Args:
+            scheduler (JobScheduler): ジョブの実行順序を決めるスケジューラー
+            backends (list): 割り当て先の Backend のリスト（current_model を実行したジョブのチェックポイントに更新する）
+            build_job (callable): build_job(ジョブの指定, ラベル) でジョブ（"name"、"args"、"checkpoint"、"lora"、"images"）を作成する関数。
+                指定が不正な場合は ValueError を送出する
+            create_generator (callable): create_generator(ジョブ, バックエンドのURL) でジェネレーターを作成する関数
+            run_generator (callable, optional): run_generator(ジェネレーター) で生成を実行する関数（省略時は generator.run()）
+            host (str): 待ち受けるアドレス（他のマシンから投入できないよう、デフォルトはループバックのみ）
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            max_events (int): 保持するイベントの最大件数（古いものから破棄する）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.scheduler = scheduler
+        self.backends = list(backends)
+        self.build_job = build_job
+        self.create_generator = create_generator
+        self.run_generator = run_generator or (lambda generator: generator.run())
+
+        self._jobs = {}
+        self._queue = []
+        self._events = deque(maxlen=max(1, int(max_events)))
+        self._next_event_id = 1
+        self._condition = threading.Condition()
+        self._stopping = False
+        self._dispatcher = None
+
+        super().__init__(host, port, logger=logger or logging.getLogger(__name__))
+
+    @classmethod
+    def from_settings(cls, daemon_settings, scheduler, backends, build_job, create_generator, run_generator=None, logger=None):
+        """
+        settings.json の "daemon" セクションから作成する
+
+        Args:
+            daemon_settings (dict, optional): "daemon" セクションの設定値
+            scheduler (JobScheduler): ジョブの実行順序を決めるスケジューラー
+            backends (list): 割り当て先の Backend のリスト
+            build_job (callable): ジョブを作成する関数
+            create_generator (callable): ジェネレーターを作成する関数
+            run_generator (callable, optional): 生成を実行する関数
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            JobServer: 作成したサーバー
+        """
+        daemon_settings = daemon_settings or {}
+        return cls(
+            scheduler,
+            backends,
+            build_job,
+            create_generator,
+            run_generator=run_generator,
+            host=daemon_settings.get("host", "127.0.0.1"),
+            port=daemon_settings.get("port", 7870),
+            max_events=daemon_settings.get("max_events", 10000),
+            logger=logger
+        )
+
+    def submit(self, job_setting):
+        """
+        ジョブをキューに追加する
+
+        Args:
+            job_setting (dict): ジョブの指定。"profile"（style, category, subcategory, model, lora_name 等）・
+                "count"（バッチ数）・"overrides"（上書きする起動オプション）を指定する。
+                profile を使わずに同じ項目を直接指定することもできる
+
+        Returns:
+            dict: ジョブの状態
+
+        Raises:
+            JobServerError: ジョブの指定が不正な場合（400）、ジョブの作成中に予期しないエラーが発生した場合（500）
+        """
+        if not isinstance(job_setting, dict):
+            raise JobServerError(400, "ジョブの指定はJSONのオブジェクトで指定してください")
+        profile = job_setting.get("profile") or {}
+        overrides = job_setting.get("overrides") or {}
+        if not isinstance(profile, dict) or not isinstance(overrides, dict):
+            raise JobServerError(400, "profile と overrides はJSONのオブジェクトで指定してください")
+        fields = {key: value for key, value in job_setting.items() if key not in ("profile", "overrides")}
+
+        job_id = uuid.uuid4().hex[:12]
+        try:
+            job = self.build_job({**profile, **fields, **overrides}, job_id)
+        except ValueError as e:
+            raise JobServerError(400, str(e)) from e
+        except Exception as e:
+            self.logger.error(f"ジョブの作成中にエラーが発生しました: {e}")
+            raise JobServerError(500, f"ジョブの作成中にエラーが発生しました: {e}") from e
+
+        job.update(
+            id=job_id, status=self.QUEUED, backend=None, generator=None, run_id=None, error=None,
+            batches_finished=0, total_batches=None, images_missing=0, submitted_at=time.time(), started_at=None, finished_at=None
+        )
+        with self._condition:
+            if self._stopping:
+                raise JobServerError(503, "デーモンを終了中のため、ジョブを受け付けられません")
+            self._jobs[job_id] = job
+            self._queue.append(job)
+            self._emit("queued", job)
+            self._condition.notify_all()
+        self.logger.info(f"ジョブ {job['name']} を受け付けました")
+        return self._describe(job)
+
+    def get_job(self, job_id):
+        """
+        ジョブの状態を返す
+
+        Raises:
+            JobServerError: ジョブが存在しない場合（404）
+        """
+        with self._condition:
+            return self._describe(self._find(job_id))
+
+    def list_jobs(self):
+        """全てのジョブの状態を投入順に返す"""
+        with self._condition:
+            return [self._describe(job) for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        """
+        ジョブを中止する
+
+        実行待ちのジョブはキューから取り除き、実行中のジョブは処理中のバッチの完了後に中止する
+        （ジョブジャーナルに未完了として記録されるため、--resume で続きから生成できる）。
+
+        Returns:
+            dict: ジョブの状態
+
+        Raises:
+            JobServerError: ジョブが存在しない場合（404）、既に終了している場合（409）
+        """
+        with self._condition:
+            job = self._find(job_id)
+            if job["status"] in self.FINISHED:
+                raise JobServerError(409, f"ジョブ {job_id} は既に終了しています ({job['status']})")
+            job["cancel_requested"] = True
+            if job["status"] == self.QUEUED:
+                if job in self._queue:
+                    self._queue.remove(job)
+                self._finish(job, self.CANCELLED)
+            elif job["generator"] is not None:
+                job["generator"].cancel()
+                self._emit("cancelling", job)
+            return self._describe(job)
+
+    def get_events(self, since=0, job_id=None, timeout=0):
+        """
+        イベントを返す（該当するイベントがない場合は timeout 秒まで待つ）
+
+        Args:
+            since (int): このIDより後のイベントを返す
+            job_id (str, optional): 指定した場合はそのジョブのイベントのみを返す
+            timeout (float): 新しいイベントを待つ最大の秒数
+
+        Returns:
+            list: {"id", "event", "job_id", "status", "time", ...} のリスト
+        """
+        def matching():
+            return [
+                event for event in self._events
+                if event["id"] > since and (job_id is None or event["job_id"] == job_id)
+            ]
+
+        with self._condition:
+            if job_id is not None:
+                self._find(job_id)
+            events = matching()
+            deadline = time.time() + timeout
+            while not events and not self._stopping:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+                events = matching()
+            return events
+
+    def get_status(self):
+        """デーモンの状態（状態毎のジョブ数とバックエンドにロード済みのチェックポイント）を返す"""
+        with self._condition:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {
+                "jobs": counts,
+                "backends": [{"url": backend.url, "current_model": backend.current_model} for backend in self.backends]
+            }
+
+    def handle(self, method, endpoint, body, query=None):
+        """
+        APIのリクエストを処理してレスポンスを返す（/events/stream 以外）
+
+        Args:
+            method (str): HTTPメソッド
+            endpoint (str): パス（例: /jobs/abc/cancel）
+            body (dict): リクエストのJSON
+            query (dict, optional): クエリパラメーター（parse_qs の結果）
+
+        Returns:
+            tuple: (HTTPステータスコード, レスポンスのJSON)
+
+        Raises:
+            JobServerError: エラーレスポンスを返す場合
+        """
+        query = query or {}
+        parts = [part for part in endpoint.split("/") if part]
+        if method == "POST" and parts == ["jobs"]:
+            return 201, self.submit(body)
+        if method == "GET" and parts == ["jobs"]:
+            return 200, {"jobs": self.list_jobs()}
+        if method == "GET" and len(parts) == 2 and parts[0] == "jobs":
+            return 200, self.get_job(parts[1])
+        if method == "POST" and len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            return 200, self.cancel(parts[1])
+        if method == "GET" and parts == ["events"]:
+            since, job_id = self._parse_event_query(query)
+            return 200, {"events": self.get_events(since, job_id)}
+        if method == "GET" and parts == ["status"]:
+            return 200, self.get_status()
+        raise JobServerError(404, "Not Found")
+
+    def stream_events(self, write, since=0, job_id=None, poll_interval=1.0):
+        """
+        イベントを発生する度に write(イベント) で送信する
+
+        job_id を指定した場合はジョブが終了した時点で、それ以外はデーモンを終了するまで送信を続ける。
+
+        Args:
+            write (callable): イベントを1件ずつ送信する関数
+            since (int): このIDより後のイベントから送信する
+            job_id (str, optional): 指定した場合はそのジョブのイベントのみを送信する
+            poll_interval (float): 新しいイベントを待つ間隔（秒）
+        """
+        while True:
+            for event in self.get_events(since, job_id, timeout=poll_interval):
+                write(event)
+                since = event["id"]
+            with self._condition:
+                if self._stopping:
+                    return
+                if job_id is not None and self._find(job_id)["status"] in self.FINISHED:
+                    if not any(event["id"] > since and event["job_id"] == job_id for event in self._events):
+                        return
+
+    def route(self, handler, method, path, query, body):
+        """/events/stream はイベントを逐次送信し、それ以外は handle() で処理する"""
+        if method == "GET" and path == "/events/stream":
+            self._stream(handler, *self._parse_event_query(query))
+            return None
+        return self.handle(method, path, body, query)
+
+    def on_start(self):
+        """リクエストの受け付けを開始する前にディスパッチャーを起動する"""
+        self._start_dispatcher()
+
+    def on_stop(self):
+        """リクエストの受け付けを終了した後に、実行中のジョブの中止を要求して終了を待つ"""
+        self._stop_dispatcher()
+
+    def _start_dispatcher(self):
+        """ディスパッチャーのスレッドを起動する"""
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def _stop_dispatcher(self):
+        """実行待ちのジョブを中止し、実行中のジョブの中止を要求して、ディスパッチャーの終了を待つ"""
+        with self._condition:
+            self._stopping = True
+            for job in self._queue:
+                job["cancel_requested"] = True
+                self._finish(job, self.CANCELLED)
+            self._queue.clear()
+            for job in self._jobs.values():
+                if job["status"] == self.RUNNING and job["generator"] is not None:
+                    job["cancel_requested"] = True
+                    job["generator"].cancel()
+            self._condition.notify_all()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+            self._dispatcher = None
+
+    def _dispatch_loop(self):
+        """キューのジョブをまとめてスケジューラーで並べ替えて実行する"""
+        while True:
+            with self._condition:
+                while not self._queue and not self._stopping:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                jobs, self._queue = self._queue, []
+
+            try:
+                schedule = self.scheduler.plan(jobs, self.backends)
+                self.scheduler.execute(schedule, self._run_job)
+            except Exception as e:
+                self.logger.error(f"ジョブの実行計画の作成中にエラーが発生しました: {e}")
+                with self._condition:
+                    for job in jobs:
+                        if job["status"] not in self.FINISHED:
+                            job["error"] = str(e)
+                            self._finish(job, self.FAILED)
+
+    def _run_job(self, job, backend_url):
+        """1つのジョブを実行し、状態を更新する（JobScheduler.execute から呼び出される）"""
+        with self._condition:
+            if job.get("cancel_requested"):
+                return
+
+        generator = self.create_generator(job, backend_url)
+        generator.on_batch_finished = lambda result: self._on_batch_finished(job, result)
+        with self._condition:
+            job.update(generator=generator, backend=backend_url, status=self.RUNNING, started_at=time.time())
+            self._emit("started", job)
+            # 作成中に中止を要求された場合
+            if job.get("cancel_requested"):
+                generator.cancel()
+
+        try:
+            self.run_generator(generator)
+        except Exception as e:
+            with self._condition:
+                job["error"] = str(e) or type(e).__name__
+                job["run_id"] = getattr(generator, "run_id", None)
+                self._finish(job, self.FAILED)
+            raise
+
+        with self._condition:
+            job["run_id"] = getattr(generator, "run_id", None)
+            if job.get("cancel_requested"):
+                status = self.CANCELLED
+            else:
+                status = self._get_run_status(job, generator)
+            if status == self.DONE:
+                # 次の実行計画では、このバックエンドにロード済みのチェックポイントとして扱う
+                for backend in self.backends:
+                    if backend.url == backend_url:
+                        backend.current_model = job["checkpoint"]
+            self._finish(job, status)
+
+    def _get_run_status(self, job, generator):
+        """
+        ジェネレーターの実行結果からジョブの状態を判定する
+
+        事前検証・モデルの切り替えに失敗して中止した場合、batch_finished イベントで未生成の画像が通知された場合、
+        全てのバッチが完了しなかった場合は失敗とする。ジョブジャーナルが有効な場合は記録された実行の状態も確認する。
+        """
+        if getattr(generator, "dry_run", False):
+            return self.DONE
+        if getattr(generator, "aborted", False):
+            return self.FAILED
+        if job["images_missing"] or not job["total_batches"] or job["batches_finished"] < job["total_batches"]:
+            return self.FAILED
+        journal = getattr(generator, "job_journal", None)
+        if journal is None:
+            return self.DONE
+        if generator.run_id is None:
+            return self.FAILED
+        run = journal.get_run(generator.run_id)
+        return self.DONE if run is not None and run["status"] == journal.DONE else self.FAILED
+
+    def _on_batch_finished(self, job, result):
+        """ジェネレーターのバッチが完了した場合のイベントを記録する"""
+        with self._condition:
+            job["batches_finished"] += 1
+            job["total_batches"] = result.get("total_batches", job["total_batches"])
+            job["images_missing"] += result.get("missing", 0)
+            self._emit("batch_finished", job, **result)
+
+    def _finish(self, job, status):
+        """ジョブを終了した状態にする（ロックを保持した状態で呼び出す）"""
+        job.update(status=status, finished_at=time.time(), generator=None)
+        self._emit(status, job)
+        self.logger.info(f"ジョブ {job['name']} が終了しました ({status})")
+
+    def _emit(self, event, job, **fields):
+        """イベントを記録して待っているクライアントに通知する（ロックを保持した状態で呼び出す）"""
+        self._events.append({
+            "id": self._next_event_id,
+            "event": event,
+            "job_id": job["id"],
+            "status": job["status"],
+            "time": time.time(),
+            **fields
+        })
+        self._next_event_id += 1
+        self._condition.notify_all()
+
+    def _find(self, job_id):
+        """ジョブを返す（ロックを保持した状態で呼び出す）"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            raise JobServerError(404, f"ジョブが見つかりません: {job_id}")
+        return job
+
+    @staticmethod
+    def _describe(job):
+        """ジョブの状態をJSONに変換できる辞書で返す"""
+        return {
+            "id": job["id"],
+            "name": job["name"],
+            "status": job["status"],
+            "checkpoint": job["checkpoint"],
+            "lora": job.get("lora"),
+            "images": job["images"],
+            "backend": job["backend"],
+            "run_id": job["run_id"],
+            "batches_finished": job["batches_finished"],
+            "images_missing": job["images_missing"],
+            "error": job["error"],
+            "submitted_at": job["submitted_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"]
+        }
+
+    @staticmethod
+    def _parse_event_query(query):
+        """イベントのクエリパラメーター（since, job_id）を解析する"""
+        try:
+            since = int(query.get("since", ["0"])[0])
+        except ValueError:
+            raise JobServerError(400, "since は整数で指定してください")
+        return since, query.get("job_id", [None])[0]
+
+    def _stream(self, handler, since, job_id):
+        """イベントを改行区切りのJSONで接続を閉じるまで送信する"""
+        if job_id is not None:
+            self.get_job(job_id)
+        handler.send_response(200)
+        handler.send_header("Content-Type", "application/x-ndjson")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+
+        def write(event):
+            handler.wfile.write(json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n")
+            handler.wfile.flush()
+
+        try:
+            self.stream_events(write, since, job_id)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
@@ -0,0 +1,154 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class JsonHTTPError(Exception):
+    """JSONのエラーレスポンスを返す場合の例外"""
+
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class JsonHTTPServer:
+    """
+    リクエスト・レスポンスをJSONでやり取りするHTTPサーバーの基底クラス
+
+    サブクラスは route() でリクエストを処理し、(HTTPステータスコード, レスポンスのJSON) を返す。
+    JsonHTTPError を送出した場合は error_body() のJSONを、それ以外の例外の場合は500を返す。
+    """
+
+    # ログに出力するサーバーの名前と、リクエストを受け付けるスレッドの名前
+    server_name = "HTTPサーバー"
+    thread_name = "json-http-server"
+    # リクエストのJSONが不正な場合のHTTPステータスコード
+    invalid_json_status = 400
+
+    def __init__(self, host, port, logger=None):
+        """
+        Args:
+            host (str): 待ち受けるアドレス
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.logger = logger or logging.getLogger(__name__)
+        self._httpd = ThreadingHTTPServer((host, port), self._create_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """サーバーのURL（例: http://127.0.0.1:7860）"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """バックグラウンドスレッドでリクエストの受け付けを開始する"""
+        self.on_start()
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=self.thread_name, daemon=True)
+        self._thread.start()
+        self.logger.info(f"{self.server_name}を起動しました: {self.url}")
+        return self
+
+    def serve_forever(self):
+        """現在のスレッドでリクエストを受け付ける（Ctrl+Cで終了）"""
+        self.on_start()
+        self.logger.info(f"{self.server_name}を起動しました: {self.url}")
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+            self.on_stop()
+
+    def stop(self):
+        """リクエストの受け付けを終了する"""
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+        self.on_stop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def on_start(self):
+        """リクエストの受け付けを開始する前に呼び出される"""
+
+    def on_stop(self):
+        """リクエストの受け付けを終了した後に呼び出される"""
+
+    def route(self, handler, method, path, query, body):
+        """
+        リクエストを処理する
+
+        Args:
+            handler (BaseHTTPRequestHandler): リクエストハンドラー（レスポンスを直接送信する場合に使用する）
+            method (str): HTTPメソッド
+            path (str): クエリ文字列と末尾の / を除いたパス
+            query (dict): クエリパラメーター（parse_qs の結果）
+            body (dict): リクエストのJSON（本文がない場合はNone）
+
+        Returns:
+            tuple: (HTTPステータスコード, レスポンスのJSON)。レスポンスを直接送信した場合はNone
+
+        Raises:
+            JsonHTTPError: エラーレスポンスを返す場合
+        """
+        raise JsonHTTPError(404, "Not Found")
+
+    def error_body(self, error):
+        """JsonHTTPError のレスポンスのJSONを返す"""
+        return {"error": type(error).__name__, "detail": error.detail}
+
+    def _create_handler(self):
+        """このサーバーのリクエストハンドラークラスを作成する"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def _dispatch(self, method):
+                path, _, query_string = self.path.partition("?")
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    try:
+                        body = json.loads(raw) if raw else None
+                    except json.JSONDecodeError as e:
+                        raise JsonHTTPError(server.invalid_json_status, f"Invalid JSON: {e}") from e
+                    response = server.route(self, method, path.rstrip("/"), parse_qs(query_string), body)
+                    if response is not None:
+                        self._send(*response)
+                except JsonHTTPError as e:
+                    self._send(e.status, server.error_body(e))
+                except Exception as e:
+                    server.logger.error(f"{method} {path} の処理中にエラーが発生しました: {e}")
+                    self._send(500, {"error": type(e).__name__, "detail": str(e)})
+
+            def _send(self, status, data):
+                encoded = json.dumps(data, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                self.wfile.write(encoded)
+
+            def log_message(self, format, *args):
+                server.logger.debug(f"{self.address_string()} - {format % args}")
+
+        return Handler
@@ -1,5 +1,6 @@
 import sys
 import time
+import asyncio
 import json
 import argparse
 import os
@@ -105,6 +106,12 @@ SD_MODEL_SCRITPS = {
 
 }
 
+# ジョブファイル・ジョブ投入APIでジョブ毎に指定できる起動オプション（この他にバッチ数 count を指定できる）
+JOB_OPTIONS = [
+    "style", "category", "subcategory", "model", "model_checkpoint", "enable_hr",
+    "width", "height", "use_lora", "lora_name", "variation_strategy"
+]
+
 # settings.json から設定を読み込む
 try:
     # 現在のファイルのディレクトリパスを取得
@@ -181,13 +188,381 @@ def get_default_model(category, use_lora=False, lora_name=None):
     else:
         return "brav6"
 
-def main():
+def resolve_model(args):
+    """
+    LoRAの指定をチェックし、使用するモデルとチェックポイントを args に設定する
+
+    Raises:
+        ValueError: LoRA・モデル・チェックポイントの指定が不正な場合
+    """
+    # LoRAの使用チェック
+    if args.use_lora:
+        if not args.lora_name:
+            raise ValueError("--use-loraが指定されていますが、--lora-nameが指定されていません")
+        if args.lora_name not in LORA_SETTINGS:
+            raise ValueError(
+                f"指定されたLoRA '{args.lora_name}' は設定に存在しません"
+                f"（利用可能なLoRA: {', '.join(LORA_SETTINGS.keys())}）"
+            )
+        if args.model and args.model != LORA_SETTINGS[args.lora_name]["model"]:
+            print(f"警告: 指定されたモデル '{args.model}' はLoRA '{args.lora_name}' の推奨モデル '{LORA_SETTINGS[args.lora_name]['model']}' と異なります")
+
+    # モデルの選択
+    if not args.model:
+        args.model = get_default_model(args.category, args.use_lora, args.lora_name)
+    else:
+        # --modelオプションが指定された場合、そのモデルを強制的に使用
+        if args.model not in SD_MODEL_CHECKPOINTS:
+            raise ValueError(
+                f"指定されたモデル '{args.model}' は利用できません"
+                f"（利用可能なモデル: {', '.join(SD_MODEL_CHECKPOINTS.keys())}）"
+            )
+        print(f"指定されたモデル '{args.model}' を使用します")
+
+    # モデルチェックポイントの選択
+    if not args.model_checkpoint:
+        if args.model in SD_MODEL_CHECKPOINTS:
+            args.model_checkpoint = SD_MODEL_CHECKPOINTS[args.model]
+        else:
+            raise ValueError(f"モデル '{args.model}' のチェックポイントが見つかりません")
+
+def create_generator(args, backends=None, session=None):
+    """
+    起動オプションからAutoImageGeneratorのインスタンスを作成
+
+    Args:
+        args (argparse.Namespace): resolve_model() でモデルを設定済みの起動オプション
+        backends (list, optional): 使用するバックエンドのURL（省略時は --backend の指定に従う）
+        session (GeneratorSession, optional): 複数のジョブで共有するリソース
+    """
+    # プロンプトフォルダのパスを設定
+    if not args.prompts_folder:
+        args.prompts_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts')
+
+    # 出力フォルダのプレフィックスを設定
+    output_folder_prefix = get_output_folder_prefix(args)
+
+    from auto_image_generator import AutoImageGenerator
+    generator = AutoImageGenerator(
+        image_generate_batch_execute_count=getattr(args, "count", None) or settings.get("image_generate_batch_execute_count", 2),
+        another_version_generate_count=settings.get("another_version_generate_count", 12),
+        input_folder="./images/input",
+        output_folder="./images/output",
+        prompts_folder=args.prompts_folder,
+        url="http://localhost:7860",
+        sd_model_checkpoint=args.model_checkpoint,
+        sd_model_prefix=args.model,
+        enable_hr=args.enable_hr.lower() == 'true',
+        output_folder_prefix=output_folder_prefix,
+        is_transparent_background=args.subcategory == "transparent",
+        is_selfie=args.subcategory == "selfie",
+        style=args.style,
+        category=args.category,
+        subcategory=args.subcategory,
+        width=args.width,
+        height=args.height,
+        use_custom_checkpoint=False,
+        use_lora=args.use_lora,
+        lora_name=args.lora_name,
+        dry_run=args.dry_run,
+        debug_mode=args.debug,
+        backends=backends or args.backends,
+        variation_strategy=getattr(args, "variation_strategy", None),
+        session=session
+    )
+    # --resume で同じ設定のジェネレーターを作成し直せるよう、起動オプションをジョブジャーナルに記録する
+    generator.run_options = dict(vars(args))
+    return generator
+
+def load_jobs(jobs_file, args):
+    """
+    ジョブファイルを読み込み、スケジューラーに渡すジョブのリストを作成
+
+    ジョブファイルは起動オプション（style, category, subcategory, model, lora_name, enable_hr, width, height, variation_strategy）と
+    バッチ数 count を指定したオブジェクトのリスト。省略した項目はコマンドラインの指定に従う。
+    {"defaults": {...}, "profiles": [...]} の形式（マニフェスト）の場合は、各プロファイルで省略した項目に defaults の値を使用する。
+
+    Args:
+        jobs_file (str): ジョブファイルのパス
+        args (argparse.Namespace): コマンドラインの起動オプション
+
+    Returns:
+        list: "args"、"checkpoint"、"lora"、"images" を持つジョブのリスト
+
+    Raises:
+        ValueError: ジョブの指定が不正な場合
+    """
+    with open(jobs_file, 'r', encoding='utf-8') as f:
+        job_settings = json.load(f)
+    if isinstance(job_settings, dict):
+        defaults = job_settings.get("defaults", {})
+        job_settings = [{**defaults, **profile} for profile in job_settings.get("profiles", [])]
+
+    return [create_job(job_setting, args, f"#{index}") for index, job_setting in enumerate(job_settings, 1)]
+
+def create_job(job_setting, args, label):
+    """
+    ジョブの指定（起動オプションとバッチ数 count）からスケジューラーに渡すジョブを作成
+
+    Args:
+        job_setting (dict): ジョブの指定（省略した項目はコマンドラインの指定に従う）
+        args (argparse.Namespace): コマンドラインの起動オプション
+        label (str): ジョブ名の先頭に付ける番号・ID
+
+    Returns:
+        dict: "name"、"args"、"checkpoint"、"lora"、"images" を持つジョブ
+
+    Raises:
+        ValueError: ジョブの指定が不正な場合
+    """
+    overrides = parse_job_options(job_setting, label)
+    if overrides.get("lora_name") and "use_lora" not in overrides:
+        overrides["use_lora"] = True
+    job_args = argparse.Namespace(**{**vars(args), "count": None, **overrides})
+
+    name = f"{label} {get_output_folder_prefix(job_args)}"
+    if not job_args.style or not job_args.category:
+        raise ValueError(f"ジョブ {name}: style と category は必須です")
+    if not validate_image_type(job_args.style, job_args.category, job_args.subcategory):
+        raise ValueError(f"ジョブ {name}: 画像タイプの組み合わせが不正です")
+    if job_args.count is not None and (not isinstance(job_args.count, int) or isinstance(job_args.count, bool) or job_args.count < 1):
+        raise ValueError(f"ジョブ {name}: count は1以上の整数を指定してください")
+    try:
+        resolve_model(job_args)
+    except ValueError as e:
+        raise ValueError(f"ジョブ {name}: {e}") from e
+
+    count = job_args.count or settings.get("image_generate_batch_execute_count", 2)
+    return {
+        "name": name,
+        "args": job_args,
+        "checkpoint": job_args.model_checkpoint,
+        "lora": job_args.lora_name if job_args.use_lora else None,
+        "images": count * max(1, settings.get("another_version_generate_count", 12))
+    }
+
+def parse_job_options(job_setting, label):
+    """
+    ジョブの指定を起動オプションと同じ型・選択肢で検証して変換
+
+    Args:
+        job_setting (dict): ジョブの指定（JOB_OPTIONS の起動オプションとバッチ数 count）
+        label (str): エラーメッセージに使うジョブの番号・ID
+
+    Returns:
+        dict: 起動オプションの dest をキーとした変換後の値
+
+    Raises:
+        ValueError: 指定できない項目や、型・選択肢が起動オプションと異なる値が指定された場合
+    """
+    actions = {action.dest: action for action in build_parser()._actions}
+    options = {}
+    for key, value in job_setting.items():
+        dest = key.replace('-', '_')
+        if dest != "count" and dest not in JOB_OPTIONS:
+            raise ValueError(f"ジョブ {label}: 指定できない項目です: {key}")
+        if dest == "count" or value is None:
+            options[dest] = value
+            continue
+
+        action = actions[dest]
+        if action.nargs == 0:
+            # --use-lora 等のフラグは true/false で指定する
+            if not isinstance(value, bool):
+                raise ValueError(f"ジョブ {label}: {key} は true または false を指定してください")
+        else:
+            if isinstance(value, bool):
+                # enable_hr 等の true/false を文字列で受け取る起動オプション
+                value = str(value).lower()
+            if isinstance(value, (dict, list)):
+                raise ValueError(f"ジョブ {label}: {key} の値が不正です: {value!r}")
+            try:
+                value = (action.type or str)(str(value))
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"ジョブ {label}: {key} の値が不正です: {value!r}") from e
+            if action.choices is not None and value not in action.choices:
+                choices = ", ".join(map(str, action.choices))
+                raise ValueError(f"ジョブ {label}: {key} は {choices} のいずれかを指定してください")
+        options[dest] = value
+    return options
+
+def check_backends(args, logger):
+    """
+    各バックエンドのヘルスチェックを行い、ロード済みのモデルを確認
+
+    Returns:
+        list: 正常な Backend のリスト（ドライランモードではWeb UIに接続せず、全てのバックエンド）
+    """
+    from backend_pool import BackendPool
+
+    pool_settings = {**settings, "backends": args.backends} if args.backends else settings
+    pool = BackendPool.from_settings("http://localhost:7860", pool_settings, logger=logger)
+    try:
+        return pool.backends if args.dry_run else pool.check_all()
+    finally:
+        pool.close()
+
+def create_scheduler(logger, session=None):
+    """
+    settings.json の "scheduler" の設定と、記録されたモデルのロード時間からスケジューラーを作成
+
+    Args:
+        logger (logging.Logger): ログ出力先
+        session (GeneratorSession, optional): 指定した場合はジェネレーターとロード時間の記録を共有する
+    """
+    from job_scheduler import JobScheduler
+    from model_load_times import ModelLoadTimes
+
+    load_times_file = os.path.abspath(
+        settings.get("model_switch", {}).get("load_times_file") or os.path.join("./images/output", "model_load_times.json")
+    )
+    if session is None:
+        load_times = ModelLoadTimes(load_times_file, logger=logger)
+    else:
+        load_times = session.get_or_create(
+            ("model_load_times", load_times_file), lambda: ModelLoadTimes(load_times_file, logger=logger)
+        )
+    return JobScheduler.from_settings(settings.get("scheduler"), load_times, logger=logger)
+
+def run_generator(generator, args):
+    """起動オプションに従ってジェネレーターを実行（ドライラン・非同期エンジン・通常のエンジン）"""
+    if args.dry_run:
+        generator.generate_prompts()
+    elif args.use_async:
+        asyncio.run(generator.arun(max_in_flight=args.max_in_flight))
+    else:
+        generator.run()
+
+def run_jobs(args, logger):
+    """
+    ジョブファイルの全ジョブを、モデルの切り替えが最小になる順序で1つのプロセスで実行
+
+    全てのジョブで GeneratorSession を共有し、HTTPの接続プール・ロード済みのモデル・プロンプトファイル等を使い回す。
+
+    Returns:
+        bool: 全てのジョブが成功した場合はTrue
+    """
+    from generator_session import GeneratorSession
+
+    try:
+        jobs = load_jobs(args.jobs, args)
+    except (OSError, ValueError) as e:
+        logger.error(f"ジョブファイル {args.jobs} を読み込めませんでした: {e}")
+        return False
+
+    # 各バックエンドにロード済みのモデルを確認
+    backends = check_backends(args, logger)
+    if not backends:
+        logger.error("正常なバックエンドが存在しないため、ジョブを実行できません")
+        return False
+
+    session = GeneratorSession(logger=logger)
+    scheduler = create_scheduler(logger, session=session)
+    schedule = scheduler.plan(jobs, backends)
+
+    def run_job(job, backend_url):
+        logger.info(f"ジョブ {job['name']} を開始します ({backend_url})")
+        generator = create_generator(job["args"], backends=[backend_url], session=session)
+        run_generator(generator, args)
+
+    with session:
+        results = scheduler.execute(schedule, run_job)
+        logger.info(f"共有リソース: {session.get_stats()}")
+    failed = [job["name"] for job, success in results if not success]
+    logger.info(f"全ジョブが完了しました。成功: {len(results) - len(failed)}, 失敗: {len(failed)}")
+    return not failed
+
+def serve(args, logger):
+    """
+    常駐の画像生成デーモンとして、ローカルのジョブ投入APIでジョブを受け付けて実行（Ctrl+Cで終了）
+
+    投入されたジョブは --jobs と同じスケジューラーで実行し、全てのジョブで GeneratorSession を共有する。
+
+    Returns:
+        bool: 起動できた場合はTrue
+    """
+    from generator_session import GeneratorSession
+    from job_server import JobServer
+
+    backends = check_backends(args, logger)
+    if not backends:
+        logger.error("正常なバックエンドが存在しないため、デーモンを起動できません")
+        return False
+
+    session = GeneratorSession(logger=logger)
+
+    def create_job_generator(job, backend_url):
+        logger.info(f"ジョブ {job['name']} を開始します ({backend_url})")
+        return create_generator(job["args"], backends=[backend_url], session=session)
+
+    with session:
+        server = JobServer.from_settings(
+            settings.get("daemon"),
+            create_scheduler(logger, session=session),
+            backends,
+            build_job=lambda job_setting, label: create_job(job_setting, args, label),
+            create_generator=create_job_generator,
+            run_generator=lambda generator: run_generator(generator, args),
+            logger=logger
+        )
+        server.serve_forever()
+        logger.info(f"デーモンを終了しました。共有リソース: {session.get_stats()}")
+    return True
+
+def resume_run(args, logger):
+    """
+    ジョブジャーナルに記録された実行を、記録された起動オプションで中断したところから再開
+
+    Returns:
+        bool: 全てのバッチが完了した場合はTrue
+    """
+    from job_journal import JobJournal
+
+    journal = JobJournal.from_settings(
+        settings.get("job_journal"),
+        default_path=os.path.join("./images/output", "job_journal.sqlite3"),
+        logger=logger
+    )
+    if journal is None:
+        logger.error("job_journal が無効なため再開できません")
+        return False
+    try:
+        run = journal.get_run(args.resume)
+    finally:
+        journal.close()
+    if run is None:
+        logger.error(f"実行IDが見つかりません: {args.resume}")
+        return False
+
+    options = run["options"]
+    if not options.get("style") or not options.get("category"):
+        logger.error(f"実行 {args.resume} の起動オプションが記録されていないため再開できません")
+        return False
+
+    # バックエンドとログの指定のみ、再開時のコマンドラインの指定を優先する
+    run_args = argparse.Namespace(**{**options, "resume": args.resume, "debug": args.debug})
+    if args.backends:
+        run_args.backends = args.backends
+    logger.info(f"実行 {args.resume} を再開します ({get_output_folder_prefix(run_args)}, {run_args.model_checkpoint})")
+
+    generator = create_generator(run_args)
+    return generator.resume(args.resume) == JobJournal.DONE
+
+def build_parser():
+    """コマンドラインの起動オプションのパーサーを作成"""
     parser = argparse.ArgumentParser(description='画像生成プログラム')
 
-    # 必須の引数
-    parser.add_argument('--style', required=True, choices=['realistic', 'illustration'],
+    # サブコマンド（run-manifest: マニフェストの全プロファイルを1つのプロセスで実行する）
+    parser.add_argument('command', nargs='?', choices=['run-manifest', 'serve'],
+                        help='run-manifest: マニフェスト（ジョブファイル）の全プロファイルを1つのプロセスで実行する, '
+                             'serve: ローカルのジョブ投入APIを持つ常駐デーモンとして起動する')
+    parser.add_argument('manifest', nargs='?', metavar='MANIFEST_FILE',
+                        help='run-manifest で実行するマニフェストのJSONファイル')
+
+    # 必須の引数（--jobs を指定した場合はジョブ毎に指定する）
+    parser.add_argument('--style', choices=['realistic', 'illustration'],
                         help='画像スタイル (realistic/illustration)')
-    parser.add_argument('--category', required=True,
+    parser.add_argument('--category',
                         help='カテゴリー (female/male/animal/background/rpg_icon/vehicle/other)')
 
     # オプションの引数
@@ -209,13 +584,40 @@ def main():
                         help='LoRAを使用するかどうか')
     parser.add_argument('--lora-name', choices=list(LORA_SETTINGS.keys()),
                         help='使用するLoRAの名前 (例: KawasakiNinja300, waifu_on_Motorcycle_v2, cybervehiclev4)')
+    parser.add_argument('--variation-strategy', choices=['prompt', 'subseed'],
+                        help='別バージョンの画像の生成方法 (prompt: オプションのプロンプトを変更, subseed: 同じプロンプトでVariation seedを変更してまとめて描画, デフォルト: settings.jsonの設定に従う)')
     parser.add_argument('--prompts-folder',
                         help='プロンプトフォルダのパス (デフォルト: autoimagegenerator/prompts)')
     parser.add_argument('--debug', action='store_true',
                         help='デバッグモードを有効にする（DEBUGレベルのログを表示）')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                        help='非同期エンジンで画像生成を行う（複数のリクエストを同時に送信する）')
+    parser.add_argument('--max-in-flight', type=int,
+                        help='非同期エンジンで同時に送信するリクエスト数 (デフォルト: settings.jsonの設定に従う)')
+    parser.add_argument('--repair', nargs='?', const='', metavar='BATCH_FOLDER',
+                        help='バッチマニフェストで未生成となっている画像のみを再生成する（フォルダ省略時は出力先の全バッチ）')
+    parser.add_argument('--backend', dest='backends', action='append', metavar='URL',
+                        help='リクエストを振り分けるStable Diffusion Web UIのURL（複数回指定可能、デフォルト: settings.jsonの設定に従う）')
+    parser.add_argument('--jobs', metavar='JOBS_FILE',
+                        help='複数のジョブを記述したJSONファイル（チェックポイント毎にまとめてモデルの切り替えが最小になる順序で実行する）')
+    parser.add_argument('--resume', metavar='RUN_ID',
+                        help='ジョブジャーナルに記録された実行を中断したところから再開する（実行IDは開始時にログに出力される）')
+    return parser
 
+def main():
+    parser = build_parser()
     args = parser.parse_args()
 
+    if args.command == 'run-manifest':
+        if not args.manifest:
+            parser.error("run-manifest にはマニフェストのファイルを指定してください")
+        args.jobs = args.manifest
+    elif args.manifest:
+        parser.error(f"不明な引数です: {args.manifest}")
+
+    if not args.jobs and not args.resume and args.command != 'serve' and (not args.style or not args.category):
+        parser.error("--style と --category は必須です（--jobs・--resume・serve を指定した場合を除く）")
+
     # ロガーの設定
     logger = logging.getLogger(__name__)
     logger.setLevel(logging.DEBUG if args.debug else logging.INFO)
@@ -255,76 +657,34 @@ def main():
     logger.info(f"LoRA名: {args.lora_name if args.lora_name else '未指定'}")
     logger.info(f"プロンプトフォルダ: {args.prompts_folder if args.prompts_folder else 'デフォルト'}")
     logger.info(f"デバッグモード: {args.debug}")
+    logger.info(f"非同期エンジン: {args.use_async}")
     logger.info("==================")
 
-    # 画像タイプの組み合わせが有効かチェック
-    if not validate_image_type(args.style, args.category, args.subcategory):
-        sys.exit(1)
-
-    # LoRAの使用チェック
-    if args.use_lora:
-        if not args.lora_name:
-            print("エラー: --use-loraが指定されていますが、--lora-nameが指定されていません")
-            sys.exit(1)
-        if args.lora_name not in LORA_SETTINGS:
-            print(f"エラー: 指定されたLoRA '{args.lora_name}' は設定に存在しません")
-            print(f"利用可能なLoRA: {', '.join(LORA_SETTINGS.keys())}")
-            sys.exit(1)
-        if args.model and args.model != LORA_SETTINGS[args.lora_name]["model"]:
-            print(f"警告: 指定されたモデル '{args.model}' はLoRA '{args.lora_name}' の推奨モデル '{LORA_SETTINGS[args.lora_name]['model']}' と異なります")
+    # 常駐デーモンとしてジョブ投入APIを起動
+    if args.command == 'serve':
+        sys.exit(0 if serve(args, logger) else 1)
 
-    # モデルの選択
-    if not args.model:
-        args.model = get_default_model(args.category, args.use_lora, args.lora_name)
-    else:
-        # --modelオプションが指定された場合、そのモデルを強制的に使用
-        if args.model not in SD_MODEL_CHECKPOINTS:
-            print(f"エラー: 指定されたモデル '{args.model}' は利用できません")
-            print(f"利用可能なモデル: {', '.join(SD_MODEL_CHECKPOINTS.keys())}")
-            sys.exit(1)
-        print(f"指定されたモデル '{args.model}' を使用します")
+    # 中断した実行を再開
+    if args.resume:
+        sys.exit(0 if resume_run(args, logger) else 1)
 
-    # モデルチェックポイントの選択
-    if not args.model_checkpoint:
-        if args.model in SD_MODEL_CHECKPOINTS:
-            args.model_checkpoint = SD_MODEL_CHECKPOINTS[args.model]
-        else:
-            print(f"エラー: モデル '{args.model}' のチェックポイントが見つかりません")
-            sys.exit(1)
+    # 複数のジョブをスケジューラーで実行
+    if args.jobs:
+        sys.exit(0 if run_jobs(args, logger) else 1)
 
-    # プロンプトフォルダのパスを設定
-    if not args.prompts_folder:
-        args.prompts_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts')
+    # 画像タイプの組み合わせが有効かチェック
+    if not validate_image_type(args.style, args.category, args.subcategory):
+        sys.exit(1)
 
-    # 出力フォルダのプレフィックスを設定
-    output_folder_prefix = get_output_folder_prefix(args)
+    # LoRAの使用チェックとモデルの選択
+    try:
+        resolve_model(args)
+    except ValueError as e:
+        print(f"エラー: {e}")
+        sys.exit(1)
 
     # AutoImageGeneratorのインスタンスを作成
-    from auto_image_generator import AutoImageGenerator
-    generator = AutoImageGenerator(
-        image_generate_batch_execute_count=settings.get("image_generate_batch_execute_count", 2),
-        another_version_generate_count=settings.get("another_version_generate_count", 12),
-        input_folder="./images/input",
-        output_folder="./images/output",
-        prompts_folder=args.prompts_folder,
-        url="http://localhost:7860",
-        sd_model_checkpoint=args.model_checkpoint,
-        sd_model_prefix=args.model,
-        enable_hr=args.enable_hr.lower() == 'true',
-        output_folder_prefix=output_folder_prefix,
-        is_transparent_background=args.subcategory == "transparent",
-        is_selfie=args.subcategory == "selfie",
-        style=args.style,
-        category=args.category,
-        subcategory=args.subcategory,
-        width=args.width,
-        height=args.height,
-        use_custom_checkpoint=False,
-        use_lora=args.use_lora,
-        lora_name=args.lora_name,
-        dry_run=args.dry_run,
-        debug_mode=args.debug
-    )
+    generator = create_generator(args)
 
     # 画像生成の実行
     if args.dry_run:
@@ -332,6 +692,10 @@ def main():
         prompts = generator.generate_prompts()
         print("生成されたプロンプト:")
         print(json.dumps(prompts, indent=2, ensure_ascii=False))
+    elif args.repair is not None:
+        generator.repair(args.repair or None)
+    elif args.use_async:
+        asyncio.run(generator.arun(max_in_flight=args.max_in_flight))
     else:
         generator.run()
 
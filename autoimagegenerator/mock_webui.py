@@ -0,0 +1,491 @@
+import argparse
+import base64
+import hashlib
+import io
+import json
+import logging
+import os
+import random
+import shlex
+import threading
+import time
+from collections import Counter
+
+from PIL import Image, PngImagePlugin
+
+try:
+    from .json_http_server import JsonHTTPError, JsonHTTPServer
+except ImportError:
+    # autoimagegeneratorフォルダ内でスクリプトとして実行された場合
+    from json_http_server import JsonHTTPError, JsonHTTPServer
+
+
+class MockWebUIError(JsonHTTPError):
+    """モックサーバーがエラーレスポンスを返す場合の例外"""
+
+
+class MockWebUIServer(JsonHTTPServer):
+    """
+    GPUなしで動作するStable Diffusion Web UI APIのローカルモックサーバー
+
+    /sdapi/v1/txt2img・options・png-info・progress・interrupt・sd-models（と事前検証で使う loras・samplers・
+    upscalers・scripts）を実装し、ペイロードから決定的に作成したPNGとWeb UIと同じ形式のinfotextを返す。
+    描画時間・モデルのロード時間・エラーの発生率を指定でき、ABG Removerを指定した場合は1枚につき3つの画像を返す。
+    Web UIと同じく描画とモデルの切り替えは1件ずつ処理し、待っているリクエスト数を /progress の "queue" で返す。
+    save_images と override_settings の outdir_samples / outdir_txt2img_samples を指定した場合は、画像をそのフォルダにも保存する。
+    """
+
+    DEFAULT_MODELS = ["model.safetensors"]
+    DEFAULT_SAMPLERS = ["DPM++ 2M", "DPM++ SDE", "DPM++ 2M SDE", "Euler a", "Euler"]
+    DEFAULT_UPSCALERS = ["None", "Lanczos", "R-ESRGAN 4x+", "4x-UltraSharp"]
+    PROMPT_SCRIPT = "prompts from file or textbox"
+    ABG_SCRIPT = "abg remover"
+    server_name = "モックWeb UI"
+    thread_name = "mock-webui"
+    invalid_json_status = 422
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        models=None,
+        loras=None,
+        latency=0.0,
+        model_load_time=0.0,
+        error_rate=0.0,
+        error_status=500,
+        abg_remover=True,
+        return_grid=False,
+        noise=False,
+        seed=None,
+        logger=None
+    ):
+        """
+        Args:
+            host (str): 待ち受けるアドレス
+            port (int): 待ち受けるポート（0の場合は空いているポート）
+            models (list, optional): /sd-models で返すチェックポイントのファイル名（先頭が起動時のモデル）
+            loras (list, optional): /loras で返すLoRAの名前
+            latency (float): 画像1枚あたりの描画時間（秒）。ステップ数で分割して進捗を更新する
+            model_load_time (float): モデルの切り替えにかかる時間（秒）
+            error_rate (float): txt2imgがエラーを返す確率（0〜1）
+            error_status (int): エラー時のHTTPステータスコード
+            abg_remover (bool): ABG Removerスクリプトを使用できるかどうか
+            return_grid (bool): batch_size が2以上の場合に先頭にグリッド画像を含めるかどうか
+            noise (bool): 単色ではなくノイズの画像を返すかどうか（実際の画像に近いサイズのレスポンスになる）
+            seed (int, optional): エラーの発生とランダムなSeed値に使う乱数のSeed値
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.models = list(models or self.DEFAULT_MODELS)
+        self.loras = list(loras or [])
+        self.latency = latency
+        self.model_load_time = model_load_time
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.abg_remover = abg_remover
+        self.return_grid = return_grid
+        self.noise = noise
+        self.logger = logger or logging.getLogger(__name__)
+
+        self.current_model = self.models[0]
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        # Web UIと同じく描画とモデルの切り替えは1件ずつ処理する
+        self._queue_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._interrupted = threading.Event()
+        self._waiting = 0
+        self._state = {}
+        self._reset_state()
+
+        super().__init__(host, port, logger=self.logger)
+
+    def handle(self, method, endpoint, body):
+        """
+        APIのリクエストを処理する
+
+        Args:
+            method (str): HTTPメソッド
+            endpoint (str): /sdapi/v1/ 以降のパス
+            body (dict): リクエストのJSON（GETの場合はNone）
+
+        Returns:
+            dict or list: レスポンスのJSON
+
+        Raises:
+            MockWebUIError: エラーレスポンスを返す場合
+        """
+        self.stats[endpoint] += 1
+        routes = {
+            ("POST", "txt2img"): self._txt2img,
+            ("GET", "options"): lambda _: {"sd_model_checkpoint": self.current_model},
+            ("POST", "options"): self._set_options,
+            ("POST", "png-info"): self._png_info,
+            ("GET", "progress"): lambda _: self._progress(),
+            ("POST", "interrupt"): lambda _: self._interrupt(),
+            ("GET", "sd-models"): lambda _: [self._model_entry(model) for model in self.models],
+            ("GET", "loras"): lambda _: [{"name": name, "alias": name, "path": f"models/Lora/{name}.safetensors"} for name in self.loras],
+            ("GET", "samplers"): lambda _: [{"name": name, "aliases": [], "options": {}} for name in self.DEFAULT_SAMPLERS],
+            ("GET", "upscalers"): lambda _: [{"name": name} for name in self.DEFAULT_UPSCALERS],
+            ("GET", "scripts"): lambda _: {"txt2img": self._scripts(), "img2img": self._scripts()},
+        }
+        route = routes.get((method, endpoint))
+        if route is None:
+            raise MockWebUIError(404, "Not Found")
+        return route(body)
+
+    def _scripts(self):
+        """使用できるスクリプト名"""
+        return [self.PROMPT_SCRIPT] + ([self.ABG_SCRIPT] if self.abg_remover else [])
+
+    @staticmethod
+    def _model_entry(model):
+        """/sd-models の1件分"""
+        name = os.path.splitext(model)[0]
+        model_hash = hashlib.sha256(model.encode("utf-8")).hexdigest()
+        return {
+            "title": f"{model} [{model_hash[:10]}]",
+            "model_name": name,
+            "hash": model_hash[:8],
+            "sha256": model_hash,
+            "filename": f"models/Stable-diffusion/{model}",
+            "config": None
+        }
+
+    def _set_options(self, body):
+        """モデルを切り替える（Web UIと同じくロードが終わるまで応答しない）"""
+        model = (body or {}).get("sd_model_checkpoint")
+        if model and model != self.current_model:
+            if model not in self.models:
+                raise MockWebUIError(500, f"model '{model}' not found")
+            self._wait_in_queue()
+            try:
+                time.sleep(self.model_load_time)
+                self.current_model = model
+                self.stats["model_loads"] += 1
+            finally:
+                self._queue_lock.release()
+        return None
+
+    def _txt2img(self, payload):
+        """txt2imgの描画を模擬し、Web UIと同じ形式のレスポンスを返す"""
+        payload = payload or {}
+        # Web UIと同じく、ペイロードではなくロード済みのモデルで描画する
+        model = self.current_model
+        script_name = (payload.get("script_name") or "").lower()
+        if script_name and script_name not in self._scripts():
+            raise MockWebUIError(422, f"Script '{payload['script_name']}' not found")
+
+        with self._random_lock:
+            failed = self._random.random() < self.error_rate
+            random_seed = self._random.randrange(4294967294)
+        if failed:
+            self.stats["errors"] += 1
+            raise MockWebUIError(self.error_status, "RuntimeError: mock injected error")
+
+        jobs = self._expand_jobs(payload, model, random_seed, script_name)
+
+        self._wait_in_queue()
+        try:
+            self._interrupted.clear()
+            rendered = self._render(jobs, payload)
+        finally:
+            self._queue_lock.release()
+
+        images = []
+        send_images = payload.get("send_images", True)
+        save_dir = self._get_save_dir(payload)
+        for job in rendered:
+            if not send_images and save_dir is None:
+                break
+            original = self._create_image(job, payload)
+            png = self._to_png(original, job["infotext"])
+            if save_dir is not None:
+                self._save_sample(save_dir, job, png)
+            if not send_images:
+                continue
+            if script_name == self.ABG_SCRIPT:
+                # 1つ目=元画像（PNGInfo付き）、2つ目=マスク画像、3つ目=透過背景画像
+                mask = Image.new("L", original.size, color=255)
+                transparent = original.convert("RGBA")
+                images.extend([self._encode(png), self._encode(self._to_png(mask)), self._encode(self._to_png(transparent))])
+            else:
+                images.append(self._encode(png))
+        if self.return_grid and len(images) > 1 and script_name != self.ABG_SCRIPT:
+            images.insert(0, images[0])
+        self.stats["images"] += len(rendered)
+
+        infotexts = [job["infotext"] for job in rendered]
+        all_seeds = [job["seed"] for job in rendered]
+        if script_name == self.PROMPT_SCRIPT:
+            # スクリプトの結果の all_seeds には先頭のジョブのSeed値のみが含まれる
+            all_seeds = all_seeds[:1]
+        elif self.return_grid and len(rendered) > 1:
+            infotexts.insert(0, infotexts[0])
+        first = jobs[0]
+        info = {
+            "prompt": first["prompt"],
+            "all_prompts": [job["prompt"] for job in rendered],
+            "negative_prompt": first["negative_prompt"],
+            "all_negative_prompts": [job["negative_prompt"] for job in rendered],
+            "seed": first["seed"],
+            "all_seeds": all_seeds,
+            "subseed": first["subseed"],
+            "all_subseeds": [job["subseed"] for job in rendered],
+            "subseed_strength": payload.get("subseed_strength", 0),
+            "width": payload.get("width", 512),
+            "height": payload.get("height", 512),
+            "sampler_name": payload.get("sampler_name", "Euler a"),
+            "cfg_scale": payload.get("cfg_scale", 7),
+            "steps": payload.get("steps", 20),
+            "batch_size": payload.get("batch_size", 1),
+            "sd_model_name": os.path.splitext(model)[0],
+            "sd_model_hash": self._model_entry(model)["hash"],
+            "infotexts": infotexts,
+            "version": "mock"
+        }
+        return {"images": images, "parameters": payload, "info": json.dumps(info, ensure_ascii=False)}
+
+    def _expand_jobs(self, payload, model, random_seed, script_name):
+        """ペイロードを1枚毎のプロンプト・Seed値・subseedに展開する"""
+        prompts = [(payload.get("prompt", ""), payload.get("negative_prompt", ""))]
+        if script_name == self.PROMPT_SCRIPT:
+            prompts = []
+            for line in str((payload.get("script_args") or [""])[-1]).splitlines():
+                if not line.strip():
+                    continue
+                args = shlex.split(line)
+                options = {args[i][2:]: args[i + 1] for i in range(len(args) - 1) if args[i].startswith("--")}
+                prompts.append((options.get("prompt", line), options.get("negative_prompt", payload.get("negative_prompt", ""))))
+
+        seed = payload.get("seed", -1)
+        seed = random_seed if seed in (None, -1) else int(seed)
+        subseed_strength = payload.get("subseed_strength", 0)
+        subseed = payload.get("subseed", -1)
+        subseed = (random_seed + 1) % 4294967294 if subseed in (None, -1) else int(subseed)
+
+        jobs = []
+        for prompt, negative_prompt in prompts:
+            for i in range(max(1, int(payload.get("batch_size", 1)))):
+                # Web UIと同じく、Variation seedを指定した場合はsubseedを、それ以外はSeed値を1ずつ増やす
+                job_seed = seed if subseed_strength else seed + i
+                job_subseed = subseed + i
+                jobs.append({
+                    "prompt": prompt,
+                    "negative_prompt": negative_prompt,
+                    "seed": job_seed,
+                    "subseed": job_subseed,
+                    "infotext": self._build_infotext(payload, model, prompt, negative_prompt, job_seed, job_subseed)
+                })
+        return jobs
+
+    def _build_infotext(self, payload, model, prompt, negative_prompt, seed, subseed):
+        """Web UIと同じ形式のinfotextを作成する"""
+        params = [
+            f"Steps: {payload.get('steps', 20)}",
+            f"Sampler: {payload.get('sampler_name', 'Euler a')}",
+            f"Schedule type: {payload.get('scheduler') or payload.get('Schedule type') or 'Automatic'}",
+            f"CFG scale: {payload.get('cfg_scale', 7)}",
+            f"Seed: {seed}",
+            f"Size: {payload.get('width', 512)}x{payload.get('height', 512)}",
+            f"Model hash: {self._model_entry(model)['hash'][:10]}",
+            f"Model: {os.path.splitext(model)[0]}",
+        ]
+        if payload.get("subseed_strength"):
+            params += [f"Variation seed: {subseed}", f"Variation seed strength: {payload['subseed_strength']}"]
+        if payload.get("enable_hr"):
+            params += [
+                f"Denoising strength: {payload.get('denoising_strength', 0.7)}",
+                f"Hires upscale: {payload.get('hr_scale', 2)}",
+                f"Hires steps: {payload.get('hr_second_pass_steps', 0)}",
+                f"Hires upscaler: {payload.get('hr_upscaler') or 'Latent'}",
+            ]
+        params.append("Version: mock")
+        text = prompt
+        if negative_prompt:
+            text += f"\nNegative prompt: {negative_prompt}"
+        return f"{text}\n{', '.join(params)}"
+
+    def _render(self, jobs, payload):
+        """描画時間を模擬して進捗を更新する（中断された場合は描画済みのジョブのみを返す）"""
+        steps = max(1, int(payload.get("steps", 20)))
+        step_time = self.latency / steps
+        with self._state_lock:
+            self._state = {
+                "job_count": len(jobs),
+                "job_no": 0,
+                "job_timestamp": time.strftime("%Y%m%d%H%M%S"),
+                "sampling_step": 0,
+                "sampling_steps": steps,
+                "started_at": time.time()
+            }
+        try:
+            for index in range(len(jobs)):
+                with self._state_lock:
+                    self._state.update({"job_no": index, "sampling_step": 0})
+                for step in range(steps):
+                    # Web UIと同じく、中断された場合は描画中の画像までを返す
+                    if self._interrupted.wait(step_time) if step_time > 0 else self._interrupted.is_set():
+                        self.stats["interrupted"] += 1
+                        return jobs[:index + 1]
+                    with self._state_lock:
+                        self._state["sampling_step"] = step + 1
+            return jobs
+        finally:
+            self._reset_state()
+
+    def _progress(self):
+        """/sdapi/v1/progress のレスポンス"""
+        with self._state_lock:
+            state = dict(self._state)
+            waiting = self._waiting
+        job_count = state.get("job_count", 0)
+        progress = 0.0
+        eta = None
+        if job_count:
+            done = state["job_no"] + state["sampling_step"] / state["sampling_steps"]
+            progress = done / job_count
+            elapsed = time.time() - state["started_at"]
+            eta = elapsed / progress - elapsed if progress > 0 else None
+        state.pop("started_at", None)
+        state.update({"skipped": False, "interrupted": self._interrupted.is_set(), "job": ""})
+        return {"progress": progress, "eta_relative": eta, "state": state, "current_image": None, "textinfo": None, "queue": waiting}
+
+    def _interrupt(self):
+        """描画中の生成を中断する"""
+        with self._state_lock:
+            running = bool(self._state.get("job_count"))
+        if running:
+            self._interrupted.set()
+        return None
+
+    def _png_info(self, body):
+        """画像のPNGInfoを返す"""
+        image_data = (body or {}).get("image") or ""
+        if "," in image_data and image_data.startswith("data:"):
+            image_data = image_data.split(",", 1)[1]
+        try:
+            with Image.open(io.BytesIO(base64.b64decode(image_data))) as image:
+                items = dict(image.info)
+        except (ValueError, OSError) as e:
+            raise MockWebUIError(422, f"Invalid image: {e}")
+        info = items.pop("parameters", "")
+        return {"info": info, "items": {key: value for key, value in items.items() if isinstance(value, str)}, "parameters": {}}
+
+    def _wait_in_queue(self):
+        """描画・モデルの切り替えの順番を待つ（待っている間は /progress の queue に数える）"""
+        with self._state_lock:
+            self._waiting += 1
+        self._queue_lock.acquire()
+        with self._state_lock:
+            self._waiting -= 1
+
+    def _reset_state(self):
+        """進捗を待機中の状態に戻す"""
+        with self._state_lock:
+            self._state = {"job_count": 0, "job_no": 0, "job_timestamp": "0", "sampling_step": 0, "sampling_steps": 0}
+
+    def _create_image(self, job, payload):
+        """プロンプト・Seed値（Variation seedを指定した場合はsubseedも）から決定的な画像を作成する"""
+        scale = payload.get("hr_scale", 2) if payload.get("enable_hr") else 1
+        size = (int(payload.get("width", 512) * scale), int(payload.get("height", 512) * scale))
+        digest = hashlib.sha256(
+            json.dumps(
+                [job["prompt"], job["negative_prompt"], job["seed"], job["subseed"] if payload.get("subseed_strength") else None],
+                ensure_ascii=False
+            ).encode("utf-8")
+        ).digest()
+        if self.noise:
+            data = random.Random(digest).randbytes(size[0] * size[1] * 3)
+            return Image.frombytes("RGB", size, data)
+        return Image.new("RGB", size, color=tuple(digest[:3]))
+
+    @staticmethod
+    def _to_png(image, infotext=None):
+        """画像をPNGのバイト列に変換する（infotextはPNGInfoとして埋め込む）"""
+        pnginfo = None
+        if infotext:
+            pnginfo = PngImagePlugin.PngInfo()
+            pnginfo.add_text("parameters", infotext)
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", pnginfo=pnginfo, compress_level=1)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _encode(png):
+        """PNGのバイト列をBase64エンコードする"""
+        return base64.b64encode(png).decode("ascii")
+
+    @staticmethod
+    def _get_save_dir(payload):
+        """save_images=True の場合の保存先（override_settings で指定された場合のみ、Web UIと同じく outdir_samples を優先）"""
+        if not payload.get("save_images"):
+            return None
+        override_settings = payload.get("override_settings") or {}
+        return override_settings.get("outdir_samples") or override_settings.get("outdir_txt2img_samples") or None
+
+    @staticmethod
+    def _save_sample(save_dir, job, png):
+        """Web UIと同じく連番とSeed値のファイル名（例: 00000-1234.png）で保存する"""
+        os.makedirs(save_dir, exist_ok=True)
+        number = len([name for name in os.listdir(save_dir) if name.endswith(".png")])
+        with open(os.path.join(save_dir, f"{number:05d}-{job['seed']}.png"), "wb") as f:
+            f.write(png)
+
+    def route(self, handler, method, path, query, body):
+        """/sdapi/v1/ 以降のパスを handle() で処理する"""
+        if not path.startswith("/sdapi/v1/"):
+            return 404, {"detail": "Not Found"}
+        return 200, self.handle(method, path[len("/sdapi/v1/"):], body)
+
+    def error_body(self, error):
+        """Web UIと同じ形式のエラーレスポンスのJSONを返す"""
+        return {"error": type(error).__name__, "detail": error.detail, "body": "", "errors": error.detail}
+
+
+def main():
+    """コマンドラインからモックサーバーを起動する"""
+    parser = argparse.ArgumentParser(description='GPUなしで動作するStable Diffusion Web UI APIのモックサーバー')
+    parser.add_argument('--host', default='127.0.0.1', help='待ち受けるアドレス')
+    parser.add_argument('--port', type=int, default=7860, help='待ち受けるポート')
+    parser.add_argument('--latency', type=float, default=0.0, help='画像1枚あたりの描画時間（秒）')
+    parser.add_argument('--model-load-time', type=float, default=0.0, help='モデルの切り替えにかかる時間（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='txt2imgがエラーを返す確率（0〜1）')
+    parser.add_argument('--error-status', type=int, default=500, help='エラー時のHTTPステータスコード')
+    parser.add_argument('--no-abg-remover', dest='abg_remover', action='store_false', help='ABG Removerスクリプトを使用できないようにする')
+    parser.add_argument('--return-grid', action='store_true', help='batch_size が2以上の場合にグリッド画像を含める')
+    parser.add_argument('--noise', action='store_true', help='ノイズの画像を返す（実際の画像に近いサイズのレスポンスになる）')
+    parser.add_argument('--seed', type=int, help='エラーの発生とランダムなSeed値に使う乱数のSeed値')
+    parser.add_argument('--model', dest='models', action='append', metavar='CHECKPOINT', help='/sd-models で返すチェックポイント（複数指定可能、省略時は main.py のチェックポイント全て）')
+    parser.add_argument('--debug', action='store_true', help='リクエスト毎のログを出力する')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.debug else logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    models = args.models
+    loras = []
+    if not models:
+        # main.py で定義されたチェックポイント・LoRAを全て使用できるようにする
+        from main import SD_MODEL_CHECKPOINTS, LORA_SETTINGS
+        models = list(dict.fromkeys(SD_MODEL_CHECKPOINTS.values()))
+        loras = list(LORA_SETTINGS.keys())
+
+    MockWebUIServer(
+        host=args.host,
+        port=args.port,
+        models=models,
+        loras=loras,
+        latency=args.latency,
+        model_load_time=args.model_load_time,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        abg_remover=args.abg_remover,
+        return_grid=args.return_grid,
+        noise=args.noise,
+        seed=args.seed
+    ).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
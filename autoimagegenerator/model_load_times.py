@@ -0,0 +1,81 @@
+import json
+import logging
+import os
+import threading
+
+
+class ModelLoadTimes:
+    """
+    チェックポイント毎のモデルのロード時間の記録
+
+    モデル切り替えに実際にかかった時間を記録してJSONファイルに保存し、次回以降の切り替え時間の予測に使用する。
+    """
+
+    def __init__(self, file_path=None, logger=None):
+        """
+        Args:
+            file_path (str, optional): 記録を保存するJSONファイルのパス（省略時は保存しない）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.file_path = file_path
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self.records = {}
+
+        if file_path and os.path.exists(file_path):
+            try:
+                with open(file_path, "r", encoding="utf-8") as f:
+                    self.records = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                self.logger.warning(f"モデルのロード時間の記録を読み込めませんでした: {e}")
+
+    def record(self, checkpoint, seconds, backend_url=None):
+        """
+        モデルのロード時間を記録する
+
+        Args:
+            checkpoint (str): チェックポイント名
+            seconds (float): ロードにかかった秒数
+            backend_url (str, optional): ロードしたバックエンドのURL
+        """
+        with self._lock:
+            record = self.records.setdefault(checkpoint, {"count": 0, "average": 0.0, "max": 0.0, "last": 0.0, "backends": {}})
+            record["count"] += 1
+            record["average"] += (seconds - record["average"]) / record["count"]
+            record["max"] = max(record["max"], seconds)
+            record["last"] = seconds
+            if backend_url:
+                record["backends"][backend_url] = seconds
+            self._save()
+        self.logger.info(f"モデル {checkpoint} のロード時間: {seconds:.1f}秒 (平均: {record['average']:.1f}秒, {record['count']}回)")
+
+    def predict(self, checkpoint, backend_url=None, default=None):
+        """
+        モデルのロード時間の予測値を返す
+
+        Args:
+            checkpoint (str): チェックポイント名
+            backend_url (str, optional): バックエンドのURL（そのバックエンドでの直近の実績を優先する）
+            default (float, optional): 記録がない場合の値
+
+        Returns:
+            float: 予測したロード時間（秒）
+        """
+        with self._lock:
+            record = self.records.get(checkpoint)
+            if not record:
+                return default
+            if backend_url and backend_url in record.get("backends", {}):
+                return record["backends"][backend_url]
+            return record["average"]
+
+    def _save(self):
+        """記録をJSONファイルに保存する（ロックを取得した状態で呼び出す）"""
+        if not self.file_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.file_path)), exist_ok=True)
+            with open(self.file_path, "w", encoding="utf-8") as f:
+                json.dump(self.records, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            self.logger.warning(f"モデルのロード時間の記録を保存できませんでした: {e}")
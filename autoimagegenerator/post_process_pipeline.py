@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class PostProcessPipeline:
+    """
+    txt2imgリクエストの送信（ディスパッチ）と画像の保存等の後処理を分離するパイプライン
+
+    ディスパッチャーはレスポンスを受け取ったら後処理（PNG・JPEG・関連画像・JSONの保存）を上限付きのキューに入れ、
+    すぐに次のリクエストを送信する。後処理は workers 個のワーカースレッドが順に実行する。
+    キューが queue_size 件で埋まっている場合は、空きが出るまでディスパッチャーを待たせる（バックプレッシャー）。
+    ステージ毎の所要時間とキューの長さは get_stats() で取得できる。
+    """
+
+    # 所要時間を記録するステージ
+    STAGES = ("dispatch", "backpressure", "queue_wait", "post_process")
+
+    def __init__(self, workers=2, queue_size=4, logger=None):
+        """
+        Args:
+            workers (int): 後処理を実行するワーカースレッド数
+            queue_size (int): 後処理のキューに入れておける最大件数
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.workers = max(1, int(workers))
+        self.queue_size = max(1, int(queue_size))
+        self.logger = logger or logging.getLogger(__name__)
+
+        self._queue = queue.Queue(maxsize=self.queue_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stage_stats = {stage: {"count": 0, "total": 0.0, "max": 0.0} for stage in self.STAGES}
+        self._depth_samples = 0
+        self._depth_total = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.failed = 0
+
+    @classmethod
+    def from_settings(cls, pipeline_settings=None, logger=None):
+        """
+        settings.json の "post_process" セクションから作成する（無効な場合はNone）
+
+        Args:
+            pipeline_settings (dict, optional): "post_process" セクションの設定値
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            PostProcessPipeline: 作成したパイプライン（enabled が false の場合はNone）
+        """
+        pipeline_settings = pipeline_settings or {}
+        if not pipeline_settings.get("enabled", True):
+            return None
+        return cls(
+            workers=pipeline_settings.get("workers", 2),
+            queue_size=pipeline_settings.get("queue_size", 4),
+            logger=logger
+        )
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        後処理をキューに入れる（キューが埋まっている場合は空きが出るまで待つ）
+
+        Args:
+            fn (callable): 後処理の関数
+            *args, **kwargs: fn に渡す引数
+
+        Returns:
+            concurrent.futures.Future: 後処理の結果（例外はこの Future に設定される）
+        """
+        self._start_workers()
+        future = Future()
+        start_time = time.time()
+        self._queue.put((future, fn, args, kwargs, time.time()))
+        self.record("backpressure", time.time() - start_time)
+
+        depth = self._queue.qsize()
+        with self._lock:
+            self._depth_samples += 1
+            self._depth_total += depth
+            self.max_queue_depth = max(self.max_queue_depth, depth)
+        self.logger.debug(f"後処理をキューに追加しました (キューの長さ: {depth}/{self.queue_size})")
+        return future
+
+    def record(self, stage, seconds):
+        """
+        ステージの所要時間を記録する
+
+        Args:
+            stage (str): ステージ名（STAGES のいずれか）
+            seconds (float): 所要時間（秒）
+        """
+        with self._lock:
+            stats = self._stage_stats[stage]
+            stats["count"] += 1
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def get_stats(self):
+        """ステージ毎の件数・平均・最大の所要時間と、キューの長さの平均・最大を返す"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": stats["count"],
+                    "avg": round(stats["total"] / stats["count"], 3) if stats["count"] else 0.0,
+                    "max": round(stats["max"], 3)
+                }
+                for stage, stats in self._stage_stats.items()
+            }
+            return {
+                "completed": self.completed,
+                "failed": self.failed,
+                "queue_depth_avg": round(self._depth_total / self._depth_samples, 2) if self._depth_samples else 0.0,
+                "queue_depth_max": self.max_queue_depth,
+                "stages": stages
+            }
+
+    def _start_workers(self):
+        """最初に後処理を投入した時にワーカースレッドを起動する"""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"post-process-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        """キューから後処理を取り出して実行する"""
+        while True:
+            future, fn, args, kwargs, enqueued_at = self._queue.get()
+            try:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.record("queue_wait", time.time() - enqueued_at)
+                start_time = time.time()
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    with self._lock:
+                        self.failed += 1
+                    future.set_exception(e)
+                else:
+                    with self._lock:
+                        self.completed += 1
+                    future.set_result(result)
+                finally:
+                    self.record("post_process", time.time() - start_time)
+            finally:
+                self._queue.task_done()
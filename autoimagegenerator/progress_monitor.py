@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+
+class RenderStalledError(requests.exceptions.Timeout):
+    """描画の進捗が一定時間止まったため、生成を中断した場合のエラー（リトライ対象のタイムアウトとして扱う）"""
+
+
+class ProgressMonitor:
+    """
+    1台のバックエンドの描画の進捗を監視するモニター
+
+    リクエストの処理中はバックグラウンドスレッドで /sdapi/v1/progress をポーリングし、ステップの速度とETAを記録する。
+    stall_timeout 秒間ステップが進まない場合は /sdapi/v1/interrupt で生成を中断する。
+    Web UI はリクエストを順番に処理するため、中断後に最初に完了したリクエストを中断されたリクエストとして扱う。
+    """
+
+    def __init__(self, client, poll_interval=2.0, stall_timeout=180.0, logger=None):
+        """
+        Args:
+            client (WebUIClient): バックエンドのHTTPクライアント
+            poll_interval (float): 進捗を確認する間隔（秒）
+            stall_timeout (float): 進捗が止まったと判定するまでの秒数
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.stall_timeout = stall_timeout
+        self.logger = logger or logging.getLogger(__name__)
+        self.progress_url = client.endpoint_url("progress") + "?skip_current_image=true"
+        self.interrupt_url = client.endpoint_url("interrupt")
+
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        self._pending_interrupts = 0
+        self._stop_event = None
+
+        # 監視結果
+        self.stall_count = 0
+        self.last_status = {}
+        self._last_signature = None
+        self._last_change = time.time()
+        self._last_step = None
+
+    @classmethod
+    def from_settings(cls, client, monitor_settings=None, logger=None):
+        """
+        settings.json の "progress_monitor" セクションから作成する
+
+        Args:
+            client (WebUIClient): バックエンドのHTTPクライアント
+            monitor_settings (dict, optional): "progress_monitor" セクションの設定値
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            ProgressMonitor: 作成したモニター
+        """
+        monitor_settings = monitor_settings or {}
+        return cls(
+            client,
+            poll_interval=monitor_settings.get("poll_interval", 2.0),
+            stall_timeout=monitor_settings.get("stall_timeout", 180.0),
+            logger=logger
+        )
+
+    @contextmanager
+    def track(self):
+        """with文の間、リクエストの処理中として進捗を監視する"""
+        with self._lock:
+            self._active_requests += 1
+            if self._active_requests == 1:
+                # 監視スレッド毎に停止用のイベントを作成（前回のスレッドは自身のイベントで終了する）
+                self._stop_event = threading.Event()
+                self._last_signature = None
+                self._last_change = time.time()
+                threading.Thread(target=self._run, args=(self._stop_event,), name="progress-monitor", daemon=True).start()
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._active_requests -= 1
+                if self._active_requests == 0:
+                    self._stop_event.set()
+
+    def consume_interrupt(self):
+        """
+        中断したリクエストが完了したかどうかを判定する（完了したリクエスト毎に1回呼び出す）
+
+        Returns:
+            bool: このリクエストが中断された場合はTrue
+        """
+        with self._lock:
+            if self._pending_interrupts > 0:
+                self._pending_interrupts -= 1
+                return True
+            return False
+
+    def _run(self, stop_event):
+        """リクエストが全て完了するまで進捗をポーリングする"""
+        while not stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+            except (requests.exceptions.RequestException, ValueError) as e:
+                self.logger.debug(f"進捗の取得に失敗しました: {e}")
+
+    def poll(self, now=None):
+        """
+        進捗を1回取得し、ステップが進んでいなければ中断する
+
+        Args:
+            now (float, optional): 現在時刻（テスト用）
+        """
+        response = self.client.get(self.progress_url)
+        response.raise_for_status()
+        self.update(response.json(), now)
+
+    def update(self, progress, now=None):
+        """
+        /sdapi/v1/progress のレスポンスから進捗を記録し、止まっている場合は中断する
+
+        Args:
+            progress (dict): /sdapi/v1/progress のレスポンス
+            now (float, optional): 現在時刻（テスト用）
+        """
+        now = now if now is not None else time.time()
+        state = progress.get("state", {}) or {}
+        step = state.get("sampling_step", 0)
+        signature = (state.get("job_timestamp"), state.get("job_no"), step, progress.get("progress"))
+        is_running = bool(state.get("job_count")) or bool(progress.get("progress"))
+
+        # ステップの速度（steps/秒）を記録
+        step_rate = self.last_status.get("step_rate")
+        if self._last_step is not None and step > self._last_step[0] and now > self._last_step[1]:
+            step_rate = (step - self._last_step[0]) / (now - self._last_step[1])
+        self._last_step = (step, now)
+
+        # サーバーの待ち行列の長さ（"queue" を返すWeb UIのみ。件数またはジョブのリスト）
+        queue = progress.get("queue")
+        queue_depth = len(queue) if isinstance(queue, list) else queue if isinstance(queue, int) else None
+
+        self.last_status = {
+            "queue_depth": queue_depth,
+            "progress": progress.get("progress"),
+            "eta": progress.get("eta_relative"),
+            "sampling_step": step,
+            "sampling_steps": state.get("sampling_steps"),
+            "step_rate": step_rate
+        }
+        self.logger.debug(f"描画の進捗 ({self.client.base_url}): {self.last_status}")
+
+        if signature != self._last_signature or not is_running:
+            self._last_signature = signature
+            self._last_change = now
+            return
+
+        if now - self._last_change >= self.stall_timeout:
+            self.interrupt(now - self._last_change)
+            self._last_change = now
+
+    def interrupt(self, stalled_seconds):
+        """
+        生成を中断し、中断したリクエストとして記録する
+
+        Args:
+            stalled_seconds (float): 進捗が止まっていた秒数
+        """
+        self.logger.warning(
+            f"描画の進捗が {stalled_seconds:.0f}秒 止まっているため生成を中断します ({self.client.base_url})"
+        )
+        # 中断したリクエストの応答が先に届く場合があるため、送信前に記録する
+        with self._lock:
+            self._pending_interrupts += 1
+            self.stall_count += 1
+        try:
+            response = self.client.post(self.interrupt_url)
+            response.raise_for_status()
+        except requests.exceptions.RequestException:
+            with self._lock:
+                self._pending_interrupts = max(0, self._pending_interrupts - 1)
+                self.stall_count -= 1
+            raise
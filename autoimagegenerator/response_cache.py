@@ -0,0 +1,241 @@
+import base64
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    txt2imgのレスポンス（画像のバイト列・info）をペイロードのハッシュをキーとして保存するディスクキャッシュ
+
+    ペイロードをキーの順序に依存しないJSONに変換したSHA-256をキーとし、同じプロンプト・Seed値・モデル・サイズ・
+    サンプラー・ハイレゾ・LoRAの組み合わせはWeb UIに送信せずに保存済みの画像を返す。
+    合計サイズが max_size を超えた場合は、最後に使用した日時が古いものから削除する（LRU）。
+    同じペイロードのリクエストが同時に送信された場合は、最初のリクエストの結果を待って共有する。
+    """
+
+    META_FILENAME = "meta.json"
+
+    def __init__(self, cache_dir, max_size=1024 * 1024 * 1024, logger=None):
+        """
+        Args:
+            cache_dir (str): キャッシュの保存先フォルダ
+            max_size (int): キャッシュの最大合計サイズ（バイト）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.logger = logger or logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._entries = OrderedDict()  # キー -> サイズ（最後に使用した順）
+        self.total_size = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_entries()
+
+    @classmethod
+    def from_settings(cls, cache_settings=None, default_cache_dir=None, logger=None):
+        """
+        settings.json の "response_cache" セクションから作成する（無効な場合はNone）
+
+        Args:
+            cache_settings (dict, optional): "response_cache" セクションの設定値
+            default_cache_dir (str, optional): cache_dir が未指定の場合の保存先
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            ResponseCache: 作成したキャッシュ（enabled が false または未指定の場合はNone）
+        """
+        cache_settings = cache_settings or {}
+        if not cache_settings.get("enabled", False):
+            return None
+        return cls(
+            cache_dir=cache_settings.get("cache_dir") or default_cache_dir,
+            max_size=cache_settings.get("max_size", 1024 * 1024 * 1024),
+            logger=logger
+        )
+
+    @staticmethod
+    def make_key(payload, model=None):
+        """
+        ペイロードからキャッシュのキーを作成する
+
+        Args:
+            payload (dict): txt2imgに送信するペイロード
+            model (str, optional): 使用するモデルのチェックポイント（ペイロードに含まれない場合に備えてキーに含める）
+
+        Returns:
+            str: キー（Seed値がランダムで結果が毎回異なる場合はNone）
+        """
+        if payload.get("seed", -1) == -1:
+            return None
+        if payload.get("subseed_strength") and payload.get("subseed", -1) == -1:
+            return None
+        canonical = json.dumps({"payload": payload, "model": model}, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def fetch(self, payload, request, required_images=None, model=None):
+        """
+        キャッシュにあるレスポンスを返し、ない場合は request を呼び出して結果を保存する
+
+        Args:
+            payload (dict): txt2imgに送信するペイロード
+            request (callable): キャッシュにない場合にレスポンスを取得する関数
+            required_images (set, optional): 必要な画像のインデックス（保存されていない場合は取得し直す、Noneの場合は全て）
+            model (str, optional): 使用するモデルのチェックポイント
+
+        Returns:
+            dict: txt2img APIのレスポンス（キャッシュの画像はファイルオブジェクト）
+        """
+        key = self.make_key(payload, model)
+        if key is None:
+            return request()
+
+        while True:
+            with self._lock:
+                r = self._load(key, required_images)
+                if r is not None:
+                    self.hits += 1
+                    self.logger.debug(f"txt2imgのレスポンスをキャッシュから取得しました: {key[:12]}")
+                    return r
+                event = self._pending.get(key)
+                owner = event is None
+                if owner:
+                    event = threading.Event()
+                    self._pending[key] = event
+
+            if not owner:
+                # 同じペイロードを送信中のリクエストの完了を待ってから、キャッシュを確認し直す
+                event.wait()
+                continue
+
+            try:
+                r = request()
+                self.misses += 1
+                self.put(key, r)
+                return r
+            finally:
+                with self._lock:
+                    self._pending.pop(key, None)
+                event.set()
+
+    def put(self, key, r):
+        """
+        レスポンスの画像とinfoを保存する（ファイルオブジェクトの画像は読み込み位置を先頭に戻す）
+
+        Args:
+            key (str): キャッシュのキー
+            r (dict): txt2img APIのレスポンス
+        """
+        entry_path = self._entry_path(key)
+        temp_path = f"{entry_path}.tmp-{uuid.uuid4().hex}"
+        try:
+            os.makedirs(temp_path)
+            images = []
+            for index, image_data in enumerate(r.get("images", [])):
+                if image_data is None:
+                    images.append(None)
+                    continue
+                filename = f"image-{index}"
+                with open(os.path.join(temp_path, filename), "wb") as f:
+                    if isinstance(image_data, str):
+                        f.write(base64.b64decode(image_data.split(",", 1)[0]))
+                    else:
+                        image_data.seek(0)
+                        shutil.copyfileobj(image_data, f)
+                        image_data.seek(0)
+                images.append(filename)
+
+            with open(os.path.join(temp_path, self.META_FILENAME), "w", encoding="utf-8") as f:
+                json.dump({"images": images, "info": r.get("info"), "parameters": r.get("parameters")}, f, ensure_ascii=False)
+            size = self._get_size(temp_path)
+
+            with self._lock:
+                if key in self._entries:
+                    self.total_size -= self._entries.pop(key)
+                    shutil.rmtree(entry_path, ignore_errors=True)
+                os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+                os.rename(temp_path, entry_path)
+                self._entries[key] = size
+                self.total_size += size
+                self._evict()
+        except (OSError, TypeError, ValueError) as e:
+            self.logger.warning(f"txt2imgのレスポンスをキャッシュに保存できませんでした: {e}")
+            shutil.rmtree(temp_path, ignore_errors=True)
+
+    def get_stats(self):
+        """ヒット数・ミス数・件数・合計サイズを返す"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "size": self.total_size}
+
+    def _load(self, key, required_images):
+        """保存済みのレスポンスを読み込む（ロックを取得した状態で呼び出す）"""
+        if key not in self._entries:
+            return None
+        entry_path = self._entry_path(key)
+        try:
+            with open(os.path.join(entry_path, self.META_FILENAME), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            filenames = meta["images"]
+            if any(
+                filenames[index] is None
+                for index in (required_images if required_images is not None else range(len(filenames)))
+                if index < len(filenames)
+            ):
+                return None
+            images = [open(os.path.join(entry_path, filename), "rb") if filename else None for filename in filenames]
+        except (OSError, KeyError, json.JSONDecodeError) as e:
+            self.logger.warning(f"キャッシュを読み込めなかったため削除します ({key[:12]}): {e}")
+            self.total_size -= self._entries.pop(key)
+            shutil.rmtree(entry_path, ignore_errors=True)
+            return None
+
+        self._entries.move_to_end(key)
+        os.utime(os.path.join(entry_path, self.META_FILENAME))
+        return {"images": images, "info": meta.get("info"), "parameters": meta.get("parameters")}
+
+    def _evict(self):
+        """合計サイズが max_size 以下になるまで、最後に使用した日時が古いものから削除する（ロックを取得した状態で呼び出す）"""
+        while self.total_size > self.max_size and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self.total_size -= size
+            shutil.rmtree(self._entry_path(key), ignore_errors=True)
+            self.logger.debug(f"キャッシュを削除しました: {key[:12]} ({size}バイト)")
+
+    def _load_entries(self):
+        """保存済みのキャッシュを最後に使用した順に読み込む"""
+        entries = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_path = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_path):
+                continue
+            for key in os.listdir(prefix_path):
+                entry_path = os.path.join(prefix_path, key)
+                meta_path = os.path.join(entry_path, self.META_FILENAME)
+                if ".tmp-" in key or not os.path.exists(meta_path):
+                    # 保存中に中断されたもの
+                    shutil.rmtree(entry_path, ignore_errors=True)
+                    continue
+                entries.append((os.path.getmtime(meta_path), key, self._get_size(entry_path)))
+
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.total_size += size
+        self._evict()
+
+    def _entry_path(self, key):
+        """キーに対応する保存先フォルダ"""
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    @staticmethod
+    def _get_size(path):
+        """フォルダ内のファイルの合計サイズ"""
+        return sum(os.path.getsize(os.path.join(path, filename)) for filename in os.listdir(path))
@@ -0,0 +1,309 @@
+import base64
+import codecs
+import json
+import tempfile
+
+
+# 画像1枚あたりメモリ上に保持する最大バイト数（超えた分は一時ファイルに書き出す）
+DEFAULT_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# レスポンスボディを読み込む単位（バイト）
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class Txt2ImgResponseParser:
+    """
+    txt2img APIのレスポンス（JSON）を逐次解析するパーサー
+
+    "images" 配列のBase64文字列はチャンク毎にデコードして SpooledTemporaryFile に書き込み、
+    レスポンス全体やBase64文字列全体をメモリ上に保持しない。
+    "parameters" や "info" など、それ以外のキーの値は通常のJSONとして解析する。
+    keep_images を指定した場合、それ以外のインデックスの画像はデコードせずに読み飛ばし、結果のリストには None を入れる。
+
+    使用例:
+        parser = Txt2ImgResponseParser()
+        for chunk in response.iter_content(chunk_size=65536):
+            parser.feed(chunk)
+        result = parser.close()  # {"images": [ファイルオブジェクト, ...], "parameters": {...}, "info": "..."}
+    """
+
+    # 解析の状態
+    _START = "start"
+    _KEY = "key"
+    _COLON = "colon"
+    _VALUE = "value"
+    _RAW_VALUE = "raw_value"
+    _IMAGES = "images"
+    _IMAGE_STRING = "image_string"
+    _DONE = "done"
+
+    def __init__(self, spool_max_size=DEFAULT_SPOOL_MAX_SIZE, image_key="images", keep_images=None):
+        """
+        Args:
+            spool_max_size (int): 画像1枚あたりメモリ上に保持する最大バイト数
+            image_key (str): 逐次デコードする画像配列のキー
+            keep_images (set, optional): デコードする画像のインデックス（0始まり、省略時は全て）
+        """
+        self.spool_max_size = spool_max_size
+        self.image_key = image_key
+        self.keep_images = keep_images
+        self.result = {}
+
+        self._decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = self._START
+        self._key = None
+
+        # キー以外の値の解析状態
+        self._raw = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+        # 画像のデコード状態
+        self._image_file = None
+        self._image_started = False
+        self._pending_base64 = ""
+
+    def feed(self, data):
+        """
+        レスポンスボディの一部を解析する
+
+        Args:
+            data (bytes): レスポンスボディのチャンク
+        """
+        self._buffer += self._decoder.decode(data)
+        while self._buffer and self._step():
+            pass
+
+    def close(self):
+        """
+        解析を終了して結果を返す
+
+        Returns:
+            dict: レスポンスの内容（"images" は先頭にシーク済みのファイルオブジェクトのリスト）
+
+        Raises:
+            ValueError: レスポンスが途中で終わっている、またはJSONとして不正な場合
+        """
+        self._buffer += self._decoder.decode(b"", final=True)
+        while self._buffer and self._step():
+            pass
+        if self._state != self._DONE:
+            for image_file in self.result.get(self.image_key, []):
+                if image_file is not None:
+                    image_file.close()
+            if self._image_file is not None:
+                self._image_file.close()
+            raise ValueError("txt2imgのレスポンスが途中で終了しています")
+        for image_file in self.result.get(self.image_key, []):
+            if image_file is not None:
+                image_file.seek(0)
+        return self.result
+
+    def _skip_whitespace(self):
+        self._buffer = self._buffer.lstrip()
+
+    def _step(self):
+        """
+        現在の状態で解析を1段階進める
+
+        Returns:
+            bool: 続けて解析できる場合はTrue（データが足りない場合はFalse）
+        """
+        if self._state == self._IMAGE_STRING:
+            return self._read_image_string()
+        if self._state == self._RAW_VALUE:
+            return self._read_raw_value()
+
+        self._skip_whitespace()
+        if not self._buffer:
+            return False
+        char = self._buffer[0]
+
+        if self._state == self._START:
+            if char != "{":
+                raise ValueError("txt2imgのレスポンスがJSONオブジェクトではありません")
+            self._buffer = self._buffer[1:]
+            self._state = self._KEY
+            return True
+
+        if self._state == self._KEY:
+            if char == ",":
+                self._buffer = self._buffer[1:]
+                return True
+            if char == "}":
+                self._buffer = self._buffer[1:]
+                self._state = self._DONE
+                return True
+            end = self._find_string_end(self._buffer, 1)
+            if end < 0:
+                return False
+            self._key = json.loads(self._buffer[:end + 1])
+            self._buffer = self._buffer[end + 1:]
+            self._state = self._COLON
+            return True
+
+        if self._state == self._COLON:
+            if char != ":":
+                raise ValueError("txt2imgのレスポンスのJSONが不正です")
+            self._buffer = self._buffer[1:]
+            self._state = self._VALUE
+            return True
+
+        if self._state == self._VALUE:
+            if self._key == self.image_key and char == "[":
+                self._buffer = self._buffer[1:]
+                self.result[self.image_key] = []
+                self._state = self._IMAGES
+            else:
+                self._raw = []
+                self._depth = 0
+                self._in_string = False
+                self._escape = False
+                self._state = self._RAW_VALUE
+            return True
+
+        if self._state == self._IMAGES:
+            if char == ",":
+                self._buffer = self._buffer[1:]
+            elif char == "]":
+                self._buffer = self._buffer[1:]
+                self._state = self._KEY
+            elif char == '"':
+                self._buffer = self._buffer[1:]
+                index = len(self.result[self.image_key])
+                if self.keep_images is None or index in self.keep_images:
+                    self._image_file = tempfile.SpooledTemporaryFile(max_size=self.spool_max_size)
+                else:
+                    self._image_file = None
+                self._image_started = False
+                self._pending_base64 = ""
+                self._state = self._IMAGE_STRING
+            else:
+                raise ValueError("txt2imgのレスポンスの images が文字列の配列ではありません")
+            return True
+
+        # _DONE の後の余分なデータは無視する
+        self._buffer = ""
+        return False
+
+    @staticmethod
+    def _find_string_end(text, start):
+        """start以降で、エスケープされていない閉じ引用符の位置を返す（見つからない場合は-1）"""
+        escape = False
+        for index in range(start, len(text)):
+            char = text[index]
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                return index
+        return -1
+
+    def _read_raw_value(self):
+        """画像以外の値を、終端（トップレベルの , または }）まで読み込んで解析する"""
+        for index, char in enumerate(self._buffer):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]" and self._depth > 0:
+                self._depth -= 1
+            elif char in ",}" and self._depth == 0:
+                self._raw.append(self._buffer[:index])
+                self._buffer = self._buffer[index:]
+                self.result[self._key] = json.loads("".join(self._raw))
+                self._raw = []
+                self._state = self._KEY
+                return True
+
+        self._raw.append(self._buffer)
+        self._buffer = ""
+        return False
+
+    def _read_image_string(self):
+        """画像のBase64文字列を、4文字単位でデコードしてファイルに書き込む"""
+        end = self._buffer.find('"')
+
+        # デコード対象外の画像は終端まで読み飛ばす
+        if self._image_file is None:
+            if end < 0:
+                self._buffer = ""
+                return False
+            self._buffer = self._buffer[end + 1:]
+            self.result[self.image_key].append(None)
+            self._state = self._IMAGES
+            return True
+        if end < 0:
+            chunk = self._buffer
+            # エスケープ（\/）がチャンクの境界で分割された場合は次のチャンクと合わせて処理する
+            if chunk.endswith("\\"):
+                chunk = chunk[:-1]
+                self._buffer = "\\"
+            else:
+                self._buffer = ""
+        else:
+            chunk = self._buffer[:end]
+            self._buffer = self._buffer[end + 1:]
+        chunk = chunk.replace("\\/", "/")
+
+        # "data:image/png;base64," 形式の場合は先頭のヘッダーを除去（ヘッダーが揃うまでは保留）
+        if not self._image_started:
+            chunk = self._pending_base64 + chunk
+            self._pending_base64 = ""
+            if chunk.startswith("data:") or "data:".startswith(chunk):
+                if "," not in chunk and end < 0:
+                    self._pending_base64 = chunk
+                    return False
+                if "," in chunk:
+                    chunk = chunk.split(",", 1)[1]
+            self._image_started = True
+
+        self._pending_base64 += chunk
+        decodable_length = len(self._pending_base64) // 4 * 4
+        if decodable_length:
+            self._image_file.write(base64.b64decode(self._pending_base64[:decodable_length]))
+            self._pending_base64 = self._pending_base64[decodable_length:]
+
+        if end < 0:
+            return False
+
+        # 文字列の終端: 残りをパディングしてデコード
+        if self._pending_base64:
+            self._image_file.write(base64.b64decode(self._pending_base64 + "=" * (-len(self._pending_base64) % 4)))
+        self.result[self.image_key].append(self._image_file)
+        self._image_file = None
+        self._pending_base64 = ""
+        self._state = self._IMAGES
+        return True
+
+
+def read_txt2img_response(response, chunk_size=DEFAULT_CHUNK_SIZE, spool_max_size=DEFAULT_SPOOL_MAX_SIZE, keep_images=None):
+    """
+    stream=True で取得したtxt2imgのレスポンスを逐次解析する
+
+    Args:
+        response (requests.Response): stream=True で送信したリクエストのレスポンス
+        chunk_size (int): 読み込む単位（バイト）
+        spool_max_size (int): 画像1枚あたりメモリ上に保持する最大バイト数
+        keep_images (set, optional): デコードする画像のインデックス（省略時は全て）
+
+    Returns:
+        dict: レスポンスの内容（"images" はファイルオブジェクトのリスト）
+    """
+    parser = Txt2ImgResponseParser(spool_max_size=spool_max_size, keep_images=keep_images)
+    try:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            parser.feed(chunk)
+    finally:
+        response.close()
+    return parser.close()
@@ -0,0 +1,269 @@
+import logging
+import random
+import threading
+import time
+
+import requests
+
+
+class CircuitBreaker:
+    """
+    バックエンド毎のサーキットブレーカー
+
+    連続して failure_threshold 回失敗すると open になり、reset_timeout 秒間はリクエストを送信しない。
+    reset_timeout 経過後は half_open となり、1件だけ試行リクエストを送信して成功すれば closed に戻る。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        """
+        Args:
+            failure_threshold (int): open にするまでの連続失敗回数
+            reset_timeout (float): open から half_open に移行するまでの秒数
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.open_count = 0  # open になった回数
+
+    @classmethod
+    def from_settings(cls, breaker_settings=None):
+        """settings.json の "circuit_breaker" セクションから作成する"""
+        breaker_settings = breaker_settings or {}
+        return cls(
+            failure_threshold=breaker_settings.get("failure_threshold", 5),
+            reset_timeout=breaker_settings.get("reset_timeout", 60)
+        )
+
+    def available(self, now=None):
+        """リクエストを送信可能かどうか（状態は変更しない）"""
+        now = now if now is not None else time.time()
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN:
+            return now - self.opened_at >= self.reset_timeout
+        return not self.trial_in_flight
+
+    def retry_after(self, now=None):
+        """リクエストを送信可能になるまでの秒数"""
+        now = now if now is not None else time.time()
+        if self.state == self.OPEN:
+            return max(0.0, self.opened_at + self.reset_timeout - now)
+        return 0.0
+
+    def before_request(self):
+        """リクエストの送信前に呼び出す（open で待機時間を過ぎていれば試行リクエストとして扱う）"""
+        if self.state != self.CLOSED:
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = True
+
+    def record_success(self):
+        """リクエストの成功を記録する"""
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.trial_in_flight = False
+
+    def record_failure(self, now=None):
+        """リクエストの失敗を記録する"""
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.open_count += 1
+            self.state = self.OPEN
+            self.opened_at = now if now is not None else time.time()
+
+
+class RetryPolicy:
+    """
+    txt2imgなどのリクエストに対するリトライポリシー
+
+    エラーを種類（5xx・タイムアウト・接続エラー・4xx・バックエンド全停止）毎に分類し、
+    リトライ対象のエラーはジッター付きの指数バックオフで再送する。
+    全てのバックエンドが停止中（サーキットオープン）の場合は、リトライ回数を消費せずに復帰を待つ。
+    """
+
+    # リトライ対象にできるエラーの種類
+    SERVER_ERROR = "server_error"
+    TIMEOUT = "timeout"
+    CONNECTION = "connection"
+    CLIENT_ERROR = "client_error"
+    CIRCUIT_OPEN = "circuit_open"
+    OTHER = "other"
+
+    def __init__(
+        self,
+        max_retries=3,
+        backoff_base=2.0,
+        backoff_max=60.0,
+        jitter=True,
+        retry_on=None,
+        max_circuit_wait=300.0,
+        logger=None,
+        sleep=time.sleep
+    ):
+        """
+        Args:
+            max_retries (int): 最大リトライ回数
+            backoff_base (float): バックオフの基準秒数（attempt回目は backoff_base * 2^attempt 秒）
+            backoff_max (float): バックオフの最大秒数
+            jitter (bool): バックオフにジッター（0〜バックオフ秒のランダム値）を使うかどうか
+            retry_on (list, optional): リトライするエラーの種類（省略時は server_error, timeout, connection）
+            max_circuit_wait (float): 全バックエンドが停止中の場合に復帰を待つ最大秒数
+            logger (logging.Logger, optional): ログ出力先
+            sleep (callable): 待機に使う関数（テスト用）
+        """
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_on = set(retry_on if retry_on is not None else [self.SERVER_ERROR, self.TIMEOUT, self.CONNECTION])
+        self.max_circuit_wait = max_circuit_wait
+        self.logger = logger or logging.getLogger(__name__)
+        self._sleep = sleep
+
+        # 失敗・リトライのカウンター
+        self._lock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "succeeded": 0,
+            "failed": 0,
+            "retries": 0,
+            "circuit_waits": 0,
+            self.SERVER_ERROR: 0,
+            self.TIMEOUT: 0,
+            self.CONNECTION: 0,
+            self.CLIENT_ERROR: 0,
+            self.OTHER: 0
+        }
+
+    @classmethod
+    def from_settings(cls, retry_settings=None, logger=None):
+        """
+        settings.json の "retry" セクションから作成する
+
+        Args:
+            retry_settings (dict, optional): "retry" セクションの設定値
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            RetryPolicy: 作成したポリシー
+        """
+        retry_settings = retry_settings or {}
+        return cls(
+            max_retries=retry_settings.get("max_retries", 3),
+            backoff_base=retry_settings.get("backoff_base", 2.0),
+            backoff_max=retry_settings.get("backoff_max", 60.0),
+            jitter=retry_settings.get("jitter", True),
+            retry_on=retry_settings.get("retry_on"),
+            max_circuit_wait=retry_settings.get("max_circuit_wait", 300.0),
+            logger=logger
+        )
+
+    @classmethod
+    def classify(cls, error):
+        """
+        例外をエラーの種類に分類する
+
+        Args:
+            error (Exception): 発生した例外
+
+        Returns:
+            str: エラーの種類
+        """
+        # NoHealthyBackendError は retry_after を持つ ConnectionError
+        if hasattr(error, "retry_after"):
+            return cls.CIRCUIT_OPEN
+        if isinstance(error, requests.exceptions.HTTPError):
+            status_code = getattr(error.response, "status_code", None)
+            if status_code is not None and status_code >= 500:
+                return cls.SERVER_ERROR
+            return cls.CLIENT_ERROR
+        if isinstance(error, requests.exceptions.Timeout):
+            return cls.TIMEOUT
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return cls.CONNECTION
+        return cls.OTHER
+
+    def get_backoff(self, attempt):
+        """
+        attempt回目（0始まり）のリトライまでの待機秒数を返す
+
+        Args:
+            attempt (int): リトライ回数
+
+        Returns:
+            float: 待機秒数
+        """
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        if self.jitter:
+            return random.uniform(0, delay)
+        return delay
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def get_stats(self):
+        """失敗・リトライのカウンターのコピーを返す"""
+        with self._lock:
+            return dict(self.stats)
+
+    def execute(self, func, description="request"):
+        """
+        リトライポリシーに従って func を実行する
+
+        Args:
+            func (callable): 実行する関数（引数なし）
+            description (str): ログに表示する処理名
+
+        Returns:
+            func の戻り値
+
+        Raises:
+            Exception: リトライ対象外のエラー、またはリトライ回数・待機時間を超えた場合の最後のエラー
+        """
+        self._count("requests")
+        attempt = 0
+        circuit_wait = 0.0
+        while True:
+            try:
+                result = func()
+            except Exception as e:
+                error_type = self.classify(e)
+
+                # 全てのバックエンドが停止中の場合は復帰を待つ（リトライ回数は消費しない）
+                if error_type == self.CIRCUIT_OPEN:
+                    wait = max(1.0, e.retry_after)
+                    if circuit_wait + wait > self.max_circuit_wait:
+                        self._count("failed")
+                        self.logger.error(f"{description}: バックエンドが {circuit_wait:.0f}秒 復帰しなかったため中止します")
+                        raise
+                    self._count("circuit_waits")
+                    self.logger.warning(f"{description}: 利用可能なバックエンドがありません。{wait:.1f}秒後に再試行します")
+                    circuit_wait += wait
+                    self._sleep(wait)
+                    continue
+
+                self._count(error_type)
+                if error_type not in self.retry_on or attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+
+                delay = self.get_backoff(attempt)
+                attempt += 1
+                self._count("retries")
+                self.logger.warning(
+                    f"{description}: {error_type} のため {delay:.1f}秒後にリトライします "
+                    f"({attempt}/{self.max_retries}): {e}"
+                )
+                self._sleep(delay)
+            else:
+                self._count("succeeded")
+                return result
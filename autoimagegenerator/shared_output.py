@@ -0,0 +1,220 @@
+import io
+import json
+import logging
+import os
+import time
+import uuid
+
+import requests
+
+
+class SharedOutputTimeout(requests.exceptions.Timeout):
+    """Web UIが保存した画像が期限内に共有フォルダに揃わなかった場合のエラー（リトライ対象のタイムアウトとして扱う）"""
+
+
+class SharedOutputImage(io.FileIO):
+    """共有フォルダから受け取った画像ファイル（閉じるとファイルを削除し、空になったジョブフォルダも削除する）"""
+
+    def close(self):
+        path = self.name if isinstance(self.name, str) else None
+        was_closed = self.closed
+        super().close()
+        if was_closed or path is None:
+            return
+        for remove in (os.remove, os.rmdir):
+            try:
+                remove(path)
+            except OSError:
+                # 他の画像が残っているジョブフォルダは、最後の画像を閉じた時に削除する
+                break
+            path = os.path.dirname(path)
+
+
+class SharedOutputHandoff:
+    """
+    Web UIと共有しているフォルダ経由でtxt2imgの画像を受け取るハンドオフ
+
+    ペイロードの override_settings でリクエスト毎のジョブフォルダを保存先に指定し、
+    save_images=True・send_images=False で送信することで、画像をBase64のJSONで転送せずにPNGファイルのまま受け取る。
+    Web UIは画像を保存してからレスポンスを返すが、NFS等ではファイルの反映が遅れる場合があるため、
+    info から分かる枚数のPNGが末尾（IENDチャンク）まで書き込まれるのを待ってから開く（完了のハンドシェイク）。
+    """
+
+    PNG_TRAILER = b"IEND\xaeB`\x82"
+
+    def __init__(self, client_dir, server_dir=None, backends=None, timeout=30, poll_interval=0.1, logger=None):
+        """
+        Args:
+            client_dir (str): このプログラムから見た共有フォルダのパス
+            server_dir (str, optional): Web UIから見た共有フォルダのパス（省略時は client_dir と同じ）
+            backends (list, optional): 共有フォルダを使用するバックエンドのURL（省略時は全て）
+            timeout (float): レスポンスを受け取ってから画像が揃うまで待つ最大秒数
+            poll_interval (float): 画像が揃ったかを確認する間隔（秒）
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.client_dir = os.path.abspath(client_dir)
+        self.server_dir = (server_dir or self.client_dir).rstrip("/\\")
+        self.backends = {url.rstrip("/") for url in backends} if backends else None
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.logger = logger or logging.getLogger(__name__)
+        os.makedirs(self.client_dir, exist_ok=True)
+
+    @classmethod
+    def from_settings(cls, handoff_settings=None, logger=None):
+        """
+        settings.json の "shared_output" セクションから作成する（無効な場合はNone）
+
+        Args:
+            handoff_settings (dict, optional): "shared_output" セクションの設定値
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            SharedOutputHandoff: 作成したハンドオフ（enabled が false または未指定の場合はNone）
+
+        Raises:
+            ValueError: enabled が true で client_dir が指定されていない場合
+        """
+        handoff_settings = handoff_settings or {}
+        if not handoff_settings.get("enabled", False):
+            return None
+        if not handoff_settings.get("client_dir"):
+            raise ValueError("shared_output.client_dir を指定してください")
+        return cls(
+            client_dir=handoff_settings["client_dir"],
+            server_dir=handoff_settings.get("server_dir"),
+            backends=handoff_settings.get("backends"),
+            timeout=handoff_settings.get("timeout", 30),
+            poll_interval=handoff_settings.get("poll_interval", 0.1),
+            logger=logger
+        )
+
+    def applies_to(self, backend_url):
+        """バックエンドが共有フォルダを使用するかどうか"""
+        return self.backends is None or backend_url.rstrip("/") in self.backends
+
+    def prepare(self, payload):
+        """
+        画像をジョブフォルダに保存してBase64で返さないペイロードを作成する
+
+        Args:
+            payload (dict): txt2imgに送信するペイロード
+
+        Returns:
+            tuple: (送信するペイロード, このプログラムから見たジョブフォルダのパス)
+        """
+        job_id = uuid.uuid4().hex
+        separator = "\\" if "\\" in self.server_dir and "/" not in self.server_dir else "/"
+        server_job_dir = f"{self.server_dir}{separator}{job_id}"
+        job_dir = os.path.join(self.client_dir, job_id)
+        os.makedirs(job_dir)
+
+        override_settings = {
+            **(payload.get("override_settings") or {}),
+            # 保存先をジョブフォルダのみにし、ファイル名を連番（00000-{seed}.png）にする
+            "outdir_samples": server_job_dir,
+            "outdir_txt2img_samples": server_job_dir,
+            "save_to_dirs": False,
+            "samples_format": "png",
+            "save_images_add_number": True,
+            "samples_filename_pattern": "[seed]",
+            "grid_save": False,
+            "save_images_before_highres_fix": False,
+            "save_images_before_face_restoration": False,
+            "save_images_before_color_correction": False,
+            "save_txt": False
+        }
+        request_payload = {
+            **payload,
+            "save_images": True,
+            "send_images": False,
+            "override_settings": override_settings,
+            "override_settings_restore_afterwards": True
+        }
+        return request_payload, job_dir
+
+    def collect(self, job_dir, r):
+        """
+        ジョブフォルダに保存された画像を開き、レスポンスの images に設定する
+
+        Args:
+            job_dir (str): prepare で作成したジョブフォルダ
+            r (dict): txt2img APIのレスポンス（images は空）
+
+        Returns:
+            dict: 画像をファイルオブジェクトにしたtxt2img APIのレスポンス
+
+        Raises:
+            SharedOutputTimeout: 期限内に画像が揃わなかった場合
+        """
+        expected = self._expected_count(r)
+        deadline = time.time() + self.timeout
+        while True:
+            paths = self._completed_images(job_dir)
+            if len(paths) >= expected:
+                break
+            if time.time() >= deadline:
+                self.discard(job_dir)
+                raise SharedOutputTimeout(
+                    f"共有フォルダに画像が揃いませんでした ({len(paths)}/{expected}枚, {self.timeout}秒): {job_dir}"
+                )
+            time.sleep(self.poll_interval)
+
+        # 画像以外に保存されたファイルは使用しない
+        for name in os.listdir(job_dir):
+            path = os.path.join(job_dir, name)
+            if path not in paths:
+                self._remove(path)
+        self.logger.debug(f"共有フォルダから画像を受け取りました: {job_dir} ({len(paths)}枚)")
+        return {**r, "images": [SharedOutputImage(path, "r") for path in paths]}
+
+    def discard(self, job_dir):
+        """失敗したリクエストのジョブフォルダを削除する"""
+        if not os.path.isdir(job_dir):
+            return
+        for name in os.listdir(job_dir):
+            self._remove(os.path.join(job_dir, name))
+        try:
+            os.rmdir(job_dir)
+        except OSError as e:
+            self.logger.warning(f"ジョブフォルダを削除できませんでした: {job_dir}: {e}")
+
+    @staticmethod
+    def _expected_count(r):
+        """レスポンスの info から保存された画像の枚数を求める（グリッド画像は保存しないため含めない）"""
+        info = r.get("info", {})
+        if isinstance(info, str):
+            try:
+                info = json.loads(info)
+            except ValueError:
+                info = {}
+        if not isinstance(info, dict):
+            info = {}
+        return max(1, len(info.get("all_prompts") or info.get("infotexts") or []))
+
+    def _completed_images(self, job_dir):
+        """末尾まで書き込まれたPNGのパスを名前順に返す"""
+        paths = []
+        for name in sorted(os.listdir(job_dir)):
+            path = os.path.join(job_dir, name)
+            if not name.lower().endswith(".png"):
+                continue
+            try:
+                with open(path, "rb") as f:
+                    f.seek(0, os.SEEK_END)
+                    if f.tell() < len(self.PNG_TRAILER):
+                        continue
+                    f.seek(-len(self.PNG_TRAILER), os.SEEK_END)
+                    if f.read() != self.PNG_TRAILER:
+                        continue
+            except OSError:
+                continue
+            paths.append(path)
+        return paths
+
+    def _remove(self, path):
+        """ファイルを削除する（失敗した場合は警告のみ）"""
+        try:
+            os.remove(path)
+        except OSError as e:
+            self.logger.warning(f"共有フォルダのファイルを削除できませんでした: {path}: {e}")
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+import base64
+import io
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from auto_image_generator import AutoImageGenerator
+
+# autoimagegenerator/prompts
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+
+def create_txt2img_response(payload, size=(8, 8), color='blue'):
+    """payloadに対応するtxt2img APIのレスポンスを作成する"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color=color).save(buffer, format='PNG')
+    infotext = f"{payload['prompt']}\nNegative prompt: {payload['negative_prompt']}\nSteps: 50, Seed: {payload['seed']}"
+    return {
+        "images": [base64.b64encode(buffer.getvalue()).decode()],
+        "info": json.dumps({"seed": payload["seed"], "all_seeds": [payload["seed"]], "infotexts": [infotext]})
+    }
+
+
+def create_generator(test_case, temp_dir, settings=None, **kwargs):
+    """
+    settings.json の代わりに settings を使用し、temp_dir に出力するテスト用のインスタンスを作成する
+
+    テストの終了時にバックエンドプールと、有効な場合はジョブジャーナル・画像エンコーダーを閉じる。
+
+    Args:
+        test_case (unittest.TestCase): 後片付けを登録するテストケース
+        temp_dir (str): 入力・出力フォルダを作成する一時フォルダ
+        settings (dict, optional): _load_settings の戻り値
+        **kwargs: AutoImageGenerator の引数（省略時は realistic/female/normal）
+
+    Returns:
+        AutoImageGenerator: 作成したインスタンス
+    """
+    options = {
+        "input_folder": os.path.join(temp_dir, "input"),
+        "output_folder": os.path.join(temp_dir, "output"),
+        "prompts_folder": PROMPTS_DIR,
+        "style": "realistic",
+        "category": "female",
+        "subcategory": "normal",
+        **kwargs
+    }
+    with patch.object(AutoImageGenerator, '_load_settings', return_value=settings or {}):
+        generator = AutoImageGenerator(**options)
+    test_case.addCleanup(generator.backend_pool.close)
+    if generator.job_journal is not None:
+        test_case.addCleanup(generator.job_journal.close)
+    if generator.image_encoder is not None:
+        test_case.addCleanup(generator.image_encoder.close)
+    return generator
+
+
+class StubWebUIHandler(BaseHTTPRequestHandler):
+    """Web UI のスタブのリクエストハンドラーの基底クラス（サブクラスで do_GET・do_POST を実装する）"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        """リクエストのJSONを読み込む（本文がない場合は空の辞書）"""
+        return json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+    def _send_json(self, data):
+        body = json.dumps(data).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_stub_server(test_case, handler, **attributes):
+    """
+    スタブサーバーをバックグラウンドで起動し、テストの終了時に停止する
+
+    Args:
+        test_case (unittest.TestCase): 後片付けを登録するテストケース
+        handler (type): StubWebUIHandler のサブクラス
+        **attributes: ハンドラーから self.server で参照するサーバーの属性
+
+    Returns:
+        ThreadingHTTPServer: 起動したサーバー（url にクライアントに指定するURLを持つ）
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    for name, value in attributes.items():
+        setattr(server, name, value)
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test_case.addCleanup(server.server_close)
+    test_case.addCleanup(server.shutdown)
+    return server
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock, patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.helpers import create_generator, create_txt2img_response
+
+
+class TestAsyncEngine(unittest.TestCase):
+    """非同期エンジン（arun/agenerate）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, output_name):
+        """テスト用のインスタンスを作成する"""
+        return create_generator(
+            self,
+            self.temp_dir,
+            image_generate_batch_execute_count=2,
+            another_version_generate_count=2,
+            output_folder=os.path.join(self.temp_dir, output_name),
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+    def collect_batch_layout(self, output_name):
+        """各バッチフォルダ内のファイル構成（相対パス）を取得する"""
+        base_path = os.path.join(self.temp_dir, output_name, "realistic", "female", "normal")
+        layouts = []
+        for batch_folder in sorted(os.listdir(base_path)):
+            batch_path = os.path.join(base_path, batch_folder)
+            files = []
+            for root, _, filenames in os.walk(batch_path):
+                files.extend(os.path.relpath(os.path.join(root, f), batch_path) for f in filenames)
+            layouts.append(sorted(files))
+        return layouts
+
+    def test_async_output_matches_sync(self):
+        """非同期エンジンと同期実行で同じフォルダ構成・JSONが出力されることをテスト"""
+        sync_generator = self.create_generator("sync")
+        with patch.object(sync_generator, 'set_model', return_value=True), \
+                patch.object(sync_generator, '_request_txt2img', side_effect=create_txt2img_response):
+            sync_generator.run()
+
+        async_generator = self.create_generator("async")
+        with patch.object(async_generator, 'set_model', return_value=True), \
+                patch.object(async_generator, '_request_txt2img', side_effect=create_txt2img_response):
+            asyncio.run(async_generator.arun(max_in_flight=3))
+
+        sync_layout = self.collect_batch_layout("sync")
+        async_layout = self.collect_batch_layout("async")
+        self.assertEqual(len(async_layout), 2)
+        self.assertEqual(sync_layout, async_layout)
+        self.assertIn("00003.json", async_layout[0])
+
+        # JSONのキー構成も同じであることを確認
+        base_path = os.path.join(self.temp_dir, "async", "realistic", "female", "normal")
+        batch_folder = sorted(os.listdir(base_path))[0]
+        with open(os.path.join(base_path, batch_folder, "00002.json"), encoding='utf-8') as f:
+            saved = json.load(f)
+        self.assertEqual(str(saved["seed"]), batch_folder.rsplit("-", 1)[-1])
+        self.assertIn("actual_prompt", saved)
+
+    def test_max_in_flight_requests(self):
+        """同時に送信されるリクエスト数が max_in_flight に保たれることをテスト"""
+        generator = self.create_generator("async")
+        lock = threading.Lock()
+        state = {"current": 0, "max": 0}
+
+        def slow_request(payload):
+            with lock:
+                state["current"] += 1
+                state["max"] = max(state["max"], state["current"])
+            time.sleep(0.05)
+            with lock:
+                state["current"] -= 1
+            return create_txt2img_response(payload)
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=slow_request):
+            asyncio.run(generator.arun(max_in_flight=2))
+
+        self.assertEqual(state["max"], 2)
+
+    def test_batch_preparation_is_bounded(self):
+        """バッチの準備が max_prepared_batches 件先までに留まり、全てのバッチが生成されることをテスト"""
+        generator = self.create_generator("async")
+        generator.IMAGE_GENERATE_BATCH_EXECUTE_COUNT = 6
+        generator.MAX_PREPARED_BATCHES = 2
+        lock = threading.Lock()
+        state = {"prepared": 0, "max": 0}
+        prepare_batch = generator._prepare_batch
+        finalize_batch = generator._finalize_batch
+
+        def counting_prepare(*args):
+            with lock:
+                state["prepared"] += 1
+                state["max"] = max(state["max"], state["prepared"])
+            return prepare_batch(*args)
+
+        def counting_finalize(*args):
+            finalize_batch(*args)
+            with lock:
+                state["prepared"] -= 1
+
+        def slow_request(payload):
+            time.sleep(0.02)
+            return create_txt2img_response(payload)
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_prepare_batch', side_effect=counting_prepare), \
+                patch.object(generator, '_finalize_batch', side_effect=counting_finalize), \
+                patch.object(generator, '_request_txt2img', side_effect=slow_request):
+            asyncio.run(generator.arun(max_in_flight=4))
+
+        self.assertEqual(state["max"], 2)
+        self.assertEqual(len(self.collect_batch_layout("async")), 6)
+
+    def test_failed_batch_waits_for_other_batches(self):
+        """バッチがエラーになった場合、他のバッチの送信前のリクエストは中止し、画像の保存が終わってから画像エンコーダーを閉じることをテスト"""
+        generator = self.create_generator("async")
+        generator.IMAGE_GENERATE_BATCH_EXECUTE_COUNT = 3
+        events = []
+        generator.image_encoder = MagicMock()
+        generator.image_encoder.close.side_effect = lambda: events.append("close")
+        prepare_batch = generator._prepare_batch
+        save_generated_images = generator._save_generated_images
+
+        def failing_prepare(current_batch, total_batches):
+            if current_batch == 2:
+                time.sleep(0.05)
+                raise RuntimeError("prepare failed")
+            return prepare_batch(current_batch, total_batches)
+
+        def slow_request(payload):
+            events.append("request")
+            time.sleep(0.2)
+            return create_txt2img_response(payload)
+
+        def recording_save(*args):
+            save_generated_images(*args)
+            events.append("save")
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_prepare_batch', side_effect=failing_prepare), \
+                patch.object(generator, '_save_generated_images', side_effect=recording_save), \
+                patch.object(generator, '_request_txt2img', side_effect=slow_request):
+            with self.assertRaises(RuntimeError):
+                asyncio.run(generator.arun(max_in_flight=1))
+
+        self.assertEqual(events, ["request", "save", "close"])
+
+
+if __name__ == '__main__':
+    unittest.main()
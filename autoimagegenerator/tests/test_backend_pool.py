@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest.mock import patch
+import requests
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend_pool import Backend, BackendPool, NoHealthyBackendError
+from tests.helpers import StubWebUIHandler, start_stub_server
+
+
+class OptionsHandler(StubWebUIHandler):
+    """/sdapi/v1/options と /sdapi/v1/txt2img のみを返すスタブ"""
+
+    def do_GET(self):
+        self._send_json({"sd_model_checkpoint": self.server.model})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path.endswith("/options"):
+            self.server.model = payload.get("sd_model_checkpoint", self.server.model)
+            self._send_json({})
+        else:
+            self.server.txt2img_count += 1
+            self._send_json({"images": [], "info": "{}"})
+
+
+class TestBackendPool(unittest.TestCase):
+    """BackendPool（複数バックエンドへの振り分け）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.pools = []
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        for pool in self.pools:
+            pool.close()
+
+    def create_pool(self, backend_settings, **settings):
+        pool = BackendPool.from_settings(backend_settings[0]["url"], {"backends": backend_settings, **settings})
+        self.pools.append(pool)
+        return pool
+
+    def start_server(self, model="model-a"):
+        server = start_stub_server(self, OptionsHandler, model=model, txt2img_count=0)
+        return server, server.url
+
+    def test_from_settings_default(self):
+        """backends が未指定の場合はデフォルトURLの1台で構成されることをテスト"""
+        pool = BackendPool.from_settings("http://localhost:7860/", {})
+        self.pools.append(pool)
+        self.assertEqual(len(pool.backends), 1)
+        self.assertEqual(pool.primary.txt2img_url, "http://localhost:7860/sdapi/v1/txt2img")
+
+    def test_least_outstanding_dispatch_with_weight(self):
+        """処理中リクエスト数 / 重み が最小のバックエンドに振り分けられることをテスト"""
+        pool = BackendPool([
+            Backend("http://backend-a", weight=1),
+            Backend("http://backend-b", weight=2)
+        ])
+        self.pools.append(pool)
+        acquired = [pool.acquire().url for _ in range(6)]
+        self.assertEqual(acquired.count("http://backend-a"), 2)
+        self.assertEqual(acquired.count("http://backend-b"), 4)
+
+        # 解放したバックエンドに次のリクエストが振り分けられる
+        pool.release(pool.backends[0])
+        self.assertEqual(pool.acquire().url, "http://backend-a")
+
+    def test_requests_spread_across_servers(self):
+        """複数のスタブサーバーにtxt2imgリクエストが分散されることをテスト"""
+        server_a, url_a = self.start_server()
+        server_b, url_b = self.start_server()
+        pool = self.create_pool([{"url": url_a}, {"url": url_b}])
+
+        leases = [pool.acquire("model-a") for _ in range(4)]
+        for backend in leases:
+            backend.client.post(backend.txt2img_url, json={"prompt": "test"}).raise_for_status()
+            pool.release(backend)
+
+        self.assertEqual(server_a.txt2img_count, 2)
+        self.assertEqual(server_b.txt2img_count, 2)
+        self.assertEqual(sum(backend.completed for backend in pool.backends), 4)
+
+    def test_prefers_backend_with_loaded_model(self):
+        """要求したモデルがロード済みのバックエンドが優先されることをテスト"""
+        _, url_a = self.start_server(model="model-a")
+        _, url_b = self.start_server(model="model-b")
+        pool = self.create_pool([{"url": url_a}, {"url": url_b}])
+        self.assertEqual(len(pool.check_all()), 2)
+
+        self.assertEqual(pool.acquire("model-b").url, url_b)
+        self.assertEqual(pool.acquire("model-b").url, url_b)
+
+    def test_backend_with_other_model_is_excluded(self):
+        """別のモデルがロード済みのバックエンドには、モデルを使用できるバックエンドが使用できない場合も振り分けないことをテスト"""
+        pool = BackendPool([Backend("http://backend-a"), Backend("http://backend-b")], health_check_interval=3600)
+        self.pools.append(pool)
+        pool.backends[0].current_model = "model-a"
+        pool.backends[1].current_model = "model-b"
+
+        pool.mark_unhealthy(pool.backends[1])
+        with self.assertRaises(NoHealthyBackendError) as context:
+            pool.acquire("model-b")
+        self.assertGreater(context.exception.retry_after, 3500)
+        # モデルを指定しない場合・ロード済みのモデルが不明な場合は振り分ける
+        self.assertEqual(pool.acquire().url, "http://backend-a")
+        pool.backends[0].current_model = None
+        self.assertEqual(pool.acquire("model-b").url, "http://backend-a")
+
+    def test_unreachable_backend_is_skipped(self):
+        """接続できないバックエンドが除外され、全滅した場合はエラーになることをテスト"""
+        _, url_a = self.start_server()
+        dead_server, dead_url = self.start_server()
+        dead_server.shutdown()
+        dead_server.server_close()
+        pool = self.create_pool([{"url": dead_url}, {"url": url_a}], health_check_interval=3600)
+
+        # 接続エラーになったバックエンドは異常としてマークされる
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            with pool.lease() as backend:
+                self.assertEqual(backend.url, dead_url)
+                backend.client.get(backend.options_url)
+        self.assertFalse(pool.backends[0].healthy)
+
+        # 以降は正常なバックエンドのみに振り分けられる
+        for _ in range(3):
+            with pool.lease() as backend:
+                self.assertEqual(backend.url, url_a)
+
+        pool.mark_unhealthy(pool.backends[1])
+        with self.assertRaises(NoHealthyBackendError):
+            pool.acquire()
+
+    def test_concurrent_acquire_rechecks_once(self):
+        """再チェック間隔を過ぎた異常なバックエンドに、同時に acquire した複数のスレッドが重複して問い合わせないことをテスト"""
+        pool = BackendPool([Backend("http://backend-a"), Backend("http://backend-b")], health_check_interval=30)
+        self.pools.append(pool)
+        pool.backends[0].healthy = False
+        pool.backends[0].last_health_check = 0
+
+        def slow_check(backend):
+            time.sleep(0.2)
+            return False
+
+        with patch.object(pool, 'check_health', side_effect=slow_check) as mock_check:
+            threads = [threading.Thread(target=pool.acquire) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        mock_check.assert_called_once_with(pool.backends[0])
+        self.assertEqual(pool.backends[1].outstanding, 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
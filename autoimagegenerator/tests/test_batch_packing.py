@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import base64
+import io
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from tests.helpers import create_generator
+
+
+def create_batch_response(payload, with_grid=False):
+    """batch_size 枚の画像を描画した txt2img API のレスポンスを作成する（Seed値は seed, seed + 1, ...）"""
+    images = []
+    infotexts = []
+    seeds = [payload["seed"] + i for i in range(payload["batch_size"])]
+    for seed in seeds:
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), color='blue').save(buffer, format='PNG')
+        images.append(base64.b64encode(buffer.getvalue()).decode())
+        infotexts.append(f"{payload['prompt']}\nNegative prompt: {payload['negative_prompt']}\nSteps: 50, Seed: {seed}")
+    if with_grid:
+        images.insert(0, images[0])
+        infotexts.insert(0, infotexts[0])
+    return {
+        "images": images,
+        "info": json.dumps({"seed": seeds[0], "all_seeds": seeds, "infotexts": infotexts})
+    }
+
+
+class TestBatchPacking(unittest.TestCase):
+    """複数のバッチを batch_size でまとめて描画するモードのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, batch_count=3, base_image_batch_size=2):
+        """テスト用のインスタンスを作成する"""
+        settings = {"base_image_batch_size": base_image_batch_size}
+        return create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=batch_count,
+            another_version_generate_count=2,
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+    def assert_batch_folders(self, expected_count):
+        """各バッチフォルダの画像・JSON・マニフェストがフォルダ名のSeed値と一致することを確認する"""
+        batch_folders = sorted(os.listdir(self.base_path))
+        self.assertEqual(len(batch_folders), expected_count)
+        for batch_folder in batch_folders:
+            folder_path = os.path.join(self.base_path, batch_folder)
+            seed = int(batch_folder.rsplit("-", 1)[-1])
+            for filename in ("00001", "00002", "00003"):
+                self.assertTrue(os.path.exists(os.path.join(folder_path, filename + ".png")))
+                with open(os.path.join(folder_path, filename + ".json"), encoding='utf-8') as f:
+                    saved = json.load(f)
+                self.assertEqual(int(saved["seed"]), seed)
+
+            # マニフェストには1枚ずつのペイロードが記録される（--repair用）
+            manifest = BatchManifest.load(folder_path)
+            self.assertEqual(manifest.get_missing_jobs(), [])
+            self.assertEqual({job["payload"]["seed"] for job in manifest.jobs}, {seed})
+            self.assertEqual({job["payload"]["batch_size"] for job in manifest.jobs}, {1})
+
+    def test_packed_batches_are_split_into_seed_folders(self):
+        """batch_size でまとめて描画した画像が {date}-{seed} のバッチフォルダ毎に保存されることをテスト"""
+        generator = self.create_generator(batch_count=3, base_image_batch_size=2)
+        payloads = []
+
+        def request(payload):
+            payloads.append(payload)
+            return create_batch_response(payload, with_grid=len(payloads) == 1)
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=request):
+            generator.run()
+
+        # バッチ1〜2を batch_size=2 で3回、バッチ3を1枚ずつ3回
+        self.assertEqual([payload["batch_size"] for payload in payloads], [2, 2, 2, 1, 1, 1])
+        self.assert_batch_folders(3)
+
+    def test_async_engine_packs_batches(self):
+        """非同期エンジンでもまとめて描画されることをテスト"""
+        generator = self.create_generator(batch_count=2, base_image_batch_size=2)
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=create_batch_response) as mock_request:
+            asyncio.run(generator.arun(max_in_flight=2))
+
+        self.assertEqual(mock_request.call_count, 3)
+        self.assert_batch_folders(2)
+
+    def test_missing_image_is_recorded_as_failed(self):
+        """レスポンスの画像が不足しているバッチのみが失敗し、他のバッチの画像は保存されることをテスト"""
+        generator = self.create_generator(batch_count=2, base_image_batch_size=2)
+
+        def request(payload):
+            r = create_batch_response(payload)
+            r["images"] = r["images"][:1]
+            return r
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=request):
+            generator.run()
+
+        # 1枚も生成できなかった2つ目のバッチフォルダは従来通り削除される
+        batch_folders = os.listdir(self.base_path)
+        self.assertEqual(len(batch_folders), 1)
+        self.assertEqual(BatchManifest.load(os.path.join(self.base_path, batch_folders[0])).get_missing_jobs(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
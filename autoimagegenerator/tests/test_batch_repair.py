@@ -0,0 +1,116 @@
+import os
+import sys
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+import requests
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from tests.helpers import create_generator, create_txt2img_response
+
+
+def create_failing_request(fail_calls):
+    """指定した回数目（1始まり）の呼び出しで500エラーになるtxt2imgのモックを作成する"""
+    state = {"calls": 0}
+
+    def request(payload):
+        state["calls"] += 1
+        if state["calls"] in fail_calls:
+            raise requests.exceptions.HTTPError("500 Server Error", response=MagicMock(status_code=500))
+        return create_txt2img_response(payload)
+    return request
+
+
+class TestBatchRepair(unittest.TestCase):
+    """一部の画像の生成失敗時の記録と --repair による再生成のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.generator = create_generator(
+            self,
+            self.temp_dir,
+            image_generate_batch_execute_count=1,
+            another_version_generate_count=2,
+            output_folder_prefix="/realistic/female/normal"
+        )
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def get_batch_folder(self):
+        folders = os.listdir(self.base_path)
+        self.assertEqual(len(folders), 1)
+        return os.path.join(self.base_path, folders[0])
+
+    def test_partial_failure_keeps_completed_images(self):
+        """1枚が失敗しても生成済みの画像は残り、マニフェストに失敗が記録されることをテスト"""
+        with patch.object(self.generator, 'set_model', return_value=True), \
+                patch.object(self.generator, '_request_txt2img', side_effect=create_failing_request({2})):
+            self.generator.run()
+
+        batch_folder = self.get_batch_folder()
+        self.assertTrue(os.path.exists(os.path.join(batch_folder, "00001.png")))
+        self.assertFalse(os.path.exists(os.path.join(batch_folder, "00002.png")))
+        self.assertTrue(os.path.exists(os.path.join(batch_folder, "00003.png")))
+
+        manifest = BatchManifest.load(batch_folder)
+        self.assertEqual(manifest.get_failed_indices(), [1])
+        self.assertIn("500", manifest.get_job("00002")["error"])
+
+    def test_repair_renders_only_missing_images(self):
+        """--repair で未生成の画像のみが保存済みのペイロードで再生成されることをテスト"""
+        with patch.object(self.generator, 'set_model', return_value=True), \
+                patch.object(self.generator, '_request_txt2img', side_effect=create_failing_request({2, 3})):
+            self.generator.run()
+
+        batch_folder = self.get_batch_folder()
+        manifest = BatchManifest.load(batch_folder)
+        failed_payloads = [manifest.get_job("00002")["payload"], manifest.get_job("00003")["payload"]]
+
+        with patch.object(self.generator, 'set_model', return_value=True), \
+                patch.object(self.generator, '_request_txt2img', side_effect=create_txt2img_response) as mock_request:
+            remaining = self.generator.repair()
+
+        self.assertEqual(remaining, {})
+        self.assertEqual([c.args[0] for c in mock_request.call_args_list], failed_payloads)
+        for filename in ["00002", "00003"]:
+            self.assertTrue(os.path.exists(os.path.join(batch_folder, filename + ".png")))
+            with open(os.path.join(batch_folder, filename + ".json"), encoding='utf-8') as f:
+                self.assertEqual(json.load(f)["seed"], manifest.data["seed"])
+        self.assertEqual(BatchManifest.load(batch_folder).get_missing_jobs(), [])
+
+        # 修復済みのバッチは再生成しない
+        with patch.object(self.generator, '_request_txt2img') as mock_request:
+            self.assertEqual(self.generator.repair(batch_folder), {})
+        mock_request.assert_not_called()
+
+    def test_all_failed_removes_folder(self):
+        """1枚も生成できなかった場合はバッチフォルダが削除されることをテスト"""
+        with patch.object(self.generator, 'set_model', return_value=True), \
+                patch.object(self.generator, '_request_txt2img', side_effect=create_failing_request({1, 2, 3})):
+            self.generator.run()
+
+        self.assertEqual(os.listdir(self.base_path), [])
+
+    def test_async_partial_failure(self):
+        """非同期エンジンでも失敗した画像のみがマニフェストに記録されることをテスト"""
+        with patch.object(self.generator, 'set_model', return_value=True), \
+                patch.object(self.generator, '_request_txt2img', side_effect=create_failing_request({3})):
+            asyncio.run(self.generator.arun(max_in_flight=1))
+
+        manifest = BatchManifest.load(self.get_batch_folder())
+        self.assertEqual(manifest.get_failed_indices(), [2])
+        self.assertEqual(len(manifest.get_missing_jobs()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
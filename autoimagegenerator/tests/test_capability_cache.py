@@ -0,0 +1,128 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend_pool import Backend
+from capability_cache import CapabilityCache, PreflightError
+from tests.helpers import StubWebUIHandler, create_generator, start_stub_server
+
+
+CAPABILITIES = {
+    "sd-models": [{
+        "title": "beautifulRealistic_v7.safetensors [bc2f30f4ad]",
+        "model_name": "beautifulRealistic_v7",
+        "filename": "/models/Stable-diffusion/beautifulRealistic_v7.safetensors"
+    }],
+    "loras": [{"name": "cars-000008", "alias": "cars-000008", "path": "/models/Lora/cars-000008.safetensors"}],
+    "upscalers": [{"name": "None"}, {"name": "4x-UltraSharp"}],
+    "samplers": [{"name": "DPM++ 2M", "aliases": ["k_dpmpp_2m"]}],
+    "scripts": {"txt2img": ["prompt matrix", "abg remover"], "img2img": []}
+}
+
+
+class CapabilityHandler(StubWebUIHandler):
+    """機能の一覧を返す Web UI のスタブ（txt2imgは呼び出された回数のみ記録する）"""
+
+    def do_GET(self):
+        endpoint = self.path.rsplit("/", 1)[-1]
+        self.server.get_count += 1
+        if endpoint in CAPABILITIES:
+            self._send_json(CAPABILITIES[endpoint])
+        else:
+            self._send_json({"sd_model_checkpoint": "beautifulRealistic_v7.safetensors"})
+
+    def do_POST(self):
+        self._read_json()
+        self.server.post_paths.append(self.path)
+        self._send_json({})
+
+
+class TestCapabilityCache(unittest.TestCase):
+    """CapabilityCache（サーバーの機能のキャッシュと事前検証）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.server = start_stub_server(self, CapabilityHandler, get_count=0, post_paths=[])
+        self.url = self.server.url
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.temp_dir, "capabilities.json")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_validate_payload(self):
+        """存在しないモデル・LoRA・アップスケーラー・サンプラー・スクリプトが検出されることをテスト"""
+        backend = Backend(self.url)
+        self.addCleanup(backend.client.close)
+        cache = CapabilityCache(self.cache_file)
+
+        valid_payload = {
+            "sd_model_checkpoint": "beautifulRealistic_v7.safetensors",
+            "sampler_name": "DPM++ 2M",
+            "enable_hr": True,
+            "hr_upscaler": "4x-UltraSharp",
+            "hr_sampler_name": "DPM++ 2M",
+            "hr_checkpoint_name": "beautifulRealistic_v7.safetensors",
+            "script_name": "ABG Remover",
+            "prompt": "car, <lora:cars-000008:0.7>"
+        }
+        self.assertEqual(cache.validate(valid_payload, backend), [])
+
+        invalid_payload = {
+            **valid_payload,
+            "sd_model_checkpoint": "beautifulRealistic_v8.safetensors",
+            "hr_upscaler": "4x-UltraSharpp",
+            "script_name": "Unknown Script",
+            "alwayson_scripts": {"Additional Networks for Generating": {"args": [True, "LoRA", [["missing.safetensors", 0.7, 0]]]}}
+        }
+        problems = cache.validate(invalid_payload, backend)
+        self.assertEqual(len(problems), 4)
+        self.assertTrue(any("beautifulRealistic_v8" in problem for problem in problems))
+        self.assertTrue(any("missing.safetensors" in problem for problem in problems))
+
+    def test_snapshot_is_cached_with_ttl(self):
+        """取得結果がTTLの間はファイルから再利用され、期限切れの場合は取得し直されることをテスト"""
+        backend = Backend(self.url)
+        self.addCleanup(backend.client.close)
+        CapabilityCache(self.cache_file, ttl=3600).get(backend)
+        self.assertEqual(self.server.get_count, len(CapabilityCache.ENDPOINTS))
+
+        # 別のインスタンスでもファイルに保存した内容を使う
+        CapabilityCache(self.cache_file, ttl=3600).get(backend)
+        self.assertEqual(self.server.get_count, len(CapabilityCache.ENDPOINTS))
+
+        CapabilityCache(self.cache_file, ttl=0).get(backend)
+        self.assertEqual(self.server.get_count, 2 * len(CapabilityCache.ENDPOINTS))
+
+    def test_invalid_job_fails_before_model_switch(self):
+        """実行できないジョブはモデルの切り替えやtxt2imgの送信前に失敗することをテスト"""
+        settings = {"capabilities": {"cache_file": self.cache_file}, "progress_monitor": {"enabled": False}}
+        generator = create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            sd_model_checkpoint="beautifulRealistic_v8.safetensors",
+            sd_model_prefix="brav7",
+            backends=[self.url]
+        )
+
+        self.assertFalse(generator.preflight())
+        with self.assertRaises(PreflightError):
+            generator._request_txt2img(generator._build_payload("test", "", 1))
+        self.assertEqual(generator.retry_policy.get_stats()["requests"], 0)
+
+        with patch.object(generator, 'set_model') as mock_set_model:
+            generator.run()
+        mock_set_model.assert_not_called()
+        self.assertEqual(self.server.post_paths, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import os
+import sys
+import threading
+import unittest
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend_pool import Backend, BackendPool
+from concurrency_controller import AIMDController
+
+
+class TestAIMDController(unittest.TestCase):
+    """AIMDController（同時リクエスト数の自動調整）のテストクラス"""
+
+    def test_additive_increase_up_to_max_limit(self):
+        """上限まで送信したリクエストが全て成功するたびに1ずつ増え、max_limit で止まることをテスト"""
+        controller = AIMDController(initial_limit=1, max_limit=3)
+        limits = []
+        for _ in range(10):
+            controller.on_success(latency=1.0, in_flight=controller.limit)
+            limits.append(controller.limit)
+
+        self.assertEqual(limits[:3], [2, 2, 3])
+        self.assertEqual(controller.limit, 3)
+        self.assertEqual([(d["from"], d["to"]) for d in controller.decisions], [(1, 2), (2, 3)])
+
+    def test_decision_history_is_bounded(self):
+        """調整の履歴は直近の history_size 件のみを残し、調整回数は全て数えることをテスト"""
+        controller = AIMDController(initial_limit=1, max_limit=4, history_size=2)
+        for _ in range(10):
+            controller.on_success(latency=1.0, in_flight=controller.limit)
+
+        self.assertEqual(controller.decision_count, 3)
+        self.assertEqual([(d["from"], d["to"]) for d in controller.decisions], [(2, 3), (3, 4)])
+
+    def test_multiplicative_decrease_on_latency_and_errors(self):
+        """1件あたりの処理時間の悪化とエラー率の上昇で半分に減り、直後の結果では続けて減らないことをテスト"""
+        controller = AIMDController(initial_limit=4, max_limit=4, error_rate_threshold=0.5, window=4)
+        controller.on_success(latency=4.0, in_flight=4)
+
+        # 1件あたり1秒 -> 3秒に悪化
+        controller.on_success(latency=3.0, in_flight=1)
+        self.assertEqual(controller.limit, 2)
+        controller.on_success(latency=3.0, in_flight=1)
+        self.assertEqual(controller.limit, 2)
+
+        controller.on_failure()
+        controller.on_failure()
+        self.assertEqual(controller.limit, 1)
+
+        # 調整の対象外の失敗（リクエスト側の問題）は数えない
+        controller.on_failure(backend_fault=False)
+        self.assertEqual(controller.error_rate, 0.5)
+
+    def test_hold_while_server_queue_is_long(self):
+        """サーバーの待ち行列が上限より長い間は増やさないことをテスト"""
+        controller = AIMDController(initial_limit=1, max_limit=4)
+        controller.observe_queue(3)
+        for _ in range(5):
+            controller.on_success(latency=1.0)
+        self.assertEqual(controller.limit, 1)
+
+        controller.observe_queue(0)
+        controller.on_success(latency=1.0)
+        self.assertEqual(controller.limit, 2)
+
+    def test_pool_waits_for_free_slot(self):
+        """同時リクエスト数の上限に達したバックエンドへの送信が、空きが出るまで待たされることをテスト"""
+        backend = Backend("http://127.0.0.1:1", concurrency=AIMDController(initial_limit=1, max_limit=1))
+        pool = BackendPool([backend])
+        self.addCleanup(pool.close)
+
+        first = pool.acquire()
+        acquired = threading.Event()
+
+        def acquire_second():
+            pool.acquire()
+            acquired.set()
+
+        threading.Thread(target=acquire_second, daemon=True).start()
+        self.assertFalse(acquired.wait(0.2))
+
+        pool.release(first, success=True, latency=0.1)
+        self.assertTrue(acquired.wait(2))
+        self.assertEqual(backend.outstanding, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
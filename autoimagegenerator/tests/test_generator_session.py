@@ -0,0 +1,91 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from auto_image_generator import AutoImageGenerator
+from generator_session import GeneratorSession
+
+
+class TestGeneratorSession(unittest.TestCase):
+    """複数のプロファイルで共有するリソース（GeneratorSession）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.prompts_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+        self.session = GeneratorSession()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.session.close()
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, subcategory):
+        """session を共有するジェネレーターを作成する"""
+        return AutoImageGenerator(
+            input_folder=os.path.join(self.temp_dir, "input"),
+            output_folder=os.path.join(self.temp_dir, "output"),
+            prompts_folder=self.prompts_dir,
+            output_folder_prefix=f"/realistic/female/{subcategory}",
+            style="realistic",
+            category="female",
+            subcategory=subcategory,
+            is_selfie=subcategory == "selfie",
+            session=self.session
+        )
+
+    def test_profiles_share_transport_and_model_residency(self):
+        """同じ session のジェネレーターが接続プール・バックエンドプール・ロード済みのモデルを共有することをテスト"""
+        with patch.object(AutoImageGenerator, '_load_settings', return_value={}) as mock_load_settings:
+            first = self.create_generator("normal")
+            second = self.create_generator("selfie")
+
+        # settings.json は最初のジェネレーターでのみ読み込む
+        mock_load_settings.assert_called_once()
+        self.assertIs(second.settings, first.settings)
+        self.assertIs(second.client, first.client)
+        self.assertIs(second.backend_pool, first.backend_pool)
+        self.assertIs(second.model_load_times, first.model_load_times)
+
+        # 前のプロファイルでロードしたモデルは切り替えずに使用する
+        first.backend_pool.primary.current_model = "brav7.safetensors"
+        with patch.object(second, '_switch_model') as mock_switch:
+            self.assertTrue(second.set_model("brav7.safetensors"))
+        mock_switch.assert_not_called()
+
+        # session を閉じると共有しているリソースを全て破棄する
+        self.session.close()
+        self.assertEqual(self.session.get_stats()["resources"], 0)
+
+    def test_prompt_files_and_output_tree_are_cached(self):
+        """プロンプトファイルの読み込みと出力ディレクトリの作成が1回だけ行われることをテスト"""
+        with patch.object(AutoImageGenerator, '_load_settings', return_value={}):
+            first = self.create_generator("normal")
+            # 出力ディレクトリ構造は最初のジェネレーターでのみ作成する
+            with patch.object(self.session, 'claim_output_tree', wraps=self.session.claim_output_tree) as mock_claim, \
+                    patch('os.makedirs') as mock_makedirs:
+                second = self.create_generator("normal")
+        mock_claim.assert_called_once()
+        mock_makedirs.assert_not_called()
+
+        first.generate_prompts()
+        misses = self.session.get_stats()["prompt_cache_misses"]
+        self.assertGreater(misses, 0)
+
+        # 2つ目のジェネレーターはキャッシュを使用し、読み込んだ内容は別のオブジェクトになる
+        second.generate_prompts()
+        stats = self.session.get_stats()
+        self.assertEqual(stats["prompt_cache_misses"], misses)
+        self.assertEqual(stats["prompt_cache_hits"], misses)
+        self.assertEqual(second.DATA_NEGATIVE, first.DATA_NEGATIVE)
+        self.assertIsNot(second.DATA_NEGATIVE, first.DATA_NEGATIVE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from image_encoder import ImageEncoder, save_target
+from tests.helpers import create_generator, create_txt2img_response
+
+
+class TestImageEncoder(unittest.TestCase):
+    """派生画像をプロセスプールでエンコードするサービスのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_encode_matches_inline_save(self):
+        """ワーカープロセスで保存した派生画像が、このプロセスで保存した場合と同じ内容になることをテスト"""
+        image = Image.new('RGBA', (40, 30), color=(10, 200, 30, 128))
+        sample_path = os.path.join(self.temp_dir, "sample.png")
+        Image.new('RGBA', (10, 10), color=(255, 0, 0, 64)).save(sample_path)
+
+        def build_targets(root):
+            return [
+                {"path": os.path.join(root, "image.png"), "pnginfo": {"parameters": "prompt\nSteps: 20"}},
+                {"path": os.path.join(root, "image.jpg"), "format": "JPEG", "convert": "RGB"},
+                {"path": os.path.join(root, "sample", "image-with-sample-text.png"),
+                 "watermark": {"image": sample_path, "offset": 10, "min_font_size": 10}},
+                {"path": os.path.join(root, "sample-thumbnail", "image-thumbnail-with-sample-text.png"),
+                 "size": (10, 7), "watermark": {"image": None, "offset": 5, "min_font_size": 5}},
+                {"path": os.path.join(root, "half-resolution", "image-half-resolution.png"),
+                 "size": (20, 15), "resample": Image.LANCZOS}
+            ]
+
+        inline_targets = build_targets(os.path.join(self.temp_dir, "inline"))
+        for target in inline_targets:
+            save_target(image, target)
+
+        with ImageEncoder(processes=2) as encoder:
+            pool_targets = build_targets(os.path.join(self.temp_dir, "pool"))
+            paths = encoder.encode(image, pool_targets)
+
+        self.assertEqual(paths, [target["path"] for target in pool_targets])
+        for inline_target, pool_target in zip(inline_targets, pool_targets):
+            with Image.open(inline_target["path"]) as expected, Image.open(pool_target["path"]) as actual:
+                self.assertEqual(actual.size, expected.size)
+                self.assertEqual(actual.mode, expected.mode)
+                self.assertEqual(actual.tobytes(), expected.tobytes())
+        with Image.open(pool_targets[0]["path"]) as saved_image:
+            self.assertEqual(saved_image.info["parameters"], "prompt\nSteps: 20")
+
+    def test_generator_saves_derivatives_with_encoder(self):
+        """image_encoder を有効にした場合も、派生画像が従来と同じファイル名・フォルダに保存されることをテスト"""
+        settings = {"image_encoder": {"enabled": True, "processes": 2}}
+        generator = create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=1,
+            another_version_generate_count=0,
+            output_folder_prefix="/realistic/female/normal",
+            enable_hr=True
+        )
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=lambda payload: create_txt2img_response(payload, size=(64, 48))):
+            result_images = generator._generate_images(1, 1)
+
+        self.assertEqual(len(result_images), 1)
+        filename, result = next(iter(result_images.items()))
+        folder_path = os.path.dirname(result["path"])
+        expected_files = [
+            (filename + ".png", (64, 48)),
+            (filename + ".jpg", (64, 48)),
+            (os.path.join("sample", filename + "-with-sample-text.png"), (64, 48)),
+            (os.path.join("thumbnail", filename + "-thumbnail.png"), (16, 12)),
+            (os.path.join("sample-thumbnail", filename + "-thumbnail-with-sample-text.png"), (16, 12)),
+            (os.path.join("half-resolution", filename + "-half-resolution.png"), (32, 24))
+        ]
+        for relative_path, size in expected_files:
+            with Image.open(os.path.join(folder_path, relative_path)) as saved_image:
+                self.assertEqual(saved_image.size, size, relative_path)
+        with Image.open(result["path"]) as saved_image:
+            self.assertIn("Seed:", saved_image.info["parameters"])
+
+
+if __name__ == '__main__':
+    unittest.main()
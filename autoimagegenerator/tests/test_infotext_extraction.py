@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import base64
+import io
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.helpers import create_generator
+
+
+def create_png_base64(color='red'):
+    """テスト用の1x1 PNG画像をBase64文字列で作成する"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1), color=color).save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+class TestInfotextExtraction(unittest.TestCase):
+    """txt2imgレスポンスの info からPNGInfoを取得する処理のテストクラス"""
+
+    INFOTEXT = "test prompt\nNegative prompt: test negative\nSteps: 50, Sampler: DPM++ 2M, CFG scale: 7, Seed: 1234567890, Size: 512x768"
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.generator = create_generator(self, self.temp_dir)
+        self.response = {
+            "images": [create_png_base64()],
+            "info": json.dumps({
+                "seed": 1234567890,
+                "all_seeds": [1234567890],
+                "infotexts": [self.INFOTEXT]
+            })
+        }
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_extract_infotext_from_response(self):
+        """/png-info APIを呼び出さずに info からPNGInfoを取得できることをテスト"""
+        with patch.object(self.generator.client, 'post') as mock_post:
+            info_text = self.generator._extract_infotext(self.response, self.response["images"][0], {})
+        mock_post.assert_not_called()
+        self.assertEqual(info_text, self.INFOTEXT)
+        self.assertEqual(self.generator._get_seed_from_info(self.response, info_text), 1234567890)
+
+    def test_png_info_api_fallback(self):
+        """use_png_info_api が有効な場合のみ /png-info APIにフォールバックすることをテスト"""
+        response = {"images": self.response["images"], "info": json.dumps({"seed": 1234567890})}
+        png_info_response = MagicMock(status_code=200)
+        png_info_response.json.return_value = {"info": self.INFOTEXT}
+
+        # 無効の場合はpayloadからデフォルトのPNGInfoを生成
+        with patch.object(self.generator.client, 'post', return_value=png_info_response) as mock_post:
+            info_text = self.generator._extract_infotext(response, response["images"][0], {"prompt": "payload prompt", "seed": 1})
+        mock_post.assert_not_called()
+        self.assertTrue(info_text.startswith("payload prompt"))
+
+        # 有効の場合は /png-info APIを呼び出す
+        self.generator.USE_PNG_INFO_API = True
+        with patch.object(self.generator.client, 'post', return_value=png_info_response) as mock_post:
+            info_text = self.generator._extract_infotext(response, response["images"][0], {})
+        mock_post.assert_called_once()
+        self.assertEqual(info_text, self.INFOTEXT)
+
+    def test_generate_single_image_uses_single_request(self):
+        """画像1枚の生成でtxt2imgのリクエストのみが送信され、JSONにPNGInfoが保存されることをテスト"""
+        txt2img_response = MagicMock(status_code=200)
+        txt2img_response.iter_content.return_value = [json.dumps(self.response).encode()]
+        output_folder_path = os.path.join(self.temp_dir, "output", "batch")
+        for subfolder in ["thumbnail", "sample", "sample-thumbnail", "half-resolution"]:
+            os.makedirs(os.path.join(output_folder_path, subfolder), exist_ok=True)
+        prompt_info = {
+            "positive_base_prompt_dict": {},
+            "positive_pose_prompt_dict": {},
+            "positive_optional_prompt_dict": {},
+            "negative_prompt_dict": {},
+            "cancel_prompts": []
+        }
+
+        with patch.object(self.generator.client, 'post', return_value=txt2img_response) as mock_post:
+            self.generator._generate_single_image({"prompt": "test prompt"}, output_folder_path, "00001", {}, prompt_info)
+
+        self.assertEqual(mock_post.call_count, 1)
+        self.assertEqual(mock_post.call_args[0][0], self.generator.TXT2IMG_URL)
+        with open(os.path.join(output_folder_path, "00001.json"), encoding='utf-8') as f:
+            saved = json.load(f)
+        self.assertEqual(saved["actual_prompt"], "test prompt")
+        # PNGInfoのキーは「Negative prompt」のため、従来通り actual_negative_prompt は保存されない
+        self.assertNotIn("actual_negative_prompt", saved)
+        self.assertEqual(saved["seed"], 1234567890)
+        with Image.open(os.path.join(output_folder_path, "00001.png")) as saved_image:
+            self.assertEqual(saved_image.info["parameters"], self.INFOTEXT)
+
+
+if __name__ == '__main__':
+    unittest.main()
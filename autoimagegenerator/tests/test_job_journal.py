@@ -0,0 +1,116 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from job_journal import JobJournal
+from tests.helpers import create_generator, create_txt2img_response
+
+
+class TestJobJournal(unittest.TestCase):
+    """SQLiteのジョブジャーナルと --resume による再開のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self):
+        """一時フォルダに出力するジェネレーターを作成する（中断時の状態を確定させるため保存は送信したスレッドで行う）"""
+        settings = {"post_process": {"enabled": False}, "job_journal": {"enabled": True}}
+        return create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=3,
+            another_version_generate_count=1,
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+    def test_resume_generates_only_unfinished_images(self):
+        """中断した実行を再開すると、完了していない画像と未着手のバッチのみを生成することをテスト"""
+        generator = self.create_generator()
+        generator.run_options = {"style": "realistic", "category": "female"}
+        sent_payloads = []
+
+        def crashing_request(payload):
+            sent_payloads.append(payload)
+            if len(sent_payloads) == 2:
+                raise RuntimeError("Web UIが応答しません")
+            if len(sent_payloads) == 4:
+                # バッチ2の別バージョンの画像の描画中にプロセスが停止
+                raise KeyboardInterrupt
+            return create_txt2img_response(payload)
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, 'preflight', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=crashing_request):
+            with self.assertRaises(KeyboardInterrupt):
+                generator.run()
+
+        run_id = generator.run_id
+        journal = generator.job_journal
+        run = journal.get_run(run_id)
+        self.assertEqual((run["status"], run["total_batches"]), (JobJournal.IN_FLIGHT, 3))
+        self.assertEqual(run["options"], {"style": "realistic", "category": "female"})
+        self.assertEqual([batch["batch"] for batch in journal.get_batches(run_id)], [1, 2])
+        self.assertEqual(
+            [job["status"] for job in journal.get_jobs(run_id, 1)],
+            [JobJournal.DONE, JobJournal.FAILED]
+        )
+        self.assertEqual(
+            [job["status"] for job in journal.get_jobs(run_id, 2)],
+            [JobJournal.DONE, JobJournal.IN_FLIGHT]
+        )
+        unfinished_payloads = [sent_payloads[1], sent_payloads[3]]
+
+        # 新しいプロセスで再開
+        resumed = self.create_generator()
+        resumed_payloads = []
+
+        def request(payload):
+            resumed_payloads.append(payload)
+            return create_txt2img_response(payload)
+
+        with patch.object(resumed, 'set_model', return_value=True), \
+                patch.object(resumed, 'preflight', return_value=True), \
+                patch.object(resumed, '_request_txt2img', side_effect=request):
+            self.assertEqual(resumed.resume(run_id), JobJournal.DONE)
+
+        # 未完了の画像は記録済みのペイロードで、未着手のバッチ3は通常通り生成する
+        self.assertEqual(len(resumed_payloads), 4)
+        self.assertEqual(resumed_payloads[:2], unfinished_payloads)
+        self.assertEqual(resumed_payloads[2]["seed"], resumed_payloads[3]["seed"])
+
+        journal = resumed.job_journal
+        self.assertEqual(journal.get_run(run_id)["status"], JobJournal.DONE)
+        self.assertEqual(journal.get_summary(run_id), {JobJournal.DONE: 6})
+        for batch in journal.get_batches(run_id):
+            self.assertEqual(batch["status"], JobJournal.DONE)
+            self.assertEqual(BatchManifest.load(batch["folder_path"]).get_missing_jobs(), [])
+            for job in journal.get_jobs(run_id, batch["batch"]):
+                self.assertTrue(os.path.exists(job["output_path"]))
+
+        # 完了した実行を再開しても何も生成しない
+        with patch.object(resumed, '_request_txt2img') as mock_request:
+            self.assertEqual(resumed.resume(run_id), JobJournal.DONE)
+        mock_request.assert_not_called()
+
+    def test_resume_unknown_run(self):
+        """存在しない実行IDを指定した場合はエラーになることをテスト"""
+        generator = self.create_generator()
+        with self.assertRaises(ValueError):
+            generator.resume("20240101-000000-unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
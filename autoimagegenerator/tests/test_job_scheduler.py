@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import unittest
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend_pool import Backend
+from job_scheduler import JobScheduler
+from model_load_times import ModelLoadTimes
+from main import load_jobs, create_job, SD_MODEL_CHECKPOINTS
+
+
+def create_backend(url, current_model=None, weight=1):
+    """ロード済みのモデルを指定したバックエンドを作成する"""
+    backend = Backend(url, weight=weight)
+    backend.current_model = current_model
+    return backend
+
+
+class TestJobScheduler(unittest.TestCase):
+    """JobScheduler（モデルの切り替えを最小にするジョブの並べ替え）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.backends = []
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        for backend in self.backends:
+            backend.client.close()
+
+    def backend(self, url, current_model=None, weight=1):
+        backend = create_backend(url, current_model, weight)
+        self.backends.append(backend)
+        return backend
+
+    def test_group_by_checkpoint_and_lora(self):
+        """交互に並んだジョブがチェックポイント毎にまとめられ、ロード済みのモデルから実行されることをテスト"""
+        jobs = [
+            {"name": "female", "checkpoint": "A", "images": 10},
+            {"name": "animal", "checkpoint": "B", "images": 10},
+            {"name": "car", "checkpoint": "C", "lora": "cars", "images": 10},
+            {"name": "female2", "checkpoint": "A", "images": 10},
+            {"name": "plain", "checkpoint": "C", "images": 10},
+        ]
+        backend = self.backend("http://a", current_model="B")
+        schedule = JobScheduler(default_load_time=30).plan(jobs, [backend])
+
+        names = [job["name"] for job in schedule["http://a"]]
+        self.assertEqual(names, ["animal", "female", "female2", "plain", "car"])
+
+    def test_model_residency_across_backends(self):
+        """各チェックポイントがロード済みのバックエンドに割り当てられることをテスト"""
+        jobs = [{"name": f"{checkpoint}{i}", "checkpoint": checkpoint, "images": 5} for i in range(3) for checkpoint in "AB"]
+        backend_a = self.backend("http://a", current_model="A")
+        backend_b = self.backend("http://b", current_model="B")
+        schedule = JobScheduler(default_load_time=100, seconds_per_image=1).plan(jobs, [backend_a, backend_b])
+
+        self.assertEqual({job["checkpoint"] for job in schedule["http://a"]}, {"A"})
+        self.assertEqual({job["checkpoint"] for job in schedule["http://b"]}, {"B"})
+
+    def test_large_group_spreads_when_load_is_cheap(self):
+        """ロード時間の実績が短い場合は、処理時間の長いチェックポイントを複数のバックエンドで分担することをテスト"""
+        load_times = ModelLoadTimes()
+        load_times.record("A", 2)
+        jobs = [{"name": f"A{i}", "checkpoint": "A", "images": 10} for i in range(4)]
+        backend_a = self.backend("http://a", current_model="A")
+        backend_b = self.backend("http://b", current_model="B")
+        schedule = JobScheduler(load_times=load_times, default_load_time=1000, seconds_per_image=1).plan(jobs, [backend_a, backend_b])
+
+        self.assertEqual(len(schedule["http://a"]), 2)
+        self.assertEqual(len(schedule["http://b"]), 2)
+
+    def test_execute_runs_in_planned_order(self):
+        """バックエンド毎に計画した順序でジョブが実行され、失敗したジョブが記録されることをテスト"""
+        schedule = {
+            "http://a": [{"name": "1", "checkpoint": "A"}, {"name": "2", "checkpoint": "A"}],
+            "http://b": [{"name": "3", "checkpoint": "B"}],
+        }
+        executed = []
+
+        def run_job(job, url):
+            executed.append((url, job["name"]))
+            if job["name"] == "2":
+                raise RuntimeError("failed")
+
+        results = JobScheduler().execute(schedule, run_job)
+
+        self.assertEqual([name for url, name in executed if url == "http://a"], ["1", "2"])
+        self.assertEqual({job["name"]: success for job, success in results}, {"1": True, "2": False, "3": True})
+
+    def test_load_jobs_resolves_checkpoints(self):
+        """ジョブファイルのプロファイルからチェックポイントとLoRAが解決されることをテスト"""
+        job_settings = [
+            {"style": "realistic", "category": "female", "subcategory": "normal", "model": "brav7", "count": 3},
+            {"style": "realistic", "category": "male", "subcategory": "normal"},
+            {"style": "realistic", "category": "vehicle", "subcategory": "car", "lora_name": "cars-000008"},
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(job_settings, f)
+        self.addCleanup(os.remove, f.name)
+        args = argparse.Namespace(
+            style=None, category=None, subcategory=None, model=None, model_checkpoint=None,
+            use_lora=False, lora_name=None, enable_hr="true", width=None, height=None
+        )
+
+        jobs = load_jobs(f.name, args)
+
+        # brav7 と brav7_men は同じチェックポイントとしてまとめられる
+        self.assertEqual(jobs[0]["checkpoint"], SD_MODEL_CHECKPOINTS["brav7"])
+        self.assertEqual(jobs[1]["checkpoint"], SD_MODEL_CHECKPOINTS["brav7"])
+        self.assertEqual(jobs[0]["args"].count, 3)
+        self.assertEqual(jobs[2]["checkpoint"], SD_MODEL_CHECKPOINTS["sd_xl_base_1.0"])
+        self.assertEqual(jobs[2]["lora"], "cars-000008")
+        self.assertIsNone(jobs[0]["lora"])
+
+        with open(f.name, "w") as invalid_file:
+            json.dump([{"style": "realistic", "category": "female", "model": "unknown"}], invalid_file)
+        with self.assertRaises(ValueError):
+            load_jobs(f.name, args)
+
+    def test_load_jobs_manifest_defaults(self):
+        """マニフェスト形式のジョブファイルで、プロファイルで省略した項目に defaults の値が使われることをテスト"""
+        manifest = {
+            "defaults": {"style": "realistic", "count": 2, "enable_hr": False},
+            "profiles": [
+                {"category": "female", "subcategory": "normal"},
+                {"category": "male", "subcategory": "normal", "count": 5},
+            ]
+        }
+        with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+            json.dump(manifest, f)
+        self.addCleanup(os.remove, f.name)
+        args = argparse.Namespace(
+            style=None, category=None, subcategory=None, model=None, model_checkpoint=None,
+            use_lora=False, lora_name=None, enable_hr="true", width=None, height=None
+        )
+
+        jobs = load_jobs(f.name, args)
+
+        self.assertEqual([job["args"].category for job in jobs], ["female", "male"])
+        self.assertEqual([job["args"].count for job in jobs], [2, 5])
+        self.assertEqual({job["args"].enable_hr for job in jobs}, {"false"})
+
+    def test_create_job_validates_options(self):
+        """ジョブの指定が起動オプションと同じ型に変換され、不正な項目・値はエラーになることをテスト"""
+        args = argparse.Namespace(
+            style=None, category=None, subcategory=None, model=None, model_checkpoint=None,
+            use_lora=False, lora_name=None, enable_hr="true", width=None, height=None, jobs=None
+        )
+        profile = {"style": "realistic", "category": "female", "subcategory": "normal"}
+
+        job = create_job({**profile, "width": "768", "enable-hr": False}, args, "#1")
+        self.assertEqual((job["args"].width, job["args"].enable_hr), (768, "false"))
+
+        for invalid in ({"width": "abc"}, {"width": 1.5}, {"style": "anime"}, {"use_lora": "yes"},
+                        {"count": True}, {"jobs": "jobs.json"}, {"repair": ""}):
+            with self.subTest(invalid=invalid), self.assertRaises(ValueError):
+                create_job({**profile, **invalid}, args, "#1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+import requests
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from backend_pool import Backend
+from job_journal import JobJournal
+from job_scheduler import JobScheduler
+from job_server import JobServer
+from tests.helpers import create_generator, create_txt2img_response
+
+
+def build_job(job_setting, label):
+    """テスト用のジョブを作成する（style が未指定の場合は不正なジョブとする）"""
+    if not job_setting.get("style"):
+        raise ValueError(f"ジョブ {label}: style と category は必須です")
+    if job_setting["style"] == "broken":
+        raise RuntimeError("unexpected")
+    return {
+        "name": f"{label} {job_setting['style']}",
+        "args": job_setting,
+        "checkpoint": job_setting.get("checkpoint", "model.safetensors"),
+        "lora": None,
+        "images": job_setting.get("count", 1)
+    }
+
+
+def stream_events(server, job_id):
+    """ジョブが終了するまでのイベントを /events/stream から受信する"""
+    response = requests.get(f"{server.url}/events/stream", params={"job_id": job_id}, stream=True, timeout=10)
+    response.raise_for_status()
+    with response:
+        return [json.loads(line) for line in response.iter_lines() if line]
+
+
+class FakeGenerator:
+    """バッチ毎に gate が開くまで待つジェネレーターのスタブ"""
+
+    def __init__(self, job, gate):
+        self.job = job
+        self.count = job["args"].get("count", 1)
+        self.gate = gate
+        self.cancelled = threading.Event()
+        self.on_batch_finished = None
+        self.run_id = None
+        self.job_journal = None
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def run(self):
+        for batch in range(1, self.count + 1):
+            if self.cancelled.is_set():
+                break
+            self.gate.wait(5)
+            self.on_batch_finished({
+                "batch": batch, "total_batches": self.count, "images": 1, "missing": self.job["args"].get("missing", 0)
+            })
+
+
+class TestJobServer(unittest.TestCase):
+    """常駐デーモンのジョブ投入APIのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.gate = threading.Event()
+        self.generators = []
+        self.backends = [Backend("http://a")]
+
+        def create_generator(job, backend_url):
+            generator = FakeGenerator(job, self.gate)
+            self.generators.append(generator)
+            return generator
+
+        self.server = JobServer(JobScheduler(), self.backends, build_job, create_generator, port=0).start()
+        self.addCleanup(self.server.stop)
+        # ジョブが残っていても終了できるよう、停止前に待機中のジョブを進める
+        self.addCleanup(self.gate.set)
+
+    def test_submit_and_stream_events(self):
+        """投入したジョブがスケジューラーで実行され、完了までのイベントを受信できることをテスト"""
+        response = requests.post(f"{self.server.url}/jobs", json={
+            "profile": {"style": "realistic", "checkpoint": "other.safetensors"},
+            "count": 2
+        }, timeout=5)
+        self.assertEqual(response.status_code, 201)
+        job_id = response.json()["id"]
+        self.assertEqual(response.json()["images"], 2)
+
+        self.gate.set()
+        events = stream_events(self.server, job_id)
+
+        self.assertEqual(
+            [event["event"] for event in events],
+            ["queued", "started", "batch_finished", "batch_finished", JobServer.DONE]
+        )
+        self.assertEqual([event["batch"] for event in events if event["event"] == "batch_finished"], [1, 2])
+        job = requests.get(f"{self.server.url}/jobs/{job_id}", timeout=5).json()
+        self.assertEqual((job["status"], job["backend"], job["batches_finished"]), (JobServer.DONE, "http://a", 2))
+
+        # 次の実行計画ではロード済みのチェックポイントとして扱う
+        self.assertEqual(self.backends[0].current_model, "other.safetensors")
+        status = requests.get(f"{self.server.url}/status", timeout=5).json()
+        self.assertEqual(status["jobs"], {JobServer.DONE: 1})
+
+    def test_cancel_running_and_queued_jobs(self):
+        """実行中のジョブは処理中のバッチの完了後に、実行待ちのジョブはすぐに中止されることをテスト"""
+        running_id = self.server.submit({"style": "realistic", "count": 3})["id"]
+        self.server.get_events(job_id=running_id, since=1, timeout=5)
+        queued_id = self.server.submit({"style": "illustration"})["id"]
+
+        response = requests.post(f"{self.server.url}/jobs/{queued_id}/cancel", timeout=5)
+        self.assertEqual(response.json()["status"], JobServer.CANCELLED)
+        self.assertEqual(requests.post(f"{self.server.url}/jobs/{running_id}/cancel", timeout=5).status_code, 200)
+        self.gate.set()
+        events = stream_events(self.server, running_id)
+
+        self.assertEqual([event["event"] for event in events][-2:], ["batch_finished", JobServer.CANCELLED])
+        self.assertEqual(self.server.get_job(running_id)["batches_finished"], 1)
+        # 中止したジョブのジェネレーターは作成しない
+        self.assertEqual(len(self.generators), 1)
+        self.assertEqual(requests.post(f"{self.server.url}/jobs/{queued_id}/cancel", timeout=5).status_code, 409)
+
+    def test_missing_images_fail_job(self):
+        """ジョブジャーナルが無効でも、未生成の画像が通知されたジョブは失敗とし、チェックポイントを記録しないことをテスト"""
+        job_id = self.server.submit({"style": "realistic", "checkpoint": "other.safetensors", "missing": 1})["id"]
+        self.gate.set()
+        events = stream_events(self.server, job_id)
+
+        self.assertEqual(events[-1]["event"], JobServer.FAILED)
+        self.assertEqual(self.server.get_job(job_id)["images_missing"], 1)
+        self.assertIsNone(self.backends[0].current_model)
+
+    def test_invalid_requests(self):
+        """不正なジョブ・存在しないジョブはエラーになることをテスト"""
+        response = requests.post(f"{self.server.url}/jobs", json={"profile": {"category": "female"}}, timeout=5)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("style", response.json()["detail"])
+        response = requests.post(f"{self.server.url}/jobs", json={"style": "broken"}, timeout=5)
+        self.assertEqual((response.status_code, response.json()["error"]), (500, "JobServerError"))
+        self.assertEqual(requests.get(f"{self.server.url}/jobs/unknown", timeout=5).status_code, 404)
+        self.assertEqual(requests.get(f"{self.server.url}/events/stream?job_id=unknown", timeout=5).status_code, 404)
+        self.assertEqual(requests.get(f"{self.server.url}/jobs", timeout=5).json(), {"jobs": []})
+
+
+class TestJobServerWithGenerator(unittest.TestCase):
+    """AutoImageGenerator を実行するジョブの状態のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.backends = [Backend("http://a")]
+
+    def test_preflight_failure_without_journal(self):
+        """ジョブジャーナルが無効な場合も、事前検証に失敗して中止したジョブは失敗になることをテスト"""
+        generators = []
+
+        def create_job_generator(job, backend_url):
+            generator = create_generator(self, self.temp_dir, {"post_process": {"enabled": False}})
+            self.assertIsNone(generator.job_journal)
+            generators.append(generator)
+            return generator
+
+        def run_generator(generator):
+            with patch.object(generator, 'preflight', return_value=False):
+                generator.run()
+
+        server = JobServer(JobScheduler(), self.backends, build_job, create_job_generator, run_generator, port=0).start()
+        self.addCleanup(server.stop)
+        job_id = server.submit({"style": "realistic", "checkpoint": "other.safetensors"})["id"]
+        events = stream_events(server, job_id)
+
+        self.assertEqual(events[-1]["event"], JobServer.FAILED)
+        self.assertTrue(generators[0].aborted)
+        # 失敗したジョブのチェックポイントはロード済みとして扱わない
+        self.assertIsNone(self.backends[0].current_model)
+
+
+class TestGeneratorCancel(unittest.TestCase):
+    """AutoImageGenerator.cancel() による中止のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_cancel_stops_before_next_batch(self):
+        """中止を要求すると処理中のバッチの完了後に終了し、ジョブジャーナルに未完了として記録されることをテスト"""
+        settings = {"post_process": {"enabled": False}, "job_journal": {"enabled": True}}
+        generator = create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=3,
+            another_version_generate_count=0,
+            output_folder_prefix="/realistic/female/normal"
+        )
+        finished_batches = []
+
+        def on_batch_finished(result):
+            finished_batches.append(result["batch"])
+            generator.cancel()
+
+        generator.on_batch_finished = on_batch_finished
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, 'preflight', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=create_txt2img_response):
+            generator.run()
+
+        self.assertEqual(finished_batches, [1])
+        run = generator.job_journal.get_run(generator.run_id)
+        self.assertEqual(run["status"], JobJournal.FAILED)
+        self.assertEqual([batch["batch"] for batch in generator.job_journal.get_batches(generator.run_id)], [1])
+
+
+if __name__ == '__main__':
+    unittest.main()
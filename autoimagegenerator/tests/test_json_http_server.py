@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+import requests
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from json_http_server import JsonHTTPError, JsonHTTPServer
+
+
+class EchoServer(JsonHTTPServer):
+    """/echo はリクエストのJSONを返し、/error・/crash はエラーを送出するテスト用のサーバー"""
+
+    def route(self, handler, method, path, query, body):
+        if path == "/echo":
+            return 200, {"method": method, "query": query, "body": body}
+        if path == "/error":
+            raise JsonHTTPError(409, "conflict")
+        if path == "/crash":
+            raise RuntimeError("unexpected")
+        return super().route(handler, method, path, query, body)
+
+
+class TestJsonHTTPServer(unittest.TestCase):
+    """JsonHTTPServer（JSONのHTTPサーバーの基底クラス）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.server = EchoServer("127.0.0.1", 0).start()
+        self.addCleanup(self.server.stop)
+
+    def test_route_and_errors(self):
+        """ルーティングの結果・エラー・不正なJSON・予期しない例外がJSONのレスポンスになることをテスト"""
+        response = requests.post(f"{self.server.url}/echo/?a=1", json={"key": "value"}, timeout=5)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"method": "POST", "query": {"a": ["1"]}, "body": {"key": "value"}})
+
+        response = requests.get(f"{self.server.url}/error", timeout=5)
+        self.assertEqual((response.status_code, response.json()), (409, {"error": "JsonHTTPError", "detail": "conflict"}))
+        self.assertEqual(requests.get(f"{self.server.url}/unknown", timeout=5).status_code, 404)
+        self.assertEqual(requests.post(f"{self.server.url}/echo", data=b"{", timeout=5).status_code, 400)
+
+        response = requests.get(f"{self.server.url}/crash", timeout=5)
+        self.assertEqual((response.status_code, response.json()["error"]), (500, "RuntimeError"))
+
+
+if __name__ == '__main__':
+    unittest.main()
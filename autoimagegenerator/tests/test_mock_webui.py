@@ -0,0 +1,153 @@
+import os
+import sys
+import json
+import base64
+import io
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import requests
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from mock_webui import MockWebUIServer
+from tests.helpers import create_generator
+
+
+class TestMockWebUI(unittest.TestCase):
+    """ローカルのモックWeb UIサーバーのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def start_server(self, **kwargs):
+        """テスト用のモックサーバーを起動する"""
+        server = MockWebUIServer(models=["initial.safetensors", "mock.safetensors"], seed=0, **kwargs).start()
+        self.addCleanup(server.stop)
+        return server
+
+    def create_generator(self, server, settings):
+        """モックサーバーに接続するテスト用のインスタンスを作成する"""
+        return create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=1,
+            another_version_generate_count=2,
+            url=server.url,
+            sd_model_checkpoint="mock.safetensors",
+            sd_model_prefix="mock",
+            use_custom_checkpoint=True,
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+    def assert_batch_saved(self, expected_images):
+        """バッチフォルダに画像とフォルダ名のSeed値を記録したJSONが保存されていることを確認する"""
+        batch_folders = os.listdir(self.base_path)
+        self.assertEqual(len(batch_folders), 1)
+        batch_folder = os.path.join(self.base_path, batch_folders[0])
+        seed = int(batch_folders[0].rsplit("-", 1)[-1])
+        for i in range(1, expected_images + 1):
+            filename = str(i).zfill(5)
+            self.assertTrue(os.path.exists(os.path.join(batch_folder, filename + ".png")))
+            with open(os.path.join(batch_folder, filename + ".json"), encoding='utf-8') as f:
+                self.assertEqual(int(json.load(f)["seed"]), seed)
+
+    def test_generator_runs_against_mock(self):
+        """モデルを切り替えてからバッチを生成し、モックのinfotextからSeed値が保存されることをテスト"""
+        server = self.start_server(model_load_time=0.2)
+        generator = self.create_generator(server, {"model_switch": {"initial_interval": 0.05}})
+        generator.run()
+
+        self.assertEqual(server.current_model, "mock.safetensors")
+        self.assertEqual(server.stats["model_loads"], 1)
+        self.assertEqual(server.stats["txt2img"], 3)
+        self.assert_batch_saved(3)
+
+    def test_injected_errors_are_retried(self):
+        """エラーを注入した場合もリトライにより全ての画像が保存されることをテスト"""
+        server = self.start_server(error_rate=0.5)
+        generator = self.create_generator(server, {
+            "retry": {"max_retries": 10, "backoff_base": 0, "backoff_max": 0},
+            "circuit_breaker": {"failure_threshold": 100}
+        })
+        generator.run()
+
+        self.assertGreater(server.stats["errors"], 0)
+        self.assertEqual(server.stats["images"], 3)
+        self.assert_batch_saved(3)
+
+    def test_abg_remover_and_png_info(self):
+        """ABG Removerを指定すると3つの画像を返し、元画像のPNGInfoを /png-info で取得できることをテスト"""
+        server = self.start_server()
+        payload = {"prompt": "1girl", "negative_prompt": "bad", "seed": 42, "width": 64, "height": 96, "script_name": "ABG Remover"}
+        r = requests.post(f"{server.url}/sdapi/v1/txt2img", json=payload).json()
+
+        self.assertEqual(len(r["images"]), 3)
+        modes = [Image.open(io.BytesIO(base64.b64decode(image))).mode for image in r["images"]]
+        self.assertEqual(modes, ["RGB", "L", "RGBA"])
+        info = json.loads(r["info"])
+        self.assertEqual(len(info["infotexts"]), 1)
+        self.assertIn("Seed: 42", info["infotexts"][0])
+
+        # 同じペイロードは同じ画像になる
+        self.assertEqual(requests.post(f"{server.url}/sdapi/v1/txt2img", json=payload).json()["images"], r["images"])
+
+        png_info = requests.post(f"{server.url}/sdapi/v1/png-info", json={"image": r["images"][0]}).json()
+        self.assertEqual(png_info["info"], info["infotexts"][0])
+
+        server.abg_remover = False
+        self.assertEqual(requests.post(f"{server.url}/sdapi/v1/txt2img", json=payload).status_code, 422)
+
+    def test_progress_and_interrupt(self):
+        """描画中は /progress で進捗と待ち行列を返し、/interrupt で中断できることをテスト"""
+        server = self.start_server(latency=5)
+        payload = {"prompt": "test", "seed": 1, "steps": 50, "batch_size": 3, "width": 64, "height": 64}
+        responses = []
+        threads = [
+            threading.Thread(target=lambda: responses.append(requests.post(f"{server.url}/sdapi/v1/txt2img", json=payload).json()))
+            for _ in range(2)
+        ]
+        for thread in threads:
+            thread.start()
+
+        def wait_for_render(queue):
+            """指定した待ち行列の長さで描画が始まるまで待つ"""
+            deadline = time.time() + 5
+            while time.time() < deadline:
+                progress = requests.get(f"{server.url}/sdapi/v1/progress").json()
+                if progress["state"]["sampling_step"] > 0 and progress["queue"] == queue:
+                    return progress
+                time.sleep(0.02)
+            self.fail("描画が始まりません")
+
+        start_time = time.time()
+        progress = wait_for_render(queue=1)
+        self.assertEqual(progress["state"]["job_count"], 3)
+        self.assertGreater(progress["progress"], 0)
+
+        # 描画中のリクエストを中断すると、待っていたリクエストの描画が始まる
+        requests.post(f"{server.url}/sdapi/v1/interrupt")
+        wait_for_render(queue=0)
+        requests.post(f"{server.url}/sdapi/v1/interrupt")
+        for thread in threads:
+            thread.join()
+
+        self.assertLess(time.time() - start_time, 5)
+        self.assertEqual([len(r["images"]) for r in responses], [1, 1])
+        self.assertEqual(server.stats["interrupted"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model_load_times import ModelLoadTimes
+from tests.helpers import StubWebUIHandler, create_generator, start_stub_server
+
+
+class SlowModelLoadHandler(StubWebUIHandler):
+    """モデルの切り替えに server.load_time 秒かかる Web UI のスタブ"""
+
+    def do_GET(self):
+        server = self.server
+        if server.pending_model and time.time() - server.switch_started >= server.load_time:
+            server.model, server.pending_model = server.pending_model, None
+        self._send_json({"sd_model_checkpoint": server.model})
+
+    def do_POST(self):
+        payload = self._read_json()
+        self.server.pending_model = payload["sd_model_checkpoint"]
+        self.server.switch_started = time.time()
+        self._send_json({})
+
+
+class TestModelSwitch(unittest.TestCase):
+    """モデル切り替えの待機処理とロード時間の記録のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.server = start_stub_server(
+            self, SlowModelLoadHandler, model="old.safetensors", pending_model=None, load_time=0.3
+        )
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, model_switch_settings):
+        settings = {"model_switch": model_switch_settings, "progress_monitor": {"enabled": False}}
+        return create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            backends=[self.server.url]
+        )
+
+    def test_adaptive_polling_records_load_time(self):
+        """ロード完了後すぐに切り替えが確認され、ロード時間が記録されることをテスト"""
+        generator = self.create_generator({"initial_interval": 0.05, "max_interval": 0.2, "deadline": 5})
+
+        start_time = time.time()
+        self.assertTrue(generator.set_model("new.safetensors"))
+        elapsed_time = time.time() - start_time
+
+        self.assertGreaterEqual(elapsed_time, 0.3)
+        self.assertLess(elapsed_time, 1.5)
+        self.assertEqual(generator.backend_pool.primary.current_model, "new.safetensors")
+
+        # ロード時間がファイルに保存され、次回の予測に使われる
+        load_times_file = os.path.join(self.temp_dir, "output", "model_load_times.json")
+        with open(load_times_file, encoding="utf-8") as f:
+            records = json.load(f)
+        self.assertEqual(records["new.safetensors"]["count"], 1)
+        predicted = ModelLoadTimes(load_times_file).predict("new.safetensors")
+        self.assertAlmostEqual(predicted, records["new.safetensors"]["average"])
+        self.assertGreaterEqual(predicted, 0.3)
+
+    def test_deadline(self):
+        """期限内にロードが完了しない場合は失敗することをテスト"""
+        self.server.load_time = 10
+        generator = self.create_generator({"initial_interval": 0.05, "max_interval": 0.1, "deadline": 0.4})
+
+        start_time = time.time()
+        self.assertFalse(generator.set_model("new.safetensors"))
+        self.assertLess(time.time() - start_time, 2)
+        self.assertIsNone(generator.model_load_times.predict("new.safetensors"))
+
+    def test_model_load_times_average(self):
+        """ロード時間の平均とバックエンド毎の直近の実績が予測に使われることをテスト"""
+        load_times = ModelLoadTimes()
+        load_times.record("model", 10, "http://a")
+        load_times.record("model", 20, "http://b")
+        self.assertEqual(load_times.predict("model"), 15)
+        self.assertEqual(load_times.predict("model", "http://a"), 10)
+        self.assertEqual(load_times.predict("model", "http://c"), 15)
+        self.assertEqual(load_times.predict("unknown", default=30), 30)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import json
+import base64
+import io
+import shlex
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from tests.helpers import create_generator
+
+
+def create_script_response(payload):
+    """"Prompts from file or textbox" スクリプトと同じく、1行につき1枚の画像を返す txt2img API のレスポンスを作成する"""
+    if payload.get("script_name") == "prompts from file or textbox":
+        prompts = []
+        for line in payload["script_args"][-1].splitlines():
+            args = shlex.split(line)
+            prompts.append((args[args.index("--prompt") + 1], args[args.index("--negative_prompt") + 1]))
+    else:
+        prompts = [(payload["prompt"], payload["negative_prompt"])]
+
+    images = []
+    infotexts = []
+    for prompt, negative_prompt in prompts:
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), color='blue').save(buffer, format='PNG')
+        images.append(base64.b64encode(buffer.getvalue()).decode())
+        infotexts.append(f"{prompt}\nNegative prompt: {negative_prompt}\nSteps: 50, Seed: {payload['seed']}")
+    # スクリプトの結果の all_seeds には先頭のSeed値のみが含まれる
+    return {
+        "images": images,
+        "info": json.dumps({"seed": payload["seed"], "all_seeds": [payload["seed"]], "infotexts": infotexts})
+    }
+
+
+class TestMultiPrompt(unittest.TestCase):
+    """別バージョンの画像のプロンプトを1回のリクエストで送信するモードのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, variation_settings):
+        """テスト用のインスタンスを作成する"""
+        return create_generator(
+            self,
+            self.temp_dir,
+            {"variation": variation_settings},
+            image_generate_batch_execute_count=1,
+            another_version_generate_count=4,
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+    def test_version_prompts_in_one_request(self):
+        """別バージョンの画像のプロンプトが1回のリクエストで送信され、各ファイルに正しいプロンプトが保存されることをテスト"""
+        generator = self.create_generator({"multi_prompt": True})
+        payloads = []
+
+        def request(payload):
+            payloads.append(payload)
+            return create_script_response(payload)
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=request):
+            generator.run()
+
+        # オリジナル画像1回 + 別バージョン4枚を1回
+        self.assertEqual(len(payloads), 2)
+        self.assertNotIn("script_name", payloads[0])
+        self.assertEqual(payloads[1]["script_name"], "prompts from file or textbox")
+        self.assertEqual(payloads[1]["script_args"][:3], [False, False, "start"])
+        self.assertEqual(len(payloads[1]["script_args"][3].splitlines()), 4)
+
+        batch_folder = os.path.join(self.base_path, os.listdir(self.base_path)[0])
+        seed = int(os.path.basename(batch_folder).rsplit("-", 1)[-1])
+        manifest = BatchManifest.load(batch_folder)
+        self.assertEqual(manifest.get_missing_jobs(), [])
+        for job in manifest.jobs[1:]:
+            with open(os.path.join(batch_folder, job["filename"] + ".json"), encoding='utf-8') as f:
+                saved = json.load(f)
+            self.assertEqual(saved["actual_prompt"], job["payload"]["prompt"])
+            self.assertEqual(int(saved["seed"]), seed)
+
+    def test_max_prompts_per_request(self):
+        """max_prompts_per_request を超える場合は均等に分けて送信し、旧バージョンのWeb UI向けに引数を省略できることをテスト"""
+        generator = self.create_generator({"multi_prompt": True, "max_prompts_per_request": 3, "prompt_position": None})
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=create_script_response) as mock_request:
+            generator.run()
+
+        script_args = [call.args[0]["script_args"] for call in mock_request.call_args_list[1:]]
+        self.assertEqual([len(args) for args in script_args], [3, 3])
+        self.assertEqual([len(args[2].splitlines()) for args in script_args], [2, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from post_process_pipeline import PostProcessPipeline
+from tests.helpers import create_generator, create_txt2img_response
+
+
+class TestPostProcessPipeline(unittest.TestCase):
+    """txt2imgリクエストの送信と後処理を分離するパイプラインのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_bounded_queue_applies_backpressure(self):
+        """キューが埋まっている場合は投入側を待たせ、後処理の例外は Future に設定されることをテスト"""
+        pipeline = PostProcessPipeline(workers=1, queue_size=1)
+        release = threading.Event()
+
+        def failing():
+            raise ValueError("保存に失敗")
+
+        futures = [pipeline.submit(release.wait)]
+        time.sleep(0.05)  # 1件目をワーカーが取り出すのを待つ
+        futures.append(pipeline.submit(failing))
+
+        # キューが埋まっているため、3件目の投入は1件目が終わるまで待たされる
+        threading.Timer(0.3, release.set).start()
+        start_time = time.time()
+        futures.append(pipeline.submit(lambda: "done"))
+        self.assertGreaterEqual(time.time() - start_time, 0.2)
+
+        self.assertEqual(futures[2].result(timeout=5), "done")
+        with self.assertRaises(ValueError):
+            futures[1].result()
+
+        stats = pipeline.get_stats()
+        self.assertEqual((stats["completed"], stats["failed"]), (2, 1))
+        self.assertEqual(stats["queue_depth_max"], 1)
+        self.assertGreaterEqual(stats["stages"]["backpressure"]["max"], 0.2)
+        self.assertEqual(stats["stages"]["post_process"]["count"], 3)
+
+    def test_next_request_is_sent_while_saving(self):
+        """画像の保存中に次のtxt2imgリクエストが送信され、バッチの結果は全ての保存が終わってから記録されることをテスト"""
+        generator = create_generator(
+            self,
+            self.temp_dir,
+            {"post_process": {"workers": 1, "queue_size": 2}},
+            image_generate_batch_execute_count=1,
+            another_version_generate_count=3,
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+        events = []
+        save_generated_images = generator._save_generated_images
+
+        def request(payload):
+            events.append("request")
+            return create_txt2img_response(payload)
+
+        def slow_save(*args):
+            time.sleep(0.1)
+            save_generated_images(*args)
+            events.append("saved")
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=request), \
+                patch.object(generator, '_save_generated_images', side_effect=slow_save):
+            result_images = generator._generate_images(1, 1)
+
+        # 全てのリクエストが最初の画像の保存完了より前に送信される
+        self.assertEqual(events[:4], ["request"] * 4)
+        self.assertEqual(events.count("saved"), 4)
+        self.assertEqual(len(result_images), 4)
+
+        batch_folder = os.path.join(self.base_path, os.listdir(self.base_path)[0])
+        self.assertEqual(BatchManifest.load(batch_folder).get_missing_jobs(), [])
+        stats = generator.post_processor.get_stats()
+        self.assertEqual(stats["stages"]["dispatch"]["count"], 4)
+        self.assertEqual(stats["completed"], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
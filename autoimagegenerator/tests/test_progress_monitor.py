@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, MagicMock
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from progress_monitor import ProgressMonitor, RenderStalledError
+from webui_client import WebUIClient
+from tests.helpers import StubWebUIHandler, create_generator, start_stub_server
+
+
+class HungRenderHandler(StubWebUIHandler):
+    """txt2imgが /sdapi/v1/interrupt を呼ばれるまで応答しない（進捗が止まった）Web UI のスタブ"""
+
+    def do_GET(self):
+        if self.path.startswith("/sdapi/v1/progress"):
+            self._send_json({"progress": 0.4, "eta_relative": 12.0, "state": {"job_count": 1, "job_no": 0, "sampling_step": 8, "sampling_steps": 20}})
+        else:
+            self._send_json({"sd_model_checkpoint": "model"})
+
+    def do_POST(self):
+        self._read_json()
+        if self.path.endswith("/interrupt"):
+            self.server.interrupt_count += 1
+            self.server.interrupted.set()
+            self._send_json({})
+        else:
+            self.server.interrupted.wait(5)
+            self._send_json({"images": [], "info": "{}"})
+
+
+class TestProgressMonitor(unittest.TestCase):
+    """ProgressMonitor（進捗の監視と中断）のテストクラス"""
+
+    def test_stall_detection(self):
+        """ステップが進んでいる間は中断せず、止まった場合のみ中断することをテスト"""
+        client = WebUIClient("http://localhost:7860")
+        self.addCleanup(client.close)
+        monitor = ProgressMonitor(client, stall_timeout=10)
+
+        with patch.object(client, 'post', return_value=MagicMock(status_code=200)) as mock_post:
+            for now, step in [(0, 1), (2, 5), (4, 9)]:
+                monitor.update({"progress": step / 20, "eta_relative": 5, "state": {"job_count": 1, "sampling_step": step}}, now=now)
+            self.assertEqual(monitor.last_status["step_rate"], 2)
+            self.assertEqual(monitor.last_status["eta"], 5)
+
+            # ジョブがない間は止まっているとは判定しない
+            monitor.update({"progress": 0, "state": {"job_count": 0, "sampling_step": 0}}, now=100)
+            monitor.update({"progress": 0, "state": {"job_count": 0, "sampling_step": 0}}, now=200)
+            mock_post.assert_not_called()
+
+            stuck = {"progress": 0.5, "state": {"job_count": 1, "sampling_step": 10}}
+            monitor.update(stuck, now=300)
+            monitor.update(stuck, now=305)
+            mock_post.assert_not_called()
+            monitor.update(stuck, now=310)
+            mock_post.assert_called_once_with(monitor.interrupt_url)
+
+        self.assertEqual(monitor.stall_count, 1)
+        self.assertTrue(monitor.consume_interrupt())
+        self.assertFalse(monitor.consume_interrupt())
+
+    def test_hung_render_is_interrupted_and_retried(self):
+        """描画が止まったリクエストが中断され、タイムアウトとしてリトライポリシーに渡されることをテスト"""
+        server = start_stub_server(self, HungRenderHandler, interrupt_count=0, interrupted=threading.Event())
+        url = server.url
+
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        settings = {
+            "progress_monitor": {"poll_interval": 0.05, "stall_timeout": 0.3},
+            "retry": {"max_retries": 0}
+        }
+        generator = create_generator(
+            self,
+            temp_dir,
+            settings,
+            backends=[url]
+        )
+
+        with self.assertRaises(RenderStalledError):
+            generator._request_txt2img({"prompt": "test"})
+
+        self.assertEqual(server.interrupt_count, 1)
+        self.assertEqual(generator.progress_monitors[url].stall_count, 1)
+        self.assertEqual(generator.retry_policy.get_stats()["timeout"], 1)
+        self.assertEqual(generator.backend_pool.backends[0].failed, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
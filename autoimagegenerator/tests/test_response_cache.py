@@ -0,0 +1,138 @@
+import os
+import sys
+import time
+import base64
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from response_cache import ResponseCache
+from tests.helpers import create_generator
+
+
+def create_response(image_bytes, count=1):
+    """txt2img API のレスポンスを作成する"""
+    return {
+        "images": [base64.b64encode(image_bytes).decode()] * count,
+        "info": '{"seed": 1234567890}'
+    }
+
+
+def read_images(r):
+    """レスポンスの画像（キャッシュの場合はファイルオブジェクト）をバイト列として読み込んで閉じる"""
+    images = []
+    for image_data in r["images"]:
+        if image_data is None:
+            images.append(None)
+        elif isinstance(image_data, str):
+            images.append(base64.b64decode(image_data))
+        else:
+            images.append(image_data.read())
+            image_data.close()
+    return images
+
+
+class TestResponseCache(unittest.TestCase):
+    """ResponseCache（txt2imgのレスポンスのディスクキャッシュ）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.temp_dir, "cache")
+        self.payload = {"prompt": "test", "negative_prompt": "", "seed": 1234567890, "width": 512, "height": 768}
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_hit_returns_stored_images(self):
+        """同じペイロード（キーの順序が異なる場合も含む）は保存済みの画像とinfoを返し、Seed値がランダムの場合はキャッシュしないことをテスト"""
+        cache = ResponseCache(self.cache_dir)
+        calls = []
+
+        def request():
+            calls.append(1)
+            return create_response(b"image-bytes")
+
+        read_images(cache.fetch(self.payload, request))
+        r = cache.fetch(dict(reversed(list(self.payload.items()))), request)
+        self.assertEqual(read_images(r), [b"image-bytes"])
+        self.assertEqual(r["info"], '{"seed": 1234567890}')
+        self.assertEqual(len(calls), 1)
+
+        # 別のインスタンスでもディスクに保存した内容を使う
+        read_images(ResponseCache(self.cache_dir).fetch(self.payload, request))
+        self.assertEqual(len(calls), 1)
+
+        random_seed_payload = {**self.payload, "seed": -1}
+        cache.fetch(random_seed_payload, request)
+        cache.fetch(random_seed_payload, request)
+        self.assertEqual(len(calls), 3)
+
+    def test_missing_required_image_is_fetched_again(self):
+        """デコードせずに破棄した画像が必要になった場合は取得し直すことをテスト"""
+        cache = ResponseCache(self.cache_dir)
+        partial = create_response(b"image", count=3)
+        partial["images"][0] = None
+        cache.fetch(self.payload, lambda: partial, required_images={2})
+
+        self.assertEqual(read_images(cache.fetch(self.payload, lambda: self.fail("キャッシュを使用していません"), required_images={2}))[2], b"image")
+        r = cache.fetch(self.payload, lambda: create_response(b"image", count=3), required_images=None)
+        self.assertEqual(read_images(r), [b"image"] * 3)
+        self.assertEqual(cache.get_stats()["misses"], 2)
+
+    def test_lru_eviction_by_size(self):
+        """合計サイズが max_size を超えた場合に、最後に使用した日時が古いものから削除されることをテスト"""
+        cache = ResponseCache(self.cache_dir, max_size=2500)
+        payloads = [{**self.payload, "seed": 1000000000 + i} for i in range(3)]
+        for payload in payloads[:2]:
+            cache.fetch(payload, lambda: create_response(b"x" * 1000))
+
+        # 1つ目を使用してから3つ目を保存すると、2つ目が削除される
+        read_images(cache.fetch(payloads[0], lambda: self.fail("キャッシュを使用していません")))
+        cache.fetch(payloads[2], lambda: create_response(b"x" * 1000))
+
+        self.assertEqual(cache.get_stats()["entries"], 2)
+        self.assertLessEqual(cache.total_size, 2500)
+        calls = []
+        cache.fetch(payloads[1], lambda: calls.append(1) or create_response(b"x"))
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrent_duplicates_share_one_request(self):
+        """同じペイロードのリクエストが同時に送信された場合は、1回だけWeb UIに送信されることをテスト"""
+        generator_settings = {"response_cache": {"enabled": True, "cache_dir": self.cache_dir}}
+        generator = create_generator(
+            self,
+            self.temp_dir,
+            generator_settings
+        )
+        calls = []
+
+        def slow_request(payload):
+            calls.append(payload)
+            time.sleep(0.2)
+            return create_response(b"image-bytes")
+
+        results = []
+        with patch.object(generator, '_request_txt2img_uncached', side_effect=slow_request):
+            threads = [
+                threading.Thread(target=lambda: results.append(read_images(generator._request_txt2img(dict(self.payload)))))
+                for _ in range(3)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [[b"image-bytes"]] * 3)
+        self.assertEqual(generator.response_cache.get_stats()["hits"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
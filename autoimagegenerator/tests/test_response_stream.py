@@ -0,0 +1,88 @@
+import os
+import sys
+import json
+import base64
+import tracemalloc
+import unittest
+from unittest.mock import MagicMock
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from response_stream import Txt2ImgResponseParser, read_txt2img_response
+
+
+def feed_in_chunks(parser, body, chunk_size):
+    """レスポンスボディを指定サイズのチャンクに分けてパーサーに渡す"""
+    for start in range(0, len(body), chunk_size):
+        parser.feed(body[start:start + chunk_size])
+    return parser.close()
+
+
+class TestResponseStream(unittest.TestCase):
+    """txt2imgレスポンスの逐次解析のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.images = [os.urandom(size) for size in (1000, 1001, 1002)]
+        self.parameters = {"prompt": "a, {b}, \"c\" [d]", "seed": 123, "nested": {"list": [1, 2, {"x": "}"}]}}
+        self.info = json.dumps({"infotexts": ["日本語のプロンプト\nSteps: 50"], "seed": 123}, ensure_ascii=False)
+        self.body = json.dumps({
+            "images": [base64.b64encode(image).decode() for image in self.images],
+            "parameters": self.parameters,
+            "info": self.info
+        }, ensure_ascii=False, indent=1).encode("utf-8")
+
+    def test_parse_in_small_chunks(self):
+        """チャンクの境界がどこにあっても、画像とその他の値が正しく解析されることをテスト"""
+        for chunk_size in (1, 3, 7, 64, len(self.body)):
+            result = feed_in_chunks(Txt2ImgResponseParser(), self.body, chunk_size)
+            self.assertEqual([image.read() for image in result["images"]], self.images)
+            self.assertEqual(result["parameters"], self.parameters)
+            self.assertEqual(result["info"], self.info)
+
+    def test_escaped_slash_and_data_uri(self):
+        """\\/ でエスケープされたBase64と data URI 形式の画像がデコードできることをテスト"""
+        image = bytes(range(256)) * 4
+        encoded = base64.b64encode(image).decode()
+        self.assertIn("/", encoded)
+        body = ('{"images": ["' + encoded.replace("/", "\\/") + '", "data:image/png;base64,' + encoded + '"], "info": null}').encode()
+        result = feed_in_chunks(Txt2ImgResponseParser(), body, 5)
+        self.assertEqual([f.read() for f in result["images"]], [image, image])
+        self.assertIsNone(result["info"])
+
+    def test_keep_images(self):
+        """keep_images に含まれない画像はデコードされずに None になることをテスト"""
+        result = feed_in_chunks(Txt2ImgResponseParser(keep_images={2}), self.body, 50)
+        self.assertEqual(result["images"][:2], [None, None])
+        self.assertEqual(result["images"][2].read(), self.images[2])
+        self.assertEqual(result["info"], self.info)
+
+    def test_truncated_response(self):
+        """途中で終了したレスポンスはエラーになることをテスト"""
+        with self.assertRaises(ValueError):
+            feed_in_chunks(Txt2ImgResponseParser(), self.body[:len(self.body) // 2], 100)
+
+    def test_read_response_with_bounded_memory(self):
+        """大きな画像でも、解析中のメモリ使用量がレスポンスのサイズに比例しないことをテスト"""
+        image = os.urandom(4 * 1024 * 1024)
+        body = json.dumps({"images": [base64.b64encode(image).decode()], "info": "{}"}).encode()
+        chunks = [body[start:start + 65536] for start in range(0, len(body), 65536)]
+        response = MagicMock()
+        response.iter_content.return_value = iter(chunks)
+        del body
+
+        tracemalloc.start()
+        try:
+            result = read_txt2img_response(response, spool_max_size=256 * 1024)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        self.assertLess(peak, 2 * 1024 * 1024)
+        self.assertEqual(result["images"][0].read(), image)
+        response.close.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
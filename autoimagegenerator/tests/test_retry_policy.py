@@ -0,0 +1,142 @@
+import os
+import sys
+import unittest
+from unittest.mock import MagicMock
+import requests
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from retry_policy import RetryPolicy, CircuitBreaker
+from backend_pool import Backend, BackendPool, NoHealthyBackendError
+
+
+def create_http_error(status_code):
+    """指定したステータスコードのHTTPErrorを作成する"""
+    return requests.exceptions.HTTPError(f"{status_code} Error", response=MagicMock(status_code=status_code))
+
+
+class TestRetryPolicy(unittest.TestCase):
+    """RetryPolicy（リトライ・バックオフ）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.sleeps = []
+        self.policy = RetryPolicy(max_retries=3, backoff_base=1, backoff_max=4, jitter=False, sleep=self.sleeps.append)
+
+    def test_classify(self):
+        """例外がエラーの種類毎に分類されることをテスト"""
+        self.assertEqual(RetryPolicy.classify(create_http_error(503)), RetryPolicy.SERVER_ERROR)
+        self.assertEqual(RetryPolicy.classify(create_http_error(422)), RetryPolicy.CLIENT_ERROR)
+        self.assertEqual(RetryPolicy.classify(requests.exceptions.ReadTimeout()), RetryPolicy.TIMEOUT)
+        self.assertEqual(RetryPolicy.classify(requests.exceptions.ConnectionError()), RetryPolicy.CONNECTION)
+        self.assertEqual(RetryPolicy.classify(NoHealthyBackendError("down", retry_after=5)), RetryPolicy.CIRCUIT_OPEN)
+        self.assertEqual(RetryPolicy.classify(ValueError()), RetryPolicy.OTHER)
+
+    def test_backoff(self):
+        """指数バックオフが上限で頭打ちになり、ジッターは上限以内に収まることをテスト"""
+        self.assertEqual([self.policy.get_backoff(i) for i in range(4)], [1, 2, 4, 4])
+        jitter_policy = RetryPolicy(backoff_base=1, backoff_max=4, jitter=True)
+        for attempt in range(5):
+            self.assertTrue(0 <= jitter_policy.get_backoff(attempt) <= 4)
+
+    def test_retry_until_success(self):
+        """一時的なエラーはリトライされ、カウンターが更新されることをテスト"""
+        func = MagicMock(side_effect=[create_http_error(502), requests.exceptions.ReadTimeout(), "ok"])
+        self.assertEqual(self.policy.execute(func), "ok")
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(self.sleeps, [1, 2])
+        stats = self.policy.get_stats()
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["server_error"], 1)
+        self.assertEqual(stats["timeout"], 1)
+        self.assertEqual(stats["succeeded"], 1)
+
+    def test_no_retry_for_client_error_and_exhaustion(self):
+        """4xxはリトライせず、リトライ回数を超えた場合は最後のエラーが送出されることをテスト"""
+        func = MagicMock(side_effect=create_http_error(400))
+        with self.assertRaises(requests.exceptions.HTTPError):
+            self.policy.execute(func)
+        self.assertEqual(func.call_count, 1)
+
+        func = MagicMock(side_effect=requests.exceptions.ConnectionError("refused"))
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.policy.execute(func)
+        self.assertEqual(func.call_count, 4)
+        self.assertEqual(self.policy.get_stats()["failed"], 2)
+
+    def test_circuit_wait_does_not_consume_retries(self):
+        """全バックエンド停止中は復帰を待ち、待機時間の上限を超えると中止することをテスト"""
+        func = MagicMock(side_effect=[NoHealthyBackendError("down", retry_after=10)] * 5 + ["ok"])
+        self.assertEqual(self.policy.execute(func), "ok")
+        self.assertEqual(self.sleeps, [10] * 5)
+        self.assertEqual(self.policy.get_stats()["retries"], 0)
+
+        self.policy.max_circuit_wait = 15
+        func = MagicMock(side_effect=NoHealthyBackendError("down", retry_after=10))
+        with self.assertRaises(NoHealthyBackendError):
+            self.policy.execute(func)
+        self.assertEqual(func.call_count, 2)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """CircuitBreaker とバックエンドプールの連携のテストクラス"""
+
+    def test_state_transitions(self):
+        """closed -> open -> half_open -> closed/open と遷移することをテスト"""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+        breaker.record_failure(now=100)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record_failure(now=100)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.available(now=105))
+        self.assertEqual(breaker.retry_after(now=105), 5)
+
+        # 待機時間経過後は1件だけ試行できる
+        self.assertTrue(breaker.available(now=110))
+        breaker.before_request()
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.available(now=110))
+
+        # 試行が失敗すると再び open
+        breaker.record_failure(now=110)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        breaker.before_request()
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.open_count, 2)
+
+    def test_pool_pauses_dispatch_to_open_backend(self):
+        """5xxが続いたバックエンドには振り分けず、全て open の場合は retry_after 付きのエラーになることをテスト"""
+        pool = BackendPool([
+            Backend("http://backend-a", breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60)),
+            Backend("http://backend-b", breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        ])
+        self.addCleanup(pool.close)
+
+        for _ in range(2):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                with pool.lease() as backend:
+                    self.assertEqual(backend.url, "http://backend-a")
+                    raise create_http_error(500)
+        self.assertEqual(pool.backends[0].breaker.state, CircuitBreaker.OPEN)
+        self.assertTrue(pool.backends[0].healthy)
+
+        # 4xxはバックエンドの障害として数えない
+        for _ in range(3):
+            with self.assertRaises(requests.exceptions.HTTPError):
+                with pool.lease() as backend:
+                    self.assertEqual(backend.url, "http://backend-b")
+                    raise create_http_error(422)
+        self.assertEqual(pool.backends[1].breaker.state, CircuitBreaker.CLOSED)
+
+        pool.backends[1].breaker.record_failure()
+        pool.backends[1].breaker.record_failure()
+        with self.assertRaises(NoHealthyBackendError) as context:
+            pool.acquire()
+        self.assertGreater(context.exception.retry_after, 0)
+        self.assertLessEqual(context.exception.retry_after, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from mock_webui import MockWebUIServer
+from shared_output import SharedOutputHandoff, SharedOutputTimeout
+from tests.helpers import create_generator
+
+
+class TestSharedOutput(unittest.TestCase):
+    """共有フォルダ経由でtxt2imgの画像を受け取るハンドオフのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.shared_dir = os.path.join(self.temp_dir, "shared")
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def test_images_are_picked_up_from_shared_folder(self):
+        """画像をBase64で受け取らずに共有フォルダから読み込み、バッチ毎に保存した後にジョブフォルダを削除することをテスト"""
+        server = MockWebUIServer(models=["mock.safetensors"], seed=0).start()
+        self.addCleanup(server.stop)
+        settings = {
+            "base_image_batch_size": 2,
+            "shared_output": {"enabled": True, "client_dir": self.shared_dir}
+        }
+        generator = create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=2,
+            another_version_generate_count=1,
+            url=server.url,
+            sd_model_checkpoint="mock.safetensors",
+            sd_model_prefix="mock",
+            use_custom_checkpoint=True,
+            output_folder_prefix="/realistic/female/normal"
+        )
+
+        responses = []
+        post_txt2img = generator._post_txt2img
+
+        def record_response(backend, payload, stream):
+            r = post_txt2img(backend, payload, stream)
+            responses.append(r)
+            return r
+
+        with patch.object(generator, '_post_txt2img', side_effect=record_response):
+            generator.run()
+
+        # 2つのバッチをまとめて2回（オリジナル画像・別バージョン）描画し、画像はレスポンスに含まれない
+        self.assertEqual([r["images"] for r in responses], [[], []])
+        batch_folders = sorted(os.listdir(self.base_path))
+        self.assertEqual(len(batch_folders), 2)
+        for batch_folder in batch_folders:
+            folder_path = os.path.join(self.base_path, batch_folder)
+            seed = int(batch_folder.rsplit("-", 1)[-1])
+            for filename in ("00001", "00002"):
+                self.assertTrue(os.path.exists(os.path.join(folder_path, filename + ".png")))
+                with open(os.path.join(folder_path, filename + ".json"), encoding='utf-8') as f:
+                    self.assertEqual(int(json.load(f)["seed"]), seed)
+            self.assertEqual(BatchManifest.load(folder_path).get_missing_jobs(), [])
+
+        # 受け取った画像とジョブフォルダは削除される
+        self.assertEqual(os.listdir(self.shared_dir), [])
+
+    def test_waits_for_complete_files(self):
+        """書き込み途中のPNGは揃うまで待ち、期限を過ぎた場合はタイムアウトとしてジョブフォルダを削除することをテスト"""
+        handoff = SharedOutputHandoff(self.shared_dir, server_dir="/mnt/shared", timeout=0.3, poll_interval=0.05)
+        payload, job_dir = handoff.prepare({"prompt": "test", "override_settings": {"CLIP_stop_at_last_layers": 2}})
+        self.assertTrue(payload["override_settings"]["outdir_txt2img_samples"].startswith("/mnt/shared/"))
+        self.assertEqual(payload["override_settings"]["CLIP_stop_at_last_layers"], 2)
+        self.assertFalse(payload["send_images"])
+
+        with open(os.path.join(job_dir, "00000-1.png"), "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n partial")
+        with self.assertRaises(SharedOutputTimeout):
+            handoff.collect(job_dir, {"images": [], "info": json.dumps({"all_prompts": ["test"]})})
+        self.assertFalse(os.path.exists(job_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
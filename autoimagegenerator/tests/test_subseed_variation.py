@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import base64
+import io
+import shutil
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch_manifest import BatchManifest
+from tests.helpers import create_generator
+
+
+def create_variation_response(payload):
+    """Web UIと同じ規則でSeed値・subseedを割り当てた txt2img API のレスポンスを作成する"""
+    batch_size = payload.get("batch_size", 1)
+    if payload.get("subseed_strength"):
+        seeds = [payload["seed"]] * batch_size
+        subseeds = [payload["subseed"] + i for i in range(batch_size)]
+    else:
+        seeds = [payload["seed"] + i for i in range(batch_size)]
+        subseeds = [0] * batch_size
+
+    images = []
+    infotexts = []
+    for seed, subseed in zip(seeds, subseeds):
+        buffer = io.BytesIO()
+        Image.new('RGB', (8, 8), color='blue').save(buffer, format='PNG')
+        images.append(base64.b64encode(buffer.getvalue()).decode())
+        infotexts.append(f"{payload['prompt']}\nNegative prompt: {payload['negative_prompt']}\nSteps: 50, Seed: {seed}, Variation seed: {subseed}")
+    return {
+        "images": images,
+        "info": json.dumps({"seed": seeds[0], "all_seeds": seeds, "all_subseeds": subseeds, "infotexts": infotexts})
+    }
+
+
+class TestSubseedVariation(unittest.TestCase):
+    """subseed による別バージョンの画像の生成のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.base_path = os.path.join(self.temp_dir, "output", "realistic", "female", "normal")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, settings, batch_count=1, variation_strategy="subseed"):
+        """テスト用のインスタンスを作成する"""
+        return create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            image_generate_batch_execute_count=batch_count,
+            another_version_generate_count=5,
+            output_folder_prefix="/realistic/female/normal",
+            variation_strategy=variation_strategy
+        )
+
+    def test_versions_rendered_in_few_calls(self):
+        """別バージョンの画像が max_batch_size 枚ずつまとめて描画され、1枚ずつ保存されることをテスト"""
+        generator = self.create_generator({"variation": {"subseed_strength": 0.2, "max_batch_size": 3}})
+        payloads = []
+
+        def request(payload):
+            payloads.append(payload)
+            return create_variation_response(payload)
+
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=request):
+            generator.run()
+
+        # オリジナル画像1回 + 別バージョン5枚を3枚と2枚に分けて2回
+        self.assertEqual([payload.get("batch_size") for payload in payloads], [1, 3, 2])
+        self.assertNotIn("subseed_strength", payloads[0])
+
+        batch_folder = os.path.join(self.base_path, os.listdir(self.base_path)[0])
+        seed = int(os.path.basename(batch_folder).rsplit("-", 1)[-1])
+        subseeds = []
+        for i in range(2, 7):
+            filename = str(i).zfill(5)
+            self.assertTrue(os.path.exists(os.path.join(batch_folder, filename + ".png")))
+            with open(os.path.join(batch_folder, filename + ".json"), encoding='utf-8') as f:
+                saved = json.load(f)
+            self.assertEqual(int(saved["seed"]), seed)
+            self.assertEqual(saved["subseed_strength"], 0.2)
+            subseeds.append(saved["subseed"])
+        self.assertEqual(subseeds, list(range(subseeds[0], subseeds[0] + 5)))
+
+        # マニフェストには1枚ずつのペイロードが記録される（--repair用）
+        manifest = BatchManifest.load(batch_folder)
+        self.assertEqual(manifest.get_missing_jobs(), [])
+        self.assertEqual([job["payload"].get("subseed") for job in manifest.jobs[1:]], subseeds)
+        self.assertEqual({job["payload"]["batch_size"] for job in manifest.jobs}, {1})
+
+    def test_combined_with_base_image_batch_size(self):
+        """複数のバッチをまとめる場合は、オリジナル画像をまとめて描画し、別バージョンの画像はバッチ毎にまとめることをテスト"""
+        generator = self.create_generator({"base_image_batch_size": 2, "variation": {"max_batch_size": 6}}, batch_count=2)
+        with patch.object(generator, 'set_model', return_value=True), \
+                patch.object(generator, '_request_txt2img', side_effect=create_variation_response) as mock_request:
+            asyncio.run(generator.arun(max_in_flight=2))
+
+        self.assertEqual(sorted(call.args[0]["batch_size"] for call in mock_request.call_args_list), [2, 5, 5])
+        for batch_folder in os.listdir(self.base_path):
+            manifest = BatchManifest.load(os.path.join(self.base_path, batch_folder))
+            self.assertEqual(manifest.get_missing_jobs(), [])
+
+    def test_invalid_strategy(self):
+        """不正な生成方法を指定した場合はエラーになることをテスト"""
+        with self.assertRaises(ValueError):
+            self.create_generator({}, variation_strategy="unknown")
+
+
+if __name__ == '__main__':
+    unittest.main()
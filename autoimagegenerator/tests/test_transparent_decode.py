@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import base64
+import io
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from PIL import Image
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.helpers import create_generator
+
+
+def create_png_bytes(color, mode='RGB'):
+    """テスト用の4x4 PNG画像のバイト列を作成する"""
+    buffer = io.BytesIO()
+    Image.new(mode, (4, 4), color=color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class TestTransparentDecode(unittest.TestCase):
+    """透過画像生成時（ABG Remover）の画像デコードのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.generator = create_generator(
+            self,
+            self.temp_dir,
+            is_transparent_background=True,
+            subcategory="transparent"
+        )
+        self.output_folder_path = os.path.join(self.temp_dir, "output", "batch")
+        os.makedirs(self.output_folder_path)
+
+        # ABG Removerの出力: 元画像、マスク画像、透過背景画像
+        self.images = [
+            create_png_bytes('red'),
+            create_png_bytes(255, mode='L'),
+            create_png_bytes((0, 0, 255, 0), mode='RGBA')
+        ]
+        self.body = json.dumps({
+            "images": [base64.b64encode(image).decode() for image in self.images],
+            "info": json.dumps({"seed": 1234567890, "infotexts": ["test prompt\nNegative prompt: test negative\nSeed: 1234567890"]})
+        }).encode()
+        self.prompt_info = {
+            "positive_base_prompt_dict": {},
+            "positive_pose_prompt_dict": {},
+            "positive_optional_prompt_dict": {},
+            "negative_prompt_dict": {},
+            "cancel_prompts": []
+        }
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def generate(self):
+        """txt2imgのレスポンスをモックして画像を1枚生成する"""
+        response = MagicMock(status_code=200)
+        response.iter_content.return_value = [self.body]
+        with patch.object(self.generator.client, 'post', return_value=response), \
+                patch.object(self.generator, '_open_image_data', wraps=self.generator._open_image_data) as mock_open:
+            self.generator._generate_single_image({"prompt": "test prompt"}, self.output_folder_path, "00001", {}, self.prompt_info)
+        return mock_open
+
+    def test_decode_only_transparent_image(self):
+        """保存する透過背景画像のみがデコードされ、元画像とマスク画像は保存されないことをテスト"""
+        mock_open = self.generate()
+
+        self.assertEqual(mock_open.call_count, 1)
+        with Image.open(os.path.join(self.output_folder_path, "00001.png")) as saved_image:
+            self.assertEqual(saved_image.mode, 'RGBA')
+            self.assertIn("test prompt", saved_image.info["parameters"])
+        self.assertFalse(os.path.exists(os.path.join(self.output_folder_path, "transparent-source")))
+
+    def test_save_transparent_sources(self):
+        """save_transparent_sources が有効な場合は元画像とマスク画像がバイト列のまま保存されることをテスト"""
+        self.generator.SAVE_TRANSPARENT_SOURCES = True
+        mock_open = self.generate()
+
+        self.assertEqual(mock_open.call_count, 1)
+        source_folder = os.path.join(self.output_folder_path, "transparent-source")
+        with open(os.path.join(source_folder, "00001-original.png"), "rb") as f:
+            self.assertEqual(f.read(), self.images[0])
+        with open(os.path.join(source_folder, "00001-mask.png"), "rb") as f:
+            self.assertEqual(f.read(), self.images[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tests.helpers import StubWebUIHandler, create_generator, start_stub_server
+
+
+class WarmupHandler(StubWebUIHandler):
+    """送信されたtxt2imgのペイロードを記録する Web UI のスタブ"""
+
+    def do_GET(self):
+        self._send_json({"sd_model_checkpoint": self.server.model})
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path.endswith("/options"):
+            self.server.model = payload["sd_model_checkpoint"]
+        else:
+            self.server.txt2img_payloads.append(payload)
+        self._send_json({"images": [], "info": "{}"})
+
+
+class TestWarmup(unittest.TestCase):
+    """モデル切り替え後のウォームアップのテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.server = start_stub_server(self, WarmupHandler, model="old.safetensors", txt2img_payloads=[])
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        shutil.rmtree(self.temp_dir)
+
+    def create_generator(self, warmup_settings):
+        settings = {
+            "warmup": warmup_settings,
+            "model_switch": {"initial_interval": 0.01},
+            "capabilities": {"enabled": False},
+            "progress_monitor": {"enabled": False}
+        }
+        return create_generator(
+            self,
+            self.temp_dir,
+            settings,
+            sd_model_checkpoint="sd_xl_base_1.0.safetensors",
+            sd_model_prefix="sd_xl_base_1.0",
+            category="vehicle",
+            subcategory="car",
+            width=1024,
+            height=640,
+            use_lora=True,
+            lora_name="cars-000008",
+            backends=[self.server.url]
+        )
+
+    def test_warmup_after_model_switch(self):
+        """モデル切り替え後にジョブと同じ解像度・LoRAで低ステップの描画が1回行われることをテスト"""
+        generator = self.create_generator({"enabled": True, "steps": 3})
+        self.assertTrue(generator.set_model("sd_xl_base_1.0.safetensors"))
+        self.assertTrue(generator.set_model("sd_xl_base_1.0.safetensors"))
+
+        self.assertEqual(len(self.server.txt2img_payloads), 1)
+        payload = self.server.txt2img_payloads[0]
+        self.assertEqual(payload["steps"], 3)
+        self.assertEqual((payload["width"], payload["height"]), (generator.width, generator.height))
+        self.assertFalse(payload["send_images"])
+        self.assertIn("alwayson_scripts", payload)
+        self.assertIn(generator.backend_pool.primary.url, generator.warmup_times)
+
+    def test_warmup_disabled_by_default(self):
+        """ウォームアップがデフォルトでは無効であることをテスト"""
+        generator = self.create_generator({})
+        self.assertTrue(generator.set_model("sd_xl_base_1.0.safetensors"))
+
+        self.assertEqual(self.server.txt2img_payloads, [])
+        self.assertEqual(generator.warmup_times, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
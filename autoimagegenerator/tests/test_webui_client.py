@@ -0,0 +1,66 @@
+import os
+import sys
+import unittest
+from unittest.mock import patch, MagicMock
+
+# テスト対象のモジュールへのパスを追加
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from webui_client import WebUIClient
+
+
+class TestWebUIClient(unittest.TestCase):
+    """WebUIClient（共有HTTPトランスポート）のテストクラス"""
+
+    def setUp(self):
+        """テスト前の準備"""
+        self.client = WebUIClient("http://localhost:7860/")
+
+    def tearDown(self):
+        """テスト後のクリーンアップ"""
+        self.client.close()
+
+    def test_endpoint_url(self):
+        """エンドポイント名からURLが生成されることをテスト"""
+        self.assertEqual(self.client.endpoint_url("txt2img"), "http://localhost:7860/sdapi/v1/txt2img")
+
+    def test_timeout_by_endpoint(self):
+        """URLに応じたタイムアウトが選択されることをテスト"""
+        self.assertEqual(self.client.get_timeout("http://localhost:7860/sdapi/v1/txt2img"), (5, 900))
+        self.assertEqual(self.client.get_timeout("http://localhost:7860/sdapi/v1/options"), (5, 30))
+        # 未定義のエンドポイントはデフォルト値
+        self.assertEqual(self.client.get_timeout("http://localhost:7860/sdapi/v1/unknown"), (5, 60))
+
+    def test_from_settings(self):
+        """settings.json の http セクションが反映されることをテスト"""
+        client = WebUIClient.from_settings("http://localhost:7860", {
+            "pool_maxsize": 2,
+            "compression": False,
+            "timeouts": {"txt2img": [3, 120]}
+        })
+        try:
+            self.assertEqual(client.get_timeout(client.endpoint_url("txt2img")), (3, 120))
+            self.assertEqual(client.session.headers["Accept-Encoding"], "identity")
+            adapter = client.session.get_adapter("http://localhost:7860")
+            self.assertEqual(adapter._pool_maxsize, 2)
+        finally:
+            client.close()
+
+    def test_request_uses_shared_session(self):
+        """全てのリクエストが共有セッション経由でタイムアウト付きで送信されることをテスト"""
+        with patch.object(self.client.session, "request", return_value=MagicMock(status_code=200)) as mock_request:
+            self.client.post(self.client.endpoint_url("txt2img"), json={"prompt": "test"})
+            self.client.get(self.client.endpoint_url("options"))
+
+        self.assertEqual(mock_request.call_count, 2)
+        post_args, post_kwargs = mock_request.call_args_list[0]
+        self.assertEqual(post_args[0], "POST")
+        self.assertEqual(post_kwargs["json"], {"prompt": "test"})
+        self.assertEqual(post_kwargs["timeout"], (5, 900))
+        get_args, get_kwargs = mock_request.call_args_list[1]
+        self.assertEqual(get_args[0], "GET")
+        self.assertEqual(get_kwargs["timeout"], (5, 30))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import logging
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class WebUIClient:
+    """
+    Stable Diffusion Web UI APIへの共有HTTPトランスポート
+
+    requests.Session を使い回すことで、バッチ毎・画像毎に発生していたTCP接続の確立を省略する。
+    エンドポイント毎のタイムアウト、接続プールのサイズ、圧縮の可否は settings.json の "http" で変更できる。
+    """
+
+    # エンドポイント毎のタイムアウト（接続タイムアウト秒, 読み込みタイムアウト秒）
+    DEFAULT_TIMEOUTS = {
+        "options": (5, 30),
+        "txt2img": (5, 900),
+        "png-info": (5, 60),
+        "progress": (5, 10),
+        "interrupt": (5, 10),
+        "default": (5, 60)
+    }
+
+    def __init__(
+        self,
+        base_url,
+        pool_connections=4,
+        pool_maxsize=8,
+        pool_block=False,
+        timeouts=None,
+        enable_compression=True,
+        logger=None
+    ):
+        """
+        Args:
+            base_url (str): Stable Diffusion Web UI のURL（例: http://localhost:7860）
+            pool_connections (int): 接続プールを保持するホスト数
+            pool_maxsize (int): 1ホストあたりに保持する最大接続数
+            pool_block (bool): 接続プールが埋まった場合に空きを待つかどうか
+            timeouts (dict, optional): エンドポイント名をキーとしたタイムアウト設定
+            enable_compression (bool): レスポンスの圧縮（gzip/deflate）を要求するかどうか
+            logger (logging.Logger, optional): ログ出力先
+        """
+        self.base_url = base_url.rstrip("/")
+        self.logger = logger or logging.getLogger(__name__)
+
+        # タイムアウト設定をデフォルト値とマージ（リストで指定された場合もタプルに揃える）
+        self.timeouts = dict(self.DEFAULT_TIMEOUTS)
+        for key, value in (timeouts or {}).items():
+            self.timeouts[key] = tuple(value) if isinstance(value, (list, tuple)) else value
+
+        # Keep-Aliveを有効にしたセッションを作成
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({
+            "Connection": "keep-alive",
+            "Accept-Encoding": "gzip, deflate" if enable_compression else "identity"
+        })
+
+    @classmethod
+    def from_settings(cls, base_url, http_settings=None, logger=None):
+        """
+        settings.json の "http" セクションからクライアントを作成する
+
+        Args:
+            base_url (str): Stable Diffusion Web UI のURL
+            http_settings (dict, optional): "http" セクションの設定値
+            logger (logging.Logger, optional): ログ出力先
+
+        Returns:
+            WebUIClient: 作成したクライアント
+        """
+        http_settings = http_settings or {}
+        return cls(
+            base_url,
+            pool_connections=http_settings.get("pool_connections", 4),
+            pool_maxsize=http_settings.get("pool_maxsize", 8),
+            pool_block=http_settings.get("pool_block", False),
+            timeouts=http_settings.get("timeouts"),
+            enable_compression=http_settings.get("compression", True),
+            logger=logger
+        )
+
+    def endpoint_url(self, endpoint):
+        """エンドポイント名（例: txt2img）からAPIのURLを生成する"""
+        return f"{self.base_url}/sdapi/v1/{endpoint}"
+
+    def get_timeout(self, url):
+        """
+        URLの末尾のパスからエンドポイントを判定し、対応するタイムアウトを返す
+
+        Args:
+            url (str): リクエスト先のURL
+
+        Returns:
+            tuple: (接続タイムアウト秒, 読み込みタイムアウト秒)
+        """
+        endpoint = urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+        return self.timeouts.get(endpoint, self.timeouts["default"])
+
+    def request(self, method, url, **kwargs):
+        """
+        共有セッションを使ってリクエストを送信する
+
+        Args:
+            method (str): HTTPメソッド
+            url (str): リクエスト先のURL
+            **kwargs: requests に渡す追加の引数（timeout を指定した場合はそちらを優先）
+
+        Returns:
+            requests.Response: レスポンス
+        """
+        kwargs.setdefault("timeout", self.get_timeout(url))
+        self.logger.debug(f"{method} {url} (timeout={kwargs['timeout']})")
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        """GETリクエストを送信する"""
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, json=None, **kwargs):
+        """POSTリクエストを送信する"""
+        return self.request("POST", url, json=json, **kwargs)
+
+    def close(self):
+        """セッションを閉じて接続プールを解放する"""
+        self.session.close()